@@ -6,7 +6,7 @@ For production, use wsgi.py instead.
 """
 
 import os
-from app import create_app
+from app import create_app, start_leader_elector
 
 # Create Flask application instance
 env = os.environ.get('FLASK_ENV', 'development')
@@ -25,4 +25,5 @@ if __name__ == '__main__':
     port = int(os.environ.get('FLASK_PORT', 5000))
     debug = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
     
+    start_leader_elector(app, env)
     app.run(host=host, port=port, debug=debug)
\ No newline at end of file
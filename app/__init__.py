@@ -81,6 +81,8 @@ def create_app(config_name=None):
     from app.controllers.attendance_report_controller import attendance_report_bp
     from app.controllers.spjamkerja_scheduler_controller import spjamkerja_scheduler_bp
     from app.controllers.auth_controller import auth_bp
+    from app.controllers.metrics_controller import metrics_bp, register_request_metrics
+    from app.controllers.data_retention_controller import data_retention_bp
     
     app.register_blueprint(auth_bp)  # Authentication routes
     app.register_blueprint(main_bp)
@@ -93,27 +95,52 @@ def create_app(config_name=None):
     app.register_blueprint(attendance_report_bp)
     app.register_blueprint(attendance_worker_bp)  # Attendance worker dashboard
     app.register_blueprint(spjamkerja_scheduler_bp)  # spJamkerja scheduler management
+    app.register_blueprint(metrics_bp)  # Prometheus /metrics
+    app.register_blueprint(data_retention_bp)  # Archive tables and retention job
+    register_request_metrics(app)
     
-    # Initialize database and create default user
-    try:
-        from app.models.user import User
-        User.create_table()
-        User.create_default_user()
-        app.logger.info("[OK] User authentication system initialized")
-    except Exception as e:
-        app.logger.error(f"[ERROR] Failed to initialize auth system: {e}")
+    # Schema bootstrapping (users, attendance_queues, service_leases, archives) is the
+    # one-time `flask init-db` command; startup makes no database round trips
+    from app.cli import register_cli
+    register_cli(app)
     
-    # Auto-start spJamkerja scheduler on application startup
+    from config.devices import validate_device_config
+    for error in validate_device_config():
+        app.logger.warning(f"[WARN] Device configuration: {error}")
+    
+    return app
+
+
+def start_leader_elector(app, config_name):
+    """
+    Background jobs run in one process per deployment: the leader elector starts
+    each role (spJamkerja scheduler auto-starts) in the process holding its lease.
+    Called from the server entry points (app.py, wsgi.py) only, so `flask` CLI
+    commands never take a lease or start a job.
+    """
     if config_name in ['production', 'development']:
         try:
-            from app.services.spjamkerja_scheduler_service import get_spjamkerja_scheduler
-            scheduler = get_spjamkerja_scheduler()
-            success, message = scheduler.start()
-            if success:
-                app.logger.info(f"[OK] spJamkerja Scheduler auto-started: {message}")
-            else:
-                app.logger.warning(f"[WARN] spJamkerja Scheduler start failed: {message}")
+            from app.services.leader_election import (
+                get_leader_elector, SCHEDULER_ROLE, WORKER_ROLE, STREAMING_ROLE, RETENTION_ROLE
+            )
+            from config.devices import DATA_RETENTION_CONFIG
+            from app.utils.lazy import LazyInstance
+            
+            # Services are only imported/constructed in the process that wins the role
+            scheduler = LazyInstance('app.services.spjamkerja_scheduler_service:get_spjamkerja_scheduler')
+            streaming_service = LazyInstance('app.services.streaming_service:get_streaming_service')
+            worker_controller = LazyInstance('app.controllers.attendance_worker_controller:attendance_worker_controller')
+            retention = LazyInstance('app.services.data_retention_service:get_data_retention_service')
+            elector = get_leader_elector()
+            elector.register(SCHEDULER_ROLE, lambda: scheduler.start(), lambda: scheduler.stop(),
+                             desired_by_default=True)
+            elector.register(WORKER_ROLE, lambda: worker_controller.start_worker_local(),
+                             lambda: worker_controller.stop_worker_local())
+            elector.register(STREAMING_ROLE, lambda: streaming_service.start_streaming(),
+                             lambda: streaming_service.stop_streaming())
+            elector.register(RETENTION_ROLE, lambda: retention.start(), lambda: retention.stop(),
+                             desired_by_default=DATA_RETENTION_CONFIG.get('enabled', False))
+            success, message = elector.start()
+            app.logger.info(f"[OK] Leader elector: {message} ({elector.identity})")
         except Exception as e:
-            app.logger.error(f"[ERROR] Error auto-starting spJamkerja Scheduler: {e}")
-    
-    return app
+            app.logger.error(f"[ERROR] Error starting leader elector: {e}")
@@ -0,0 +1,114 @@
+"""
+Flask CLI commands
+One-time setup that used to run on every application start.
+
+    flask --app app.py init-db
+    flask --app app.py archive-data [--dry-run]
+    flask --app app.py export-archive [--table FPLog] [--month 2025-01] [--force]
+    flask --app app.py query-archive --table FPLog --start 2024-01-01 --end 2024-12-31 [--pin 1234]
+"""
+
+import click
+
+from config.devices import validate_device_config
+
+
+def register_cli(app):
+    """Register the application's CLI commands"""
+
+    @app.cli.command('init-db')
+    def init_db():
+        """Create application tables and the default admin user"""
+        from app.models.user import User
+        from app.models.attendance import AttendanceModel
+        from app.services.leader_election import get_leader_elector
+        from app.services.data_retention_service import get_data_retention_service
+
+        ok = True
+
+        if User.create_table() and User.create_default_user():
+            click.echo("[OK] users table and default user ready")
+        else:
+            click.echo("[ERROR] Failed to initialize users table (see log)")
+            ok = False
+
+        success, message = AttendanceModel().create_attendance_queues_table()
+        click.echo(f"[{'OK' if success else 'ERROR'}] attendance_queues: {message}")
+        ok = ok and success
+
+        try:
+            get_leader_elector()._ensure_table()
+            click.echo("[OK] service_leases table ready")
+        except Exception as e:
+            click.echo(f"[ERROR] service_leases: {e}")
+            ok = False
+
+        success, message = get_data_retention_service().ensure_archive_tables()
+        click.echo(f"[{'OK' if success else 'ERROR'}] archive tables: {message}")
+        ok = ok and success
+
+        if not ok:
+            raise SystemExit(1)
+
+    @app.cli.command('archive-data')
+    @click.option('--dry-run', is_flag=True, help='Only count the rows that would be archived')
+    def archive_data(dry_run):
+        """Move rows past their retention window (DATA_RETENTION_CONFIG) to the archive tables"""
+        from app.services.data_retention_service import get_data_retention_service
+
+        success, message = get_data_retention_service().run(dry_run=dry_run)
+        click.echo(f"[{'OK' if success else 'ERROR'}] {message}")
+        if not success:
+            raise SystemExit(1)
+
+    @app.cli.command('export-archive')
+    @click.option('--table', 'tables', multiple=True, help='Table to export (default: all configured)')
+    @click.option('--month', 'months', multiple=True, help='YYYY-MM (default: every closed month not archived yet)')
+    @click.option('--force', is_flag=True, help='Rewrite months that are already archived')
+    def export_archive(tables, months, force):
+        """Export closed months to the columnar archive (COLUMNAR_ARCHIVE_CONFIG)"""
+        from app.services.columnar_archive_service import ColumnarArchiveExporter
+
+        success, message = ColumnarArchiveExporter().export(list(tables) or None, list(months) or None, force)
+        click.echo(f"[{'OK' if success else 'ERROR'}] {message}")
+        if not success:
+            raise SystemExit(1)
+
+    @app.cli.command('query-archive')
+    @click.option('--table', required=True)
+    @click.option('--start', required=True, help='YYYY-MM-DD')
+    @click.option('--end', required=True, help='YYYY-MM-DD (inclusive)')
+    @click.option('--pin', 'pins', multiple=True)
+    @click.option('--columns', help='Comma-separated columns (default: all)')
+    def query_archive(table, start, end, pins, columns):
+        """Print archived rows as CSV without querying SQL Server"""
+        import csv
+        import sys
+        from app.services.columnar_archive_service import ColumnarArchiveReader
+
+        try:
+            rows = ColumnarArchiveReader().rows(
+                table, start, end, pins=list(pins) or None,
+                columns=[name.strip() for name in columns.split(',')] if columns else None
+            )
+        except ValueError as e:
+            click.echo(f"[ERROR] {e}", err=True)
+            raise SystemExit(1)
+        if not rows:
+            click.echo("No archived rows for this range", err=True)
+            return
+        writer = csv.DictWriter(sys.stdout, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    @app.cli.command('check-devices')
+    def check_devices():
+        """Validate config/devices.py"""
+        errors = validate_device_config()
+        if not errors:
+            click.echo("[OK] Device configuration is valid")
+            return
+        click.echo("Device configuration validation errors:")
+        for error in errors:
+            click.echo(f"  - {error}")
+        raise SystemExit(1)
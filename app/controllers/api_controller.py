@@ -1,6 +1,8 @@
 from flask import jsonify, request
 from app.services.attendance_service import AttendanceService
-from app.services.streaming_service import StreamingService
+from app.services.streaming_service import get_streaming_service
+from app.services.leader_election import get_leader_elector, STREAMING_ROLE
+from app.services.punch_tracing import get_punch_tracer
 from datetime import datetime
 
 class APIController:
@@ -8,7 +10,8 @@ class APIController:
     
     def __init__(self):
         self.attendance_service = AttendanceService()
-        self.streaming_service = StreamingService()
+        self.streaming_service = get_streaming_service()
+        self.leader_elector = get_leader_elector()
     
     def api_attrecord_post(self):
         """Execute attrecord stored procedure"""
@@ -115,7 +118,8 @@ class APIController:
     def api_streaming_start(self):
         """Start data streaming"""
         try:
-            success, message = self.streaming_service.start_streaming()
+            # Streaming runs in the process holding the streaming lease
+            success, message = self.leader_elector.set_desired(STREAMING_ROLE, True)
             
             if success:
                 return jsonify({
@@ -137,7 +141,7 @@ class APIController:
     def api_streaming_stop(self):
         """Stop data streaming"""
         try:
-            success, message = self.streaming_service.stop_streaming()
+            success, message = self.leader_elector.set_desired(STREAMING_ROLE, False)
             
             return jsonify({
                 'status': 'success',
@@ -154,6 +158,7 @@ class APIController:
         """Get streaming status"""
         try:
             status = self.streaming_service.get_streaming_status()
+            status['leader'] = self.leader_elector.get_role_status(STREAMING_ROLE)
             
             return jsonify({
                 'status': 'success',
@@ -166,6 +171,33 @@ class APIController:
                 'message': f'An error occurred: {str(e)}'
             }), 500
     
+    def api_punch_latency(self):
+        """Get per-stage punch latency percentiles (and recent traces with ?traces=N)"""
+        try:
+            tracer = get_punch_tracer()
+            data = tracer.get_stats()
+            # Traces are held by the streaming leader; other workers only forward stamps
+            leader = self.leader_elector.get_role_status(STREAMING_ROLE)
+            data['identity'] = leader['identity']
+            data['is_local_leader'] = leader['is_local_leader']
+            data['leader'] = leader
+            if not leader['is_local_leader']:
+                data['note'] = f"Latency windows are held by the streaming leader ({leader.get('holder') or 'none'}); query it directly"
+            trace_limit = request.args.get('traces', 0, type=int)
+            if trace_limit > 0:
+                data['recent_traces'] = tracer.get_recent_traces(min(trace_limit, 200))
+            
+            return jsonify({
+                'status': 'success',
+                'data': data
+            }), 200
+                
+        except Exception as e:
+            return jsonify({
+                'status': 'error',
+                'message': f'An error occurred: {str(e)}'
+            }), 500
+    
     def api_summary(self):
         """Get attendance summary"""
         try:
@@ -9,7 +9,9 @@ import threading
 import time
 from app.workers.attendance_worker import AttendanceWorker
 from app.models.attendance import AttendanceModel
+from app.services.leader_election import get_leader_elector, WORKER_ROLE
 from config.logging_config import get_worker_logger
+from app.utils.lazy import LazyInstance
 
 logger = get_worker_logger()
 
@@ -18,6 +20,7 @@ class AttendanceWorkerController:
         self.attendance_model = AttendanceModel()
         self.worker_instance = None
         self.worker_thread = None
+        self.leader_elector = get_leader_elector()
         self.activity_log = []
         self.max_log_entries = 100
         
@@ -60,6 +63,8 @@ class AttendanceWorkerController:
                     else:
                         status_info['next_run'] = 'Belum ada jadwal'
             
+            status_info['leader'] = self.leader_elector.get_role_status(WORKER_ROLE)
+            
             return jsonify({
                 'success': True,
                 'worker_status': status_info
@@ -125,33 +130,11 @@ class AttendanceWorkerController:
     def start_worker(self):
         """API endpoint untuk memulai worker"""
         try:
-            if self.worker_instance and self.worker_instance.is_running:
-                return jsonify({
-                    'success': False,
-                    'message': 'Worker sudah berjalan'
-                })
-            
-            # Buat instance worker baru
-            self.worker_instance = AttendanceWorker()
-            
-            # Jalankan worker dalam thread terpisah
-            self.worker_thread = threading.Thread(
-                target=self.worker_instance.start_scheduler,
-                name="AttendanceWorkerThread",
-                daemon=True
-            )
-            self.worker_thread.start()
-            
-            # Tambahkan ke activity log
-            self._add_to_activity_log("🚀 Worker dimulai melalui dashboard", 'SUCCESS')
-            self._add_to_activity_log("⏰ Jadwal: Setiap 30 menit, memproses data 2 hari yang lalu", 'INFO')
-            self._add_to_activity_log("📊 Status: Worker aktif dan siap memproses", 'INFO')
-            
-            logger.info("Attendance worker started via dashboard")
-            
+            # Worker berjalan di proses yang memegang lease attendance_worker
+            success, message = self.leader_elector.set_desired(WORKER_ROLE, True)
             return jsonify({
-                'success': True,
-                'message': 'Worker berhasil dijalankan'
+                'success': success,
+                'message': message
             })
             
         except Exception as e:
@@ -164,25 +147,10 @@ class AttendanceWorkerController:
     def stop_worker(self):
         """API endpoint untuk menghentikan worker"""
         try:
-            if not self.worker_instance or not self.worker_instance.is_running:
-                return jsonify({
-                    'success': False,
-                    'message': 'Worker tidak sedang berjalan'
-                })
-            
-            # Hentikan worker
-            self.worker_instance.stop_scheduler()
-            
-            # Tambahkan ke activity log
-            self._add_to_activity_log("🛑 Worker dihentikan melalui dashboard", 'INFO')
-            self._add_to_activity_log("⏸️ Jadwal otomatis dibatalkan", 'INFO')
-            self._add_to_activity_log("📊 Status: Worker tidak aktif", 'INFO')
-            
-            logger.info("Attendance worker stopped via dashboard")
-            
+            success, message = self.leader_elector.set_desired(WORKER_ROLE, False)
             return jsonify({
-                'success': True,
-                'message': 'Worker berhasil dihentikan'
+                'success': success,
+                'message': message
             })
             
         except Exception as e:
@@ -192,6 +160,46 @@ class AttendanceWorkerController:
                 'message': f'Error stopping worker: {str(e)}'
             }), 500
     
+    def start_worker_local(self):
+        """Start the worker in this process (leader election hook)"""
+        if self.worker_instance and self.worker_instance.is_running:
+            return False, 'Worker sudah berjalan'
+        
+        # Buat instance worker baru
+        self.worker_instance = AttendanceWorker()
+        
+        # Jalankan worker dalam thread terpisah
+        self.worker_thread = threading.Thread(
+            target=self.worker_instance.start_scheduler,
+            name="AttendanceWorkerThread",
+            daemon=True
+        )
+        self.worker_thread.start()
+        
+        # Tambahkan ke activity log
+        self._add_to_activity_log("🚀 Worker dimulai melalui dashboard", 'SUCCESS')
+        self._add_to_activity_log("⏰ Jadwal: Setiap 30 menit, memproses data 2 hari yang lalu", 'INFO')
+        self._add_to_activity_log("📊 Status: Worker aktif dan siap memproses", 'INFO')
+        
+        logger.info("Attendance worker started via dashboard")
+        return True, 'Worker berhasil dijalankan'
+    
+    def stop_worker_local(self):
+        """Stop the worker in this process (leader election hook)"""
+        if not self.worker_instance or not self.worker_instance.is_running:
+            return False, 'Worker tidak sedang berjalan'
+        
+        # Hentikan worker
+        self.worker_instance.stop_scheduler()
+        
+        # Tambahkan ke activity log
+        self._add_to_activity_log("🛑 Worker dihentikan melalui dashboard", 'INFO')
+        self._add_to_activity_log("⏸️ Jadwal otomatis dibatalkan", 'INFO')
+        self._add_to_activity_log("📊 Status: Worker tidak aktif", 'INFO')
+        
+        logger.info("Attendance worker stopped via dashboard")
+        return True, 'Worker berhasil dihentikan'
+    
     def run_now(self):
         """API endpoint untuk menjalankan worker sekali sekarang"""
         try:
@@ -436,5 +444,5 @@ class AttendanceWorkerController:
             self._add_to_activity_log(f"Error logging processing result: {str(e)}", 'ERROR')
             logger.error(f"Error logging processing result: {str(e)}")
 
-# Global controller instance
-attendance_worker_controller = AttendanceWorkerController()
\ No newline at end of file
+# Global controller instance (constructed on first use)
+attendance_worker_controller = LazyInstance(AttendanceWorkerController)
@@ -0,0 +1,63 @@
+"""
+Data Retention Controller
+Status, manual runs and start/stop of the archival job
+"""
+
+import logging
+
+from flask import Blueprint, jsonify, request
+
+from app.services.leader_election import get_leader_elector, RETENTION_ROLE
+from app.utils.auth_middleware import login_required
+
+logger = logging.getLogger(__name__)
+
+data_retention_bp = Blueprint('data_retention', __name__, url_prefix='/admin/data-retention')
+
+
+def _service():
+    # Imported on first use so create_app does not build the service
+    from app.services.data_retention_service import get_data_retention_service
+    return get_data_retention_service()
+
+
+@data_retention_bp.route('/status')
+@login_required
+def get_retention_status():
+    """Retention windows, schedule and last run (of this process)"""
+    try:
+        status = _service().get_status()
+        status['leader'] = get_leader_elector().get_role_status(RETENTION_ROLE)
+        return jsonify({'success': True, 'data': status})
+    except Exception as e:
+        logger.error(f"Error getting data retention status: {e}")
+        return jsonify({'success': False, 'message': f"Error getting status: {str(e)}"}), 500
+
+
+@data_retention_bp.route('/run', methods=['POST'])
+@login_required
+def run_retention():
+    """Archive now; {"dry_run": true} only counts the rows that would move"""
+    try:
+        data = request.get_json(silent=True) or {}
+        success, message = _service().run(dry_run=bool(data.get('dry_run')))
+        return jsonify({'success': success, 'message': message})
+    except Exception as e:
+        logger.error(f"Error running data retention: {e}")
+        return jsonify({'success': False, 'message': f"Error running data retention: {str(e)}"}), 500
+
+
+@data_retention_bp.route('/start', methods=['POST'])
+@login_required
+def start_retention():
+    """Enable the daily job deployment-wide"""
+    success, message = get_leader_elector().set_desired(RETENTION_ROLE, True)
+    return jsonify({'success': success, 'message': message})
+
+
+@data_retention_bp.route('/stop', methods=['POST'])
+@login_required
+def stop_retention():
+    """Disable the daily job deployment-wide"""
+    success, message = get_leader_elector().set_desired(RETENTION_ROLE, False)
+    return jsonify({'success': success, 'message': message})
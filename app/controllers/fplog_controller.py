@@ -41,22 +41,24 @@ class FPLogController:
                 'start_date': data.get('start_date', '').strip(),
                 'end_date': data.get('end_date', '').strip(),
                 'status': data.get('status', '').strip(),
-                'limit': data.get('limit', 5000)
+                'pin_match': data.get('pin_match', '').strip(),
+                'cursor': data.get('cursor', '').strip(),
+                'limit': data.get('limit', 1000)
             }
             
             # Remove empty filters
             filters = {k: v for k, v in filters.items() if v != ''}
-            print(f"FPLog Export - Processed filters: {filters}")
-            print(f"FPLog Export - Processed filters: {filters}")
             
-            success, message, fplog_data = self.fplog_service.search_fplog_data(filters)
+            success, message, fplog_data, next_cursor = self.fplog_service.search_fplog_data(filters)
             
             if success:
                 return jsonify({
                     'success': True,
                     'message': message,
                     'data': fplog_data,
-                    'total': len(fplog_data)
+                    'total': len(fplog_data),
+                    'next_cursor': next_cursor,
+                    'has_more': next_cursor is not None
                 })
             else:
                 return jsonify({
@@ -74,28 +76,29 @@ class FPLogController:
         """Export FPLog data to Excel"""
         try:
             data = request.get_json() or {}
-            print(f"FPLog Export - Received filters: {data}")
-            print(f"FPLog Export - Received filters: {data}")
             
             filters = {
                 'pin': data.get('pin', '').strip(),
                 'machine': data.get('machine', '').strip(),
                 'start_date': data.get('start_date', '').strip(),
                 'end_date': data.get('end_date', '').strip(),
-                'status': data.get('status', '').strip()
-                # No limit for export - get all filtered data
+                'status': data.get('status', '').strip(),
+                'pin_match': data.get('pin_match', '').strip()
+                # No limit for export - walk every page of filtered data
             }
             
             # Remove empty filters
             filters = {k: v for k, v in filters.items() if v != ''}
             
             # Get data
-            success, message, fplog_data = self.fplog_service.search_fplog_data(filters)
-            
-            if not success:
+            fplog_data = []
+            try:
+                for page in self.fplog_service.iter_fplog_pages(filters):
+                    fplog_data.extend(page)
+            except RuntimeError as e:
                 return jsonify({
                     'success': False,
-                    'message': message
+                    'message': str(e)
                 }), 400
             
             if not fplog_data:
@@ -3,10 +3,11 @@ Legacy Attendance Controller
 Controller untuk menangani API requests terkait export data absensi legacy
 """
 
-from flask import request, jsonify, Response, render_template
+from flask import request, jsonify, Response, render_template, stream_with_context
 from datetime import datetime
 from app.services.legacy_attendance_service import legacy_attendance_service
 from config.logging_config import get_background_logger
+from app.utils.lazy import LazyInstance
 
 logger = get_background_logger('LegacyAttendanceController', 'logs/legacy_attendance_controller.log')
 
@@ -108,12 +109,12 @@ class LegacyAttendanceController:
             logger.info(f"Exporting legacy attendance CSV for period {start_date} to {end_date}")
             
             # Export to CSV
-            success, csv_data, filename, message = self.legacy_service.export_legacy_attendance_to_csv(start_date, end_date)
+            success, csv_chunks, filename, message = self.legacy_service.export_legacy_attendance_to_csv(start_date, end_date)
             
             if success:
-                # Return CSV file as download
+                # Stream the CSV file as download
                 response = Response(
-                    csv_data,
+                    stream_with_context(csv_chunks),
                     mimetype='text/csv',
                     headers={
                         'Content-Disposition': f'attachment; filename="{filename}"',
@@ -121,7 +122,7 @@ class LegacyAttendanceController:
                     }
                 )
                 
-                logger.info(f"Successfully exported CSV: {filename}")
+                logger.info(f"Streaming CSV download: {filename}")
                 return response
             else:
                 return jsonify({
@@ -191,5 +192,5 @@ class LegacyAttendanceController:
                 'message': f'Internal error: {str(e)}'
             }), 500
 
-# Global controller instance
-legacy_attendance_controller = LegacyAttendanceController()
\ No newline at end of file
+# Global controller instance (constructed on first use)
+legacy_attendance_controller = LazyInstance(LegacyAttendanceController)
@@ -0,0 +1,137 @@
+"""
+Metrics Controller
+Prometheus text exposition endpoint, per-route HTTP latency hooks and the
+per-statement database timings
+"""
+
+import threading
+import time
+
+from flask import Blueprint, Response, current_app, g, jsonify, request
+
+from app.services.punch_spool import PunchSpool
+from app.utils import metrics
+from app.utils.auth_middleware import login_required
+from config.database import statement_stats
+
+metrics_bp = Blueprint('metrics', __name__)
+
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    'attendance_http_request_seconds', 'HTTP handler latency per route',
+    ['blueprint', 'route', 'method', 'status']
+)
+
+# attendance_queues is counted at most once per interval, not on every scrape
+QUEUE_DEPTH_TTL = 30
+_queue_depth_cache = {'at': 0.0, 'value': {}}
+_queue_depth_lock = threading.Lock()
+
+
+def _queue_depth():
+    """{(status,): rows} from attendance_queues, cached for QUEUE_DEPTH_TTL seconds"""
+    with _queue_depth_lock:
+        if time.monotonic() - _queue_depth_cache['at'] >= QUEUE_DEPTH_TTL:
+            from app.models.attendance import AttendanceModel
+            # Also throttles retries while the database is unreachable
+            _queue_depth_cache['at'] = time.monotonic()
+            depth = AttendanceModel().get_attendance_queue_depth()
+            _queue_depth_cache['value'] = {(status,): count for status, count in depth.items()}
+        return _queue_depth_cache['value']
+
+
+metrics.gauge('attendance_queue_depth', 'attendance_queues rows by status', ['status'], callback=_queue_depth)
+
+# The spool file is shared, so every worker reports it (not only the streaming
+# leader); read at most once per SPOOL_STATS_TTL
+SPOOL_STATS_TTL = 5
+_spool_stats_cache = {'at': 0.0, 'value': {}}
+_spool_stats_lock = threading.Lock()
+_spool = None
+
+
+def _spool_stats():
+    """PunchSpool.get_stats() of the shared spool, cached for SPOOL_STATS_TTL seconds"""
+    global _spool
+    with _spool_stats_lock:
+        if time.monotonic() - _spool_stats_cache['at'] >= SPOOL_STATS_TTL:
+            if _spool is None:
+                _spool = PunchSpool()
+            _spool_stats_cache['at'] = time.monotonic()
+            _spool_stats_cache['value'] = _spool.get_stats()
+        stats = _spool_stats_cache['value']
+    if 'error' in stats:
+        raise RuntimeError(stats['error'])
+    return stats
+
+
+metrics.gauge('attendance_spool_pending', 'Punches in the spool not yet confirmed in SQL Server',
+              callback=lambda: {(): _spool_stats()['pending']})
+metrics.gauge('attendance_spool_dead', 'Spooled punches parked after max_attempts failed attempts',
+              callback=lambda: {(): _spool_stats()['dead']})
+metrics.gauge('attendance_spool_size_bytes', 'Size of the spool file and its WAL',
+              callback=lambda: {(): _spool_stats()['size_bytes']})
+metrics.gauge('attendance_spool_oldest_pending_age_seconds', 'Age of the oldest unflushed punch (0 when empty)',
+              callback=lambda: {(): _spool_stats()['oldest_pending_age_seconds']})
+
+
+def register_request_metrics(app):
+    """Time every request by blueprint and route template"""
+
+    @app.before_request
+    def _start_request_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        started = g.pop('_metrics_started', None)
+        if started is not None:
+            rule = request.url_rule
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                blueprint=request.blueprint or '',
+                route=rule.rule if rule else 'unmatched',
+                method=request.method,
+                status=response.status_code
+            )
+        return response
+
+
+@metrics_bp.route('/metrics')
+def metrics_endpoint():
+    """Metrics in Prometheus text format (bearer METRICS_TOKEN when configured)"""
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+STATEMENT_ORDER_FIELDS = ('total_seconds', 'calls', 'max_seconds', 'execute_seconds', 'fetch_seconds', 'rows', 'slow_calls')
+
+
+@metrics_bp.route('/admin/db/statements')
+@login_required
+def db_statements():
+    """Top-N SQL statements (normalized) by total time or another field"""
+    limit = min(request.args.get('limit', 20, type=int), 200)
+    order_by = request.args.get('order_by', 'total_seconds')
+    if order_by not in STATEMENT_ORDER_FIELDS:
+        return jsonify({
+            'success': False,
+            'message': f"order_by must be one of: {', '.join(STATEMENT_ORDER_FIELDS)}"
+        }), 400
+    return jsonify({
+        'success': True,
+        'data': {
+            'slow_query_ms': statement_stats.slow_ms,
+            'order_by': order_by,
+            'statements': statement_stats.top(limit, order_by)
+        }
+    })
+
+
+@metrics_bp.route('/admin/db/statements/reset', methods=['POST'])
+@login_required
+def reset_db_statements():
+    """Clear the statement totals"""
+    statement_stats.reset()
+    return jsonify({'success': True, 'message': 'Statement statistics cleared'})
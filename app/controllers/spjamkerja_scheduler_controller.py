@@ -5,6 +5,7 @@ Handles HTTP requests for scheduler management
 
 from flask import Blueprint, jsonify, request, render_template
 from app.services.spjamkerja_scheduler_service import get_spjamkerja_scheduler
+from app.services.leader_election import get_leader_elector, SCHEDULER_ROLE
 from app.utils.auth_middleware import login_required
 import logging
 
@@ -25,6 +26,7 @@ def get_scheduler_status():
     try:
         scheduler = get_spjamkerja_scheduler()
         status = scheduler.get_status()
+        status['leader'] = get_leader_elector().get_role_status(SCHEDULER_ROLE)
         
         return jsonify({
             'success': True,
@@ -42,8 +44,8 @@ def get_scheduler_status():
 def start_scheduler():
     """Start the scheduler"""
     try:
-        scheduler = get_spjamkerja_scheduler()
-        success, message = scheduler.start()
+        # The scheduler runs in the process holding the scheduler lease
+        success, message = get_leader_elector().set_desired(SCHEDULER_ROLE, True)
         
         return jsonify({
             'success': success,
@@ -61,8 +63,7 @@ def start_scheduler():
 def stop_scheduler():
     """Stop the scheduler"""
     try:
-        scheduler = get_spjamkerja_scheduler()
-        success, message = scheduler.stop()
+        success, message = get_leader_elector().set_desired(SCHEDULER_ROLE, False)
         
         return jsonify({
             'success': success,
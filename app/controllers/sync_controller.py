@@ -1,10 +1,13 @@
 """
 Controller for handling FPLog synchronization operations
 """
-from flask import jsonify, request, render_template
+from flask import jsonify, request, render_template, Response, stream_with_context
 from datetime import datetime, timedelta
+import time
 from app.services.sync_service import SyncService
-from app.services.streaming_service import StreamingService
+from app.services.streaming_service import get_streaming_service
+from app.services.leader_election import get_leader_elector, STREAMING_ROLE
+from app.services.notification_stream import get_notification_broadcaster, format_sse
 import sys
 import os
 
@@ -17,7 +20,10 @@ class SyncController:
     
     def __init__(self):
         self.sync_service = SyncService()
-        self.streaming_service = StreamingService()
+        self.streaming_service = get_streaming_service()
+        self.leader_elector = get_leader_elector()
+        self.notification_broadcaster = get_notification_broadcaster()
+        self.streaming_service.add_notification_callback(self.notification_broadcaster.notify)
     
     def sync_dashboard(self):
         """Display sync dashboard page"""
@@ -464,7 +470,8 @@ class SyncController:
     def start_streaming(self):
         """Start real-time streaming from all devices"""
         try:
-            success, message = self.streaming_service.start_streaming()
+            # Streaming runs in the process holding the streaming lease
+            success, message = self.leader_elector.set_desired(STREAMING_ROLE, True)
             return jsonify({
                 'success': success,
                 'message': message
@@ -478,7 +485,7 @@ class SyncController:
     def stop_streaming(self):
         """Stop real-time streaming from all devices"""
         try:
-            success, message = self.streaming_service.stop_streaming()
+            success, message = self.leader_elector.set_desired(STREAMING_ROLE, False)
             return jsonify({
                 'success': success,
                 'message': message
@@ -493,6 +500,7 @@ class SyncController:
         """Get current streaming status"""
         try:
             status = self.streaming_service.get_streaming_status()
+            status['leader'] = self.leader_elector.get_role_status(STREAMING_ROLE)
             return jsonify({
                 'success': True,
                 'streaming': status
@@ -508,14 +516,11 @@ class SyncController:
         try:
             limit = request.args.get('limit', 20, type=int)
             
-            # Get notifications directly from streaming service
-            notifications = list(self.streaming_service.notifications)
-            
-            # Sort by timestamp (newest first) and limit
-            notifications.sort(key=lambda x: x['datetime'], reverse=True)
-            notifications = notifications[:limit]
+            # Newest first, straight from the streaming service's arrival-ordered deque
+            notifications = self.streaming_service.get_recent_notifications(limit)
             
             return jsonify({
+                'success': True,
                 'status': 'success',
                 'notifications': notifications,
                 'count': len(notifications)
@@ -541,3 +546,53 @@ class SyncController:
                 'success': False,
                 'message': f'Error clearing notifications: {str(e)}'
             }), 500
+    
+    def stream_notifications(self):
+        """
+        Push streaming notifications to the browser as Server-Sent Events.
+        
+        Resumes from the Last-Event-ID header (or last_event_id query parameter).
+        Each connection is closed after max_stream_seconds; EventSource reconnects
+        automatically and resumes from the last delivered id.
+        """
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        try:
+            last_event_id = int(last_event_id) if last_event_id not in (None, '') else None
+        except ValueError:
+            last_event_id = None
+        
+        subscription = self.notification_broadcaster.subscribe(last_event_id)
+        if subscription is None:
+            return jsonify({
+                'success': False,
+                'message': 'Too many notification stream clients, use polling instead'
+            }), 503
+        
+        heartbeat_seconds = 15
+        max_stream_seconds = 55
+        broadcaster = self.notification_broadcaster
+        
+        def generate():
+            started = time.monotonic()
+            try:
+                # Every message carries an id, so a reconnect always resumes from
+                # Last-Event-ID even when no notification was delivered
+                yield format_sse({'connected': True}, event='ready', event_id=subscription.start_seq, retry=3000)
+                while time.monotonic() - started < max_stream_seconds:
+                    notifications = subscription.drain(heartbeat_seconds)
+                    if subscription.dropped:
+                        yield format_sse({'dropped': subscription.dropped}, event='overflow')
+                        subscription.dropped = 0
+                    if not notifications:
+                        yield f"id: {subscription.delivered_seq}\n: keep-alive\n\n"
+                        continue
+                    for notification in notifications:
+                        yield format_sse(notification, event='notification', event_id=notification['seq'])
+                        subscription.delivered_seq = notification['seq']
+            finally:
+                broadcaster.unsubscribe(subscription)
+        
+        response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
@@ -7,6 +7,7 @@ import json
 from flask import Blueprint, request, jsonify, session, render_template
 from datetime import date, datetime, timedelta
 from app.services.vps_push_service import vps_push_service
+from app.utils.lazy import LazyInstance
 from config.logging_config import get_background_logger
 
 # Setup logging
@@ -848,8 +849,5 @@ class VPSPushController:
                 'message': f'Internal error: {str(e)}'
             }), 500
 
-# Global controller instance
-vps_push_controller = VPSPushController()
-
-# Global controller instance
-vps_push_controller = VPSPushController()
\ No newline at end of file
+# Global controller instance (constructed on first use)
+vps_push_controller = LazyInstance(VPSPushController)
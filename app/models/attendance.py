@@ -1,5 +1,16 @@
 from config.database import db_manager
 from datetime import datetime
+from app.utils import metrics
+
+PROCEDURE_SECONDS = metrics.histogram(
+    'attendance_procedure_seconds', 'attrecord/spJamkerja stored procedure execution time', ['procedure']
+)
+FPLOG_INSERT_SECONDS = metrics.histogram(
+    'attendance_fplog_insert_seconds', 'FPLog write latency including the duplicate check', ['path']
+)
+FPLOG_RECORDS = metrics.counter(
+    'attendance_fplog_records_total', 'FPLog records written or skipped as duplicates', ['path', 'result']
+)
 
 class AttendanceModel:
     """Model for handling attendance data operations"""
@@ -70,6 +81,7 @@ class AttendanceModel:
         else:
             return self._execute_attrecord_procedure_original(start_date, end_date)
     
+    @PROCEDURE_SECONDS.timed(procedure='attrecord')
     def _execute_attrecord_procedure_original(self, start_date, end_date):
         """Execute the attrecord stored procedure"""
         try:
@@ -101,6 +113,7 @@ class AttendanceModel:
         """Alias for execute_spjamkerja_procedure (scheduler compatibility)"""
         return self._execute_spjamkerja_procedure_original(start_date, end_date)
     
+    @PROCEDURE_SECONDS.timed(procedure='spJamkerja')
     def _execute_spjamkerja_procedure_original(self, start_date, end_date):
         """Execute the spJamkerja stored procedure"""
         try:
@@ -121,6 +134,7 @@ class AttendanceModel:
         except Exception as e:
             return False, f"Error executing procedure: {str(e)}"
 
+    @PROCEDURE_SECONDS.timed(procedure='attrecord')
     def execute_attrecord_procedure_with_pins(self, start_date, end_date, pins=None):
         """Execute the attrecord stored procedure with date range and optional PIN list"""
         try:
@@ -160,6 +174,7 @@ class AttendanceModel:
         except Exception as e:
             return False, f"Error executing procedure: {str(e)}"
 
+    @PROCEDURE_SECONDS.timed(procedure='spJamkerja')
     def execute_spjamkerja_procedure_with_pins(self, start_date, end_date, pins=None):
         """Execute the spJamkerja stored procedure with date range and optional PIN list"""
         try:
@@ -812,10 +827,19 @@ class AttendanceModel:
     
     def sync_fplog_to_sqlserver_with_duplicate_check(self, fplog_data, start_date=None, end_date=None):
         """Sync FPLog data from fingerprint devices to SQL Server with duplicate prevention"""
+        success, message, _, _ = self.sync_fplog_batch_with_duplicate_check(fplog_data)
+        return success, message
+    
+    @FPLOG_INSERT_SECONDS.timed(path='batch')
+    def sync_fplog_batch_with_duplicate_check(self, fplog_data):
+        """
+        Insert one batch of FPLog records, skipping duplicates.
+        Returns (success, message, inserted_count, duplicates_count).
+        """
         try:
             # Validate input data
             if not fplog_data or not isinstance(fplog_data, list):
-                return False, "Invalid or empty FPLog data provided"
+                return False, "Invalid or empty FPLog data provided", 0, 0
             
             print(f"Starting sync of {len(fplog_data)} FPLog records with duplicate check...")
             
@@ -824,12 +848,14 @@ class AttendanceModel:
             
             print(f"Duplicate check completed: {duplicates_found} duplicates found, {records_kept} records to insert")
             
+            if duplicates_found:
+                FPLOG_RECORDS.inc(duplicates_found, path='batch', result='duplicate')
             if not filtered_data:
-                return True, f"All {len(fplog_data)} records were duplicates - no new data to sync"
+                return True, f"All {len(fplog_data)} records were duplicates - no new data to sync", 0, len(fplog_data)
             
             conn = self.db_manager.get_sqlserver_connection()
             if not conn:
-                return False, "Failed to connect to SQL Server"
+                return False, "Failed to connect to SQL Server", 0, 0
             
             cursor = conn.cursor()
             
@@ -884,11 +910,12 @@ class AttendanceModel:
                     total_inserted += cursor.rowcount
             
             conn.commit()
+            FPLOG_RECORDS.inc(total_inserted, path='batch', result='inserted')
             cursor.close()
             conn.close()
             
             print(f"Sync completed: {total_inserted} new records inserted, {duplicates_found} duplicates skipped")
-            return True, f"Successfully synced {total_inserted} new records (skipped {duplicates_found} duplicates)"
+            return True, f"Successfully synced {total_inserted} new records (skipped {duplicates_found} duplicates)", total_inserted, duplicates_found
             
         except Exception as e:
             print(f"Error details: {str(e)}")
@@ -899,8 +926,9 @@ class AttendanceModel:
                     conn.close()
             except:
                 pass
-            return False, f"Error syncing FPLog data: {str(e)}"
+            return False, f"Error syncing FPLog data: {str(e)}", 0, 0
     
+    @FPLOG_INSERT_SECONDS.timed(path='single')
     def add_fplog_record_if_not_duplicate(self, pin, date, machine, status, fpid=None):
         """Add single FPLog record only if it's not a duplicate"""
         try:
@@ -908,6 +936,7 @@ class AttendanceModel:
             is_duplicate, message = self.check_fplog_duplicate(pin, date, status)
             
             if is_duplicate:
+                FPLOG_RECORDS.inc(path='single', result='duplicate')
                 return False, f"Duplicate record found - not inserted: PIN={pin}, Date={date}, Status={status}"
             
             # Insert the record
@@ -930,6 +959,7 @@ class AttendanceModel:
             
             cursor.execute(insert_query, (pin, date, machine, status, fpid))
             conn.commit()
+            FPLOG_RECORDS.inc(path='single', result='inserted')
             
             cursor.close()
             conn.close()
@@ -1219,3 +1249,17 @@ class AttendanceModel:
         except Exception as e:
             print(f"Error getting attendance queue stats: {e}")
             return {'total': 0, 'processed': 0, 'baru': 0, 'error': 0}
+    
+    def get_attendance_queue_depth(self):
+        """Row count per status over the whole attendance_queues table"""
+        conn = self.db_manager.get_sqlserver_connection()
+        if not conn:
+            raise ConnectionError("Failed to connect to SQL Server")
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT status, COUNT(*) FROM attendance_queues GROUP BY status")
+            depth = {row[0]: row[1] for row in cursor.fetchall()}
+            cursor.close()
+            return depth
+        finally:
+            conn.close()
@@ -1,6 +1,5 @@
 from config.database import db_manager
 from datetime import datetime, date
-import pandas as pd
 from io import BytesIO
 
 class AttendanceReportModel:
@@ -164,6 +163,7 @@ class AttendanceReportModel:
         Returns:
             BytesIO: Excel file as bytes
         """
+        import pandas as pd
         try:
             conn = self.db_manager.get_sqlserver_connection()
             if not conn:
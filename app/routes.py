@@ -1,14 +1,6 @@
 from flask import Blueprint, redirect, url_for
-from app.controllers.main_controller import MainController
-from app.controllers.api_controller import APIController
-from app.controllers.sync_controller import SyncController
-from app.controllers.fplog_controller import FPLogController
-from app.controllers.failed_log_controller import FailedLogController
-from app.controllers.vps_push_controller import vps_push_controller
-from app.controllers.legacy_attendance_controller import legacy_attendance_controller
-
-from app.controllers.attendance_worker_controller import attendance_worker_controller
 from app.utils.auth_middleware import login_required
+from app.utils.lazy import LazyInstance
 
 # Create blueprints
 main_bp = Blueprint('main', __name__)
@@ -21,12 +13,15 @@ legacy_attendance_bp = Blueprint('legacy_attendance', __name__, url_prefix='/leg
 
 attendance_worker_bp = Blueprint('attendance_worker', __name__, url_prefix='/attendance-worker')
 
-# Initialize controllers
-main_controller = MainController()
-api_controller = APIController()
-sync_controller = SyncController()
-fplog_controller = FPLogController()
-failed_log_controller = FailedLogController()
+# Controllers are imported and constructed on first request (once per process)
+main_controller = LazyInstance('app.controllers.main_controller:MainController')
+api_controller = LazyInstance('app.controllers.api_controller:APIController')
+sync_controller = LazyInstance('app.controllers.sync_controller:SyncController')
+fplog_controller = LazyInstance('app.controllers.fplog_controller:FPLogController')
+failed_log_controller = LazyInstance('app.controllers.failed_log_controller:FailedLogController')
+vps_push_controller = LazyInstance('app.controllers.vps_push_controller:vps_push_controller')
+legacy_attendance_controller = LazyInstance('app.controllers.legacy_attendance_controller:legacy_attendance_controller')
+attendance_worker_controller = LazyInstance('app.controllers.attendance_worker_controller:attendance_worker_controller')
 
 # Main routes
 @main_bp.route('/')
@@ -60,6 +55,10 @@ def api_streaming_stop():
 def api_streaming_status():
     return api_controller.api_streaming_status()
 
+@api_bp.route('/punch-latency', methods=['GET'])
+def api_punch_latency():
+    return api_controller.api_punch_latency()
+
 @api_bp.route('/summary', methods=['GET'])
 def api_summary():
     return api_controller.api_summary()
@@ -118,6 +117,10 @@ def get_streaming_status():
 def get_streaming_notifications():
     return sync_controller.get_streaming_notifications()
 
+@sync_bp.route('/streaming/events')
+def stream_streaming_notifications():
+    return sync_controller.stream_notifications()
+
 @sync_bp.route('/streaming/notifications/clear', methods=['POST'])
 def clear_streaming_notifications():
     return sync_controller.clear_streaming_notifications()
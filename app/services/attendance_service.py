@@ -1,5 +1,4 @@
 from app.models.attendance import AttendanceModel
-import pandas as pd
 import io
 
 class AttendanceService:
@@ -26,6 +25,7 @@ class AttendanceService:
     
     def export_attendance_to_csv(self, start_date=None, end_date=None):
         """Export attendance data to CSV format"""
+        import pandas as pd
         try:
             # Get all data (no pagination for export)
             logs, _, _ = self.attendance_model.get_attendance_logs(
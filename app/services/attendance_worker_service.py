@@ -6,6 +6,7 @@ import threading
 import time
 from datetime import datetime
 from app.workers.attendance_worker import AttendanceWorker
+from app.utils.lazy import LazyInstance
 
 class AttendanceWorkerService:
     """Service untuk mengelola worker attendance"""
@@ -75,5 +76,5 @@ class AttendanceWorkerService:
         except Exception as e:
             return False, f"Error menjalankan pemrosesan manual: {str(e)}"
 
-# Global instance
-attendance_worker_service = AttendanceWorkerService()
+# Global instance (constructed on first use)
+attendance_worker_service = LazyInstance(AttendanceWorkerService)
@@ -0,0 +1,416 @@
+"""
+Columnar Archive Service
+Exports closed months of FPLog, gagalabsens and attrecords to compressed
+column files and answers date range / PIN queries from them without SQL
+Server.
+
+Layout (COLUMNAR_ARCHIVE_CONFIG['directory']):
+
+    manifest.json                 tables -> months -> file, rows, date range, columns, column order, sha256
+    <table>/<YYYY-MM>.npz         one compressed .npz per table and month
+
+Each month file holds one member per column, sorted by the date column:
+strings are dictionary encoded (<col>.values + int32 <col>.codes, -1 = NULL),
+dates and datetimes are datetime64 with NaT for NULL, numbers are int64 or
+float64 with a <col>.null mask when the column has NULLs. .npz members are
+decompressed only when accessed, so a query reads the date column, slices
+the requested range and then loads just the columns it returns.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+
+from app.utils import metrics
+from config.database import db_manager
+from config.devices import COLUMNAR_ARCHIVE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+ROWS_EXPORTED = metrics.counter(
+    'attendance_columnar_rows_exported_total', 'Rows written to the columnar archive', ['table']
+)
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+
+
+def _month_range(month):
+    """'YYYY-MM' -> (first day, first day of the next month)"""
+    year, month_number = (int(part) for part in month.split('-'))
+    start = datetime(year, month_number, 1)
+    end = datetime(year + month_number // 12, month_number % 12 + 1, 1)
+    return start, end
+
+
+def _months_between(first, last):
+    """'YYYY-MM' strings from first to last (inclusive)"""
+    year, month = first.year, first.month
+    while (year, month) <= (last.year, last.month):
+        yield f"{year:04d}-{month:02d}"
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def _column_kind(values):
+    """Storage kind from the first non-NULL value"""
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, datetime):
+            return 'datetime'
+        if isinstance(value, date):
+            return 'date'
+        if isinstance(value, bool):
+            return 'bool'
+        if isinstance(value, int):
+            return 'int'
+        if isinstance(value, (float, Decimal)):
+            return 'float'
+        return 'string'
+    return 'null'
+
+
+def encode_column(name, values):
+    """Column values -> (kind, {member name: array})"""
+    kind = _column_kind(values)
+    nulls = np.fromiter((value is None for value in values), dtype=bool, count=len(values))
+    if kind == 'datetime':
+        return kind, {name: np.array([value if value is not None else 'NaT' for value in values], dtype='datetime64[s]')}
+    if kind == 'date':
+        return kind, {name: np.array([value if value is not None else 'NaT' for value in values], dtype='datetime64[D]')}
+    if kind == 'float':
+        return kind, {name: np.array([float(value) if value is not None else np.nan for value in values], dtype=np.float64)}
+    if kind in ('int', 'bool'):
+        members = {name: np.array([int(value) if value is not None else 0 for value in values], dtype=np.int64)}
+        if nulls.any():
+            members[f'{name}.null'] = nulls
+        return kind, members
+    if kind == 'string':
+        text = np.array([str(value) if value is not None else '' for value in values], dtype=str)
+        dictionary, codes = np.unique(text, return_inverse=True)
+        codes = codes.astype(np.int32)
+        codes[nulls] = -1
+        return kind, {f'{name}.values': dictionary, f'{name}.codes': codes}
+    return kind, {}
+
+
+def decode_column(archive, name, kind, rows, index=slice(None)):
+    """Array of one column (rows selected by index); object arrays hold None for NULL"""
+    if kind in ('datetime', 'date', 'float'):
+        return archive[name][index]
+    if kind in ('int', 'bool'):
+        values = archive[name][index]
+        null_key = f'{name}.null'
+        if null_key in archive.files:
+            values = values.astype(object)
+            values[archive[null_key][index]] = None
+        return values.astype(bool) if kind == 'bool' and values.dtype != object else values
+    if kind == 'string':
+        codes = archive[f'{name}.codes'][index]
+        values = archive[f'{name}.values'].astype(object)
+        decoded = np.empty(len(codes), dtype=object)
+        present = codes >= 0
+        decoded[present] = values[codes[present]]
+        return decoded
+    return np.full(len(np.arange(rows)[index]), None, dtype=object)
+
+
+def _python_value(value):
+    """numpy scalar -> plain Python value for rows()"""
+    if isinstance(value, np.datetime64):
+        if np.isnat(value):
+            return None
+        return value.astype('datetime64[us]').astype(datetime) if value.dtype == np.dtype('datetime64[s]') \
+            else value.astype('datetime64[D]').astype(date)
+    if isinstance(value, np.floating):
+        return None if np.isnan(value) else float(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.bool_):
+        return bool(value)
+    return value
+
+
+class ColumnarArchive:
+    """Manifest handling shared by the exporter and the reader"""
+
+    def __init__(self, directory=None, config=COLUMNAR_ARCHIVE_CONFIG):
+        self.config = config
+        self.directory = directory or config.get('directory', 'archive/columnar')
+        self.manifest_path = os.path.join(self.directory, MANIFEST_NAME)
+        self._manifest_lock = threading.Lock()
+
+    def load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {'format_version': FORMAT_VERSION, 'tables': {}}
+        with open(self.manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported archive format version: {manifest.get('format_version')}")
+        return manifest
+
+    def _save_manifest(self, manifest):
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+
+    def _table_config(self, table):
+        tables = self.config.get('tables', {})
+        if table not in tables:
+            raise ValueError(f"Table {table} is not configured in COLUMNAR_ARCHIVE_CONFIG")
+        return tables[table]
+
+
+class ColumnarArchiveExporter(ColumnarArchive):
+    """Writes closed months from SQL Server (hot + _archive table) to month files"""
+
+    def __init__(self, directory=None, config=COLUMNAR_ARCHIVE_CONFIG, db=db_manager):
+        super().__init__(directory, config)
+        self.db_manager = db
+
+    def _source_query(self, cursor, table, date_column):
+        """SELECT over the table and, when it exists, its retention archive"""
+        cursor.execute("SELECT OBJECT_ID(?, 'U')", (f"{table}_archive",))
+        has_archive = cursor.fetchone()[0] is not None
+        where = f"WHERE [{date_column}] >= ? AND [{date_column}] < ?"
+        query = f"SELECT * FROM [{table}] {where}"
+        if has_archive:
+            query += f" UNION ALL SELECT * FROM [{table}_archive] {where}"
+        return query, has_archive
+
+    def closed_months(self, table):
+        """Months with data before the current month"""
+        date_column = self._table_config(table)['date_column']
+        conn = self.db_manager.get_sqlserver_connection()
+        if not conn:
+            raise ConnectionError("Database connection failed")
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT OBJECT_ID(?, 'U')", (f"{table}_archive",))
+            sources = [table] + ([f"{table}_archive"] if cursor.fetchone()[0] is not None else [])
+            first = None
+            for source in sources:
+                cursor.execute(f"SELECT MIN([{date_column}]) FROM [{source}]")
+                value = cursor.fetchone()[0]
+                if value is not None and (first is None or value < first):
+                    first = value
+            cursor.close()
+        finally:
+            conn.close()
+        if first is None:
+            return []
+        current_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        last_closed = (current_month - timedelta(days=1)).replace(day=1)
+        if not isinstance(first, datetime):
+            first = datetime(first.year, first.month, first.day)
+        return list(_months_between(first, last_closed)) if first <= last_closed else []
+
+    def export_month(self, table, month, force=False):
+        """Export one month of a table; returns (success, message)"""
+        table_config = self._table_config(table)
+        date_column = table_config['date_column']
+        start, end = _month_range(month)
+        if end > datetime(datetime.now().year, datetime.now().month, 1):
+            return False, f"{month} is not a closed month"
+
+        manifest = self.load_manifest()
+        if not force and month in manifest['tables'].get(table, {}).get('months', {}):
+            return True, f"{table} {month} already archived"
+
+        conn = self.db_manager.get_sqlserver_connection()
+        if not conn:
+            return False, "Database connection failed"
+        try:
+            cursor = conn.cursor()
+            query, has_archive = self._source_query(cursor, table, date_column)
+            params = (start, end, start, end) if has_archive else (start, end)
+            cursor.execute(query, params)
+            columns = [column[0] for column in cursor.description]
+            data = {name: [] for name in columns}
+            fetch_size = int(self.config.get('fetch_size', 20000))
+            while True:
+                batch = cursor.fetchmany(fetch_size)
+                if not batch:
+                    break
+                for row in batch:
+                    for name, value in zip(columns, row):
+                        data[name].append(value)
+            cursor.close()
+        except Exception as e:
+            logger.error(f"[ERROR] Reading {table} {month} failed: {e}")
+            return False, f"Error reading {table} {month}: {e}"
+        finally:
+            conn.close()
+
+        rows = len(data[date_column])
+        if rows == 0:
+            return True, f"{table} {month}: no rows"
+
+        # Sorted by date (NULL last) so readers can binary-search the range
+        dates = data[date_column]
+        order = sorted(range(rows), key=lambda i: (dates[i] is None, dates[i] or 0))
+        members = {}
+        kinds = {}
+        for name in columns:
+            values = [data[name][i] for i in order]
+            kinds[name], encoded = encode_column(name, values)
+            members.update(encoded)
+
+        relative_path = os.path.join(table, f"{month}.npz")
+        path = os.path.join(self.directory, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            np.savez_compressed(f, **members)
+        with open(temp_path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        os.replace(temp_path, path)
+
+        dates = [value for value in dates if value is not None]
+        with self._manifest_lock:
+            manifest = self.load_manifest()
+            entry = manifest['tables'].setdefault(table, {'date_column': date_column, 'months': {}})
+            entry['date_column'] = date_column
+            entry['pin_column'] = table_config.get('pin_column')
+            entry['months'][month] = {
+                'file': relative_path.replace(os.sep, '/'),
+                'rows': rows,
+                'min': str(min(dates)) if dates else None,
+                'max': str(max(dates)) if dates else None,
+                'columns': kinds,
+                'column_order': columns,
+                'bytes': os.path.getsize(path),
+                'sha256': digest,
+                'exported_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            self._save_manifest(manifest)
+
+        ROWS_EXPORTED.inc(rows, table=table)
+        logger.info(f"[ARCHIVE] {table} {month}: {rows} rows -> {relative_path} ({os.path.getsize(path)} bytes)")
+        return True, f"{table} {month}: {rows} rows"
+
+    def export(self, tables=None, months=None, force=False):
+        """Export every closed month not archived yet (or the given months); returns (success, message)"""
+        results = []
+        ok = True
+        for table in tables or list(self.config.get('tables', {})):
+            try:
+                table_months = months or self.closed_months(table)
+            except Exception as e:
+                ok = False
+                results.append(f"{table}: {e}")
+                continue
+            for month in table_months:
+                success, message = self.export_month(table, month, force=force)
+                ok = ok and success
+                if not message.endswith('already archived'):
+                    results.append(message)
+        return ok, '; '.join(results) if results else 'Nothing to export'
+
+
+class ColumnarArchiveReader(ColumnarArchive):
+    """Range and PIN queries over the month files"""
+
+    def months_for(self, table, start_date, end_date):
+        """Manifest entries of the months overlapping [start_date, end_date]"""
+        entry = self.load_manifest()['tables'].get(table)
+        if not entry:
+            return None, []
+        first = f"{start_date.year:04d}-{start_date.month:02d}"
+        last = f"{end_date.year:04d}-{end_date.month:02d}"
+        months = [(month, info) for month, info in sorted(entry['months'].items()) if first <= month <= last]
+        return entry, months
+
+    def read(self, table, start_date, end_date, pins=None, columns=None):
+        """
+        Rows with start_date <= date < end_date + 1 day (dates are inclusive),
+        optionally only the given PINs and columns. Returns {column: array}.
+        """
+        if isinstance(start_date, str):
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+        if isinstance(end_date, str):
+            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+        entry, months = self.months_for(table, start_date, end_date)
+        if entry is None:
+            return {}
+        date_column = entry['date_column']
+        pin_column = entry.get('pin_column')
+        low = np.datetime64(start_date, 'D')
+        high = np.datetime64(end_date, 'D') + np.timedelta64(1, 'D')
+        pin_set = {str(pin) for pin in pins} if pins else None
+        if pin_set is not None and not pin_column:
+            raise ValueError(f"No pin_column configured for {table}, cannot filter by PIN")
+
+        parts = {}
+        for month, info in months:
+            kinds = info['columns']
+            # Manifests written before column_order existed fall back to the (sorted) kinds
+            wanted = columns or info.get('column_order') or list(kinds)
+            if pin_set is not None and pin_column not in kinds:
+                raise ValueError(
+                    f"PIN column {pin_column} not found in {table} {month} (columns: {', '.join(sorted(kinds))})"
+                )
+            unknown = [name for name in wanted if name not in kinds]
+            if unknown:
+                raise ValueError(f"Unknown columns for {table}: {', '.join(unknown)}")
+            with np.load(os.path.join(self.directory, info['file']), allow_pickle=False) as archive:
+                dates = archive[date_column]
+                begin = np.searchsorted(dates, low.astype(dates.dtype), side='left')
+                finish = np.searchsorted(dates, high.astype(dates.dtype), side='left')
+                selection = np.arange(begin, finish)
+                if pin_set is not None and selection.size:
+                    if kinds[pin_column] == 'string':
+                        codes = archive[f'{pin_column}.codes'][begin:finish]
+                        dictionary = archive[f'{pin_column}.values']
+                        matching = np.flatnonzero(np.isin(dictionary, list(pin_set)))
+                        selection = selection[np.isin(codes, matching)]
+                    else:
+                        # Numeric PINs are compared as text, the way they were passed in
+                        values = decode_column(archive, pin_column, kinds[pin_column], info['rows'], selection)
+                        text = np.array([str(_python_value(value)) for value in values], dtype=object)
+                        selection = selection[np.isin(text, list(pin_set))]
+                if not selection.size:
+                    continue
+                for name in wanted:
+                    parts.setdefault(name, []).append(
+                        decode_column(archive, name, kinds[name], info['rows'], selection)
+                    )
+        return {name: np.concatenate(arrays) for name, arrays in parts.items()}
+
+    def rows(self, table, start_date, end_date, pins=None, columns=None):
+        """read() as a list of dicts with plain Python values"""
+        data = self.read(table, start_date, end_date, pins, columns)
+        if not data:
+            return []
+        names = list(data)
+        return [
+            {name: _python_value(value) for name, value in zip(names, values)}
+            for values in zip(*(data[name] for name in names))
+        ]
+
+    def verify(self):
+        """Check every month file against its manifest checksum; returns (success, message)"""
+        manifest = self.load_manifest()
+        bad = []
+        checked = 0
+        for table, entry in manifest['tables'].items():
+            for month, info in entry['months'].items():
+                path = os.path.join(self.directory, info['file'])
+                checked += 1
+                try:
+                    with open(path, 'rb') as f:
+                        if hashlib.sha256(f.read()).hexdigest() != info['sha256']:
+                            bad.append(f"{table} {month}: checksum mismatch")
+                except OSError as e:
+                    bad.append(f"{table} {month}: {e}")
+        if bad:
+            return False, '; '.join(bad)
+        return True, f"{checked} month files verified"
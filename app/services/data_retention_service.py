@@ -0,0 +1,324 @@
+"""
+Data Retention Service
+Moves old rows out of the hot tables (attendance_queues, FPLog, gagalabsens)
+into <table>_archive so the worker's queue reads and the duplicate checks keep
+seeking small indexes.
+
+Rows are moved with DELETE TOP (n) ... OUTPUT DELETED.* INTO <table>_archive,
+one batch per transaction: a row is either in the hot table or in the archive,
+never in both or neither, and each batch holds its locks only briefly. Archive
+tables have the source's columns, a clustered index on the date column and
+page compression where the SQL Server edition supports it.
+
+Windows and schedule come from DATA_RETENTION_CONFIG; the daily job runs in
+the process holding the data_retention leader role.
+"""
+
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app.utils import metrics
+from config.database import db_manager
+from config.devices import DATA_RETENTION_CONFIG
+
+logger = logging.getLogger(__name__)
+
+ROWS_ARCHIVED = metrics.counter(
+    'attendance_rows_archived_total', 'Rows moved from hot tables to their archive tables', ['table']
+)
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def archive_table_name(table):
+    """Archive table of a hot table"""
+    return f"{table}_archive"
+
+
+def retention_cutoff(policy, now=None):
+    """
+    First timestamp that is kept, or None when the table is not archived.
+    Monthly tables are cut at a month boundary, so only closed months move.
+    """
+    days = int(policy.get('days') or 0)
+    if days <= 0:
+        return None
+    now = now or datetime.now()
+    cutoff = now - timedelta(days=days)
+    if policy.get('monthly'):
+        return datetime(cutoff.year, cutoff.month, 1)
+    return cutoff
+
+
+class DataRetentionService:
+    """Archives rows past their retention window, daily or on demand"""
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        """Singleton pattern - one retention job per process"""
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if hasattr(self, '_initialized'):
+            return
+
+        self._initialized = True
+        self.db_manager = db_manager
+        self.config = DATA_RETENTION_CONFIG
+        self.running = False
+        self.thread = None
+        self._stop_event = threading.Event()
+        self._run_lock = threading.Lock()
+        self.is_processing = False
+        self.last_run = None
+        self.run_count = 0
+
+    # === Lifecycle ===
+
+    def start(self):
+        """Start the daily job"""
+        if self.running:
+            return False, "Data retention job is already running"
+
+        self.running = True
+        self._stop_event = threading.Event()
+        self.thread = threading.Thread(
+            target=self._loop, args=(self._stop_event,), daemon=True, name="DataRetentionThread"
+        )
+        self.thread.start()
+        logger.info(f"[OK] Data retention job started (daily at {self.config.get('run_at', '02:30')})")
+        return True, "Data retention job started"
+
+    def stop(self):
+        """Stop the daily job (a batch in progress finishes first)"""
+        if not self.running:
+            return False, "Data retention job is not running"
+
+        self.running = False
+        self._stop_event.set()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=30)
+        logger.info("[OK] Data retention job stopped")
+        return True, "Data retention job stopped"
+
+    def _seconds_until_next_run(self):
+        hour, minute = (int(part) for part in self.config.get('run_at', '02:30').split(':'))
+        now = datetime.now()
+        next_run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        return (next_run - now).total_seconds()
+
+    def _loop(self, stop_event):
+        while not stop_event.wait(self._seconds_until_next_run()):
+            try:
+                self.run(stop_event=stop_event)
+            except Exception as e:
+                logger.error(f"[ERROR] Data retention run failed: {e}", exc_info=True)
+
+    # === Archive tables ===
+
+    def _policies(self):
+        """(table, policy) pairs with validated identifiers"""
+        for table, policy in self.config.get('tables', {}).items():
+            column = policy.get('date_column', '')
+            if not (_IDENTIFIER.match(table) and _IDENTIFIER.match(column)):
+                raise ValueError(f"Invalid table or column name in DATA_RETENTION_CONFIG: {table}.{column}")
+            yield table, policy
+
+    def ensure_archive_tables(self):
+        """Create missing archive tables; returns (success, message)"""
+        conn = self.db_manager.get_sqlserver_connection()
+        if not conn:
+            return False, "Database connection failed"
+        created = []
+        try:
+            cursor = conn.cursor()
+            for table, policy in self._policies():
+                archive = archive_table_name(table)
+                cursor.execute("SELECT OBJECT_ID(?, 'U'), OBJECT_ID(?, 'U')", (table, archive))
+                source_id, archive_id = cursor.fetchone()
+                if source_id is None or archive_id is not None:
+                    continue
+                # UNION ALL drops the IDENTITY property, so archived ids are kept as plain values
+                cursor.execute(
+                    f"SELECT * INTO [{archive}] FROM "
+                    f"(SELECT TOP 0 * FROM [{table}] UNION ALL SELECT TOP 0 * FROM [{table}]) AS source"
+                )
+                conn.commit()
+                self._create_archive_index(cursor, conn, archive, policy['date_column'])
+                created.append(archive)
+            cursor.close()
+        except Exception as e:
+            logger.error(f"[ERROR] Could not create archive tables: {e}")
+            return False, f"Error creating archive tables: {e}"
+        finally:
+            conn.close()
+        if created:
+            return True, f"Created {', '.join(created)}"
+        return True, "Archive tables ready"
+
+    def _create_archive_index(self, cursor, conn, archive, column):
+        """Clustered index on the date column, page-compressed when the edition allows it"""
+        statement = f"CREATE CLUSTERED INDEX [cx_{archive}_{column}] ON [{archive}] ([{column}])"
+        try:
+            cursor.execute(statement + " WITH (DATA_COMPRESSION = PAGE)")
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.info(f"[INFO] Page compression not available for {archive} ({e}); using an uncompressed index")
+            cursor.execute(statement)
+            conn.commit()
+
+    # === Archival ===
+
+    def _where(self, policy):
+        where = f"[{policy['date_column']}] < ?"
+        if policy.get('status'):
+            where += " AND status = ?"
+        return where
+
+    def _params(self, policy, cutoff):
+        return (cutoff, policy['status']) if policy.get('status') else (cutoff,)
+
+    def count_eligible(self, table, policy, cutoff):
+        """Rows that the next run would move"""
+        conn = self.db_manager.get_sqlserver_connection()
+        if not conn:
+            raise ConnectionError("Database connection failed")
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT COUNT(*) FROM [{table}] WHERE {self._where(policy)}", self._params(policy, cutoff))
+            count = cursor.fetchone()[0]
+            cursor.close()
+            return count
+        finally:
+            conn.close()
+
+    def archive_table(self, table, policy, cutoff, stop_event=None):
+        """Move rows before cutoff in batches; returns rows moved"""
+        archive = archive_table_name(table)
+        batch_size = int(self.config.get('batch_size', 4000))
+        max_batches = int(self.config.get('max_batches_per_run', 250))
+        statement = (
+            f"DELETE TOP (?) FROM [{table}] OUTPUT DELETED.* INTO [{archive}] WHERE {self._where(policy)}"
+        )
+        params = (batch_size,) + self._params(policy, cutoff)
+
+        conn = self.db_manager.get_sqlserver_connection()
+        if not conn:
+            raise ConnectionError("Database connection failed")
+        moved = 0
+        try:
+            cursor = conn.cursor()
+            for _ in range(max_batches):
+                if stop_event is not None and stop_event.is_set():
+                    break
+                cursor.execute(statement, params)
+                count = cursor.rowcount
+                conn.commit()
+                if count <= 0:
+                    break
+                moved += count
+                ROWS_ARCHIVED.inc(count, table=table)
+                if count < batch_size:
+                    break
+            cursor.close()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return moved
+
+    def run(self, dry_run=False, stop_event=None):
+        """
+        Archive every configured table once.
+        With dry_run only counts the rows that would move.
+        Returns (success, message).
+        """
+        if not self._run_lock.acquire(blocking=False):
+            return False, "Data retention is already running"
+        self.is_processing = True
+        started = time.monotonic()
+        tables = {}
+        errors = []
+        try:
+            if not dry_run:
+                success, message = self.ensure_archive_tables()
+                if not success:
+                    return False, message
+            for table, policy in self._policies():
+                cutoff = retention_cutoff(policy)
+                if cutoff is None:
+                    continue
+                try:
+                    if dry_run:
+                        rows = self.count_eligible(table, policy, cutoff)
+                    else:
+                        rows = self.archive_table(table, policy, cutoff, stop_event)
+                    tables[table] = {'cutoff': cutoff.strftime('%Y-%m-%d %H:%M:%S'), 'rows': rows}
+                    logger.info(f"[RETENTION] {table}: {rows} rows before {cutoff:%Y-%m-%d} "
+                                f"{'eligible' if dry_run else 'archived'}")
+                except Exception as e:
+                    errors.append(f"{table}: {e}")
+                    logger.error(f"[ERROR] Archiving {table} failed: {e}")
+        finally:
+            duration = round(time.monotonic() - started, 1)
+            if not dry_run:
+                self.run_count += 1
+                self.last_run = {
+                    'at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    'duration_seconds': duration,
+                    'tables': tables,
+                    'errors': errors,
+                }
+            self.is_processing = False
+            self._run_lock.release()
+
+        summary = ', '.join(f"{table}: {info['rows']}" for table, info in tables.items()) or 'no tables configured'
+        verb = 'eligible' if dry_run else 'archived'
+        if errors:
+            return False, f"Rows {verb} ({summary}); errors: {'; '.join(errors)}"
+        return True, f"Rows {verb} ({summary}) in {duration}s"
+
+    def get_status(self):
+        """Schedule, windows and the last run"""
+        return {
+            'running': self.running,
+            'is_processing': self.is_processing,
+            'run_at': self.config.get('run_at'),
+            'next_run_in_seconds': int(self._seconds_until_next_run()) if self.running else None,
+            'tables': {
+                table: {
+                    'days': policy.get('days', 0),
+                    'monthly': bool(policy.get('monthly')),
+                    'cutoff': cutoff.strftime('%Y-%m-%d %H:%M:%S') if cutoff else None,
+                }
+                for table, policy in self._policies()
+                for cutoff in [retention_cutoff(policy)]
+            },
+            'run_count': self.run_count,
+            'last_run': self.last_run,
+        }
+
+
+# Singleton instance getter
+_retention_instance = None
+
+
+def get_data_retention_service():
+    """Get singleton instance of DataRetentionService"""
+    global _retention_instance
+    if _retention_instance is None:
+        _retention_instance = DataRetentionService()
+    return _retention_instance
@@ -0,0 +1,409 @@
+"""
+Device Gateway
+Runs streaming for every configured device on a single asyncio event loop.
+
+Each device gets a supervisor task that connects, streams and reconnects after
+errors using DeviceSupervisor backoff and health tracking. Blocking pyzk reads
+and HTTP calls run in a small shared thread pool with short read timeouts, so
+pool threads rotate between devices instead of one OS thread being parked per
+device. Poll intervals are plain awaits and
+hold no thread at all. Received records are queued to a single batched writer
+that spools them to disk, saves them through StreamingService and runs
+attrecord once per date for each batch; a replayer task drains the spool after
+database outages.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app.services.device_supervisor import DeviceSupervisor
+from config.logging_config import get_streaming_logger
+
+logger = get_streaming_logger()
+
+# Sentinel returned when the live capture generator is exhausted
+_CAPTURE_END = object()
+
+
+class DeviceGateway:
+    """Multiplexes all device streams on one event loop thread"""
+
+    def __init__(self, streaming_service, supervisor=None, io_workers=8, zk_read_timeout=2, batch_size=50,
+                 flush_interval=1.0, queue_size=5000):
+        self.service = streaming_service
+        self.supervisor = supervisor or DeviceSupervisor()
+        self.io_workers = io_workers
+        self.zk_read_timeout = zk_read_timeout
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+
+        # Online Attendance schedule (Fingerspot intervals come from FINGERSPOT_API_CONFIG)
+        self.online_sync_interval = 3 * 60 * 60  # 3 hours
+        self.online_check_interval = 300  # 5 minutes
+
+        self.loop = None
+        self.thread = None
+        self.stop_event = None
+        self.write_queue = None
+        self.io_executor = None
+        self.db_executor = None
+        self.tasks = {}
+        self.stats = {
+            'records_queued': 0,
+            'records_written': 0,
+            'batches_written': 0,
+            'write_errors': 0
+        }
+
+    # === Lifecycle ===
+
+    def start(self, devices):
+        """Start the event loop thread and one supervisor per device"""
+        if self.is_running():
+            return False, "Device gateway is already running"
+
+        for device in devices:
+            self.supervisor.register(device)
+        self.io_executor = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="GatewayIO")
+        self.db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="GatewayWriter")
+
+        ready = threading.Event()
+        self.thread = threading.Thread(
+            target=self._run_loop,
+            args=(devices, ready),
+            daemon=True,
+            name="DeviceGatewayLoop"
+        )
+        self.thread.start()
+        ready.wait(5)
+        return True, f"Device gateway started for {len(devices)} devices"
+
+    def stop(self, timeout=30):
+        """Signal all supervisors to stop, flush pending writes and join the loop thread"""
+        if not self.is_running():
+            return False, "Device gateway is not running"
+
+        self.loop.call_soon_threadsafe(self.stop_event.set)
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            logger.warning("Device gateway did not stop within the timeout")
+        else:
+            logger.info("Device gateway stopped")
+
+        self.io_executor.shutdown(wait=False)
+        self.db_executor.shutdown(wait=False)
+        return True, "Device gateway stopped"
+
+    def is_running(self):
+        """Check whether the event loop thread is alive"""
+        return bool(self.thread and self.thread.is_alive())
+
+    def get_status(self):
+        """Get gateway status (per-device health is reported by the supervisor)"""
+        return {
+            'running': self.is_running(),
+            'active_devices': len([t for t in self.tasks.values() if not t.done()]),
+            'pending_writes': self.write_queue.qsize() if self.write_queue else 0,
+            'io_workers': self.io_workers,
+            'stats': dict(self.stats)
+        }
+
+    def _run_loop(self, devices, ready):
+        """Event loop thread entry point"""
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._main(devices, ready))
+        except Exception as e:
+            logger.error(f"Device gateway loop crashed: {e}")
+        finally:
+            self.loop.close()
+
+    async def _main(self, devices, ready):
+        """Run supervisors and the batched writer until stop is requested"""
+        self.stop_event = asyncio.Event()
+        self.write_queue = asyncio.Queue(maxsize=self.queue_size)
+        writer = asyncio.create_task(self._batch_writer())
+        replayer = asyncio.create_task(self._spool_replayer())
+        self.tasks = {
+            device['name']: asyncio.create_task(self._supervise(device))
+            for device in devices
+        }
+        ready.set()
+        logger.info(f"Device gateway running {len(self.tasks)} device supervisors")
+
+        await self.stop_event.wait()
+
+        # Supervisors notice the stop flag within one read timeout; blocking calls
+        # already handed to the pool are allowed to finish rather than cancelled.
+        tasks = list(self.tasks.values())
+        if tasks:
+            done, pending = await asyncio.wait(tasks, timeout=max(self.zk_read_timeout * 5, 10))
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending, timeout=5)
+
+        replayer.cancel()
+        await self.write_queue.put(None)
+        await writer
+
+    # === Helpers ===
+
+    async def _call(self, func, *args, **kwargs):
+        """Run a blocking call in the shared I/O pool"""
+        return await self.loop.run_in_executor(self.io_executor, lambda: func(*args, **kwargs))
+
+    async def _sleep(self, seconds):
+        """Sleep unless stop is requested; returns True when stopping"""
+        try:
+            await asyncio.wait_for(self.stop_event.wait(), timeout=seconds)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _enqueue(self, kind, device_name, record):
+        """Hand a received record to the batched writer"""
+        await self._enqueue_many(kind, device_name, [record])
+
+    async def _enqueue_many(self, kind, device_name, records):
+        """
+        Spool received records, then hand them to the batched writer. The spool
+        write comes first so punches waiting in the in-memory queue survive a crash.
+        """
+        items = [(kind, device_name, record) for record in records]
+        seqs = await self._call(self.service.spool_punches, items)
+        health = self.supervisor.get(device_name)
+        for item, seq in zip(items, seqs):
+            await self.write_queue.put(item + (seq,))
+            self.stats['records_queued'] += 1
+            health.record_punch()
+        return seqs
+
+    # === Supervision ===
+
+    async def _supervise(self, device):
+        """Keep one device streaming, reconnecting with backoff after errors"""
+        device_name = device['name']
+        connection_type = device.get('connection_type', 'zk')
+        health = self.supervisor.get(device_name)
+
+        if connection_type == 'fingerspot_api':
+            handler = self._run_fingerspot
+        elif connection_type == 'online_attendance':
+            handler = self._run_online
+        else:
+            handler = self._run_zk
+
+        logger.info(f"[{device_name}] Starting {connection_type} supervisor...")
+
+        while not self.stop_event.is_set():
+            health.state = 'connecting'
+            try:
+                # Known-down devices get a cheap probe before a full connect
+                if not await self._call(self.supervisor.probe, device):
+                    raise ConnectionError("device unreachable (probe failed)")
+                finished = await handler(device)
+                if finished:
+                    # Handler gave up for good (e.g. service or driver unavailable)
+                    health.state = 'disabled'
+                    return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                health.record_failure(e)
+                logger.error(f"[{device_name}] Streaming error: {e}")
+
+            if self.stop_event.is_set():
+                break
+            delay = self.supervisor.next_delay(device_name)
+            logger.info(f"[{device_name}] Retrying in {delay:.0f} seconds ({health.state}, {health.consecutive_failures} consecutive failures)")
+            if await self._sleep(delay):
+                break
+            health.restarts += 1
+
+        health.state = 'stopped'
+        logger.info(f"[{device_name}] Supervisor stopped")
+
+    async def _run_zk(self, device):
+        """Stream a ZK device through pooled live_capture reads"""
+        device_name = device['name']
+        try:
+            from zk import ZK
+        except ImportError:
+            logger.error(f"[{device_name}] pyzk module not available. Cannot stream from ZK device.")
+            return True
+
+        zk = ZK(device['ip'], port=device['port'], timeout=30, password=device['password'])
+
+        logger.info(f"[{device_name}] Connecting to ZK device...")
+        zk_conn = await self._call(zk.connect)
+        capture = None
+        try:
+            # Short read timeout: each pooled read returns None after it, so the
+            # pool thread is released and the stop flag is checked regularly
+            capture = zk_conn.live_capture(new_timeout=self.zk_read_timeout)
+            self._mark_connected(device_name)
+            logger.info(f"[{device_name}] ZK device connected, waiting for attendance data...")
+
+            while not self.stop_event.is_set():
+                attendance = await self._call(next, capture, _CAPTURE_END)
+                if attendance is _CAPTURE_END:
+                    raise ConnectionError("live capture ended")
+                if attendance is None:
+                    continue
+                logger.info(f"[{device_name}] ZK Data received: User ID: {attendance.user_id}, Time: {attendance.timestamp}")
+                await self._enqueue('zk', device_name, attendance)
+        finally:
+            await self._call(self._close_zk, device_name, zk_conn, capture)
+
+        return False
+
+    def _close_zk(self, device_name, zk_conn, capture):
+        """Leave live capture mode and disconnect (runs in the pool)"""
+        try:
+            if capture is not None:
+                # Let the generator run its own cleanup (re-enable device, restore timeout)
+                zk_conn.end_live_capture = True
+                next(capture, None)
+                capture.close()
+        except Exception as e:
+            logger.debug(f"[{device_name}] Error ending live capture: {e}")
+        try:
+            if zk_conn.is_connect:
+                zk_conn.disconnect()
+                logger.info(f"[{device_name}] Device connection closed.")
+        except Exception as e:
+            logger.debug(f"[{device_name}] Error disconnecting: {e}")
+
+    async def _run_fingerspot(self, device):
+        """Poll a Fingerspot API device on the event loop"""
+        device_name = device['name']
+        fingerspot_service = self.service.fingerspot_service
+        if not fingerspot_service:
+            logger.error(f"[{device_name}] Fingerspot service not available. Cannot stream from API device.")
+            return True
+
+        logger.info(f"[{device_name}] Testing API connection...")
+        connection_success, connection_message = await self._call(fingerspot_service.test_connection, device, use_cache=True)
+        if not connection_success:
+            raise ConnectionError(f"API connection test failed: {connection_message}")
+
+        logger.info(f"[{device_name}] API connection successful: {connection_message}")
+        self._mark_connected(device_name)
+
+        # Watermark polling: only records not seen before come back, and the
+        # interval shrinks while punches are arriving
+        poll_interval = fingerspot_service.get_poll_interval(device)
+        while not self.stop_event.is_set():
+            logger.info(f"[{device_name}] Polling Fingerspot API for new attendance data...")
+            attendance_records, state = await self._call(fingerspot_service.poll_new_attendance, device)
+
+            if attendance_records:
+                logger.info(f"[{device_name}] Found {len(attendance_records)} new records from API")
+                seqs = await self._enqueue_many('fingerspot', device_name, attendance_records)
+                # Advance the watermark only once the poll is in the spool
+                if all(seq is not None for seq in seqs):
+                    await self._call(fingerspot_service.commit_watermark, state)
+            else:
+                logger.debug(f"[{device_name}] No new records found in API poll")
+                await self._call(fingerspot_service.commit_watermark, state)
+
+            poll_interval = fingerspot_service.get_poll_interval(device, poll_interval, bool(attendance_records))
+            if await self._sleep(poll_interval):
+                break
+
+        return False
+
+    async def _run_online(self, device):
+        """Run the Online Attendance 3-hour sync schedule on the event loop"""
+        device_name = device['name']
+        online_service = self.service.online_attendance_service
+        if not online_service:
+            logger.error(f"[{device_name}] Online Attendance service not available for streaming")
+            return True
+
+        logger.info(f"[{device_name}] Starting Online Attendance streaming with 3-hour schedule...")
+        self._mark_connected(device_name)
+        last_sync_time = time.monotonic()
+
+        while not await self._sleep(self.online_check_interval):
+            if time.monotonic() - last_sync_time < self.online_sync_interval:
+                continue
+
+            current_time = datetime.now()
+            logger.info(f"[{device_name}] Starting scheduled sync (3-hour interval)...")
+            success, message = await self._call(
+                online_service.sync_attendance_data,
+                processor_callback=self._notify_online_record,
+                run_attrecord=True
+            )
+            self.service._notify_online_sync_result(device_name, success, message, current_time)
+            last_sync_time = time.monotonic()
+
+        return False
+
+    def _notify_online_record(self, device_name, record):
+        """Per-record hook for the Online Attendance sync (runs on a pool thread)"""
+        self.supervisor.get(device_name).record_punch()
+        self.service._notify_online_record(device_name, record)
+
+    def _mark_connected(self, device_name):
+        """Record that a device is connected"""
+        self.supervisor.get(device_name).record_connected()
+
+    # === Batched writer ===
+
+    async def _spool_replayer(self):
+        """Drain punches left in the spool (DB outage, crash) on the writer thread"""
+        while True:
+            try:
+                replayed = await self.loop.run_in_executor(self.db_executor, self.service.replay_spool)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error replaying punch spool: {e}")
+                replayed = 0
+            # Keep going while full batches succeed; otherwise wait for the next round
+            if replayed < self.service.spool_replay_batch:
+                await asyncio.sleep(self.service.spool_replay_interval)
+
+    async def _batch_writer(self):
+        """Drain queued records in batches and write them on the writer thread"""
+        while True:
+            item = await self.write_queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            deadline = self.loop.time() + self.flush_interval
+            stopping = False
+            while len(batch) < self.batch_size:
+                timeout = deadline - self.loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.write_queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            items = [item[:3] for item in batch]
+            seqs = [item[3] for item in batch]
+            try:
+                await self.loop.run_in_executor(self.db_executor, self.service.process_attendance_batch, items, seqs)
+                self.stats['records_written'] += len(batch)
+                self.stats['batches_written'] += 1
+            except Exception as e:
+                self.stats['write_errors'] += 1
+                logger.error(f"Error writing batch of {len(batch)} records: {e}")
+
+            if stopping:
+                return
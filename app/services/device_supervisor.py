@@ -0,0 +1,191 @@
+"""
+Device Supervisor
+Reconnect policy and health tracking for streaming devices.
+
+Failed connections are retried with capped exponential backoff plus jitter so
+devices that drop together (e.g. a site power cut) do not reconnect in
+lockstep. Devices with repeated failures are marked down: their retries
+stretch towards the backoff cap, and ZK devices get a cheap TCP probe before a
+full (30 second timeout) connect is attempted.
+"""
+
+import random
+import socket
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+
+class BackoffPolicy:
+    """Capped exponential backoff with equal jitter"""
+
+    def __init__(self, base=5, factor=2, cap=600):
+        self.base = base
+        self.factor = factor
+        self.cap = cap
+
+    def delay(self, attempt):
+        """Delay in seconds before retry number attempt (1-based)"""
+        ceiling = min(self.cap, self.base * (self.factor ** max(attempt - 1, 0)))
+        # Half fixed, half random: never retries immediately, still spreads out
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+class DeviceHealth:
+    """Connection health for a single device"""
+
+    # A connection that stayed up this long resets the failure count when it drops
+    STABLE_SECONDS = 60
+
+    def __init__(self, device_name, connection_type='zk'):
+        self.device_name = device_name
+        self.connection_type = connection_type
+        self.state = 'starting'
+        self.consecutive_failures = 0
+        self.total_failures = 0
+        self.restarts = 0
+        self.records = 0
+        self.last_error = None
+        self.last_success = None
+        self.last_failure = None
+        self.last_record_at = None
+        self.connected_since = None
+        self.next_retry_at = None
+        self._disconnected_at = None
+        self._connected_at = None
+        self._reconnect_times = deque(maxlen=20)
+        self._punch_times = deque()
+
+    def record_connected(self):
+        """A connection attempt succeeded"""
+        now = time.monotonic()
+        if self._disconnected_at is not None:
+            self._reconnect_times.append(now - self._disconnected_at)
+            self._disconnected_at = None
+        # consecutive_failures is kept until the connection proves stable, so a
+        # device that connects and drops immediately still backs off
+        self._connected_at = now
+        self.state = 'connected'
+        self.last_success = datetime.now()
+        self.connected_since = self.last_success
+        self.next_retry_at = None
+
+    def record_failure(self, error):
+        """A connection attempt failed or an established connection dropped"""
+        now = time.monotonic()
+        if self._connected_at is not None and now - self._connected_at >= self.STABLE_SECONDS:
+            self.consecutive_failures = 0
+        self._connected_at = None
+        if self._disconnected_at is None:
+            self._disconnected_at = now
+        self.consecutive_failures += 1
+        self.total_failures += 1
+        self.last_error = str(error)
+        self.last_failure = datetime.now()
+        self.connected_since = None
+
+    def record_punch(self):
+        """A punch was received from the device"""
+        now = time.monotonic()
+        self.consecutive_failures = 0
+        self.records += 1
+        self.last_record_at = datetime.now()
+        self._punch_times.append(now)
+        self._prune_punches(now)
+
+    def _prune_punches(self, now):
+        """Drop punch timestamps older than one hour"""
+        cutoff = now - 3600
+        while self._punch_times and self._punch_times[0] < cutoff:
+            self._punch_times.popleft()
+
+    @property
+    def punches_per_hour(self):
+        """Number of punches received in the last hour"""
+        self._prune_punches(time.monotonic())
+        return len(self._punch_times)
+
+    @property
+    def mean_reconnect_seconds(self):
+        """Mean time from disconnect to successful reconnect (recent history)"""
+        if not self._reconnect_times:
+            return None
+        return round(sum(self._reconnect_times) / len(self._reconnect_times), 1)
+
+    def to_dict(self):
+        """Serializable health snapshot"""
+        def fmt(value):
+            return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+        return {
+            'connection_type': self.connection_type,
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'total_failures': self.total_failures,
+            'restarts': self.restarts,
+            'records': self.records,
+            'punches_per_hour': self.punches_per_hour,
+            'mean_reconnect_seconds': self.mean_reconnect_seconds,
+            'last_success': fmt(self.last_success),
+            'last_failure': fmt(self.last_failure),
+            'last_record_at': fmt(self.last_record_at),
+            'connected_since': fmt(self.connected_since),
+            'next_retry_at': fmt(self.next_retry_at),
+            'last_error': self.last_error
+        }
+
+
+class DeviceSupervisor:
+    """Tracks health for all devices and decides when to retry them"""
+
+    def __init__(self, backoff=None, down_threshold=5, probe_timeout=3):
+        self.backoff = backoff or BackoffPolicy()
+        self.down_threshold = down_threshold
+        self.probe_timeout = probe_timeout
+        self.health = {}
+        self.lock = threading.Lock()
+
+    def register(self, device):
+        """Start tracking a device (keeps existing history on restart)"""
+        name = device['name']
+        with self.lock:
+            if name not in self.health:
+                self.health[name] = DeviceHealth(name, device.get('connection_type', 'zk'))
+            return self.health[name]
+
+    def get(self, device_name):
+        """Get the health record for a device"""
+        return self.health.get(device_name)
+
+    def is_down(self, device_name):
+        """A device is down after down_threshold consecutive failures"""
+        health = self.health.get(device_name)
+        return bool(health and health.consecutive_failures >= self.down_threshold)
+
+    def next_delay(self, device_name):
+        """Backoff delay before the next attempt; also marks the device backoff/down"""
+        health = self.health[device_name]
+        delay = self.backoff.delay(max(health.consecutive_failures, 1))
+        health.state = 'down' if self.is_down(device_name) else 'backoff'
+        health.next_retry_at = datetime.fromtimestamp(time.time() + delay)
+        return delay
+
+    def probe(self, device):
+        """
+        Cheap reachability check used before a full connect to a device that is
+        known to be down. Only ZK devices are probed (TCP connect to ip:port);
+        API devices always return True.
+        """
+        if device.get('connection_type', 'zk') != 'zk' or not self.is_down(device['name']):
+            return True
+        try:
+            with socket.create_connection((device['ip'], device['port']), timeout=self.probe_timeout):
+                return True
+        except OSError:
+            return False
+
+    def snapshot(self):
+        """Health of every tracked device"""
+        with self.lock:
+            return {name: health.to_dict() for name, health in self.health.items()}
@@ -3,15 +3,39 @@ Failed Attendance Upload Service
 Service untuk menangani upload file Excel gagal absensi sesuai dengan flowchart
 """
 
-import pandas as pd
+from __future__ import annotations
+
+import importlib
 import os
-from datetime import datetime
-from typing import Tuple, List, Dict, Any
+from typing import TYPE_CHECKING, Tuple, List, Dict, Any
 from config.database import DatabaseManager
 from config.logging_config import get_background_logger
+from app.utils.lazy import LazyInstance
+
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    # pandas loads on first use, not when the controller imports this module at startup
+    pd = LazyInstance(lambda: importlib.import_module('pandas'))
 
 logger = get_background_logger('FailedAttendanceUploadService', 'logs/failed_attendance_upload.log')
 
+REQUIRED_COLUMNS = ['TANGGAL', 'ID', 'DIVISI', 'MASUK', 'MASUK PRODUKSI', 'PULANG PRODUKSI', 'PULANG', 'KETERANGAN']
+
+# Kolom jam -> (machine, status, statistik) sesuai flowchart
+PUNCH_COLUMNS = {
+    'MASUK': ('104', 'I', 'processed_masuk'),
+    'MASUK PRODUKSI': ('204', 'I', 'processed_produksi'),
+    'PULANG PRODUKSI': ('202', 'O', 'processed_produksi'),
+    'PULANG': ('102', 'O', 'processed_pulang'),
+}
+
+# String date formats, tried in this order before pandas' own inference
+DATE_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%m/%d/%Y']
+
+# Entries returned in statistics['errors']; error_count has the full total
+MAX_REPORTED_ERRORS = 200
+
 class FailedAttendanceUploadService:
     """Service untuk upload gagal absensi dari file Excel"""
     
@@ -22,11 +46,16 @@ class FailedAttendanceUploadService:
         """
         Process Excel file upload sesuai flowchart
         
+        Kolom diparse per kolom (bukan per baris), kolom jam di-melt menjadi
+        satu record per punch, lalu disimpan dengan staging table + anti-join
+        sehingga upload ulang file yang sama tidak menggandakan gagalabsens.
+        
         Args:
             file_path: Path ke file Excel yang diupload
             
         Returns:
-            Tuple[bool, str, Dict]: (success, message, statistics)
+            Tuple[bool, str, Dict]: (success, message, statistics) - statistics['errors']
+            berisi baris Excel yang ditolak beserta kolom dan alasannya
         """
         try:
             logger.info(f"Starting Excel file processing: {file_path}")
@@ -39,46 +68,25 @@ class FailedAttendanceUploadService:
             logger.info(f"Excel file read successfully. Rows: {len(df)}")
             
             # Step 2: Proses data sesuai flowchart
-            processed_data = []
-            stats = {
-                'total_rows': len(df),
-                'processed_masuk': 0,
-                'processed_produksi': 0,
-                'processed_pulang': 0,
-                'skipped_rows': 0,
-                'error_rows': 0
-            }
+            punches, errors, stats = self._build_punches(df)
             
-            for index, row in df.iterrows():
-                try:
-                    # Proses setiap kolom sesuai flowchart
-                    row_data = self._process_row_data(row, index + 2)  # +2 karena header dan 0-indexed
-                    
-                    for data_item in row_data:
-                        if data_item:
-                            processed_data.append(data_item)
-                            # Update statistics
-                            if 'masuk' in data_item['keterangan'].lower():
-                                stats['processed_masuk'] += 1
-                            elif 'produksi' in data_item['keterangan'].lower():
-                                stats['processed_produksi'] += 1
-                            elif 'pulang' in data_item['keterangan'].lower():
-                                stats['processed_pulang'] += 1
-                
-                except Exception as e:
-                    logger.error(f"Error processing row {index + 2}: {e}")
-                    stats['error_rows'] += 1
+            stats['error_count'] = len(errors)
+            stats['errors'] = errors[:MAX_REPORTED_ERRORS]
+            if errors:
+                logger.warning(f"{len(errors)} cells rejected in {stats['error_rows']} rows")
             
-            if not processed_data:
+            if not punches:
                 return False, "Tidak ada data valid untuk diproses", stats
             
             # Step 3: Insert ke database
-            success, message = self._insert_to_gagalabsens(processed_data)
+            success, message, inserted = self._insert_to_gagalabsens(punches)
             
             if success:
-                stats['inserted_records'] = len(processed_data)
-                logger.info(f"Successfully processed {len(processed_data)} records")
-                return True, f"Berhasil mengupload {len(processed_data)} record gagal absensi", stats
+                stats['inserted_records'] = inserted
+                stats['duplicate_records'] = len(punches) - inserted
+                logger.info(f"Successfully processed {len(punches)} records ({inserted} inserted)")
+                return True, (f"Berhasil mengupload {inserted} record gagal absensi"
+                              f" ({len(punches) - inserted} duplikat dilewati)"), stats
             else:
                 return False, f"Gagal menyimpan data: {message}", stats
                 
@@ -100,14 +108,11 @@ class FailedAttendanceUploadService:
             # Baca Excel file
             df = pd.read_excel(file_path)
             
-            # Validasi kolom yang diperlukan sesuai header Excel
-            required_columns = ['TANGGAL', 'ID', 'DIVISI', 'MASUK', 'MASUK PRODUKSI', 'PULANG PRODUKSI', 'PULANG', 'KETERANGAN']
-            
             # Check if all required columns exist (case insensitive)
-            df_columns_lower = [col.lower().strip() for col in df.columns]
+            df_columns_lower = [str(col).lower().strip() for col in df.columns]
             missing_columns = []
             
-            for req_col in required_columns:
+            for req_col in REQUIRED_COLUMNS:
                 if req_col.lower() not in df_columns_lower:
                     missing_columns.append(req_col)
             
@@ -117,9 +122,9 @@ class FailedAttendanceUploadService:
             
             # Rename columns to standard format
             column_mapping = {}
-            for req_col in required_columns:
+            for req_col in REQUIRED_COLUMNS:
                 for actual_col in df.columns:
-                    if actual_col.lower().strip() == req_col.lower():
+                    if str(actual_col).lower().strip() == req_col.lower():
                         column_mapping[actual_col] = req_col
                         break
             
@@ -135,215 +140,181 @@ class FailedAttendanceUploadService:
             logger.error(f"Error reading Excel file: {e}")
             return None
     
-    def _process_row_data(self, row: pd.Series, row_number: int) -> List[Dict[str, Any]]:
+    def _build_punches(self, df: pd.DataFrame) -> Tuple[List[tuple], List[Dict[str, Any]], Dict[str, Any]]:
         """
-        Process satu row data sesuai dengan flowchart logic
-        Mengecek setiap kolom (masuk, masuk produksi, pulang produksi, pulang) dan buat record terpisah
+        Ubah sheet menjadi record gagalabsens (pin, tgl, machine, status).
+        Returns (punches, errors, stats); baris Excel = index + 2 (header dan 0-indexed).
         """
-        processed_items = []
+        excel_row = pd.Series(df.index + 2, index=df.index)
         
-        try:
-            # Base data dari row
-            tanggal = self._parse_date(row.get('TANGGAL'))
-            if not tanggal:
-                logger.warning(f"Row {row_number}: Invalid or missing date")
-                return []
-            
-            # Fix PIN - convert to integer first to remove .0, then back to string
-            pin_raw = row.get('ID', '')
-            try:
-                # Convert to float first (in case it comes as string), then to int to remove decimals
-                pin = str(int(float(str(pin_raw).strip())))
-            except (ValueError, TypeError):
-                logger.warning(f"Row {row_number}: Invalid PIN format: {pin_raw}")
-                return []
-            
-            if not pin:
-                logger.warning(f"Row {row_number}: Missing ID/PIN")
-                return []
-            
-            divisi = str(row.get('DIVISI', '')).strip()
-            keterangan_base = str(row.get('KETERANGAN', '')).strip()
-            
-            # Proses setiap kolom sesuai flowchart
-            
-            # 1. Cek data kolom masuk - machine: 104, status: I
-            if pd.notna(row.get('MASUK')) and str(row.get('MASUK')).strip():
-                masuk_time = self._parse_time(row.get('MASUK'))
-                if masuk_time:
-                    processed_items.append({
-                        'pin': pin,
-                        'tanggal': tanggal,
-                        'jam': masuk_time,
-                        'machine': '104',
-                        'status_code': 'I',
-                        'keterangan': f"masuk - {keterangan_base}" if keterangan_base else "masuk",
-                        'divisi': divisi,
-                        'status': 'masuk',
-                        'datetime_combined': f"{tanggal} {masuk_time}"
-                    })
-            
-            # 2. Cek data kolom masuk produksi - machine: 204, status: I
-            if pd.notna(row.get('MASUK PRODUKSI')) and str(row.get('MASUK PRODUKSI')).strip():
-                masuk_produksi_time = self._parse_time(row.get('MASUK PRODUKSI'))
-                if masuk_produksi_time:
-                    processed_items.append({
-                        'pin': pin,
-                        'tanggal': tanggal,
-                        'jam': masuk_produksi_time,
-                        'machine': '204',
-                        'status_code': 'I',
-                        'keterangan': f"masuk produksi - {keterangan_base}" if keterangan_base else "masuk produksi",
-                        'divisi': divisi,
-                        'status': 'masuk produksi',
-                        'datetime_combined': f"{tanggal} {masuk_produksi_time}"
-                    })
-            
-            # 3. Cek data kolom pulang produksi - machine: 202, status: O
-            if pd.notna(row.get('PULANG PRODUKSI')) and str(row.get('PULANG PRODUKSI')).strip():
-                pulang_produksi_time = self._parse_time(row.get('PULANG PRODUKSI'))
-                if pulang_produksi_time:
-                    processed_items.append({
-                        'pin': pin,
-                        'tanggal': tanggal,
-                        'jam': pulang_produksi_time,
-                        'machine': '202',
-                        'status_code': 'O',
-                        'keterangan': f"pulang produksi - {keterangan_base}" if keterangan_base else "pulang produksi",
-                        'divisi': divisi,
-                        'status': 'pulang produksi',
-                        'datetime_combined': f"{tanggal} {pulang_produksi_time}"
-                    })
-            
-            # 4. Cek data kolom pulang - machine: 102, status: O
-            if pd.notna(row.get('PULANG')) and str(row.get('PULANG')).strip():
-                pulang_time = self._parse_time(row.get('PULANG'))
-                if pulang_time:
-                    processed_items.append({
-                        'pin': pin,
-                        'tanggal': tanggal,
-                        'jam': pulang_time,
-                        'machine': '102',
-                        'status_code': 'O',
-                        'keterangan': f"pulang - {keterangan_base}" if keterangan_base else "pulang",
-                        'divisi': divisi,
-                        'status': 'pulang',
-                        'datetime_combined': f"{tanggal} {pulang_time}"
-                    })
-            
-            return processed_items
-            
-        except Exception as e:
-            logger.error(f"Error processing row {row_number}: {e}")
-            return []
-    
-    def _parse_date(self, date_value) -> str:
-        """Parse tanggal ke format YYYY-MM-DD"""
-        if pd.isna(date_value):
-            return None
+        tanggal = self._per_unique(df['TANGGAL'], self._parse_dates)
+        pin = self._per_unique(df['ID'], self._parse_pins)
+        error_frames = [
+            self._cell_errors(df, excel_row, 'TANGGAL', tanggal.isna(), 'Tanggal kosong atau tidak valid'),
+            self._cell_errors(df, excel_row, 'ID', pin.isna(), 'ID/PIN kosong atau tidak valid'),
+        ]
+        valid = tanggal.notna() & pin.notna()
         
-        try:
-            if isinstance(date_value, str):
-                # Try common date formats
-                for fmt in ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%m/%d/%Y']:
-                    try:
-                        dt = datetime.strptime(date_value.strip(), fmt)
-                        return dt.strftime('%Y-%m-%d')
-                    except:
-                        continue
-            elif isinstance(date_value, datetime):
-                return date_value.strftime('%Y-%m-%d')
-            elif hasattr(date_value, 'date'):
-                return date_value.date().strftime('%Y-%m-%d')
-            
-            # Try pandas to_datetime as last resort
-            dt = pd.to_datetime(date_value)
-            return dt.strftime('%Y-%m-%d')
-            
-        except Exception as e:
-            logger.warning(f"Failed to parse date '{date_value}': {e}")
-            return None
+        # Wide punch columns -> one long row per filled cell
+        times = pd.DataFrame({column: self._per_unique(df[column], self._parse_times) for column in PUNCH_COLUMNS},
+                             index=df.index)
+        for column in PUNCH_COLUMNS:
+            filled = self._per_unique(df[column], self._is_filled).fillna(False).astype(bool)
+            bad = valid & filled & times[column].isna()
+            error_frames.append(self._cell_errors(df, excel_row, column, bad, 'Format jam tidak valid'))
+        
+        times['pin'] = pin
+        times['tanggal'] = tanggal
+        long = times[valid].melt(id_vars=['pin', 'tanggal'], value_vars=list(PUNCH_COLUMNS),
+                                 var_name='column', value_name='jam', ignore_index=False)
+        long = long[long['jam'].notna()].sort_index(kind='stable')
+        
+        errors = pd.concat(error_frames).sort_values(['row', 'column'], kind='stable')
+        stats = {
+            'total_rows': len(df),
+            'processed_masuk': 0,
+            'processed_produksi': 0,
+            'processed_pulang': 0,
+            'skipped_rows': int((valid & ~valid.index.isin(long.index)).sum()),
+            'error_rows': int(errors['row'].nunique()),
+        }
+        for column, count in long['column'].value_counts().items():
+            stats[PUNCH_COLUMNS[column][2]] += int(count)
+        
+        tgl = (long['tanggal'] + long['jam']).dt.strftime('%Y-%m-%d %H:%M:%S')
+        machine = long['column'].map({column: rule[0] for column, rule in PUNCH_COLUMNS.items()})
+        status = long['column'].map({column: rule[1] for column, rule in PUNCH_COLUMNS.items()})
+        punches = list(zip(long['pin'], tgl, machine, status))
+        return punches, errors.to_dict('records'), stats
     
-    def _parse_time(self, time_value) -> str:
-        """Parse waktu ke format HH:MM:SS"""
-        if pd.isna(time_value):
-            return None
+    def _cell_errors(self, df: pd.DataFrame, excel_row: pd.Series, column: str, mask: pd.Series, message: str) -> pd.DataFrame:
+        """Error report entries for the cells selected by mask"""
+        return pd.DataFrame({
+            'row': excel_row[mask].astype(int),
+            'column': column,
+            'value': df.loc[mask, column].map(lambda value: '' if pd.isna(value) else str(value)),
+            'error': message,
+        }, columns=['row', 'column', 'value', 'error'])
+    
+    def _per_unique(self, series: pd.Series, parse) -> pd.Series:
+        """
+        Run a column parser over the distinct values only and broadcast the
+        result back; sheets repeat the same dates, PINs and times thousands of times
+        """
+        codes, uniques = pd.factorize(series)
+        parsed = parse(pd.Series(uniques, dtype=object))
+        return parsed.reindex(codes).set_axis(series.index)  # code -1 (NaN) -> NA
+    
+    def _is_filled(self, series: pd.Series) -> pd.Series:
+        """Cells that are neither NaN nor blank text"""
+        return series.notna() & (series.astype(str).str.strip() != '')
+    
+    def _parse_dates(self, series: pd.Series) -> pd.Series:
+        """Tanggal (tanpa jam) per baris; NaT untuk tanggal kosong/tidak valid"""
+        parsed = pd.Series(pd.NaT, index=series.index, dtype='datetime64[ns]')
+        text = series.where(self._is_filled(series)).astype('string').str.strip()
+        for fmt in DATE_FORMATS:
+            missing = parsed.isna() & text.notna()
+            if not missing.any():
+                break
+            parsed[missing] = pd.to_datetime(text[missing], format=fmt, errors='coerce')
         
-        try:
-            time_str = str(time_value).strip()
-            
-            # Handle different time formats
-            if ':' in time_str:
-                parts = time_str.split(':')
-                if len(parts) >= 2:
-                    hour = int(parts[0])
-                    minute = int(parts[1])
-                    second = int(parts[2]) if len(parts) > 2 else 0
-                    return f"{hour:02d}:{minute:02d}:{second:02d}"
-            else:
-                # Handle numeric time (e.g., 800 = 08:00)
-                if time_str.isdigit() and len(time_str) <= 4:
-                    time_str = time_str.zfill(4)
-                    hour = int(time_str[:2])
-                    minute = int(time_str[2:])
-                    return f"{hour:02d}:{minute:02d}:00"
-            
-            # Try parsing as datetime
-            if isinstance(time_value, datetime):
-                return time_value.strftime('%H:%M:%S')
-            
-            # Try pandas to_datetime
-            dt = pd.to_datetime(time_str, format='%H:%M:%S')
-            return dt.strftime('%H:%M:%S')
-            
-        except Exception as e:
-            logger.warning(f"Failed to parse time '{time_value}': {e}")
-            return None
+        # datetime cells and other layouts pandas can infer
+        missing = parsed.isna() & text.notna()
+        if missing.any():
+            parsed[missing] = pd.to_datetime(series[missing], format='mixed', errors='coerce')
+        return parsed.dt.normalize()
+    
+    def _parse_pins(self, series: pd.Series) -> pd.Series:
+        """PIN sebagai string tanpa .0; NA untuk PIN kosong/tidak valid"""
+        import numpy as np
+        numbers = pd.to_numeric(series.astype(str).str.strip(), errors='coerce')
+        # inf/-inf (and values past float precision) would make the Int64 cast raise
+        valid = np.isfinite(numbers) & (numbers.abs() < 2 ** 53) & (numbers == numbers.round())
+        return numbers.where(valid).astype('Int64').astype('string')
     
-    def _insert_to_gagalabsens(self, data_list: List[Dict[str, Any]]) -> Tuple[bool, str]:
+    def _parse_times(self, series: pd.Series) -> pd.Series:
         """
-        Insert semua data ke database gagalabsens sesuai flowchart
-        Format: insert into gagalabsens values('id','YYYY-MM-DD HH:MM:SS'/'masuk/status',getdate(),getdate())
+        Jam sebagai timedelta sejak tengah malam; NaT untuk sel kosong/tidak valid.
+        Menerima H:MM[:SS] (termasuk sel time/datetime Excel) dan angka HMM (800 = 08:00).
         """
-        if not data_list:
-            return True, "No data to insert"
-            
-        query = """
-            INSERT INTO gagalabsens (pin, tgl, machine, status, created_at, updated_at)
-            VALUES (?, ?, ?, ?, GETDATE(), GETDATE())
+        text = series.where(self._is_filled(series)).astype('string').str.strip()
+        text = text.str.replace(r'\.0+$', '', regex=True)
+        
+        parts = text.str.extract(r'(?:^|\s)(\d{1,2}):(\d{1,2})(?::(\d{1,2}))?')
+        compact = text.str.extract(r'^(\d{1,4})$')[0].str.zfill(4)
+        hour = pd.to_numeric(parts[0].fillna(compact.str[:2]), errors='coerce')
+        minute = pd.to_numeric(parts[1].fillna(compact.str[2:]), errors='coerce')
+        second = pd.to_numeric(parts[2], errors='coerce').fillna(0)
+        
+        in_range = (hour < 24) & (minute < 60) & (second < 60)
+        seconds = (hour * 3600 + minute * 60 + second).where(in_range)
+        return pd.to_timedelta(seconds, unit='s')
+    
+    def _insert_to_gagalabsens(self, punches: List[tuple]) -> Tuple[bool, str, int]:
+        """
+        Insert data ke gagalabsens dalam satu koneksi: bulk insert ke staging
+        table lalu INSERT ... SELECT dengan anti-join, dengan kunci duplikat
+        yang sama seperti sync online (pin, machine, menit)
+        
+        Returns:
+            Tuple[bool, str, int]: (success, message, inserted_count)
         """
+        if not punches:
+            return True, "No data to insert", 0
         
         conn = self.db_manager.get_connection()
         if not conn:
             logger.error("Failed to get database connection")
-            return False, "Database connection failed"
+            return False, "Database connection failed", 0
             
         try:
             cursor = conn.cursor()
-            
-            # Prepare batch insert data
-            batch_data = []
-            for item in data_list:
-                # Format sesuai aturan: pin, tgl, machine, status
-                batch_data.append((
-                    item['pin'],  # PIN tanpa .0
-                    item['datetime_combined'],  # YYYY-MM-DD HH:MM:SS format untuk kolom tgl
-                    item['machine'],  # machine code sesuai aturan (104/204/202/102)
-                    item['status_code']  # status code sesuai aturan (I/O)
-                ))
-            
-            # Execute batch insert
-            cursor.executemany(query, batch_data)
+            cursor.execute("""
+                CREATE TABLE #upload_stage (
+                    row_no INT NOT NULL,
+                    pin NVARCHAR(50) COLLATE DATABASE_DEFAULT NOT NULL,
+                    tgl DATETIME NOT NULL,
+                    machine NVARCHAR(20) COLLATE DATABASE_DEFAULT NOT NULL,
+                    status NVARCHAR(20) COLLATE DATABASE_DEFAULT NOT NULL,
+                    tgl_minute AS DATEADD(minute, DATEDIFF(minute, 0, tgl), 0) PERSISTED
+                )
+            """)
+            cursor.fast_executemany = True
+            cursor.executemany(
+                "INSERT INTO #upload_stage (row_no, pin, tgl, machine, status) VALUES (?, ?, ?, ?, ?)",
+                [(row_no,) + punch for row_no, punch in enumerate(punches)]
+            )
+            
+            # First row of each (pin, machine, minute) in the file, without a match in gagalabsens
+            cursor.execute("""
+                INSERT INTO gagalabsens (pin, tgl, machine, status, created_at, updated_at)
+                SELECT s.pin, s.tgl, s.machine, s.status, GETDATE(), GETDATE()
+                FROM (
+                    SELECT *, ROW_NUMBER() OVER (PARTITION BY pin, machine, tgl_minute ORDER BY tgl, row_no) AS rn
+                    FROM #upload_stage
+                ) s
+                WHERE s.rn = 1
+                AND NOT EXISTS (
+                    SELECT 1 FROM gagalabsens g
+                    WHERE g.pin = s.pin
+                    AND g.machine = s.machine
+                    AND g.tgl >= s.tgl_minute
+                    AND g.tgl < DATEADD(minute, 1, s.tgl_minute)
+                )
+            """)
+            inserted = cursor.rowcount
             conn.commit()
+            cursor.close()
             
-            logger.info(f"Successfully inserted {len(batch_data)} records to gagalabsens")
-            return True, f"Successfully inserted {len(batch_data)} records"
+            logger.info(f"Successfully inserted {inserted} records to gagalabsens ({len(punches) - inserted} duplicates skipped)")
+            return True, f"Successfully inserted {inserted} records", inserted
             
         except Exception as e:
             if conn:
                 conn.rollback()
             logger.error(f"Error inserting to gagalabsens: {e}")
-            return False, str(e)
+            return False, str(e), 0
         finally:
             if conn:
                 conn.close()
@@ -353,12 +324,10 @@ class FailedAttendanceUploadService:
         try:
             df = pd.read_excel(file_path)
             
-            required_columns = ['TANGGAL', 'ID', 'DIVISI', 'MASUK', 'MASUK PRODUKSI', 'PULANG PRODUKSI', 'PULANG', 'KETERANGAN']
-            
-            df_columns_lower = [col.lower().strip() for col in df.columns]
+            df_columns_lower = [str(col).lower().strip() for col in df.columns]
             missing_columns = []
             
-            for req_col in required_columns:
+            for req_col in REQUIRED_COLUMNS:
                 if req_col.lower() not in df_columns_lower:
                     missing_columns.append(req_col)
             
@@ -370,5 +339,5 @@ class FailedAttendanceUploadService:
         except Exception as e:
             return False, f"Error validating file: {str(e)}", []
 
-# Global service instance
-failed_attendance_upload_service = FailedAttendanceUploadService()
\ No newline at end of file
+# Global service instance (constructed on first use)
+failed_attendance_upload_service = LazyInstance(FailedAttendanceUploadService)
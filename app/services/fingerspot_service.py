@@ -5,16 +5,20 @@ This service handles devices 201 and 203 that use Fingerspot Developer API
 
 import requests
 import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Tuple
 from config.devices import (
     get_fingerspot_api_devices,
     get_fingerspot_config,
     FINGERSPOT_API_CONFIG,
-    determine_status,
-    get_status_display
+    resolve_status
 )
 from config.logging_config import get_streaming_logger
+from app.services.http_client import get_http_pool
 
 # Setup logging
 logger = get_streaming_logger()
@@ -28,12 +32,60 @@ class FingerspotAttendance:
         self.uid = uid
         self.original_status_scan = original_status_scan  # Store original status_scan value (can be int or str)
 
+class FingerspotWatermarkStore:
+    """
+    Persists, per cloud_id, the newest scan_date seen and the keys of records
+    already seen inside the refetch horizon, so repeated polls of the same
+    days only yield new records
+    """
+    
+    def __init__(self, file_path: str = "shared/fingerspot_watermarks.json"):
+        self.file_path = file_path
+        self.lock = threading.Lock()
+        self._state = None
+    
+    def _load(self) -> Dict:
+        """Load the state file once"""
+        if self._state is None:
+            try:
+                with open(self.file_path, 'r', encoding='utf-8') as f:
+                    self._state = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self._state = {}
+        return self._state
+    
+    def get(self, cloud_id: str) -> Dict:
+        """Get {'watermark': 'YYYY-mm-dd HH:MM:SS' or None, 'seen': [...]} for a cloud_id"""
+        with self.lock:
+            state = self._load().get(str(cloud_id), {})
+            return {'watermark': state.get('watermark'), 'seen': list(state.get('seen', []))}
+    
+    def update(self, cloud_id: str, watermark: Optional[str], seen: List[str]):
+        """Store the new state for a cloud_id and write the file atomically"""
+        with self.lock:
+            state = self._load()
+            state[str(cloud_id)] = {'watermark': watermark, 'seen': seen}
+            directory = os.path.dirname(self.file_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            tmp_path = f"{self.file_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.file_path)
+
+
 class FingerspotAPIService:
     """Service for handling Fingerspot API communication"""
     
     def __init__(self):
         self.base_config = FINGERSPOT_API_CONFIG
         self.timeout = self.base_config.get('timeout', 30)
+        self.watermarks = FingerspotWatermarkStore()
+        self.http = get_http_pool()
+        self.connection_check_ttl = self.base_config.get('connection_check_ttl', 60)
+        # cloud_id -> (checked_at monotonic, get_device data) for successful checks only
+        self._connection_cache = {}
+        self._connection_cache_lock = threading.Lock()
         
     def _make_request(self, method: str, url: str, device_config: Dict, **kwargs) -> Optional[Dict]:
         """Make HTTP request to Fingerspot API with error handling and retries"""
@@ -62,13 +114,10 @@ class FingerspotAPIService:
             try:
                 logger.debug(f"API Request (attempt {attempt + 1}): {method} {url}")
                 
-                if method.upper() == 'POST':
-                    response = requests.post(url, **kwargs)
-                elif method.upper() == 'GET':
-                    response = requests.get(url, **kwargs)
-                else:
+                if method.upper() not in ('POST', 'GET'):
                     logger.error(f"Unsupported HTTP method: {method}")
                     return None
+                response = self.http.request(method.upper(), url, **kwargs)
                 
                 # Log response
                 logger.debug(f"API Response: {response.status_code} - {response.text[:500]}")
@@ -93,7 +142,6 @@ class FingerspotAPIService:
             # Retry logic
             if attempt < retry_count - 1:
                 logger.info(f"Retrying in {retry_delay} seconds...")
-                import time
                 time.sleep(retry_delay)
             else:
                 logger.error(f"All retry attempts failed for {url}")
@@ -101,12 +149,56 @@ class FingerspotAPIService:
         
         return None
 
-    def test_connection(self, device_config: Dict) -> Tuple[bool, str]:
+    def _cached_device_data(self, cloud_id) -> Optional[Dict]:
+        """get_device data from a successful check younger than connection_check_ttl"""
+        with self._connection_cache_lock:
+            entry = self._connection_cache.get(cloud_id)
+        if entry and time.monotonic() - entry[0] < self.connection_check_ttl:
+            return entry[1]
+        return None
+    
+    def _mark_reachable(self, cloud_id, device_data: Dict = None):
+        """Record a successful API round trip for a device (keeps known device data)"""
+        with self._connection_cache_lock:
+            if device_data is None:
+                entry = self._connection_cache.get(cloud_id)
+                device_data = entry[1] if entry else {}
+            self._connection_cache[cloud_id] = (time.monotonic(), device_data)
+    
+    def _get_device(self, device_config: Dict) -> Tuple[Optional[Dict], Optional[str]]:
+        """Call the get_device endpoint; returns (device data, error message)"""
+        api_config = device_config.get('api_config', {})
+        
+        # Build API URL for device endpoint
+        base_url = api_config.get('base_url', self.base_config['base_url'])
+        cloud_id = api_config.get('cloud_id')
+        endpoint = self.base_config['endpoints']['devices']  # /get_device
+        
+        url = f"{base_url}{endpoint}"
+        
+        # Prepare request data (trans_id is required)
+        data = {
+            'trans_id': 1,
+            'cloud_id': cloud_id
+        }
+        
+        response_data = self._make_request('POST', url, device_config, json=data)
+        if not response_data:
+            return None, 'No response'
+        if not response_data.get('success'):
+            return None, response_data.get('message', 'Unknown error')
+        
+        device_data = response_data.get('data') or {}
+        self._mark_reachable(cloud_id, device_data)
+        return device_data, None
+
+    def test_connection(self, device_config: Dict, use_cache: bool = False) -> Tuple[bool, str]:
         """
         Test connection to Fingerspot API using get_device endpoint
         
         Args:
             device_config: Device configuration
+            use_cache: Accept a successful check (or API call) younger than connection_check_ttl
             
         Returns:
             Tuple of (success, message)
@@ -117,34 +209,22 @@ class FingerspotAPIService:
         if not api_config:
             return False, f"No API config found for device {device_name}"
         
-        # Build API URL for device endpoint
-        base_url = api_config.get('base_url', self.base_config['base_url'])
-        cloud_id = api_config.get('cloud_id')
-        endpoint = self.base_config['endpoints']['devices']  # /get_device
-        
-        url = f"{base_url}{endpoint}"
-        
-        # Prepare request data (trans_id is required)
-        data = {
-            'trans_id': 1,
-            'cloud_id': cloud_id
-        }
+        if use_cache and self._cached_device_data(api_config.get('cloud_id')) is not None:
+            return True, f"Connection successful for device {device_name} (cached)"
         
         try:
             logger.info(f"Testing Fingerspot API connection for device {device_name}")
-            response_data = self._make_request('POST', url, device_config, json=data)
+            device_info, error_msg = self._get_device(device_config)
             
-            if not response_data:
+            if error_msg == 'No response':
                 return False, f"No response from Fingerspot API for device {device_name}"
             
             # Check if request was successful
-            if response_data.get('success'):
-                device_info = response_data.get('data', {})
+            if error_msg is None:
                 device_api_name = device_info.get('device_name', 'Unknown')
                 logger.info(f"Connection successful. Device: {device_api_name}")
                 return True, f"Connection successful for device {device_name}"
             else:
-                error_msg = response_data.get('message', 'Unknown error')
                 logger.error(f"API returned error for device {device_name}: {error_msg}")
                 return False, f"API error: {error_msg}"
                 
@@ -190,30 +270,49 @@ class FingerspotAPIService:
         
         url = f"{base_url}{endpoint}"
         
+        # The API accepts at most 2 days per request: split longer ranges into
+        # windows and fetch them concurrently
+        windows = self._split_date_windows(start_date, end_date)
+        logger.info(f"Fetching attendance data for device {device_name} (cloud_id: {cloud_id}) in {len(windows)} window(s)")
+        
+        if len(windows) == 1:
+            results = [self._fetch_attendance_window(device_config, url, cloud_id, *windows[0])]
+        else:
+            max_workers = min(len(windows), self.base_config.get('max_concurrent_windows', 4))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(
+                    lambda window: self._fetch_attendance_window(device_config, url, cloud_id, *window),
+                    windows
+                ))
+        
+        attendance_records = [record for window_records in results for record in window_records]
+        attendance_records.sort(key=lambda att: att.timestamp)
+        
+        logger.info(f"Successfully parsed {len(attendance_records)} attendance records for device {device_name}")
+        return attendance_records
+    
+    def _split_date_windows(self, start_date: datetime, end_date: datetime, max_days: int = 2) -> List[Tuple[datetime, datetime]]:
+        """Split a date range into consecutive windows covering at most max_days calendar days each"""
+        windows = []
+        window_start = start_date
+        while True:
+            window_end = min(end_date, window_start.replace(hour=23, minute=59, second=59) + timedelta(days=max_days - 1))
+            windows.append((window_start, window_end))
+            if window_end >= end_date:
+                return windows
+            window_start = (window_end + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    def _fetch_attendance_window(self, device_config: Dict, url: str, cloud_id, start_date: datetime, end_date: datetime) -> List[FingerspotAttendance]:
+        """Fetch and parse one ≤2-day window of attendance logs"""
+        device_name = device_config.get('name')
+        
         # Prepare request data for POST (trans_id is required based on testing)
         data = {
             'trans_id': 1,
-            'cloud_id': cloud_id
+            'cloud_id': cloud_id,
+            'start_date': start_date.strftime('%Y-%m-%d'),
+            'end_date': end_date.strftime('%Y-%m-%d')
         }
-        
-        # Add date filters if provided (max 2 days range as per API limitation)
-        if start_date and end_date:
-            # Ensure date range is not more than 2 days
-            date_diff = (end_date - start_date).days
-            if date_diff > 2:
-                logger.warning(f"Date range too large ({date_diff} days), limiting to 2 days")
-                end_date = start_date + timedelta(days=2)
-            
-            data['start_date'] = start_date.strftime('%Y-%m-%d')
-            data['end_date'] = end_date.strftime('%Y-%m-%d')
-        elif start_date:
-            data['start_date'] = start_date.strftime('%Y-%m-%d')
-            data['end_date'] = start_date.strftime('%Y-%m-%d')
-        elif end_date:
-            data['start_date'] = end_date.strftime('%Y-%m-%d')
-            data['end_date'] = end_date.strftime('%Y-%m-%d')
-        
-        logger.info(f"Fetching attendance data for device {device_name} (cloud_id: {cloud_id})")
         logger.debug(f"API URL: {url}, Data: {data}")
         
         try:
@@ -230,8 +329,7 @@ class FingerspotAPIService:
                 logger.warning(f"Fingerspot API returned error: {error_msg}")
                 return []
             
-            # Parse response data
-            attendance_records = []
+            self._mark_reachable(cloud_id)
             
             # Handle different possible response formats
             if 'data' in response_data:
@@ -245,65 +343,151 @@ class FingerspotAPIService:
                 return []
             
             if not records:
-                logger.info(f"No attendance records found for device {device_name}")
+                logger.info(f"No attendance records found for device {device_name} ({data['start_date']} to {data['end_date']})")
                 return []
             
-            # Convert to FingerspotAttendance objects
-            for record in records:
-                try:
-                    # Parse timestamp
-                    timestamp_str = record.get('scan_date') or record.get('datetime') or record.get('timestamp')
-                    if timestamp_str:
-                        timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-                    else:
-                        logger.warning(f"No timestamp found in record: {record}")
-                        continue
-                    
-                    # Get user ID
-                    user_id = record.get('pin') or record.get('user_id') or record.get('uid')
-                    if not user_id:
-                        logger.warning(f"No user ID found in record: {record}")
-                        continue
-                    
-                    # Get punch/status code - handle 0 values properly
-                    punch = None
-                    if 'status_scan' in record:
-                        punch = record['status_scan']
-                    elif 'status' in record:
-                        punch = record['status']
-                    elif 'punch' in record:
-                        punch = record['punch']
-                    elif 'verify' in record:
-                        punch = record['verify']
-                    
-                    if punch is None:
-                        logger.warning(f"No status_scan/punch/status found in record: {record}")
-                        continue
-                    
-                    # Store original status_scan value for queue processing (keep as original type)
-                    original_status_scan = punch  # Keep original value (integer from API)
-                    
-                    # Create attendance object
-                    attendance = FingerspotAttendance(
-                        user_id=str(user_id),
-                        timestamp=timestamp,
-                        punch=int(punch),
-                        uid=record.get('uid'),
-                        original_status_scan=original_status_scan
-                    )
-                    
-                    attendance_records.append(attendance)
-                    
-                except (ValueError, KeyError) as e:
-                    logger.error(f"Error parsing attendance record {record}: {e}")
-                    continue
-            
-            logger.info(f"Successfully parsed {len(attendance_records)} attendance records for device {device_name}")
-            return attendance_records
+            return self._parse_attendance_records(records)
             
         except Exception as e:
             logger.error(f"Error getting attendance data for device {device_name}: {str(e)}")
             return []
+    
+    def _parse_attendance_records(self, records: List[Dict]) -> List[FingerspotAttendance]:
+        """Convert raw API records to FingerspotAttendance objects"""
+        attendance_records = []
+        
+        # Convert to FingerspotAttendance objects
+        for record in records:
+            try:
+                # Parse timestamp
+                timestamp_str = record.get('scan_date') or record.get('datetime') or record.get('timestamp')
+                if timestamp_str:
+                    timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
+                else:
+                    logger.warning(f"No timestamp found in record: {record}")
+                    continue
+                
+                # Get user ID
+                user_id = record.get('pin') or record.get('user_id') or record.get('uid')
+                if not user_id:
+                    logger.warning(f"No user ID found in record: {record}")
+                    continue
+                
+                # Get punch/status code - handle 0 values properly
+                punch = None
+                if 'status_scan' in record:
+                    punch = record['status_scan']
+                elif 'status' in record:
+                    punch = record['status']
+                elif 'punch' in record:
+                    punch = record['punch']
+                elif 'verify' in record:
+                    punch = record['verify']
+                
+                if punch is None:
+                    logger.warning(f"No status_scan/punch/status found in record: {record}")
+                    continue
+                
+                # Store original status_scan value for queue processing (keep as original type)
+                original_status_scan = punch  # Keep original value (integer from API)
+                
+                # Create attendance object
+                attendance = FingerspotAttendance(
+                    user_id=str(user_id),
+                    timestamp=timestamp,
+                    punch=int(punch),
+                    uid=record.get('uid'),
+                    original_status_scan=original_status_scan
+                )
+                
+                attendance_records.append(attendance)
+                
+            except (ValueError, KeyError) as e:
+                logger.error(f"Error parsing attendance record {record}: {e}")
+                continue
+        
+        return attendance_records
+
+    @staticmethod
+    def _record_key(att: FingerspotAttendance) -> str:
+        """Identity of an attendance record for seen-record tracking"""
+        return f"{att.user_id}|{att.timestamp.strftime('%Y-%m-%d %H:%M:%S')}|{att.punch}"
+    
+    def poll_new_attendance(self, device_config: Dict, now: datetime = None) -> Tuple[List[FingerspotAttendance], Optional[Dict]]:
+        """
+        Fetch only records not seen by a previous poll of this device's cloud_id
+        
+        The API filters by whole days, so each poll refetches from the watermark
+        day (minus lookback_days, to catch logs the device uploads late) up to
+        now, and already-seen records are dropped here before any DB work.
+        
+        Returns (new_records, state). The watermark is not advanced here: pass
+        state to commit_watermark once the records are durable (spooled), so a
+        crash in between refetches them instead of losing them.
+        """
+        api_config = device_config.get('api_config', {})
+        cloud_id = api_config.get('cloud_id') or device_config.get('name')
+        lookback_days = api_config.get('lookback_days', self.base_config.get('lookback_days', 1))
+        now = now or datetime.now()
+        
+        state = self.watermarks.get(cloud_id)
+        if state['watermark']:
+            watermark = datetime.strptime(state['watermark'], '%Y-%m-%d %H:%M:%S')
+            start_date = (min(watermark, now) - timedelta(days=lookback_days)).replace(hour=0, minute=0, second=0, microsecond=0)
+        else:
+            watermark = None
+            start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        
+        records = self.get_attendance_data(device_config, start_date, now)
+        
+        seen = set(state['seen'])
+        new_records = []
+        for att in records:
+            key = self._record_key(att)
+            if key not in seen:
+                seen.add(key)
+                new_records.append(att)
+        
+        if new_records:
+            newest = max(att.timestamp for att in new_records)
+            watermark = max(watermark, newest) if watermark else newest
+        
+        new_state = None
+        if new_records or not state['watermark']:
+            # Forget keys that fall before the next poll's refetch horizon
+            horizon = start_date.strftime('%Y-%m-%d %H:%M:%S')
+            new_state = {
+                'cloud_id': cloud_id,
+                'watermark': watermark.strftime('%Y-%m-%d %H:%M:%S') if watermark else None,
+                'seen': [key for key in seen if key.split('|')[1] >= horizon],
+            }
+        
+        logger.info(f"Fingerspot poll for {device_config.get('name')}: {len(records)} fetched, {len(new_records)} new")
+        return new_records, new_state
+    
+    def commit_watermark(self, state: Optional[Dict]):
+        """Persist the state returned by poll_new_attendance"""
+        if state:
+            self.watermarks.update(state['cloud_id'], state['watermark'], state['seen'])
+    
+    def get_poll_interval(self, device_config: Dict, current: float = None, found_new: bool = False) -> float:
+        """
+        Adaptive poll interval: drop to min_poll_interval when new punches arrive,
+        otherwise stretch by poll_backoff_factor up to max_poll_interval
+        """
+        api_config = device_config.get('api_config', {})
+        
+        def setting(key, default):
+            return api_config.get(key, self.base_config.get(key, default))
+        
+        min_interval = setting('min_poll_interval', 60)
+        max_interval = setting('max_poll_interval', 900)
+        
+        if current is None:
+            return setting('poll_interval', 120)
+        if found_new:
+            return min_interval
+        return min(max_interval, max(min_interval, current * setting('poll_backoff_factor', 1.5)))
 
     def sync_device_data(self, device_config: Dict, start_date: datetime = None, end_date: datetime = None) -> Tuple[bool, str, List[Dict]]:
         """
@@ -337,8 +521,7 @@ class FingerspotAPIService:
             fplog_data = []
             for att in attendance_records:
                 # Determine device status using config logic
-                device_status = determine_status(device_name, att.punch)
-                status_display = get_status_display(device_name, att.punch)
+                device_status, status_display = resolve_status(device_name, att.punch)
                 
                 # Create FPLog entry
                 fplog_entry = {
@@ -365,6 +548,7 @@ class FingerspotAPIService:
     def get_device_info(self, device_config: Dict) -> Optional[Dict]:
         """
         Get device information from Fingerspot API
+        (reuses the data of a connection test younger than connection_check_ttl)
         
         Args:
             device_config: Device configuration
@@ -379,27 +563,17 @@ class FingerspotAPIService:
             logger.error(f"No API config found for device {device_name}")
             return None
         
-        # Build API URL
-        base_url = api_config.get('base_url', self.base_config['base_url'])
-        cloud_id = api_config.get('cloud_id')
-        endpoint = self.base_config['endpoints']['devices']
-        
-        url = f"{base_url}{endpoint}"
-        
-        # Prepare request data
-        data = {
-            'trans_id': 1,
-            'cloud_id': cloud_id
-        }
+        cached = self._cached_device_data(api_config.get('cloud_id'))
+        if cached:
+            return cached
         
         try:
             logger.info(f"Getting device info for {device_name}")
-            response_data = self._make_request('POST', url, device_config, json=data)
+            device_info, error_msg = self._get_device(device_config)
             
-            if response_data and response_data.get('success'):
-                return response_data.get('data')
+            if error_msg is None:
+                return device_info
             else:
-                error_msg = response_data.get('message', 'Unknown error') if response_data else 'No response'
                 logger.error(f"Failed to get device info for {device_name}: {error_msg}")
                 return None
                 
@@ -1,11 +1,156 @@
 """
 Service for handling FPLog data operations
 """
+import base64
+import json
+import threading
+import time
 from datetime import datetime, timedelta
-import pandas as pd
+from functools import lru_cache
 from io import BytesIO
 from app.models.attendance import AttendanceModel
 from config.database import db_manager
+from config.devices import DEVICE_STATUS_RULES, resolve_status_batch
+
+# === Status Display Tables ===
+# Raw FPLog.Status (as stored, varchar) -> display text, per display family.
+# Machines not listed here use the generic table. Unmapped values are shown as-is.
+# Which raw values a machine writes comes from config.devices (see below).
+MACHINE_STATUS_DISPLAY = {
+    '104': {'I': 'Masuk', 'O': 'Keluar', 'i': 'Masuk Istirahat', 'o': 'Keluar Istirahat'},
+    '102': {'0': 'Masuk', '1': 'Keluar'},
+}
+
+GENERIC_STATUS_DISPLAY = {
+    '0': 'Check In',
+    '1': 'Check Out',
+    '2': 'Break Out',
+    '3': 'Break In',
+    '4': 'OT In',
+    '5': 'OT Out',
+    'i': 'Masuk Istirahat',
+    'o': 'Keluar Istirahat'
+}
+
+
+def _lookup_status_display(machine, status):
+    """Display text for a raw (machine, status) pair using the family tables"""
+    family = MACHINE_STATUS_DISPLAY.get(str(machine), GENERIC_STATUS_DISPLAY)
+    key = str(status)
+    return family.get(key, key)
+
+
+# Numeric punch codes run through the compiled status tables to enumerate every
+# raw status a machine can write (device 201 derives its status from the code)
+_STATUS_PUNCH_CODES = list(range(256))
+
+
+def _build_status_display_table():
+    """
+    Precompute (machine, raw status) -> display for every status value the
+    device rules in config.devices can write to FPLog, using the compiled
+    status tables (resolve_status_batch)
+    """
+    table = {}
+    for machine, rules in DEVICE_STATUS_RULES.items():
+        if machine == 'default' or rules.get('device_type') == 'online_attendance':
+            continue
+        rule_codes = [key[len('punch_'):] for key in rules if key.startswith('punch_') and key != 'punch_other']
+        statuses, _ = resolve_status_batch(machine, _STATUS_PUNCH_CODES + rule_codes)
+        for value in statuses:
+            table[(machine, str(value))] = _lookup_status_display(machine, value)
+    return table
+
+
+STATUS_DISPLAY_TABLE = _build_status_display_table()
+
+
+def _group_statuses_by_machine(table):
+    """Configured machine -> raw statuses its rules write"""
+    statuses = {}
+    for machine, raw in table:
+        statuses.setdefault(machine, set()).add(raw)
+    return statuses
+
+
+CONFIGURED_STATUSES = _group_statuses_by_machine(STATUS_DISPLAY_TABLE)
+
+# Dashboard statistics cache, shared by every FPLogService instance
+STATS_CACHE_TTL = 10  # seconds
+_stats_cache = {'stats': None, 'expires_at': 0.0}
+_stats_cache_lock = threading.Lock()
+
+# Paging limits for search_fplog_data (paging is mandatory)
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 5000
+
+
+@lru_cache(maxsize=128)
+def _status_filter_clause(status_display):
+    """
+    Build a SQL predicate matching every (Machine, Status) pair that renders as
+    status_display. Returns (sql, params); sql is None when nothing can match.
+    """
+    clauses = []
+    params = []
+    
+    def fallback_raws(machine):
+        """Raw values outside the configured table that render as status_display"""
+        family = MACHINE_STATUS_DISPLAY.get(machine, GENERIC_STATUS_DISPLAY)
+        raws = [raw for raw, display in family.items() if display == status_display]
+        # Unmapped values are displayed as-is
+        if status_display not in family:
+            raws.append(status_display)
+        return raws
+    
+    configured_machines = sorted(CONFIGURED_STATUSES)
+    for machine in configured_machines:
+        known = CONFIGURED_STATUSES[machine]
+        raws = sorted(raw for raw in known if STATUS_DISPLAY_TABLE[(machine, raw)] == status_display)
+        raws += [raw for raw in fallback_raws(machine) if raw not in known and raw not in raws]
+        if raws:
+            clauses.append(f"(Machine = ? AND Status IN ({', '.join('?' * len(raws))}))")
+            params.extend([machine] + raws)
+    
+    raws = fallback_raws(None)
+    if raws:
+        clauses.append(
+            f"((Machine IS NULL OR Machine NOT IN ({', '.join('?' * len(configured_machines))}))"
+            f" AND Status IN ({', '.join('?' * len(raws))}))"
+        )
+        params.extend(configured_machines + raws)
+    
+    if not clauses:
+        return None, ()
+    return "(" + " OR ".join(clauses) + ")", tuple(params)
+
+
+def _encode_cursor(row):
+    """Encode the keyset position (Date, id) of the last row of a page; Date may be NULL"""
+    date_str = row['Date'].strftime('%Y-%m-%d %H:%M:%S.%f') if row['Date'] is not None else None
+    payload = [date_str, row['id']]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor_token):
+    """Decode a cursor produced by _encode_cursor. Raises ValueError if invalid"""
+    try:
+        date_str, last_id = json.loads(base64.urlsafe_b64decode(cursor_token.encode('ascii')))
+        last_date = datetime.strptime(date_str, '%Y-%m-%d %H:%M:%S.%f') if date_str is not None else None
+        return last_date, int(last_id)
+    except Exception:
+        raise ValueError("Cursor tidak valid")
+
+
+def _parse_date(value):
+    """Parse a YYYY-MM-DD filter value. Raises ValueError if invalid"""
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
+def _escape_like(value):
+    """Escape LIKE wildcards so user input is matched literally"""
+    return value.replace('[', '[[]').replace('%', '[%]').replace('_', '[_]')
+
 
 class FPLogService:
     """Service for FPLog data operations including search, filter, and export"""
@@ -16,123 +161,154 @@ class FPLogService:
         
     def _determine_status_display(self, status, device_name):
         """Convert status code to display text based on device rules"""
-        if device_name == '104':
-            if status == 'I':
-                return 'Masuk'
-            elif status == 'O':
-                return 'Keluar'
-            elif status == 'i':
-                return 'Masuk Istirahat'
-            elif status == 'o':
-                return 'Keluar Istirahat'
+        display = STATUS_DISPLAY_TABLE.get((device_name, str(status)))
+        if display is not None:
+            return display
+        return _lookup_status_display(device_name, status)
+    
+    def _build_search_query(self, filters, page_size):
+        """
+        Build the paged FPLog search query.
+        
+        Date filters are half-open ranges on the raw Date column, PIN filters use
+        prefix (default) or exact matching, the status filter is resolved to a
+        (Machine, Status) predicate, and paging uses a keyset cursor on
+        (Date, id); rows without a Date sort last, as in SQL Server.
+        """
+        conditions = []
+        params = []
+        
+        if filters.get('pin'):
+            if filters.get('pin_match') == 'exact':
+                conditions.append("PIN = ?")
+                params.append(filters['pin'])
             else:
-                return str(status)
-        elif device_name == '102':
-            if status == 0 or status == '0':
-                return 'Masuk'
-            elif status == 1 or status == '1':
-                return 'Keluar'
+                conditions.append("PIN LIKE ?")
+                params.append(f"{_escape_like(filters['pin'])}%")
+        
+        if filters.get('machine'):
+            conditions.append("Machine = ?")
+            params.append(filters['machine'])
+        
+        if filters.get('start_date'):
+            conditions.append("Date >= ?")
+            params.append(_parse_date(filters['start_date']))
+        
+        if filters.get('end_date'):
+            conditions.append("Date < ?")
+            params.append(_parse_date(filters['end_date']) + timedelta(days=1))
+        
+        if filters.get('status') and filters['status'] != 'all':
+            status_sql, status_params = _status_filter_clause(filters['status'])
+            if status_sql is None:
+                return None, ()
+            conditions.append(status_sql)
+            params.extend(status_params)
+        
+        if filters.get('cursor'):
+            last_date, last_id = _decode_cursor(filters['cursor'])
+            if last_date is None:
+                conditions.append("(Date IS NULL AND id < ?)")
+                params.append(last_id)
             else:
-                return str(status)
-        else:
-            # Standard mapping for other devices
-            status_map = {
-                0: 'Check In',
-                1: 'Check Out', 
-                2: 'Break Out',
-                3: 'Break In',
-                4: 'OT In',
-                5: 'OT Out',
-                'i': 'Masuk Istirahat',
-                'o': 'Keluar Istirahat'
-            }
-            return status_map.get(int(status) if str(status).isdigit() else status, str(status))
+                conditions.append(
+                    "(Date < CAST(? AS DATETIME) OR Date IS NULL"
+                    " OR (Date = CAST(? AS DATETIME) AND id < ?))"
+                )
+                params.extend([last_date, last_date, last_id])
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"""
+            SELECT TOP ({page_size + 1}) id, PIN, Date, Machine, Status, fpid
+            FROM FPLog
+            {where}
+            ORDER BY Date DESC, id DESC
+        """
+        return query, tuple(params)
     
     def search_fplog_data(self, filters=None):
-        """Search FPLog data with filters"""
+        """
+        Search one page of FPLog data with filters.
+        
+        filters['limit'] sets the page size (default DEFAULT_PAGE_SIZE, capped at
+        MAX_PAGE_SIZE) and filters['cursor'] continues from a previous page.
+        
+        Returns:
+            tuple: (success, message, data, next_cursor) - next_cursor is None on the last page
+        """
+        filters = filters or {}
+        try:
+            page_size = min(int(filters.get('limit') or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE)
+            if page_size <= 0:
+                page_size = DEFAULT_PAGE_SIZE
+            query, params = self._build_search_query(filters, page_size)
+        except ValueError as e:
+            return False, f"Filter tidak valid: {str(e)}", [], None
+        
+        if query is None:
+            return True, "Data berhasil diambil", [], None
+        
         try:
             conn = self.db_manager.get_sqlserver_connection()
             if not conn:
-                return False, "Tidak dapat terhubung ke database", []
+                return False, "Tidak dapat terhubung ke database", [], None
             
             cursor = conn.cursor()
-            
-            # Base query
-            base_query = """
-                SELECT PIN, Date, Machine, Status, fpid
-                FROM FPLog 
-                WHERE 1=1
-            """
-            
-            params = []
-            conditions = []
-            
-            # Apply filters
-            if filters:
-                if filters.get('pin'):
-                    conditions.append("PIN LIKE ?")
-                    params.append(f"%{filters['pin']}%")
-                
-                if filters.get('machine'):
-                    conditions.append("Machine = ?")
-                    params.append(filters['machine'])
-                
-                if filters.get('start_date'):
-                    conditions.append("CAST(Date AS DATE) >= ?")
-                    params.append(filters['start_date'])
-                
-                if filters.get('end_date'):
-                    conditions.append("CAST(Date AS DATE) <= ?")
-                    params.append(filters['end_date'])
-                
-                # Note: status filtering is done after query since we need to apply device-specific logic
-            
-            # Add conditions to query
-            if conditions:
-                base_query += " AND " + " AND ".join(conditions)
-            
-            # Add ordering
-            base_query += " ORDER BY Date DESC"
-            
-            # Add limit if specified
-            if filters and filters.get('limit'):
-                base_query += f" OFFSET 0 ROWS FETCH NEXT {int(filters['limit'])} ROWS ONLY"
-            
-            cursor.execute(base_query, tuple(params))
-            rows = cursor.fetchall()
-            
-            # Convert to dictionary manually
+            cursor.execute(query, params)
             columns = [column[0] for column in cursor.description]
-            raw_data = [dict(zip(columns, row)) for row in rows]
             
-            # Process data to add display status and format dates
             processed_data = []
-            for row in raw_data:
-                row_copy = dict(row)
-                row_copy['status_display'] = self._determine_status_display(row['Status'], row['Machine'])
-                
-                # Format dates in Python instead of SQL
-                if row['Date']:
-                    row_copy['date_only'] = row['Date'].strftime('%Y-%m-%d')
-                    row_copy['time_only'] = row['Date'].strftime('%H:%M:%S')
-                else:
-                    row_copy['date_only'] = ''
-                    row_copy['time_only'] = ''
-                
-                # Apply status filter after processing if specified
-                if filters.get('status') and filters['status'] != 'all':
-                    if row_copy['status_display'] != filters['status']:
-                        continue
-                        
-                processed_data.append(row_copy)
+            has_more = False
+            while True:
+                rows = cursor.fetchmany(500)
+                if not rows:
+                    break
+                for row in rows:
+                    if len(processed_data) == page_size:
+                        has_more = True
+                        break
+                    row_dict = dict(zip(columns, row))
+                    row_dict['status_display'] = self._determine_status_display(row_dict['Status'], row_dict['Machine'])
+                    
+                    # Format dates in Python instead of SQL
+                    if row_dict['Date']:
+                        row_dict['date_only'] = row_dict['Date'].strftime('%Y-%m-%d')
+                        row_dict['time_only'] = row_dict['Date'].strftime('%H:%M:%S')
+                    else:
+                        row_dict['date_only'] = ''
+                        row_dict['time_only'] = ''
+                    
+                    processed_data.append(row_dict)
+                if has_more:
+                    break
             
             cursor.close()
             conn.close()
             
-            return True, "Data berhasil diambil", processed_data
+            next_cursor = _encode_cursor(processed_data[-1]) if has_more and processed_data else None
+            return True, "Data berhasil diambil", processed_data, next_cursor
             
         except Exception as e:
-            return False, f"Error mengambil data: {str(e)}", []
+            return False, f"Error mengambil data: {str(e)}", [], None
+    
+    def iter_fplog_pages(self, filters=None, page_size=MAX_PAGE_SIZE):
+        """
+        Yield successive pages of search results by following the cursor.
+        Raises RuntimeError if a page fails to load.
+        """
+        page_filters = dict(filters or {})
+        page_filters['limit'] = page_size
+        page_filters.pop('cursor', None)
+        
+        while True:
+            success, message, data, next_cursor = self.search_fplog_data(page_filters)
+            if not success:
+                raise RuntimeError(message)
+            if data:
+                yield data
+            if not next_cursor:
+                break
+            page_filters['cursor'] = next_cursor
     
     def get_machine_list(self):
         """Get list of unique machines from FPLog"""
@@ -176,6 +352,7 @@ class FPLogService:
     
     def export_to_excel(self, data, filters=None):
         """Export FPLog data to Excel format"""
+        import pandas as pd
         try:
             if not data:
                 return None, "Tidak ada data untuk diekspor"
@@ -269,41 +446,76 @@ class FPLogService:
         
         return summary
     
-    def get_fplog_statistics(self):
-        """Get FPLog statistics for dashboard"""
+    def get_fplog_statistics(self, use_cache=True):
+        """
+        Get FPLog statistics for dashboard.
+        
+        Counts come from one range aggregate bounded by the start of the week or
+        month (whichever is earlier), the total from partition metadata, and the
+        result is cached for STATS_CACHE_TTL seconds across all service instances.
+        """
+        now = time.monotonic()
+        if use_cache:
+            with _stats_cache_lock:
+                if _stats_cache['stats'] is not None and now < _stats_cache['expires_at']:
+                    return dict(_stats_cache['stats'])
+        
         try:
             conn = self.db_manager.get_sqlserver_connection()
             if not conn:
                 return {}
             
-            cursor = conn.cursor(dictionary=True)
-            
-            stats = {}
-            
-            # Total records
-            cursor.execute("SELECT COUNT(*) as total FROM FPLog")
-            stats['total_records'] = cursor.fetchone()['total']
+            cursor = conn.cursor()
             
-            # Records today
-            cursor.execute("SELECT COUNT(*) as today FROM FPLog WHERE DATE(Date) = CURDATE()")
-            stats['today_records'] = cursor.fetchone()['today']
+            today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            tomorrow_start = today_start + timedelta(days=1)
+            week_start = today_start - timedelta(days=today_start.weekday())  # Monday
+            month_start = today_start.replace(day=1)
+            range_start = min(week_start, month_start)
             
-            # Records this week
-            cursor.execute("SELECT COUNT(*) as week FROM FPLog WHERE YEARWEEK(Date) = YEARWEEK(NOW())")
-            stats['week_records'] = cursor.fetchone()['week']
+            stats = {}
             
-            # Records this month
-            cursor.execute("SELECT COUNT(*) as month FROM FPLog WHERE YEAR(Date) = YEAR(NOW()) AND MONTH(Date) = MONTH(NOW())")
-            stats['month_records'] = cursor.fetchone()['month']
+            # Total records (metadata row count, falls back to COUNT(*) without VIEW DATABASE STATE)
+            try:
+                cursor.execute("""
+                    SELECT SUM(row_count)
+                    FROM sys.dm_db_partition_stats
+                    WHERE object_id = OBJECT_ID('FPLog') AND index_id IN (0, 1)
+                """)
+                total = cursor.fetchone()[0]
+            except Exception:
+                total = None
+            if total is None:
+                cursor.execute("SELECT COUNT_BIG(*) FROM FPLog")
+                total = cursor.fetchone()[0]
+            stats['total_records'] = int(total or 0)
+            
+            # Today / this week / this month in a single range scan
+            cursor.execute("""
+                SELECT
+                    SUM(CASE WHEN Date >= ? THEN 1 ELSE 0 END) AS today,
+                    SUM(CASE WHEN Date >= ? THEN 1 ELSE 0 END) AS week,
+                    SUM(CASE WHEN Date >= ? THEN 1 ELSE 0 END) AS month
+                FROM FPLog
+                WHERE Date >= ? AND Date < ?
+            """, (today_start, week_start, month_start, range_start, tomorrow_start))
+            row = cursor.fetchone()
+            stats['today_records'] = int(row[0] or 0) if row else 0
+            stats['week_records'] = int(row[1] or 0) if row else 0
+            stats['month_records'] = int(row[2] or 0) if row else 0
             
             # Latest record
-            cursor.execute("SELECT Date FROM FPLog ORDER BY Date DESC LIMIT 1")
+            cursor.execute("SELECT MAX(Date) FROM FPLog")
             latest = cursor.fetchone()
-            stats['latest_record'] = latest['Date'] if latest else None
+            stats['latest_record'] = latest[0].strftime('%Y-%m-%d %H:%M:%S') if latest and latest[0] else None
             
             cursor.close()
             conn.close()
             
+            with _stats_cache_lock:
+                _stats_cache['stats'] = dict(stats)
+                _stats_cache['expires_at'] = time.monotonic() + STATS_CACHE_TTL
+            
             return stats
             
         except Exception as e:
@@ -332,4 +544,14 @@ class FPLogService:
     
     def get_status_list(self):
         """Get list of possible status values"""
-        return ['Masuk', 'Keluar', 'Break Masuk', 'Break Keluar', 'Lembur Masuk', 'Lembur Keluar', 'Masuk Istirahat', 'Keluar Istirahat']
+        # Statuses named in the device rules (not every derived P1 MASUK-X of device 201)
+        statuses = {
+            STATUS_DISPLAY_TABLE[(machine, str(value))]
+            for machine, rules in DEVICE_STATUS_RULES.items()
+            for key, value in rules.items()
+            if key.startswith('punch_') and (machine, str(value)) in STATUS_DISPLAY_TABLE
+        }
+        statuses |= set(GENERIC_STATUS_DISPLAY.values())
+        for family in MACHINE_STATUS_DISPLAY.values():
+            statuses.update(family.values())
+        return sorted(statuses)
@@ -0,0 +1,151 @@
+"""
+HTTP Client Pool
+Shared keep-alive sessions for the external attendance APIs.
+
+One requests.Session is kept per scheme://host, with an HTTPAdapter sized for
+the number of concurrent requests this process makes to that host (Fingerspot
+date windows, Online Attendance pages), so TCP/TLS connections are reused
+across polls instead of being opened for every call. Every request is timed
+and per-host latency statistics are available for the status endpoints.
+"""
+
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config.devices import HTTP_CLIENT_CONFIG
+from config.logging_config import get_streaming_logger
+
+logger = get_streaming_logger()
+
+
+class HostLatency:
+    """Request count, errors and latency (time to response headers) for one host"""
+
+    def __init__(self, window=200):
+        self.requests = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = None
+        self.recent = deque(maxlen=window)
+
+    def record(self, elapsed_ms, ok):
+        """Add one request"""
+        self.requests += 1
+        if not ok:
+            self.errors += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.last_ms = elapsed_ms
+        self.recent.append(elapsed_ms)
+
+    def to_dict(self):
+        """Serializable latency summary (percentiles over the recent window)"""
+        recent = sorted(self.recent)
+
+        def percentile(p):
+            if not recent:
+                return None
+            return round(recent[min(len(recent) - 1, int(len(recent) * p))], 1)
+
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'avg_ms': round(self.total_ms / self.requests, 1) if self.requests else None,
+            'p50_ms': percentile(0.5),
+            'p95_ms': percentile(0.95),
+            'max_ms': round(self.max_ms, 1),
+            'last_ms': round(self.last_ms, 1) if self.last_ms is not None else None
+        }
+
+
+class HttpSessionPool:
+    """Per-host pooled requests sessions with latency measurement"""
+
+    def __init__(self, pool_connections=None, pool_maxsize=None, latency_window=None):
+        self.pool_connections = pool_connections or HTTP_CLIENT_CONFIG.get('pool_connections', 4)
+        self.pool_maxsize = pool_maxsize or HTTP_CLIENT_CONFIG.get('pool_maxsize', 10)
+        self.latency_window = latency_window or HTTP_CLIENT_CONFIG.get('latency_window', 200)
+        self.sessions = {}
+        self.latency = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _host_key(url):
+        """scheme://host[:port] of a URL"""
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def get_session(self, url):
+        """Get (or create) the keep-alive session for the URL's host"""
+        host = self._host_key(url)
+        with self.lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                # Retries stay in the callers, which already log and back off
+                adapter = HTTPAdapter(
+                    pool_connections=self.pool_connections,
+                    pool_maxsize=self.pool_maxsize,
+                    max_retries=0
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self.sessions[host] = session
+                self.latency[host] = HostLatency(self.latency_window)
+            return session
+
+    def request(self, method, url, **kwargs):
+        """Send a request through the host's pooled session and record its latency"""
+        session = self.get_session(url)
+        host = self._host_key(url)
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = session.request(method, url, **kwargs)
+            ok = response.status_code < 400
+            return response
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self.lock:
+                self.latency[host].record(elapsed_ms, ok)
+            logger.debug(f"HTTP {method.upper()} {url} took {elapsed_ms:.0f} ms")
+
+    def get(self, url, **kwargs):
+        """GET through the pool"""
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """POST through the pool"""
+        return self.request('POST', url, **kwargs)
+
+    def get_stats(self):
+        """Latency statistics per host"""
+        with self.lock:
+            return {host: latency.to_dict() for host, latency in self.latency.items()}
+
+    def close(self):
+        """Close all sessions (their pooled connections)"""
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
+
+
+# Singleton instance getter
+_pool_instance = None
+_pool_lock = threading.Lock()
+
+def get_http_pool():
+    """Get singleton instance of HttpSessionPool"""
+    global _pool_instance
+    if _pool_instance is None:
+        with _pool_lock:
+            if _pool_instance is None:
+                _pool_instance = HttpSessionPool()
+    return _pool_instance
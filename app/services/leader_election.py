@@ -0,0 +1,368 @@
+"""
+Leader Election
+Runs each background role (spJamkerja scheduler, attendance worker, streaming
+gateway, data retention) in exactly one process across all workers and nodes.
+
+Leadership of a role is a session-owned SQL Server application lock
+(sp_getapplock, LockOwner='Session') held on a dedicated connection. SQL
+Server releases the lock as soon as that connection ends, so when the leader
+process dies another process takes the role over on its next check. The
+service_leases table records who holds each role and whether it should run at
+all, so dashboard start/stop applies to the whole deployment.
+
+Set LEADER_ELECTION=off to run every role in the local process (single
+process development setups).
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+
+from config.database import db_manager
+
+logger = logging.getLogger(__name__)
+
+LEADER_ELECTION_MODE = os.environ.get('LEADER_ELECTION', 'applock').lower()
+
+# Roles
+SCHEDULER_ROLE = 'spjamkerja_scheduler'
+WORKER_ROLE = 'attendance_worker'
+STREAMING_ROLE = 'streaming'
+RETENTION_ROLE = 'data_retention'
+
+LOCK_PREFIX = 'attendance_app:'
+
+
+class LeaderRole:
+    """A role and the local hooks that start/stop it"""
+
+    def __init__(self, name, on_elected, on_demoted, desired_by_default=False):
+        self.name = name
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        # Used until the role has a service_leases row (first dashboard start/stop)
+        self.desired_by_default = desired_by_default
+        self.desired = desired_by_default
+        self.conn = None
+        self.is_leader = False
+        self.elected_at = None
+        self.last_error = None
+
+
+class LeaderElector:
+    """Acquires, keeps and releases role leases for this process"""
+
+    def __init__(self, db=db_manager, check_interval=10, mode=LEADER_ELECTION_MODE):
+        self.db = db
+        self.check_interval = check_interval
+        self.enabled = mode != 'off'
+        self.identity = f"{socket.gethostname()}:{os.getpid()}"
+        self.roles = {}
+        self.lock = threading.RLock()
+        self.wakeup = threading.Event()
+        self.running = False
+        self.thread = None
+        self._table_ready = False
+
+    def register(self, name, on_elected, on_demoted, desired_by_default=False):
+        """Register a role with its start/stop hooks"""
+        with self.lock:
+            self.roles[name] = LeaderRole(name, on_elected, on_demoted, desired_by_default)
+
+    def start(self):
+        """Start the election loop"""
+        if self.running:
+            return False, "Leader elector is already running"
+        self.running = True
+        self.thread = threading.Thread(target=self._election_loop, daemon=True, name="LeaderElectorThread")
+        self.thread.start()
+        logger.info(f"[OK] Leader elector started as {self.identity} (mode: {'applock' if self.enabled else 'off'})")
+        return True, "Leader elector started"
+
+    def stop(self):
+        """Stop the loop and step down from every role"""
+        self.running = False
+        self.wakeup.set()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=15)
+        with self.lock:
+            for role in self.roles.values():
+                if role.is_leader:
+                    self._demote(role, "elector stopped")
+
+    # === Public API ===
+
+    def is_leader(self, name):
+        """Whether this process currently runs the role"""
+        role = self.roles.get(name)
+        return bool(role and role.is_leader)
+
+    def set_desired(self, name, desired, wait=5):
+        """
+        Start or stop a role deployment-wide. The leader may be another
+        process; waits up to wait seconds for this process to pick it up.
+        Returns (success, message).
+        """
+        role = self.roles.get(name)
+        if not role:
+            return False, f"Unknown role: {name}"
+
+        if not self.enabled or not self.running:
+            # No election: run the role in this process
+            with self.lock:
+                role.desired = desired
+                if desired and not role.is_leader:
+                    return self._elect(role)
+                if not desired and role.is_leader:
+                    return self._demote(role, "stopped")
+            return False, f"{name} is already {'running' if desired else 'stopped'}"
+
+        try:
+            self._write_desired(name, desired)
+        except Exception as e:
+            logger.error(f"[ERROR] Could not update lease for {name}: {e}")
+            return False, f"Could not update lease for {name}: {e}"
+
+        self.wakeup.set()
+        deadline = time.monotonic() + wait
+        while role.is_leader != desired and time.monotonic() < deadline:
+            time.sleep(0.25)
+
+        if not desired:
+            return True, f"{name} stop requested"
+        if role.is_leader:
+            return True, f"{name} started on {self.identity}"
+        holder = self.get_role_status(name).get('holder')
+        return True, f"{name} start requested (leader: {holder or 'pending'})"
+
+    def get_role_status(self, name):
+        """Lease state of a role as seen from this process"""
+        role = self.roles.get(name)
+        status = {
+            'role': name,
+            'identity': self.identity,
+            'is_local_leader': bool(role and role.is_leader),
+            'elected_at': role.elected_at.isoformat() if role and role.elected_at else None,
+            'desired': role.desired if role else None,
+            'holder': self.identity if role and role.is_leader else None,
+            'heartbeat_at': None,
+            'mode': 'applock' if self.enabled else 'off'
+        }
+        if not self.enabled:
+            return status
+        try:
+            row = self._read_lease(name)
+            if row:
+                status['holder'], status['desired'], heartbeat_at = row[0], bool(row[1]), row[2]
+                status['heartbeat_at'] = heartbeat_at.isoformat() if heartbeat_at else None
+        except Exception as e:
+            status['error'] = str(e)
+        return status
+
+    def get_status(self):
+        """Lease state of every registered role"""
+        return {name: self.get_role_status(name) for name in list(self.roles)}
+
+    # === Election loop ===
+
+    def _election_loop(self):
+        """Keep leases for held roles and pick up free ones"""
+        while self.running:
+            with self.lock:
+                for role in self.roles.values():
+                    try:
+                        if self.enabled:
+                            self._check_role(role)
+                        elif role.desired and not role.is_leader:
+                            self._elect(role)
+                    except Exception as e:
+                        role.last_error = str(e)
+                        logger.error(f"[ERROR] Leader check for {role.name} failed: {e}")
+            self.wakeup.wait(self.check_interval)
+            self.wakeup.clear()
+
+    def _check_role(self, role):
+        """One election step for a role"""
+        self._ensure_table()
+        row = self._read_lease(role.name)
+        role.desired = bool(row[1]) if row else role.desired_by_default
+
+        if role.is_leader:
+            if not self._lock_held(role):
+                # The lock connection broke: another process may already lead
+                self._demote(role, "lease lost")
+            elif not role.desired:
+                self._demote(role, "stop requested")
+            else:
+                self._heartbeat(role.name)
+        elif role.desired and self._try_acquire(role):
+            self._write_holder(role.name)
+            self._elect(role)
+
+    def _elect(self, role):
+        """Become leader for a role and run its start hook"""
+        role.is_leader = True
+        role.elected_at = datetime.now()
+        logger.info(f"[LEADER] {self.identity} elected for {role.name}")
+        try:
+            return role.on_elected()
+        except Exception as e:
+            role.last_error = str(e)
+            logger.error(f"[ERROR] Start hook for {role.name} failed: {e}")
+            return False, str(e)
+
+    def _demote(self, role, reason):
+        """Stop a role locally and release its lease"""
+        logger.info(f"[LEADER] {self.identity} stepping down from {role.name}: {reason}")
+        role.is_leader = False
+        role.elected_at = None
+        try:
+            result = role.on_demoted()
+        except Exception as e:
+            role.last_error = str(e)
+            logger.error(f"[ERROR] Stop hook for {role.name} failed: {e}")
+            result = (False, str(e))
+        self._release(role)
+        return result
+
+    # === SQL Server application locks ===
+
+    def _try_acquire(self, role):
+        """Try (without waiting) to take the role's application lock on a dedicated connection"""
+        conn = self.db.get_sqlserver_connection()
+        if not conn:
+            return False
+        try:
+            conn.autocommit = True
+            cursor = conn.cursor()
+            cursor.execute("""
+                SET NOCOUNT ON;
+                DECLARE @result INT;
+                EXEC @result = sp_getapplock @Resource = ?, @LockMode = 'Exclusive',
+                    @LockOwner = 'Session', @LockTimeout = 0;
+                SELECT @result;
+            """, (LOCK_PREFIX + role.name,))
+            result = cursor.fetchone()[0]
+            cursor.close()
+        except Exception:
+            conn.close()
+            raise
+        if result is not None and result >= 0:
+            role.conn = conn
+            return True
+        conn.close()
+        return False
+
+    def _lock_held(self, role):
+        """Whether the role's lock connection is alive and still owns the lock"""
+        try:
+            cursor = role.conn.cursor()
+            cursor.execute("SELECT APPLOCK_MODE('public', ?, 'Session')", (LOCK_PREFIX + role.name,))
+            mode = cursor.fetchone()[0]
+            cursor.close()
+            return mode == 'Exclusive'
+        except Exception as e:
+            logger.warning(f"[WARN] Lease check for {role.name} failed: {e}")
+            return False
+
+    def _release(self, role):
+        """Release the lock (closing the connection releases it as well)"""
+        conn, role.conn = role.conn, None
+        if not conn:
+            return
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "EXEC sp_releaseapplock @Resource = ?, @LockOwner = 'Session'",
+                (LOCK_PREFIX + role.name,)
+            )
+            cursor.close()
+        except Exception:
+            pass
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    # === service_leases table ===
+
+    def _ensure_table(self):
+        """Create the service_leases table if it does not exist"""
+        if self._table_ready:
+            return
+        self._execute("""
+            IF OBJECT_ID('service_leases', 'U') IS NULL
+            CREATE TABLE service_leases (
+                role NVARCHAR(100) NOT NULL PRIMARY KEY,
+                holder NVARCHAR(200) NULL,
+                desired BIT NOT NULL DEFAULT 0,
+                acquired_at DATETIME NULL,
+                heartbeat_at DATETIME NULL
+            )
+        """)
+        self._table_ready = True
+
+    def _execute(self, query, params=()):
+        """Run a statement on a short-lived connection"""
+        conn = self.db.get_sqlserver_connection()
+        if not conn:
+            raise ConnectionError("Failed to connect to SQL Server")
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            row = cursor.fetchone() if cursor.description else None
+            conn.commit()
+            cursor.close()
+            return row
+        finally:
+            conn.close()
+
+    def _read_lease(self, name):
+        """(holder, desired, heartbeat_at) of a role, or None"""
+        self._ensure_table()
+        return self._execute("SELECT holder, desired, heartbeat_at FROM service_leases WHERE role = ?", (name,))
+
+    def _write_desired(self, name, desired):
+        """Set whether a role should run"""
+        self._ensure_table()
+        self._execute("""
+            MERGE service_leases AS t
+            USING (SELECT ? AS role) AS s ON t.role = s.role
+            WHEN MATCHED THEN UPDATE SET desired = ?
+            WHEN NOT MATCHED THEN INSERT (role, desired) VALUES (s.role, ?);
+        """, (name, int(desired), int(desired)))
+
+    def _write_holder(self, name):
+        """Record this process as the role holder"""
+        self._execute("""
+            MERGE service_leases AS t
+            USING (SELECT ? AS role) AS s ON t.role = s.role
+            WHEN MATCHED THEN UPDATE SET holder = ?, acquired_at = GETDATE(), heartbeat_at = GETDATE()
+            WHEN NOT MATCHED THEN INSERT (role, holder, desired, acquired_at, heartbeat_at)
+                VALUES (s.role, ?, 1, GETDATE(), GETDATE());
+        """, (name, self.identity, self.identity))
+
+    def _heartbeat(self, name):
+        """Refresh the holder's heartbeat (informational; the lock is what counts)"""
+        self._execute(
+            "UPDATE service_leases SET heartbeat_at = GETDATE() WHERE role = ? AND holder = ?",
+            (name, self.identity)
+        )
+
+
+# Singleton instance getter
+_elector_instance = None
+_elector_lock = threading.Lock()
+
+def get_leader_elector():
+    """Get singleton instance of LeaderElector"""
+    global _elector_instance
+    if _elector_instance is None:
+        with _elector_lock:
+            if _elector_instance is None:
+                _elector_instance = LeaderElector()
+    return _elector_instance
@@ -3,20 +3,115 @@ Legacy Attendance Service
 Service untuk mengambil dan mengexport data absensi legacy dengan format khusus
 """
 
-import pandas as pd
+import csv
 import io
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from app.models.attendance import AttendanceModel
 from config.logging_config import get_background_logger
+from app.utils.lazy import LazyInstance
 
 logger = get_background_logger('LegacyAttendanceService', 'logs/legacy_attendance_service.log')
 
+# Rows per fetchmany while streaming the CSV
+CSV_FETCH_SIZE = 5000
+
+# Columns are selected in CSV order; ranges are half-open ([start, end + 1 day))
+# so the date columns stay sargable instead of wrapping them in CONVERT()
+LEGACY_ATTENDANCE_QUERY = """
+    SELECT
+        d.deptname,
+        e.name,
+        e.pin AS pin,
+        e.eid,
+        CONVERT(date, f.Date) AS tgl,
+        f.Date AS jam,
+        f.status,
+        f.Machine
+    FROM FPLog f
+    JOIN employees e ON e.pin = f.pin AND e.status = 'Active'
+    JOIN departments d ON d.id = e.department
+    WHERE f.Machine IN ('105','102','104','108','111','110','1','2','3','4','201','203')
+        AND f.Date >= ? AND f.Date < ?
+
+    UNION
+
+    SELECT
+        d.deptname,
+        e.name,
+        e.pin AS pin,
+        e.eid,
+        CONVERT(date, f.tgl) AS tgl,
+        f.tgl AS jam,
+        f.status,
+        f.Machine
+    FROM gagalabsens f
+    JOIN employees e ON e.pin = f.pin AND e.status = 'Active'
+    JOIN departments d ON d.id = e.department
+    WHERE f.tgl >= ? AND f.tgl < ?
+"""
+
+# GROUPING_ID(deptname, Machine, status) of each grouping set
+_GROUP_DEPARTMENT = 3
+_GROUP_MACHINE = 5
+_GROUP_STATUS = 6
+_GROUP_TOTAL = 7
+
+LEGACY_SUMMARY_QUERY = f"""
+    WITH a AS ({LEGACY_ATTENDANCE_QUERY})
+    SELECT
+        GROUPING_ID(deptname, Machine, status) AS grp,
+        deptname,
+        Machine,
+        status,
+        COUNT(*) AS records,
+        COUNT(DISTINCT pin) AS employees,
+        COUNT(DISTINCT tgl) AS dates
+    FROM a
+    GROUP BY GROUPING SETS ((deptname), (Machine), (status), ())
+    ORDER BY grp, records DESC
+"""
+
+CSV_HEADER = ['Departemen', 'Nama Karyawan', 'PIN', 'Employee ID', 'Tanggal', 'Jam', 'Status', 'Mesin']
+
+
+def _range_params(start_date, end_date):
+    """Half-open [start, end + 1 day) bounds for both halves of the UNION"""
+    start = datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
+    return (start, end, start, end)
+
+
+def _format_date(value):
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m-%d')
+    return value
+
+
+def _format_datetime(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
 class LegacyAttendanceService:
     """Service untuk menangani data absensi legacy"""
     
     def __init__(self):
         self.attendance_model = AttendanceModel()
     
+    def _execute(self, query, start_date, end_date):
+        """Run query for the period; returns (conn, cursor) or (None, None) without a connection"""
+        conn = self.attendance_model.db_manager.get_sqlserver_connection()
+        if not conn:
+            return None, None
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query, _range_params(start_date, end_date))
+        except Exception:
+            conn.close()
+            raise
+        return conn, cursor
+    
     def get_legacy_attendance_data(self, start_date, end_date):
         """
         Mengambil data absensi legacy menggunakan query khusus
@@ -29,80 +124,23 @@ class LegacyAttendanceService:
             tuple: (success, data, message)
         """
         try:
-            # Format tanggal untuk query
-            start_date_formatted = start_date.replace('-', '')
-            end_date_formatted = end_date.replace('-', '')
-            
-            # Query legacy attendance data
-            query = """
-            SELECT * FROM (
-                SELECT 
-                    d.deptname,
-                    e.name,
-                    e.pin,
-                    CONVERT(date, f.Date) AS tgl,
-                    f.Date AS jam,
-                    f.status,
-                    f.Machine,
-                    e.eid
-                FROM FPLog f
-                JOIN employees e ON e.pin = f.pin AND e.status = 'Active'
-                JOIN departments d ON d.id = e.department
-                WHERE f.Machine IN ('105','102','104','108','111','110','1','2','3','4','201','203') 
-                    AND CONVERT(date, f.Date) BETWEEN ? AND ?
-                
-                UNION
-                
-                SELECT 
-                    d.deptname,
-                    e.name,
-                    e.pin,
-                    CONVERT(date, f.tgl) AS tgl,
-                    f.tgl AS jam,
-                    f.status,
-                    f.Machine,
-                    e.eid 
-                FROM gagalabsens f
-                JOIN employees e ON e.pin = f.pin AND e.status = 'Active'
-                JOIN departments d ON d.id = e.department
-                WHERE CONVERT(date, f.tgl) BETWEEN ? AND ?
-            ) a
-            ORDER BY pin, tgl, jam
-            """
-            
             logger.info(f"Executing legacy attendance query for period {start_date} to {end_date}")
             
-            conn = self.attendance_model.db_manager.get_sqlserver_connection()
+            conn, cursor = self._execute(LEGACY_ATTENDANCE_QUERY + " ORDER BY pin, tgl, jam", start_date, end_date)
             if not conn:
                 return False, None, "Database connection failed"
             
-            cursor = conn.cursor()
-            cursor.execute(query, (start_date_formatted, end_date_formatted, start_date_formatted, end_date_formatted))
-            
-            # Fetch all results
-            rows = cursor.fetchall()
-            columns = [desc[0] for desc in cursor.description]
-            
-            cursor.close()
-            conn.close()
-            
-            # Convert to list of dictionaries
-            data = []
-            for row in rows:
-                row_dict = {}
-                for i, column in enumerate(columns):
-                    value = row[i]
-                    # Format datetime objects
-                    if isinstance(value, datetime):
-                        if column == 'tgl':
-                            row_dict[column] = value.strftime('%Y-%m-%d')
-                        elif column == 'jam':
-                            row_dict[column] = value.strftime('%Y-%m-%d %H:%M:%S')
-                        else:
-                            row_dict[column] = value.strftime('%Y-%m-%d %H:%M:%S')
-                    else:
-                        row_dict[column] = value
-                data.append(row_dict)
+            try:
+                columns = [desc[0] for desc in cursor.description]
+                data = []
+                for row in cursor.fetchall():
+                    row_dict = dict(zip(columns, row))
+                    row_dict['tgl'] = _format_date(row_dict['tgl'])
+                    row_dict['jam'] = _format_datetime(row_dict['jam'])
+                    data.append(row_dict)
+                cursor.close()
+            finally:
+                conn.close()
             
             logger.info(f"Successfully retrieved {len(data)} legacy attendance records")
             return True, data, f"Retrieved {len(data)} records"
@@ -114,65 +152,70 @@ class LegacyAttendanceService:
     
     def export_legacy_attendance_to_csv(self, start_date, end_date):
         """
-        Export legacy attendance data to CSV format
+        Export legacy attendance data to CSV format.
+        The query runs and its first batch is fetched before returning, so
+        connection errors and empty periods are still reported up front; the
+        rest of the rows are streamed by the returned generator.
         
         Args:
             start_date (str): Tanggal mulai format YYYY-MM-DD
             end_date (str): Tanggal akhir format YYYY-MM-DD
             
         Returns:
-            tuple: (success, csv_data, filename, message)
+            tuple: (success, csv_chunks, filename, message) - csv_chunks yields bytes
         """
         try:
-            # Get data
-            success, data, message = self.get_legacy_attendance_data(start_date, end_date)
-            
-            if not success:
-                return False, None, None, message
+            conn, cursor = self._execute(LEGACY_ATTENDANCE_QUERY + " ORDER BY pin, tgl, jam", start_date, end_date)
+            if not conn:
+                return False, None, None, "Database connection failed"
             
-            if not data:
+            try:
+                rows = cursor.fetchmany(CSV_FETCH_SIZE)
+            except Exception:
+                conn.close()
+                raise
+            if not rows:
+                cursor.close()
+                conn.close()
                 return False, None, None, "No data found for the specified date range"
             
-            # Convert to DataFrame
-            df = pd.DataFrame(data)
-            
-            # Rename columns to more user-friendly names
-            column_mapping = {
-                'deptname': 'Departemen',
-                'name': 'Nama Karyawan',
-                'pin': 'PIN',
-                'tgl': 'Tanggal',
-                'jam': 'Jam',
-                'status': 'Status',
-                'Machine': 'Mesin',
-                'eid': 'Employee ID'
-            }
-            
-            df = df.rename(columns=column_mapping)
-            
-            # Reorder columns
-            column_order = ['Departemen', 'Nama Karyawan', 'PIN', 'Employee ID', 'Tanggal', 'Jam', 'Status', 'Mesin']
-            df = df.reindex(columns=column_order)
-            
-            # Create CSV in memory
-            output = io.StringIO()
-            df.to_csv(output, index=False, encoding='utf-8-sig')  # utf-8-sig for Excel compatibility
-            
-            # Convert to bytes
-            csv_data = output.getvalue().encode('utf-8-sig')
-            output.close()
-            
-            # Generate filename
             filename = f"legacy_attendance_{start_date}_to_{end_date}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
             
-            logger.info(f"Successfully created CSV export: {filename} with {len(data)} records")
-            return True, csv_data, filename, f"CSV created successfully with {len(data)} records"
+            logger.info(f"Streaming CSV export: {filename}")
+            return True, self._stream_csv(conn, cursor, rows, filename), filename, "CSV export started"
             
         except Exception as e:
             error_msg = f"Error creating CSV export: {str(e)}"
             logger.error(error_msg)
             return False, None, None, error_msg
     
+    def _stream_csv(self, conn, cursor, rows, filename):
+        """Yield the CSV one fetchmany batch at a time; closes the connection when done"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        total = 0
+        try:
+            buffer.write('\ufeff')  # BOM for Excel
+            writer.writerow(CSV_HEADER)
+            while rows:
+                for row in rows:
+                    row = list(row)
+                    row[4] = _format_date(row[4])
+                    row[5] = _format_datetime(row[5])
+                    writer.writerow(row)
+                total += len(rows)
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+                rows = cursor.fetchmany(CSV_FETCH_SIZE)
+            cursor.close()
+            logger.info(f"Successfully created CSV export: {filename} with {total} records")
+        except Exception as e:
+            logger.error(f"Error streaming CSV export {filename} after {total} records: {e}")
+            raise
+        finally:
+            conn.close()
+    
     def get_legacy_attendance_summary(self, start_date, end_date):
         """
         Get summary statistics for legacy attendance data
@@ -185,12 +228,18 @@ class LegacyAttendanceService:
             tuple: (success, summary, message)
         """
         try:
-            success, data, message = self.get_legacy_attendance_data(start_date, end_date)
+            conn, cursor = self._execute(LEGACY_SUMMARY_QUERY, start_date, end_date)
+            if not conn:
+                return False, None, "Database connection failed"
             
-            if not success:
-                return False, None, message
+            try:
+                rows = cursor.fetchall()
+                cursor.close()
+            finally:
+                conn.close()
             
-            if not data:
+            total = next((row for row in rows if row.grp == _GROUP_TOTAL), None)
+            if total is None or not total.records:
                 return True, {
                     'total_records': 0,
                     'unique_employees': 0,
@@ -199,21 +248,28 @@ class LegacyAttendanceService:
                     'machines': 0
                 }, "No data found"
             
-            df = pd.DataFrame(data)
+            # Rows come ordered by count, matching the old value_counts() ordering;
+            # NULL keys are left out as value_counts() did
+            department_breakdown = {row.deptname: row.records for row in rows
+                                    if row.grp == _GROUP_DEPARTMENT and row.deptname is not None}
+            machine_breakdown = {row.Machine: row.records for row in rows
+                                 if row.grp == _GROUP_MACHINE and row.Machine is not None}
+            status_breakdown = {row.status: row.records for row in rows
+                                if row.grp == _GROUP_STATUS and row.status is not None}
             
             summary = {
-                'total_records': len(df),
-                'unique_employees': df['pin'].nunique(),
-                'unique_dates': df['tgl'].nunique(),
-                'departments': df['deptname'].nunique(),
-                'machines': df['Machine'].nunique(),
+                'total_records': total.records,
+                'unique_employees': total.employees,
+                'unique_dates': total.dates,
+                'departments': len(department_breakdown),
+                'machines': len(machine_breakdown),
                 'date_range': {
                     'start': start_date,
                     'end': end_date
                 },
-                'department_breakdown': df['deptname'].value_counts().to_dict(),
-                'machine_breakdown': df['Machine'].value_counts().to_dict(),
-                'status_breakdown': df['status'].value_counts().to_dict()
+                'department_breakdown': department_breakdown,
+                'machine_breakdown': machine_breakdown,
+                'status_breakdown': status_breakdown
             }
             
             return True, summary, "Summary created successfully"
@@ -223,5 +279,5 @@ class LegacyAttendanceService:
             logger.error(error_msg)
             return False, None, error_msg
 
-# Global service instance
-legacy_attendance_service = LegacyAttendanceService()
\ No newline at end of file
+# Global service instance (constructed on first use)
+legacy_attendance_service = LazyInstance(LegacyAttendanceService)
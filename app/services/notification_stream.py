@@ -0,0 +1,183 @@
+"""
+Notification Stream Service
+Fans out streaming notifications to Server-Sent Events (SSE) clients.
+
+A single tail thread per process follows the shared notification log
+(shared/notification_queue) and pushes new entries into a bounded buffer per
+connected client, so any number of browser tabs can watch live punches
+without polling. Clients resume after a reconnect with Last-Event-ID, which
+is the notification sequence number in the shared log.
+"""
+
+import json
+import os
+import threading
+from collections import deque
+
+from config.logging_config import get_streaming_logger
+from shared.notification_queue import notification_queue
+
+logger = get_streaming_logger()
+
+# Each SSE client holds a worker thread for up to a minute, so keep this well
+# below the worker's thread count (gunicorn -k gthread --threads N); the rest
+# of the dashboard falls back to polling when the limit is reached
+SSE_MAX_CLIENTS = int(os.environ.get('SSE_MAX_CLIENTS', 8))
+
+
+class NotificationSubscription:
+    """Bounded per-client notification buffer"""
+
+    def __init__(self, last_seq, buffer_size):
+        self.start_seq = last_seq
+        # last_seq is the newest notification buffered; delivered_seq the newest
+        # one actually written to the client, which is the only safe resume point
+        self.last_seq = last_seq
+        self.delivered_seq = last_seq
+        self.buffer = deque(maxlen=buffer_size)
+        self.dropped = 0
+        self.condition = threading.Condition()
+
+    def push(self, notification):
+        """Queue a notification for this client, dropping the oldest when full"""
+        with self.condition:
+            if notification['seq'] <= self.last_seq:
+                return
+            if len(self.buffer) == self.buffer.maxlen:
+                self.dropped += 1
+            self.buffer.append(notification)
+            self.last_seq = notification['seq']
+            self.condition.notify()
+
+    def drain(self, timeout):
+        """Wait up to timeout seconds and return all buffered notifications"""
+        with self.condition:
+            if not self.buffer:
+                self.condition.wait(timeout)
+            items = list(self.buffer)
+            self.buffer.clear()
+            return items
+
+
+class NotificationBroadcaster:
+    """Tails the shared notification log and distributes entries to subscribers"""
+
+    def __init__(self, queue=notification_queue, poll_interval=1.0, client_buffer_size=100, max_clients=SSE_MAX_CLIENTS):
+        self.queue = queue
+        self.poll_interval = poll_interval
+        self.client_buffer_size = client_buffer_size
+        self.max_clients = max_clients
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.tail_thread = None
+        self.last_seq = 0
+
+    def notify(self, notification=None):
+        """Wake the tail thread immediately (registered as a StreamingService callback)"""
+        self.wakeup.set()
+
+    def subscribe(self, last_event_id=None):
+        """
+        Register a client. With last_event_id, notifications after that sequence
+        are replayed (up to the client buffer size); otherwise only new ones are sent.
+        Returns None when the client limit is reached.
+        """
+        # Limit check, backlog replay and registration under one lock so concurrent
+        # connects cannot overshoot and the tail thread cannot push past the backlog
+        with self.lock:
+            if len(self.subscribers) >= self.max_clients:
+                return None
+
+            if last_event_id is None:
+                subscription = NotificationSubscription(self.queue.get_last_sequence(), self.client_buffer_size)
+            else:
+                subscription = NotificationSubscription(last_event_id, self.client_buffer_size)
+                backlog = self.queue.get_notifications_since(last_event_id, limit=self.client_buffer_size, newest=True)
+                for notification in backlog:
+                    subscription.push(notification)
+                if len(backlog) == self.client_buffer_size:
+                    subscription.dropped = max(0, self.queue.count_notifications_since(last_event_id) - len(backlog))
+
+            self.subscribers.add(subscription)
+            if not self.tail_thread or not self.tail_thread.is_alive():
+                self.last_seq = self.queue.get_last_sequence()
+                self.tail_thread = threading.Thread(
+                    target=self._tail_loop,
+                    daemon=True,
+                    name="NotificationTailThread"
+                )
+                self.tail_thread.start()
+
+        # Catch up on anything appended while registering (duplicates are ignored by seq)
+        for notification in self.queue.get_notifications_since(subscription.last_seq):
+            subscription.push(notification)
+
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Remove a client"""
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def _tail_loop(self):
+        """Follow the shared log while at least one client is connected"""
+        while True:
+            with self.lock:
+                if not self.subscribers:
+                    self.tail_thread = None
+                    return
+                subscribers = list(self.subscribers)
+
+            try:
+                new_notifications = self.queue.get_notifications_since(self.last_seq, limit=500)
+            except Exception as e:
+                logger.error(f"Error reading notification log: {e}")
+                new_notifications = []
+
+            for notification in new_notifications:
+                for subscription in subscribers:
+                    subscription.push(notification)
+                self.last_seq = notification['seq']
+
+            if len(new_notifications) < 500:
+                self.wakeup.wait(self.poll_interval)
+                self.wakeup.clear()
+
+    def get_status(self):
+        """Get broadcaster status"""
+        with self.lock:
+            return {
+                'clients': len(self.subscribers),
+                'max_clients': self.max_clients,
+                'last_seq': self.last_seq,
+                'tailing': bool(self.tail_thread and self.tail_thread.is_alive())
+            }
+
+
+def format_sse(data, event=None, event_id=None, retry=None):
+    """Format one Server-Sent Events message"""
+    lines = []
+    if retry is not None:
+        lines.append(f"retry: {int(retry)}")
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    lines.extend(f"data: {line}" for line in payload.splitlines())
+    return "\n".join(lines) + "\n\n"
+
+
+# Singleton instance getter
+_broadcaster_instance = None
+_broadcaster_lock = threading.Lock()
+
+def get_notification_broadcaster():
+    """Get singleton instance of NotificationBroadcaster"""
+    global _broadcaster_instance
+    if _broadcaster_instance is None:
+        with _broadcaster_lock:
+            if _broadcaster_instance is None:
+                _broadcaster_instance = NotificationBroadcaster()
+    return _broadcaster_instance
@@ -1,16 +1,139 @@
 """
 Service untuk mengambil data dari Online Attendance API dan menyimpannya ke tabel gagalabsens
 """
+import codecs
+import json
 import requests
 import logging
 from datetime import datetime, timedelta
 from config.database import db_manager
 from config.devices import get_device_by_name, DEVICE_STATUS_RULES, ONLINE_ATTENDANCE_API_CONFIG
+from app.services.http_client import get_http_pool
+from app.models.attendance import PROCEDURE_SECONDS
+from app.services.punch_tracing import get_punch_tracer
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Keys that hold the record list when the API wraps it in an object
+_RECORD_KEYS = ('data', 'results')
+
+_JSON_WHITESPACE = ' \t\r\n'
+
+
+def _iter_json_records(chunks, meta):
+    """
+    Incrementally parse an API response body and yield attendance records one at a time.
+
+    Accepts a top-level list, or an object whose 'data'/'results' key holds the list;
+    other top-level keys of an object (pagination metadata) are stored in meta.
+    Only the record being decoded is held in memory, not the whole body.
+    """
+    decoder = json.JSONDecoder()
+    # Incremental so a multibyte character split across two chunks decodes correctly
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buffer = ''
+    pos = 0
+    exhausted = False
+
+    def fill():
+        nonlocal buffer, pos, exhausted
+        for chunk in chunks:
+            text = text_decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+            if text:
+                buffer = buffer[pos:] + text
+                pos = 0
+                return True
+        exhausted = True
+        # Raises on a body that ends inside a multibyte sequence
+        text_decoder.decode(b'', final=True)
+        return False
+
+    def next_char():
+        # Skip whitespace and return the next significant character ('' at end of body)
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in _JSON_WHITESPACE:
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if not fill():
+                return ''
+
+    def decode_value():
+        # A value that ends exactly at the buffer end may be truncated (e.g. a number),
+        # so only accept it once more input follows or the body is complete
+        nonlocal pos
+        next_char()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                if end < len(buffer) or exhausted:
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if exhausted:
+                    raise
+            fill()
+
+    def iter_array():
+        nonlocal pos
+        pos += 1  # '['
+        while True:
+            char = next_char()
+            if char == ']':
+                pos += 1
+                return
+            if char == ',':
+                pos += 1
+                continue
+            if not char:
+                raise ValueError("Response JSON terpotong: array tidak ditutup")
+            yield decode_value()
+
+    char = next_char()
+    if char == '[':
+        yield from iter_array()
+        return
+    if char != '{':
+        raise ValueError("Format response tidak dikenal")
+
+    pos += 1
+    while True:
+        char = next_char()
+        if char == '}':
+            pos += 1
+            return
+        if char == ',':
+            pos += 1
+            continue
+        if not char:
+            raise ValueError("Response JSON terpotong: object tidak ditutup")
+        key = decode_value()
+        if next_char() != ':':
+            raise ValueError("Response JSON tidak valid")
+        pos += 1
+        if key in _RECORD_KEYS and next_char() == '[':
+            yield from iter_array()
+        else:
+            meta[key] = decode_value()
+
+
+def _has_next_page(meta, page):
+    """Whether pagination metadata (Laravel-style, top level or under 'meta') reports more pages"""
+    info = meta.get('meta') if isinstance(meta.get('meta'), dict) else meta
+    if 'next_page_url' in meta:
+        return bool(meta['next_page_url'])
+    if isinstance(meta.get('links'), dict) and 'next' in meta['links']:
+        return bool(meta['links']['next'])
+    last_page = info.get('last_page')
+    if last_page is not None:
+        return page < int(last_page)
+    return False
+
+
 class OnlineAttendanceService:
     """Service untuk mengelola data absensi online dari API eksternal"""
     
@@ -22,6 +145,7 @@ class OnlineAttendanceService:
         self.base_url = self.api_config['base_url']
         self.headers = self.api_config['headers']
         self.timeout = self.api_config['timeout']
+        self.http = get_http_pool()
         
         if not self.device_config:
             raise ValueError("Device 'Absensi Online' tidak ditemukan dalam konfigurasi")
@@ -75,7 +199,7 @@ class OnlineAttendanceService:
             self.logger.info(f"Testing connection to {test_url}")
             
             # Lakukan request test
-            response = requests.get(
+            response = self.http.get(
                 test_url,
                 headers=headers,
                 params=params,
@@ -124,68 +248,9 @@ class OnlineAttendanceService:
             tuple: (success: bool, data: list, message: str)
         """
         try:
-            # Jika tidak ada tanggal yang ditentukan, ambil data 3 jam terakhir
-            if not start_date or not end_date:
-                end_time = datetime.now()
-                start_time = end_time - timedelta(hours=3)
-                start_date = start_time.strftime('%Y-%m-%d')
-                end_date = end_time.strftime('%Y-%m-%d')
-            
-            # Konfigurasi API
-            api_config = self.device_config['api_config']
-            base_url = api_config['base_url']
-            endpoint = api_config['endpoint']
-            api_key = api_config.get('api_key', '')
-            timeout = api_config.get('timeout', 30)
-            
-            # URL lengkap
-            full_url = f"{base_url}{endpoint}"
-            
-            # Headers untuk request
-            headers = self.headers.copy()
-            if api_key:
-                headers['Authorization'] = f'Bearer {api_key}'
-                # atau headers['X-API-Key'] = api_key, sesuaikan dengan API
-            
-            # Parameters untuk request
-            params = {
-                'start_date': start_date,
-                'end_date': end_date,
-                'format': 'json'
-            }
-            
-            self.logger.info(f"Fetching attendance data from {full_url}")
-            self.logger.info(f"Date range: {start_date} to {end_date}")
-            
-            # Lakukan request ke API
-            response = requests.get(
-                full_url,
-                headers=headers,
-                params=params,
-                timeout=timeout
-            )
-            
-            # Check status code
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Validasi struktur response
-                if isinstance(data, dict):
-                    # Jika response berupa dict dengan key 'data' atau 'results'
-                    attendance_records = data.get('data', data.get('results', []))
-                elif isinstance(data, list):
-                    # Jika response langsung berupa list
-                    attendance_records = data
-                else:
-                    return False, [], f"Format response tidak dikenal: {type(data)}"
-                
-                self.logger.info(f"Successfully fetched {len(attendance_records)} records")
-                return True, attendance_records, f"Berhasil mengambil {len(attendance_records)} data"
-                
-            else:
-                error_msg = f"API request failed with status {response.status_code}: {response.text}"
-                self.logger.error(error_msg)
-                return False, [], error_msg
+            attendance_records = list(self.iter_attendance_records(start_date, end_date))
+            self.logger.info(f"Successfully fetched {len(attendance_records)} records")
+            return True, attendance_records, f"Berhasil mengambil {len(attendance_records)} data"
                 
         except requests.exceptions.RequestException as e:
             error_msg = f"Request error: {str(e)}"
@@ -197,6 +262,78 @@ class OnlineAttendanceService:
             self.logger.error(error_msg)
             return False, [], error_msg
 
+    def _get_fetch_setting(self, key, default):
+        """Fetch setting from the device api_config, falling back to ONLINE_ATTENDANCE_API_CONFIG"""
+        return self.device_config.get('api_config', {}).get(key, self.api_config.get(key, default))
+
+    def iter_attendance_records(self, start_date=None, end_date=None):
+        """
+        Generator: stream attendance records from the API.
+
+        The range is requested in windows of window_days; each window follows
+        page/per_page while the response reports more pages, and every page body
+        is parsed incrementally, so memory stays flat regardless of range size.
+        Requests go through the shared keep-alive pool.
+        Raises requests.exceptions.RequestException on API errors.
+        """
+        # Jika tidak ada tanggal yang ditentukan, ambil data 3 jam terakhir
+        if not start_date or not end_date:
+            end_time = datetime.now()
+            start_time = end_time - timedelta(hours=3)
+            start_date = start_time.strftime('%Y-%m-%d')
+            end_date = end_time.strftime('%Y-%m-%d')
+        
+        # Konfigurasi API
+        api_config = self.device_config['api_config']
+        full_url = f"{api_config['base_url']}{api_config['endpoint']}"
+        api_key = api_config.get('api_key', '')
+        timeout = api_config.get('timeout', 30)
+        window_days = max(int(self._get_fetch_setting('window_days', 1)), 1)
+        page_size = int(self._get_fetch_setting('page_size', 500))
+        max_pages = int(self._get_fetch_setting('max_pages', 1000))
+        
+        # Headers untuk request
+        headers = self.headers.copy()
+        if api_key:
+            headers['Authorization'] = f'Bearer {api_key}'
+        
+        self.logger.info(f"Fetching attendance data from {full_url}")
+        self.logger.info(f"Date range: {start_date} to {end_date}")
+        
+        window_start = datetime.strptime(start_date, '%Y-%m-%d').date()
+        last_day = datetime.strptime(end_date, '%Y-%m-%d').date()
+        while window_start <= last_day:
+            window_end = min(window_start + timedelta(days=window_days - 1), last_day)
+            params = {
+                'start_date': window_start.strftime('%Y-%m-%d'),
+                'end_date': window_end.strftime('%Y-%m-%d'),
+                'format': 'json',
+                'per_page': page_size
+            }
+            
+            for page in range(1, max_pages + 1):
+                params['page'] = page
+                meta = {}
+                page_count = 0
+                with self.http.get(full_url, headers=headers, params=params, timeout=timeout, stream=True) as response:
+                    if response.status_code != 200:
+                        raise requests.exceptions.HTTPError(
+                            f"API request failed with status {response.status_code}: {response.text[:200]}",
+                            response=response
+                        )
+                    for record in _iter_json_records(response.iter_content(chunk_size=65536), meta):
+                        page_count += 1
+                        yield record
+                
+                self.logger.debug(f"Fetched {page_count} records for {params['start_date']} - {params['end_date']} (page {page})")
+                # No pagination metadata means the API returned the whole window
+                if not page_count or not _has_next_page(meta, page):
+                    break
+            else:
+                self.logger.warning(f"Stopped after {max_pages} pages for {params['start_date']} - {params['end_date']}")
+            
+            window_start = window_end + timedelta(days=1)
+
     
     def process_attendance_record(self, record):
         """
@@ -357,152 +494,315 @@ class OnlineAttendanceService:
         Returns:
             bool: True jika duplicate ditemukan
         """
+        return not self.filter_duplicates([{'pin': pin, 'tgl': timestamp, 'machine': machine, 'status': None}])
+    
+    def _stage_records(self, cursor, records):
+        """
+        Bulk-load processed records into the #online_stage temp table, keeping
+        one row per (pin, machine, minute) - the duplicate key used for gagalabsens
+        """
+        cursor.execute("""
+            CREATE TABLE #online_stage (
+                row_no INT NOT NULL,
+                pin NVARCHAR(50) COLLATE DATABASE_DEFAULT NOT NULL,
+                tgl DATETIME NOT NULL,
+                machine NVARCHAR(20) COLLATE DATABASE_DEFAULT NOT NULL,
+                status NVARCHAR(20) COLLATE DATABASE_DEFAULT NULL,
+                tgl_minute AS DATEADD(minute, DATEDIFF(minute, 0, tgl), 0) PERSISTED
+            )
+        """)
+        cursor.fast_executemany = True
+        cursor.executemany(
+            "INSERT INTO #online_stage (row_no, pin, tgl, machine, status) VALUES (?, ?, ?, ?, ?)",
+            [
+                (row_no, record['pin'], record['tgl'], record['machine'], record['status'])
+                for row_no, record in enumerate(records)
+            ]
+        )
+    
+    # Staged rows that are first in their (pin, machine, minute) group and have
+    # no match in gagalabsens. The minute range keeps the predicate sargable.
+    _NEW_STAGED_ROWS_SQL = """
+        SELECT s.row_no, s.pin, s.tgl, s.machine, s.status
+        FROM (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY pin, machine, tgl_minute ORDER BY tgl, row_no) AS rn
+            FROM #online_stage
+        ) s
+        WHERE s.rn = 1
+        AND NOT EXISTS (
+            SELECT 1 FROM gagalabsens g
+            WHERE g.pin = s.pin
+            AND g.machine = s.machine
+            AND g.tgl >= s.tgl_minute
+            AND g.tgl < DATEADD(minute, 1, s.tgl_minute)
+        )
+    """
+    
+    def filter_duplicates(self, records):
+        """
+        Filter out duplicate records (set-based: one staging load plus an anti-join)
+        
+        Args:
+            records (list): List of processed records
+            
+        Returns:
+            list: Filtered records without duplicates
+        """
+        if not records:
+            return []
+        
+        conn = None
         try:
             conn = self.db_manager.get_sqlserver_connection()
             if not conn:
-                return False
+                # Jika ada error, skip semua record untuk keamanan
+                self.logger.error("Error checking duplicates: Gagal koneksi ke database")
+                return []
             
             cursor = conn.cursor()
+            self._stage_records(cursor, records)
+            cursor.execute(self._NEW_STAGED_ROWS_SQL + " ORDER BY s.row_no")
+            new_rows = {row[0] for row in cursor.fetchall()}
+            cursor.close()
             
-            # Check untuk duplicate berdasarkan PIN, timestamp (down to minute), dan machine
-            check_query = """
-                SELECT COUNT(*) as count
-                FROM gagalabsens
-                WHERE pin = ? 
-                AND CONVERT(varchar(16), tgl, 120) = CONVERT(varchar(16), ?, 120)
-                AND machine = ?
-            """
+            skipped = len(records) - len(new_rows)
+            if skipped:
+                self.logger.debug(f"Skipping {skipped} duplicate records")
+            return [record for row_no, record in enumerate(records) if row_no in new_rows]
             
-            cursor.execute(check_query, (pin, timestamp, machine))
-            result = cursor.fetchone()
-            count = result[0] if result else 0
+        except Exception as e:
+            self.logger.error(f"Error checking duplicates: {e}")
+            return []
+        finally:
+            if conn:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+    
+    def save_new_to_gagalabsens(self, records):
+        """
+        Menyimpan hanya record baru ke gagalabsens dalam satu koneksi:
+        bulk insert ke staging table lalu INSERT ... SELECT dengan anti-join
+        
+        Args:
+            records (list): List of processed records
+            
+        Returns:
+            tuple: (success: bool, message: str, inserted_count: int)
+        """
+        if not records:
+            return True, "Tidak ada data untuk disimpan", 0
+        
+        conn = None
+        try:
+            conn = self.db_manager.get_sqlserver_connection()
+            if not conn:
+                return False, "Gagal koneksi ke database", 0
             
+            cursor = conn.cursor()
+            self._stage_records(cursor, records)
+            cursor.execute(f"""
+                INSERT INTO gagalabsens (pin, tgl, machine, status, created_at, updated_at)
+                SELECT n.pin, n.tgl, n.machine, n.status, GETDATE(), GETDATE()
+                FROM ({self._NEW_STAGED_ROWS_SQL}) n
+            """)
+            inserted_count = cursor.rowcount
+            conn.commit()
             cursor.close()
-            conn.close()
             
-            return count > 0
+            success_msg = f"Berhasil menyimpan {inserted_count} record ke tabel gagalabsens ({len(records) - inserted_count} duplikat dilewati)"
+            self.logger.info(success_msg)
+            return True, success_msg, inserted_count
             
         except Exception as e:
-            self.logger.error(f"Error checking duplicate: {e}")
-            return False
+            error_msg = f"Error saving to gagalabsens: {str(e)}"
+            self.logger.error(error_msg)
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            return False, error_msg, 0
+        finally:
+            if conn:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
     
-    def filter_duplicates(self, records):
+    def execute_attrecord_for_records(self, records):
         """
-        Filter out duplicate records
+        Menjalankan prosedur attrecord sekali per tanggal dengan daftar PIN
+        dari record yang diproses
         
         Args:
             records (list): List of processed records
             
         Returns:
-            list: Filtered records without duplicates
+            tuple: (pin_count: int, failed_dates: list)
         """
-        filtered_records = []
-        
+        pins_by_date = {}
+        self._collect_pins(pins_by_date, records)
+        return self.execute_attrecord_for_pins(pins_by_date)
+    
+    @staticmethod
+    def _collect_pins(pins_by_date, records):
+        """Add the PINs of processed records to a {date: {pin: None}} map (ordered, no duplicates)"""
         for record in records:
-            try:
-                is_duplicate = self.check_duplicate_in_gagalabsens(
-                    record['pin'],
-                    record['tgl'],
-                    record['machine']
-                )
-                
-                if not is_duplicate:
-                    filtered_records.append(record)
-                else:
-                    self.logger.debug(f"Skipping duplicate record: PIN={record['pin']}, Time={record['tgl']}")
-                    
-            except Exception as e:
-                self.logger.error(f"Error checking duplicate for record: {e}")
-                # Jika ada error, skip record ini untuk keamanan
-                continue
+            pins_by_date.setdefault(record['tgl'][:10], {})[record['pin']] = None
+    
+    def execute_attrecord_for_pins(self, pins_by_date):
+        """
+        Menjalankan prosedur attrecord sekali per tanggal
+        
+        Args:
+            pins_by_date (dict): {tanggal 'YYYY-MM-DD': iterable PIN}
+            
+        Returns:
+            tuple: (pin_count: int, failed_dates: list)
+        """
+        if not pins_by_date:
+            return 0, []
+        
+        failed_dates = []
+        done_dates = set()
+        pin_count = 0
+        conn = None
+        try:
+            conn = self.db_manager.get_sqlserver_connection()
+            if not conn:
+                return 0, sorted(pins_by_date)
+            
+            cursor = conn.cursor()
+            for date_str in sorted(pins_by_date):
+                pins = list(pins_by_date[date_str])
+                try:
+                    with PROCEDURE_SECONDS.time(procedure='attrecord'):
+                        cursor.execute("EXEC [dbo].[attrecord] ?, ?, ?", (date_str, date_str, ','.join(pins)))
+                        conn.commit()
+                    pin_count += len(pins)
+                    done_dates.add(date_str)
+                    get_punch_tracer().mark_date(pins, date_str, 'recompute')
+                    self.logger.info(f"Attrecord executed for {len(pins)} PINs on {date_str}")
+                except Exception as e:
+                    conn.rollback()
+                    failed_dates.append(date_str)
+                    self.logger.error(f"Error executing attrecord for {date_str}: {e}")
+            cursor.close()
+            
+        except Exception as e:
+            self.logger.error(f"Error executing attrecord: {e}")
+            return pin_count, sorted(set(pins_by_date) - done_dates)
+        finally:
+            if conn:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
         
-        return filtered_records
+        return pin_count, failed_dates
     
-    def sync_attendance_data(self, start_date=None, end_date=None, processor_callback=None):
+    def sync_attendance_data(self, start_date=None, end_date=None, processor_callback=None, run_attrecord=None):
         """
         Main method untuk melakukan sync data absensi dari API ke gagalabsens dengan attrecord integration
         
         Args:
             start_date (str): Tanggal mulai (optional)
             end_date (str): Tanggal akhir (optional)
-            processor_callback (function): Callback function untuk eksekusi prosedur attrecord (optional)
+            processor_callback (function): Callback ('Absensi Online', raw_record) untuk setiap record yang valid (optional)
+            run_attrecord (bool): Jalankan attrecord sekali per tanggal untuk PIN yang diproses
+                (default: True jika processor_callback diberikan)
             
         Returns:
             tuple: (success: bool, message: str)
         """
+        if run_attrecord is None:
+            run_attrecord = processor_callback is not None
+        
+        batch_size = max(int(self._get_fetch_setting('sync_batch_size', 500)), 1)
+        fetched = 0
+        processed = 0
+        saved_count = 0
+        processing_errors = 0
+        first_errors = []
+        pins_by_date = {}
+        
         try:
             self.logger.info("Starting online attendance data sync")
             
-            # Step 1: Fetch data from API
-            success, raw_data, fetch_message = self.fetch_attendance_data(start_date, end_date)
-            
-            if not success:
-                return False, f"Failed to fetch data: {fetch_message}"
-            
-            if not raw_data:
-                return True, "No new data available from API"
-            
-            # Step 2: Process raw data for gagalabsens
-            processed_records = []
-            processing_errors = []
-            attrecord_processed = 0
-            
-            for record in raw_data:
+            # Step 1-3: Stream records from the API and process/save them batch by batch
+            batch = []
+            valid_raw_records = []
+            records = self.iter_attendance_records(start_date, end_date)
+            while True:
                 try:
-                    # Always process record for gagalabsens
-                    processed_record = self.process_attendance_record(record)
-                    processed_records.append(processed_record)
+                    record = next(records, None)
+                except requests.exceptions.RequestException as e:
+                    return False, f"Failed to fetch data: Request error: {str(e)} (saved {saved_count} records before the error)"
+                
+                if record is not None:
+                    fetched += 1
+                    try:
+                        batch.append(self.process_attendance_record(record))
+                        valid_raw_records.append(record)
+                    except Exception as e:
+                        processing_errors += 1
+                        if len(first_errors) < 3:
+                            first_errors.append(f"Error processing record: {e}")
+                
+                if batch and (len(batch) >= batch_size or record is None):
+                    save_success, save_message, batch_saved = self.save_new_to_gagalabsens(batch)
+                    if not save_success:
+                        return False, f"Failed to save data: {save_message}"
+                    saved_count += batch_saved
+                    processed += len(batch)
+                    if run_attrecord:
+                        self._collect_pins(pins_by_date, batch)
                     
-                    # If processor callback is provided, also process for attrecord procedure
                     if processor_callback:
-                        try:
-                            processor_callback('Absensi Online', record)
-                            attrecord_processed += 1
-                        except Exception as callback_error:
-                            self.logger.warning(f"Attrecord callback failed for record: {callback_error}")
-                    
-                except Exception as e:
-                    processing_errors.append(f"Error processing record: {e}")
-                    continue
+                        for raw_record in valid_raw_records:
+                            try:
+                                processor_callback('Absensi Online', raw_record)
+                            except Exception as callback_error:
+                                self.logger.warning(f"Processor callback failed for record: {callback_error}")
+                    batch = []
+                    valid_raw_records = []
+                
+                if record is None:
+                    break
+            
+            if not fetched:
+                return True, "No new data available from API"
             
-            if not processed_records:
+            if not processed:
                 error_msg = "No valid records after processing"
-                if processing_errors:
-                    error_msg += f". Errors: {'; '.join(processing_errors[:3])}"
+                if first_errors:
+                    error_msg += f". Errors: {'; '.join(first_errors)}"
                 return False, error_msg
             
-            # Step 3: Filter duplicates for gagalabsens
-            filtered_records = self.filter_duplicates(processed_records)
-            
-            if not filtered_records:
-                # Even if no new records for gagalabsens, attrecord might have been processed
-                if processor_callback and attrecord_processed > 0:
-                    summary_msg = f"All {len(processed_records)} records were duplicates for gagalabsens, but {attrecord_processed} processed for attrecord"
-                else:
-                    summary_msg = f"All {len(processed_records)} records were duplicates - no new data to save"
-                return True, summary_msg
-            
-            # Step 4: Save to gagalabsens
-            save_success, save_message = self.save_to_gagalabsens(filtered_records)
-            
-            if not save_success:
-                return False, f"Failed to save data: {save_message}"
+            # Step 4: attrecord once per date for every PIN in this sync
+            attrecord_processed = 0
+            failed_dates = []
+            if run_attrecord:
+                attrecord_processed, failed_dates = self.execute_attrecord_for_pins(pins_by_date)
             
             # Step 5: Return summary
-            if processor_callback:
+            if run_attrecord:
                 summary_msg = f"Hybrid sync completed. "
-                summary_msg += f"Fetched: {len(raw_data)}, "
-                summary_msg += f"Processed: {len(processed_records)}, "
-                summary_msg += f"Saved to gagalabsens: {len(filtered_records)}, "
+                summary_msg += f"Fetched: {fetched}, "
+                summary_msg += f"Processed: {processed}, "
+                summary_msg += f"Saved to gagalabsens: {saved_count}, "
                 summary_msg += f"Attrecord processed: {attrecord_processed}"
+                if failed_dates:
+                    summary_msg += f", Attrecord failed for: {', '.join(failed_dates)}"
             else:
                 summary_msg = f"Legacy sync completed. "
-                summary_msg += f"Fetched: {len(raw_data)}, "
-                summary_msg += f"Processed: {len(processed_records)}, "
-                summary_msg += f"Saved to gagalabsens: {len(filtered_records)}"
+                summary_msg += f"Fetched: {fetched}, "
+                summary_msg += f"Processed: {processed}, "
+                summary_msg += f"Saved to gagalabsens: {saved_count}"
             
             if processing_errors:
-                summary_msg += f", Errors: {len(processing_errors)}"
+                summary_msg += f", Errors: {processing_errors}"
             
             self.logger.info(summary_msg)
             return True, summary_msg
@@ -0,0 +1,231 @@
+"""
+Punch Spool
+Durable local write-ahead log for captured punches.
+
+Every punch taken from a device is appended here (SQLite, WAL mode,
+synchronous=FULL, one fsync per batch) before it is written to SQL Server and
+removed once processing succeeds. If SQL Server is unreachable the punch stays
+in the spool and the replayer feeds it through the normal processing path
+when the database is back. Replays are safe to repeat because FPLog and
+attendance_queues inserts are duplicate-checked.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from app.utils import metrics
+
+SPOOL_REPLAYED = metrics.counter(
+    'attendance_spool_replayed_total', 'Spooled punches written to SQL Server by the replayer'
+)
+
+
+class SpooledPunch:
+    """Attendance record rebuilt from the spool (same attributes as pyzk/Fingerspot records)"""
+
+    def __init__(self, user_id, timestamp, punch, uid=None, original_status_scan=None):
+        self.user_id = user_id
+        self.timestamp = timestamp
+        self.punch = punch
+        self.uid = uid
+        self.original_status_scan = original_status_scan
+
+
+def _serialize_record(kind, record):
+    """Convert a captured record to a JSON-safe dict"""
+    if kind == 'online':
+        # Online Attendance records are already plain dicts from the API
+        return dict(record)
+    timestamp = record.timestamp
+    return {
+        'user_id': record.user_id,
+        'timestamp': timestamp.isoformat() if isinstance(timestamp, datetime) else str(timestamp),
+        'punch': record.punch,
+        'uid': getattr(record, 'uid', None),
+        'original_status_scan': getattr(record, 'original_status_scan', None)
+    }
+
+
+def _deserialize_record(kind, payload):
+    """Rebuild a record from its spooled dict"""
+    data = json.loads(payload)
+    if kind == 'online':
+        return data
+    timestamp = data['timestamp']
+    try:
+        timestamp = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        pass
+    return SpooledPunch(
+        data['user_id'], timestamp, data['punch'],
+        uid=data.get('uid'), original_status_scan=data.get('original_status_scan')
+    )
+
+
+class PunchSpool:
+    """SQLite-backed spool of punches not yet confirmed in SQL Server"""
+
+    def __init__(self, file_path="shared/punch_spool.db", max_attempts=20, replay_window=300):
+        self.file_path = file_path
+        self.max_attempts = max_attempts
+        self.replay_window = replay_window
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._stats_lock = threading.Lock()
+        self._replayed = deque()
+        self.stats = {'appended': 0, 'completed': 0, 'replayed': 0, 'failed_attempts': 0}
+
+        directory = os.path.dirname(self.file_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def _connect(self):
+        """Get the calling thread's connection, creating it (and the schema) on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.file_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # FULL: a committed punch survives power loss, not only a process crash
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+            self._ensure_schema(conn)
+        return conn
+
+    def _ensure_schema(self, conn):
+        """Create the spool table if it does not exist"""
+        if self._schema_ready:
+            return
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS punches (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    device_name TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    captured_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    dead INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_punches_pending ON punches (dead, seq)")
+            self._schema_ready = True
+
+    def append_many(self, items):
+        """
+        Append (kind, device_name, record) items in one transaction (one fsync).
+        Returns the spool sequence numbers in item order.
+        """
+        now = time.time()
+        conn = self._connect()
+        seqs = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for kind, device_name, record in items:
+                cursor = conn.execute(
+                    "INSERT INTO punches (kind, device_name, payload, captured_at) VALUES (?, ?, ?, ?)",
+                    (kind, device_name, json.dumps(_serialize_record(kind, record), default=str), now)
+                )
+                seqs.append(cursor.lastrowid)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        with self._stats_lock:
+            self.stats['appended'] += len(seqs)
+        return seqs
+
+    def complete(self, seqs, replayed=False):
+        """Remove punches that are now safely in SQL Server"""
+        if not seqs:
+            return
+        conn = self._connect()
+        for start in range(0, len(seqs), 500):
+            chunk = seqs[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            conn.execute(f"DELETE FROM punches WHERE seq IN ({placeholders})", chunk)
+
+        with self._stats_lock:
+            self.stats['completed'] += len(seqs)
+            if replayed:
+                SPOOL_REPLAYED.inc(len(seqs))
+                self.stats['replayed'] += len(seqs)
+                now = time.monotonic()
+                self._replayed.extend([now] * len(seqs))
+
+    def fail(self, seqs, error):
+        """Record a failed processing attempt; punches over max_attempts are parked as dead"""
+        if not seqs:
+            return
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for seq in seqs:
+                conn.execute(
+                    "UPDATE punches SET attempts = attempts + 1, last_error = ?, "
+                    "dead = CASE WHEN attempts + 1 >= ? THEN 1 ELSE 0 END WHERE seq = ?",
+                    (str(error)[:500], self.max_attempts, seq)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        with self._stats_lock:
+            self.stats['failed_attempts'] += len(seqs)
+
+    def pending(self, limit=200, min_age=60):
+        """
+        Oldest pending punches as (seq, kind, device_name, record). Punches younger
+        than min_age seconds are skipped: they are most likely still being processed
+        by the live path.
+        """
+        rows = self._connect().execute(
+            "SELECT seq, kind, device_name, payload FROM punches "
+            "WHERE dead = 0 AND captured_at <= ? ORDER BY seq LIMIT ?",
+            (time.time() - min_age, limit)
+        ).fetchall()
+        return [(seq, kind, device_name, _deserialize_record(kind, payload)) for seq, kind, device_name, payload in rows]
+
+    def get_stats(self):
+        """Spool metrics: size, age of the oldest unflushed punch and replay rate"""
+        try:
+            conn = self._connect()
+            pending, oldest = conn.execute(
+                "SELECT COUNT(*), MIN(captured_at) FROM punches WHERE dead = 0"
+            ).fetchone()
+            dead = conn.execute("SELECT COUNT(*) FROM punches WHERE dead = 1").fetchone()[0]
+        except sqlite3.Error as e:
+            return {'error': str(e)}
+
+        size_bytes = 0
+        for suffix in ('', '-wal'):
+            path = self.file_path + suffix
+            if os.path.exists(path):
+                size_bytes += os.path.getsize(path)
+
+        with self._stats_lock:
+            cutoff = time.monotonic() - self.replay_window
+            while self._replayed and self._replayed[0] < cutoff:
+                self._replayed.popleft()
+            replay_rate = len(self._replayed) / (self.replay_window / 60)
+            totals = dict(self.stats)
+
+        return {
+            'pending': pending,
+            'dead': dead,
+            'size_bytes': size_bytes,
+            'oldest_pending_age_seconds': round(time.time() - oldest, 1) if oldest else 0,
+            'replay_rate_per_minute': round(replay_rate, 2),
+            **totals
+        }
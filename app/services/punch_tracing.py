@@ -0,0 +1,400 @@
+"""
+Punch Tracing
+End-to-end latency of a punch from the device to the VPS.
+
+Every punch captured by the streaming service gets a trace id and the time of
+each stage is recorded as it happens:
+
+    capture       received from the device (latency = capture - device punch time)
+    fplog_commit  FPLog row committed
+    queue_insert  attendance_queues row inserted
+    recompute     attrecord executed for the PIN and date
+    vps_ack       accepted by the VPS (FPLog or attrecord push)
+
+Later stages are measured from capture on the server clock, so device clock
+skew only affects the capture stage. Stages are joined by (PIN, punch time)
+or (PIN, date), which the services already have at hand.
+
+Traces live in the process that captures punches (the streaming leader).
+A process without open traces, e.g. a gunicorn worker running a VPS push for
+a web request, writes its stage stamps to a shared SQLite file instead, and
+the leader joins them into its traces every few seconds.
+"""
+
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+
+from config.devices import PUNCH_TRACE_CONFIG
+from config.logging_config import get_background_logger
+from app.utils import metrics
+
+STAGES = ('capture', 'fplog_commit', 'queue_insert', 'recompute', 'vps_ack')
+
+PUNCH_LATENCY_SECONDS = metrics.histogram(
+    'attendance_punch_latency_seconds', 'Punch latency per stage (capture: from device time; others: from capture)',
+    ['stage'], buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 900, 1800, 3600, 7200, 21600, 86400)
+)
+
+trace_logger = get_background_logger('PunchTrace', PUNCH_TRACE_CONFIG.get('log_file'))
+
+
+def _punch_key(pin, punch_time):
+    """(pin, 'YYYY-MM-DD HH:MM:SS')"""
+    if isinstance(punch_time, datetime):
+        punch_time = punch_time.strftime('%Y-%m-%d %H:%M:%S')
+    return str(pin), str(punch_time)[:19]
+
+
+class PunchTrace:
+    """Stage timestamps of one punch"""
+
+    __slots__ = ('trace_id', 'device', 'pin', 'punch_time', 'date', 'stages', 'started')
+
+    def __init__(self, device, pin, punch_time):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.device = device
+        self.pin, self.punch_time = _punch_key(pin, punch_time)
+        self.date = self.punch_time[:10]
+        self.started = time.monotonic()
+        self.stages = {'capture': time.time()}
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'device': self.device,
+            'pin': self.pin,
+            'punch_time': self.punch_time,
+            'stages': {stage: datetime.fromtimestamp(ts).isoformat(timespec='milliseconds')
+                       for stage, ts in self.stages.items()}
+        }
+
+
+class SharedStageStamps:
+    """Stage stamps handed from other processes to the streaming leader (SQLite, WAL)"""
+
+    def __init__(self, file_path, max_rows=100000):
+        self.file_path = file_path
+        # Without a leader to drain them, stamps would pile up; only the newest are kept
+        self.max_rows = max_rows
+        self._local = threading.local()
+        directory = os.path.dirname(file_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def _connect(self):
+        """Get the calling thread's connection, creating it (and the schema) on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.file_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS stamps (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    pin TEXT NOT NULL,
+                    punch_time TEXT,
+                    date TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    ts REAL NOT NULL
+                )
+            """)
+            self._local.conn = conn
+        return conn
+
+    def add(self, rows):
+        """Append (pin, punch_time or None, date, stage, ts) rows in one transaction"""
+        if not rows:
+            return
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT INTO stamps (pin, punch_time, date, stage, ts) VALUES (?, ?, ?, ?, ?)", rows)
+            conn.execute("DELETE FROM stamps WHERE id <= (SELECT MAX(id) FROM stamps) - ?", (self.max_rows,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def take(self, limit=5000):
+        """Remove and return the oldest stamps"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, pin, punch_time, date, stage, ts FROM stamps ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+            if rows:
+                conn.execute("DELETE FROM stamps WHERE id <= ?", (rows[-1][0],))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [row[1:] for row in rows]
+
+
+class PunchTracer:
+    """Open traces, per-stage latency windows and the slow-outlier log"""
+
+    def __init__(self, config=PUNCH_TRACE_CONFIG):
+        self.enabled = config.get('enabled', True)
+        self.window = config.get('window', 2000)
+        self.max_open = config.get('max_open_traces', 20000)
+        self.ttl = config.get('trace_ttl', 2 * 24 * 3600)
+        self.slow_seconds = config.get('slow_seconds', {})
+        self.slow_sample_rate = config.get('slow_sample_rate', 1.0)
+        self.traces = OrderedDict()       # trace_id -> PunchTrace, oldest first
+        self.by_punch = {}                # (pin, punch_time) -> trace_id
+        self.by_date = {}                 # (pin, date) -> set of trace_id
+        self.latencies = {stage: deque(maxlen=self.window) for stage in STAGES}
+        self.counts = dict.fromkeys(STAGES, 0)
+        self.slow_logged = 0
+        self.lock = threading.Lock()
+        shared_file = config.get('shared_file')
+        self.shared = SharedStageStamps(shared_file, self.max_open * 5) if self.enabled and shared_file else None
+        self.shared_poll_interval = config.get('shared_poll_interval', 5)
+        self._shared_polled = 0.0
+        self.shared_forwarded = 0
+        self.shared_joined = 0
+
+    # === Recording ===
+
+    def start(self, device, pin, punch_time):
+        """Open a trace at capture; returns its id (an open trace for the same punch is reused)"""
+        if not self.enabled:
+            return None
+        self._poll_shared()
+        key = _punch_key(pin, punch_time)
+        with self.lock:
+            trace_id = self.by_punch.get(key)
+            if trace_id:
+                return trace_id
+            self._evict()
+            trace = PunchTrace(device, pin, punch_time)
+            self.traces[trace.trace_id] = trace
+            self.by_punch[key] = trace.trace_id
+            self.by_date.setdefault((trace.pin, trace.date), set()).add(trace.trace_id)
+            try:
+                device_time = datetime.strptime(trace.punch_time, '%Y-%m-%d %H:%M:%S').timestamp()
+                latency = max(0.0, trace.stages['capture'] - device_time)
+            except ValueError:
+                latency = None
+        if latency is not None:
+            self._observe(trace, 'capture', latency)
+        return trace.trace_id
+
+    def mark(self, pin, punch_time, stage):
+        """Record a stage for one punch"""
+        self.mark_many([(pin, punch_time)], stage)
+
+    def mark_many(self, punches, stage):
+        """Record a stage for (pin, punch_time) pairs, e.g. the records of one VPS push"""
+        if not self.enabled:
+            return
+        keys = [_punch_key(pin, punch_time) for pin, punch_time in punches]
+        observed = []
+        with self.lock:
+            forward = not self.traces
+            if not forward:
+                for key in keys:
+                    trace_id = self.by_punch.get(key)
+                    trace = self.traces.get(trace_id) if trace_id else None
+                    latency = self._mark(trace, stage)
+                    if latency is not None:
+                        observed.append((trace, latency))
+        if forward:
+            now = time.time()
+            self._forward([(pin, punch_time, punch_time[:10], stage, now) for pin, punch_time in keys])
+        for trace, latency in observed:
+            self._observe(trace, stage, latency)
+
+    def mark_date(self, pins, date, stage):
+        """Record a stage for every open punch of the PINs on a date (attrecord, attrecord push)"""
+        if not self.enabled:
+            return
+        date = str(date)[:10]
+        observed = []
+        with self.lock:
+            forward = not self.traces
+            if not forward:
+                for pin in pins:
+                    observed.extend(self._mark_date(str(pin), date, stage))
+        if forward:
+            now = time.time()
+            self._forward([(str(pin), None, date, stage, now) for pin in pins])
+        for trace, latency in observed:
+            self._observe(trace, stage, latency)
+
+    def _mark_date(self, pin, date, stage, at=None):
+        """Stamp a stage on the open traces of a PIN and date (lock held)"""
+        observed = []
+        for trace_id in list(self.by_date.get((pin, date), ())):
+            trace = self.traces.get(trace_id)
+            latency = self._mark(trace, stage, at)
+            if latency is not None:
+                observed.append((trace, latency))
+        return observed
+
+    def _mark(self, trace, stage, at=None):
+        """
+        Stamp a stage once (lock held); returns seconds since capture or None.
+        at is the wall-clock time of a stamp made in another process; stamps
+        older than the capture belong to an earlier punch and are ignored.
+        """
+        if trace is None or stage in trace.stages:
+            return None
+        if at is None:
+            trace.stages[stage] = time.time()
+            latency = time.monotonic() - trace.started
+        else:
+            latency = at - trace.stages['capture']
+            if latency < 0:
+                return None
+            trace.stages[stage] = at
+        if stage == STAGES[-1]:
+            self._forget(trace)
+        return latency
+
+    # === Stamps from other processes ===
+
+    def _forward(self, rows):
+        """Hand stamps to the process holding the traces"""
+        if self.shared is None:
+            return
+        try:
+            self.shared.add(rows)
+        except sqlite3.Error as e:
+            trace_logger.error(f"Could not write shared trace stamps: {e}")
+            return
+        with self.lock:
+            self.shared_forwarded += len(rows)
+
+    def _poll_shared(self, force=False):
+        """Join shared stamps into open traces (at most every shared_poll_interval seconds)"""
+        if self.shared is None:
+            return
+        now = time.monotonic()
+        with self.lock:
+            if not self.traces or (not force and now - self._shared_polled < self.shared_poll_interval):
+                return
+            self._shared_polled = now
+        try:
+            rows = self.shared.take()
+        except sqlite3.Error as e:
+            trace_logger.error(f"Could not read shared trace stamps: {e}")
+            return
+        observed = []
+        with self.lock:
+            for pin, punch_time, date, stage, at in rows:
+                if punch_time is None:
+                    marked = self._mark_date(pin, date, stage, at)
+                else:
+                    trace_id = self.by_punch.get((pin, punch_time))
+                    trace = self.traces.get(trace_id) if trace_id else None
+                    latency = self._mark(trace, stage, at)
+                    marked = [(trace, latency)] if latency is not None else []
+                observed.extend((trace, stage, latency) for trace, latency in marked)
+            self.shared_joined += len(observed)
+        for trace, stage, latency in observed:
+            self._observe(trace, stage, latency)
+
+    def _observe(self, trace, stage, latency):
+        """Aggregate a latency and log the trace when it is a sampled slow outlier"""
+        PUNCH_LATENCY_SECONDS.observe(latency, stage=stage)
+        with self.lock:
+            self.latencies[stage].append(latency)
+            self.counts[stage] += 1
+        threshold = self.slow_seconds.get(stage)
+        if threshold is not None and latency >= threshold and random.random() < self.slow_sample_rate:
+            with self.lock:
+                self.slow_logged += 1
+            trace_logger.warning(json.dumps({
+                'event': 'slow_punch',
+                'stage': stage,
+                'latency_seconds': round(latency, 3),
+                'threshold_seconds': threshold,
+                **trace.to_dict()
+            }))
+
+    def _forget(self, trace):
+        """Drop a trace from all indexes (lock held)"""
+        self.traces.pop(trace.trace_id, None)
+        key = (trace.pin, trace.punch_time)
+        if self.by_punch.get(key) == trace.trace_id:
+            del self.by_punch[key]
+        ids = self.by_date.get((trace.pin, trace.date))
+        if ids is not None:
+            ids.discard(trace.trace_id)
+            if not ids:
+                del self.by_date[(trace.pin, trace.date)]
+
+    def _evict(self):
+        """Drop expired traces and keep at most max_open - 1 (lock held)"""
+        cutoff = time.monotonic() - self.ttl
+        while self.traces:
+            oldest = next(iter(self.traces.values()))
+            if oldest.started >= cutoff and len(self.traces) < self.max_open:
+                break
+            self._forget(oldest)
+
+    # === Reporting ===
+
+    def get_stats(self):
+        """Per-stage latency percentiles over the recent window"""
+        self._poll_shared(force=True)
+        with self.lock:
+            windows = {stage: sorted(values) for stage, values in self.latencies.items()}
+            counts = dict(self.counts)
+            open_traces = len(self.traces)
+
+        def percentile(values, p):
+            if not values:
+                return None
+            return round(values[min(len(values) - 1, int(len(values) * p))], 3)
+
+        stages = {}
+        for stage in STAGES:
+            values = windows[stage]
+            stages[stage] = {
+                'count': counts[stage],
+                'window': len(values),
+                'p50_seconds': percentile(values, 0.5),
+                'p90_seconds': percentile(values, 0.9),
+                'p99_seconds': percentile(values, 0.99),
+                'max_seconds': round(values[-1], 3) if values else None
+            }
+        return {
+            'enabled': self.enabled,
+            'open_traces': open_traces,
+            'slow_logged': self.slow_logged,
+            'shared_stamps_forwarded': self.shared_forwarded,
+            'shared_stamps_joined': self.shared_joined,
+            'stages': stages
+        }
+
+    def get_recent_traces(self, limit=20):
+        """Most recently opened traces"""
+        with self.lock:
+            traces = list(self.traces.values())[-limit:]
+        return [trace.to_dict() for trace in reversed(traces)]
+
+
+# Singleton instance getter
+_tracer_instance = None
+_tracer_lock = threading.Lock()
+
+def get_punch_tracer():
+    """Get singleton instance of PunchTracer"""
+    global _tracer_instance
+    if _tracer_instance is None:
+        with _tracer_lock:
+            if _tracer_instance is None:
+                _tracer_instance = PunchTracer()
+    return _tracer_instance
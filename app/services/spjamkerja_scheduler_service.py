@@ -6,7 +6,6 @@ Date: 2025-10-28
 """
 
 import threading
-import time
 import logging
 from datetime import datetime, timedelta
 from app.models.attendance import AttendanceModel
@@ -41,6 +40,7 @@ class SpJamkerjaScheduler:
         self._initialized = True
         self.running = False
         self.scheduler_thread = None
+        self._stop_event = threading.Event()
         self.is_processing = False
         self.last_execution_time = None
         self.last_execution_duration = None
@@ -62,8 +62,12 @@ class SpJamkerjaScheduler:
             return False, "Scheduler is already running"
         
         self.running = True
+        # Fresh event per run: a loop from a previous start() exits even if it is
+        # still sleeping when the scheduler is restarted (e.g. leader failover)
+        self._stop_event = threading.Event()
         self.scheduler_thread = threading.Thread(
             target=self._scheduler_loop,
+            args=(self._stop_event,),
             daemon=True,
             name="SpJamkerjaSchedulerThread"
         )
@@ -78,6 +82,7 @@ class SpJamkerjaScheduler:
             return False, "Scheduler is not running"
         
         self.running = False
+        self._stop_event.set()
         
         # Wait for thread to finish (max 5 seconds)
         if self.scheduler_thread and self.scheduler_thread.is_alive():
@@ -127,16 +132,16 @@ class SpJamkerjaScheduler:
             'next_execution_in_seconds': self._calculate_next_execution() if self.running else None
         }
     
-    def _scheduler_loop(self):
+    def _scheduler_loop(self, stop_event):
         """Main scheduler loop (runs in background thread)"""
         logger.info("[LOOP] Scheduler loop started")
         
         # Eksekusi pertama kali setelah 5 menit startup (biar aplikasi settle dulu)
         initial_delay = 300  # 5 menit
         logger.info(f"[WAIT] First execution will run after {initial_delay} seconds...")
-        time.sleep(initial_delay)
+        stop_event.wait(initial_delay)
         
-        while self.running:
+        while not stop_event.is_set():
             try:
                 # Execute spJamkerja
                 self._execute_spjamkerja()
@@ -144,16 +149,12 @@ class SpJamkerjaScheduler:
                 # Wait for next interval
                 logger.info(f"[WAIT] Next execution in {self.interval_seconds} seconds ({self.interval_seconds/3600:.1f} hours)...")
                 
-                # Sleep in chunks untuk bisa responsive terhadap stop()
-                sleep_chunk = 10  # Check setiap 10 detik
-                total_slept = 0
-                while total_slept < self.interval_seconds and self.running:
-                    time.sleep(min(sleep_chunk, self.interval_seconds - total_slept))
-                    total_slept += sleep_chunk
+                # Wait responsive terhadap stop()
+                stop_event.wait(self.interval_seconds)
                 
             except Exception as e:
                 logger.error(f"[ERROR] Error in scheduler loop: {e}", exc_info=True)
-                time.sleep(60)  # Wait 1 minute before retry
+                stop_event.wait(60)  # Wait 1 minute before retry
         
         logger.info("[STOP] Scheduler loop stopped")
     
@@ -1,23 +1,41 @@
+import os
 import threading
 import time
 from datetime import datetime
 from collections import deque
+from itertools import islice
 from config.database import db_manager
 from config.devices import (
     FINGERPRINT_DEVICES,
     determine_status,
     get_status_display,
+    resolve_status,
     get_device_display_name,
     get_zk_devices,
     get_fingerspot_api_devices,
     DEVICE_STATUS_RULES
 )
 from app.models.attendance import AttendanceModel
+from app.services.device_gateway import DeviceGateway
+from app.services.device_supervisor import DeviceSupervisor
+from app.services.http_client import get_http_pool
+from app.services.punch_spool import PunchSpool
+from app.services.punch_tracing import get_punch_tracer
+from app.utils import metrics
 from config.logging_config import get_streaming_logger
+from shared.notification_queue import notification_queue
 
 # Setup logging
 logger = get_streaming_logger()
 
+PUNCHES_CAPTURED = metrics.counter(
+    'attendance_punches_captured_total', 'Punches received from devices', ['device', 'kind']
+)
+
+# 'gateway' runs all devices on one asyncio event loop; 'threads' keeps the
+# previous one-thread-per-device implementation
+STREAMING_MODE = os.environ.get('STREAMING_MODE', 'gateway').lower()
+
 class StreamingService:
     """Service for handling real-time data streaming from fingerprint devices"""
     
@@ -26,6 +44,16 @@ class StreamingService:
         self.devices = FINGERPRINT_DEVICES
         self.running = False
         self.threads = []
+        self.gateway = None
+        # Reconnect backoff and per-device health (shared by both streaming modes)
+        self.supervisor = DeviceSupervisor()
+        # Durable spool: punches survive SQL Server outages and restarts
+        self.spool = PunchSpool()
+        # Device -> FPLog -> queue -> attrecord -> VPS latency
+        self.tracer = get_punch_tracer()
+        self.spool_replay_interval = 30
+        self.spool_replay_batch = 200
+        self.spool_thread = None
         # Notification system
         self.notifications = deque(maxlen=100)  # Keep last 100 notifications
         self.notification_callbacks = []  # For real-time callbacks
@@ -65,21 +93,37 @@ class StreamingService:
         if callback in self.notification_callbacks:
             self.notification_callbacks.remove(callback)
     
-    def _add_notification(self, notification_type, device_name, user_id, status, timestamp):
-        """Add a new notification to the queue"""
+    def _add_notification(self, notification_type, device_name, user_id=None, status=None, timestamp=None, message=None, **extra):
+        """Add a new notification to the queue and the shared notification log"""
+        timestamp = timestamp or datetime.now()
+        display_name = get_device_display_name(device_name)
+        if message is None:
+            message = f"Absensi diterima PIN {user_id} mesin {display_name}"
+        
         notification = {
             'id': f"{device_name}_{user_id}_{int(timestamp.timestamp())}",
             'type': notification_type,
-            'device_name': get_device_display_name(device_name),
+            'device_name': display_name,
             'user_id': user_id,
             'status': status,
-            'status_display': get_status_display(device_name, determine_status(device_name, status)),
+            'status_display': get_status_display(device_name, determine_status(device_name, status)) if status is not None else None,
             'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
             'datetime': timestamp,
-            'message': f"Absensi diterima PIN {user_id} mesin {get_device_display_name(device_name)}",
-            'toast_message': f"Absensi diterima PIN {user_id} mesin {get_device_display_name(device_name)}"
+            'message': message,
+            'toast_message': message,
+            **extra
         }
         
+        # Shared log gives every process (and SSE clients) a sequence-numbered copy
+        try:
+            shared_fields = {k: v for k, v in notification.items() if k not in ('id', 'type', 'message', 'device_name', 'user_id', 'status', 'datetime')}
+            notification_queue.add_notification(
+                notification_type, message, display_name,
+                user_id=user_id, status=status, **shared_fields
+            )
+        except Exception as e:
+            logger.error(f"Error writing shared notification: {e}")
+        
         self.notifications.append(notification)
         
         # Call notification callbacks
@@ -94,10 +138,8 @@ class StreamingService:
         return get_status_display(device_name, status)
     
     def get_recent_notifications(self, limit=20):
-        """Get recent notifications"""
-        notifications_list = list(self.notifications)
-        notifications_list.sort(key=lambda x: x['datetime'], reverse=True)
-        return notifications_list[:limit]
+        """Get recent notifications (newest first; the deque is already in arrival order)"""
+        return list(islice(reversed(self.notifications), limit))
     
     def clear_notifications(self):
         """Clear all notifications"""
@@ -112,6 +154,10 @@ class StreamingService:
         self.running = True
         self.threads = []
         
+        if STREAMING_MODE != 'threads':
+            self.gateway = DeviceGateway(self, supervisor=self.supervisor)
+            return self.gateway.start(self.devices)
+        
         for device in self.devices:
             thread = threading.Thread(
                 target=self._handle_device, 
@@ -121,6 +167,10 @@ class StreamingService:
             self.threads.append(thread)
             thread.start()
         
+        self.spool_thread = threading.Thread(target=self._spool_replay_loop, daemon=True, name="PunchSpoolReplay")
+        self.threads.append(self.spool_thread)
+        self.spool_thread.start()
+        
         return True, f"Started streaming from {len(self.devices)} devices"
     
     def stop_streaming(self):
@@ -128,6 +178,10 @@ class StreamingService:
         logger.info("Stopping streaming service...")
         self.running = False
         
+        if self.gateway:
+            self.gateway.stop(timeout=30)
+            self.gateway = None
+        
         # Give threads time to gracefully shutdown
         if self.threads:
             logger.info(f"Waiting for {len(self.threads)} threads to finish...")
@@ -174,21 +228,163 @@ class StreamingService:
     
     def get_streaming_status(self):
         """Get current streaming status"""
+        gateway_status = self.gateway.get_status() if self.gateway else None
         return {
             'running': self.running,
+            'mode': STREAMING_MODE,
             'devices_count': len(self.devices),
             'active_threads': len([t for t in self.threads if t.is_alive()]),
+            'active_devices': gateway_status['active_devices'] if gateway_status else len([t for t in self.threads if t.is_alive()]),
+            'gateway': gateway_status,
+            'health': self.supervisor.snapshot(),
+            'spool': self.spool.get_stats(),
+            'http': get_http_pool().get_stats(),
             'devices': [{'name': d['name'], 'ip': d['ip']} for d in self.devices],
             'recent_notifications': len(self.notifications),
-            'last_notification': list(self.notifications)[-1] if self.notifications else None
+            'last_notification': self.notifications[-1] if self.notifications else None
         }
     
+    def spool_punches(self, items):
+        """
+        Write-ahead: append (kind, device_name, record) items to the spool in one fsync.
+        Returns one spool sequence number per item (None when the spool write failed).
+        """
+        for kind, device_name, _ in items:
+            PUNCHES_CAPTURED.inc(device=device_name, kind=kind)
+        try:
+            return self.spool.append_many(items)
+        except Exception as e:
+            logger.error(f"Error writing {len(items)} punches to spool: {e}")
+            return [None] * len(items)
+    
+    def process_attendance_batch(self, items, seqs=None):
+        """
+        Spool, save and run attrecord (once per date) for a batch of received records
+        
+        Args:
+            items: list of (kind, device_name, record) where kind is 'zk', 'fingerspot' or 'online'
+            seqs: spool sequence numbers when the items were already spooled
+        """
+        if seqs is None:
+            seqs = self.spool_punches(items)
+        
+        # One probe per batch: while SQL Server is down the batch stays in the
+        # spool for replay_spool instead of every record waiting on a login timeout
+        if all(seq is not None for seq in seqs) and not self._database_available():
+            logger.warning(f"SQL Server unreachable; {len(items)} punches left in spool")
+            return
+        
+        outcomes = self._process_items(items)
+        self._settle_spool(seqs, outcomes, replayed=False)
+    
+    def _database_available(self):
+        """Cheap reachability check before a round of SQL Server work"""
+        conn = self.db_manager.get_sqlserver_connection()
+        if not conn:
+            return False
+        conn.close()
+        return True
+    
+    def replay_spool(self, limit=None):
+        """Re-process spooled punches once SQL Server is reachable. Returns the number replayed."""
+        try:
+            pending = self.spool.pending(limit or self.spool_replay_batch)
+        except Exception as e:
+            logger.error(f"Error reading punch spool: {e}")
+            return 0
+        if not pending:
+            return 0
+        
+        # Skip the whole round while the database is still down
+        if not self._database_available():
+            logger.warning(f"SQL Server unreachable; {len(pending)}+ punches waiting in spool")
+            return 0
+        
+        logger.info(f"Replaying {len(pending)} spooled punches...")
+        seqs = [seq for seq, _, _, _ in pending]
+        items = [(kind, device_name, record) for _, kind, device_name, record in pending]
+        outcomes = self._process_items(items)
+        self._settle_spool(seqs, outcomes, replayed=True)
+        return sum(1 for ok in outcomes if ok)
+    
+    def _settle_spool(self, seqs, outcomes, replayed):
+        """Remove processed punches from the spool and count failed attempts on the rest"""
+        try:
+            self.spool.complete([seq for seq, ok in zip(seqs, outcomes) if ok and seq is not None], replayed=replayed)
+            self.spool.fail([seq for seq, ok in zip(seqs, outcomes) if not ok and seq is not None], "processing failed")
+        except Exception as e:
+            logger.error(f"Error updating punch spool: {e}")
+    
+    def _spool_replay_loop(self):
+        """Replay spooled punches periodically (thread streaming mode)"""
+        while self.running:
+            try:
+                # Keep going while full batches succeed; otherwise wait for the next round
+                while self.running and self.replay_spool() >= self.spool_replay_batch:
+                    pass
+            except Exception as e:
+                logger.error(f"Error replaying punch spool: {e}")
+            self._sleep_while_running(self.spool_replay_interval)
+    
+    def _process_items(self, items):
+        """Process (kind, device_name, record) items; returns a per-item ok flag"""
+        processors = {
+            'zk': self._process_zk_attendance_record,
+            'fingerspot': self._process_fingerspot_attendance_record,
+            'online': self._process_online_attendance_record
+        }
+        
+        outcomes = []
+        deferred_list = []
+        for kind, device_name, record in items:
+            ok, deferred = processors[kind](device_name, record, run_attrecord=False)
+            outcomes.append(ok)
+            deferred_list.append(deferred)
+        
+        failed_dates = self._run_attrecord_batch([deferred for deferred in deferred_list if deferred])
+        
+        # Online records only exist to trigger attrecord, so retry them if it failed
+        for i, (kind, _, _) in enumerate(items):
+            if kind == 'online' and deferred_list[i] and deferred_list[i][1] in failed_dates:
+                outcomes[i] = False
+        
+        return outcomes
+    
+    def _run_attrecord_batch(self, pending):
+        """Execute attrecord once per date for all PINs saved on that date; returns the dates that failed"""
+        failed_dates = set()
+        pins_by_date = {}
+        for pin, date_str in pending:
+            pins = pins_by_date.setdefault(date_str, [])
+            if pin not in pins:
+                pins.append(pin)
+        
+        for date_str, pins in pins_by_date.items():
+            try:
+                success, message = self.attendance_model.execute_attrecord_procedure_with_pins(
+                    start_date=date_str,
+                    end_date=date_str,
+                    pins=pins
+                )
+                if success:
+                    self.tracer.mark_date(pins, date_str, 'recompute')
+                    logger.info(f"   -> Attrecord procedure executed for {len(pins)} PINs on {date_str}: {message}")
+                else:
+                    failed_dates.add(date_str)
+                    logger.warning(f"   -> Attrecord procedure failed for {date_str}: {message}")
+            except Exception as attrecord_error:
+                failed_dates.add(date_str)
+                logger.error(f"   -> Error executing attrecord procedure for {date_str}: {attrecord_error}")
+        
+        return failed_dates
+    
     def _handle_device(self, device_info):
         """Handle streaming from a single device (ZK or Fingerspot API)"""
         device_name = device_info['name']
         connection_type = device_info.get('connection_type', 'zk')
         
         logger.info(f"[{device_name}] Starting streaming thread for {connection_type} device...")
+        self.supervisor.register(device_info)
         
         # Route to appropriate streaming method based on connection type
         if connection_type == 'fingerspot_api':
@@ -198,6 +394,18 @@ class StreamingService:
         else:
             self._handle_zk_device(device_info)
     
+    def _sleep_while_running(self, seconds):
+        """Sleep in short steps so stop_streaming is not held up by a long backoff"""
+        deadline = time.monotonic() + seconds
+        while self.running and time.monotonic() < deadline:
+            time.sleep(min(1, deadline - time.monotonic()))
+    
+    def _backoff(self, device_name):
+        """Wait for the supervisor's jittered backoff delay before the next attempt"""
+        delay = self.supervisor.next_delay(device_name)
+        logger.info(f"[{device_name}] Retrying in {delay:.0f} seconds...")
+        self._sleep_while_running(delay)
+    
     def _handle_zk_device(self, device_info):
         """Handle streaming from a ZK device"""
         device_name = device_info['name']
@@ -210,14 +418,20 @@ class StreamingService:
             return
         
         zk = ZK(device_info['ip'], port=device_info['port'], timeout=30, password=device_info['password'])
+        health = self.supervisor.get(device_name)
         
         while self.running:
             zk_conn = None
             db_conn = None
             cursor = None
             try:
+                # Known-down devices get a cheap probe before a full connect
+                if not self.supervisor.probe(device_info):
+                    raise ConnectionError("device unreachable (probe failed)")
+                
                 logger.info(f"[{device_name}] Connecting to ZK device...")
                 zk_conn = zk.connect()
+                health.record_connected()
                 logger.info(f"[{device_name}] ZK device connected successfully!")
                 
                 # Use connection pooling untuk database
@@ -241,10 +455,12 @@ class StreamingService:
                         continue
                     
                     # Process ZK device attendance record
-                    self._process_zk_attendance_record(device_name, attendance, cursor, db_conn)
+                    health.record_punch()
+                    self.process_attendance_batch([('zk', device_name, attendance)])
                         
             except Exception as e:
-                logger.error(f"[{device_name}] Streaming error: {e}. Retrying in 30 seconds...")
+                health.record_failure(e)
+                logger.error(f"[{device_name}] Streaming error: {e}")
             finally:
                 if zk_conn and zk_conn.is_connect:
                     zk_conn.disconnect()
@@ -262,7 +478,7 @@ class StreamingService:
                         pass  # Connection might already be closed
             
             if self.running:
-                time.sleep(30)  # Wait before retrying
+                self._backoff(device_name)
     
     def _handle_fingerspot_device(self, device_info):
         """Handle streaming from a Fingerspot API device (polling-based)"""
@@ -273,53 +489,57 @@ class StreamingService:
             logger.error(f"[{device_name}] Fingerspot service not available. Cannot stream from API device.")
             return
         
-        # Test connection first using get_device endpoint
-        logger.info(f"[{device_name}] Testing API connection...")
-        connection_success, connection_message = self.fingerspot_service.test_connection(device_info)
-        
-        if not connection_success:
+        # Test connection first using get_device endpoint, retrying with backoff
+        health = self.supervisor.get(device_name)
+        while self.running:
+            logger.info(f"[{device_name}] Testing API connection...")
+            connection_success, connection_message = self.fingerspot_service.test_connection(device_info, use_cache=True)
+            if connection_success:
+                break
+            health.record_failure(connection_message)
             logger.error(f"[{device_name}] API connection test failed: {connection_message}")
+            self._backoff(device_name)
+        
+        if not self.running:
             return
         
+        health.record_connected()
         logger.info(f"[{device_name}] API connection successful: {connection_message}")
         
-        # For API devices, we use polling instead of live streaming
-        last_poll_time = datetime.now()
-        poll_interval = 7200  # Poll every 7200 seconds (2 hours)
+        # For API devices, we use watermark polling instead of live streaming
+        poll_interval = self.fingerspot_service.get_poll_interval(device_info)
 
         while self.running:
+            attendance_records = []
             try:
                 logger.info(f"[{device_name}] Polling Fingerspot API for new attendance data...")
                 
-                # Get attendance data from the last poll time
-                end_time = datetime.now()
-                
-                # Get recent attendance data
-                attendance_records = self.fingerspot_service.get_attendance_data(
-                    device_info, 
-                    start_date=last_poll_time,
-                    end_date=end_time
-                )
+                # Only records not seen by a previous poll are returned
+                attendance_records, state = self.fingerspot_service.poll_new_attendance(device_info)
                 
                 if attendance_records:
                     logger.info(f"[{device_name}] Found {len(attendance_records)} new records from API")
                     
-                    # Process each record
                     for attendance in attendance_records:
-                        # Process Fingerspot API attendance record
-                        self._process_fingerspot_attendance_record(device_name, attendance)
+                        health.record_punch()
+                    
+                    # Spool and process the whole poll as one batch; the watermark
+                    # only advances once the poll is in the spool
+                    items = [('fingerspot', device_name, attendance) for attendance in attendance_records]
+                    seqs = self.spool_punches(items)
+                    if all(seq is not None for seq in seqs):
+                        self.fingerspot_service.commit_watermark(state)
+                    self.process_attendance_batch(items, seqs)
                 else:
                     logger.debug(f"[{device_name}] No new records found in API poll")
-                
-                # Update last poll time
-                last_poll_time = end_time
+                    self.fingerspot_service.commit_watermark(state)
                 
             except Exception as e:
-                logger.error(f"[{device_name}] Fingerspot API streaming error: {e}. Retrying in {poll_interval} seconds...")
+                logger.error(f"[{device_name}] Fingerspot API streaming error: {e}")
             
-            # Wait for next poll
-            if self.running:
-                time.sleep(poll_interval)
+            # Wait for next poll (shorter while punches are arriving)
+            poll_interval = self.fingerspot_service.get_poll_interval(device_info, poll_interval, bool(attendance_records))
+            self._sleep_while_running(poll_interval)
     
     def _determine_status(self, device_name, punch):
         """Determine status based on device name and punch code (deprecated - use config.devices)"""
@@ -352,20 +572,28 @@ class StreamingService:
             logger.error(f"   -> Error looking up fpid for PIN {pin}: {e}")
             return None
     
-    def _process_zk_attendance_record(self, device_name, attendance, cursor, db_conn):
-        """Process attendance record from ZK device"""
+    def _process_zk_attendance_record(self, device_name, attendance, cursor=None, db_conn=None, run_attrecord=True):
+        """
+        Process attendance record from ZK device.
+        Returns (ok, deferred): ok is False when the record should be retried
+        (FPLog write failed for a reason other than a duplicate). With
+        run_attrecord=False the attrecord call is left to the caller and
+        deferred is (pin, date) for saved records.
+        """
+        ok = False
+        deferred = None
         logger.info(f"[{device_name}] ZK Data received: User ID: {attendance.user_id}, Time: {attendance.timestamp}")
         
         try:
             # Use config function to determine status with enhanced logging
-            status_val = determine_status(device_name, attendance.punch)
-            status_display = get_status_display(device_name, attendance.punch)
+            status_val, status_display = resolve_status(device_name, attendance.punch)
             
             if status_val is not None:
                 # Validate and convert data types to prevent SQL Server errors
                 pin = str(attendance.user_id) if attendance.user_id is not None else ''
                 timestamp = attendance.timestamp
                 machine = str(device_name) if device_name is not None else ''
+                self.tracer.start(device_name, pin, timestamp)
                 
                 # Use status as-is since status column is varchar
                 status = status_val
@@ -383,22 +611,27 @@ class StreamingService:
                     fpid=fpid
                 )
 
+                ok = success or message.startswith('Duplicate')
                 if success:
+                    self.tracer.mark(pin, timestamp, 'fplog_commit')
                     logger.info(f"   -> [{device_name}] ZK Data saved to FPLog: {message}")
                     
                     # Update attrecord table with today's date range and specific PIN
                     try:
                         today_str = timestamp.strftime('%Y-%m-%d') if isinstance(timestamp, datetime) else timestamp.split()[0]
-                        attrecord_success, attrecord_message = self.attendance_model.execute_attrecord_procedure_with_pins(
-                            start_date=today_str,
-                            end_date=today_str,
-                            pins=[pin]
-                        )
-                        
-                        if attrecord_success:
-                            logger.info(f"   -> [{device_name}] ZK Attrecord procedure executed: {attrecord_message}")
+                        if run_attrecord:
+                            attrecord_success, attrecord_message = self.attendance_model.execute_attrecord_procedure_with_pins(
+                                start_date=today_str,
+                                end_date=today_str,
+                                pins=[pin]
+                            )
+                            
+                            if attrecord_success:
+                                logger.info(f"   -> [{device_name}] ZK Attrecord procedure executed: {attrecord_message}")
+                            else:
+                                logger.warning(f"   -> [{device_name}] ZK Attrecord procedure failed: {attrecord_message}")
                         else:
-                            logger.warning(f"   -> [{device_name}] ZK Attrecord procedure failed: {attrecord_message}")
+                            deferred = (pin, today_str)
                             
                     except Exception as attrecord_error:
                         logger.error(f"   -> [{device_name}] ZK Error executing attrecord procedure: {attrecord_error}")
@@ -419,6 +652,7 @@ class StreamingService:
                     )
                     
                     if queue_success:
+                        self.tracer.mark(pin, timestamp, 'queue_insert')
                         logger.info(f"   -> [{device_name}] ZK Data added to attendance queue: {queue_message}")
                     else:
                         logger.info(f"   -> [{device_name}] ZK Data not added to attendance queue: {queue_message}")
@@ -437,6 +671,7 @@ class StreamingService:
                 
             else:
                 logger.debug(f"   -> [{device_name}] ZK Status {attendance.punch} ignored.")
+                ok = True
                 
         except Exception as e:
             logger.error(f"   -> [{device_name}] Failed to save ZK data: {e}")
@@ -447,13 +682,16 @@ class StreamingService:
                 message=f"Failed to save ZK attendance data: {e}",
                 timestamp=attendance.timestamp
             )
+        
+        return ok, deferred
     
-    def _process_fingerspot_attendance_record(self, device_name, attendance):
-        """Process attendance record from Fingerspot API device"""
+    def _process_fingerspot_attendance_record(self, device_name, attendance, run_attrecord=True):
+        """Process attendance record from Fingerspot API device (see _process_zk_attendance_record for the return value)"""
+        ok = False
+        deferred = None
         try:
             # Use config function to determine status
-            status_val = determine_status(device_name, attendance.punch)
-            status_display = get_status_display(device_name, attendance.punch)
+            status_val, status_display = resolve_status(device_name, attendance.punch)
             
             if status_val is not None:
                 # Prepare data for database
@@ -461,6 +699,7 @@ class StreamingService:
                 timestamp = attendance.timestamp
                 machine = str(device_name)
                 status = status_val
+                self.tracer.start(device_name, pin, timestamp)
                 
                 # Get fpid from employee table based on PIN
                 fpid = self._get_fpid_by_pin(pin)
@@ -476,22 +715,27 @@ class StreamingService:
                     fpid=fpid
                 )
 
+                ok = success or message.startswith('Duplicate')
                 if success:
+                    self.tracer.mark(pin, timestamp, 'fplog_commit')
                     logger.info(f"   -> [{device_name}] Fingerspot API Data saved to FPLog: {message}")
                     
                     # Update attrecord table with today's date range and specific PIN
                     try:
                         today_str = timestamp.strftime('%Y-%m-%d') if isinstance(timestamp, datetime) else timestamp.split()[0]
-                        attrecord_success, attrecord_message = self.attendance_model.execute_attrecord_procedure_with_pins(
-                            start_date=today_str,
-                            end_date=today_str,
-                            pins=[pin]
-                        )
-                        
-                        if attrecord_success:
-                            logger.info(f"   -> [{device_name}] Fingerspot API Attrecord procedure executed: {attrecord_message}")
+                        if run_attrecord:
+                            attrecord_success, attrecord_message = self.attendance_model.execute_attrecord_procedure_with_pins(
+                                start_date=today_str,
+                                end_date=today_str,
+                                pins=[pin]
+                            )
+                            
+                            if attrecord_success:
+                                logger.info(f"   -> [{device_name}] Fingerspot API Attrecord procedure executed: {attrecord_message}")
+                            else:
+                                logger.warning(f"   -> [{device_name}] Fingerspot API Attrecord procedure failed: {attrecord_message}")
                         else:
-                            logger.warning(f"   -> [{device_name}] Fingerspot API Attrecord procedure failed: {attrecord_message}")
+                            deferred = (pin, today_str)
                             
                     except Exception as attrecord_error:
                         logger.error(f"   -> [{device_name}] Fingerspot API Error executing attrecord procedure: {attrecord_error}")
@@ -527,6 +771,7 @@ class StreamingService:
                     )
                     
                     if queue_success:
+                        self.tracer.mark(pin, timestamp, 'queue_insert')
                         logger.info(f"   -> [{device_name}] Fingerspot API Data added to attendance queue: {queue_message}")
                     else:
                         logger.info(f"   -> [{device_name}] Fingerspot API Data not added to attendance queue: {queue_message}")
@@ -545,6 +790,7 @@ class StreamingService:
                 
             else:
                 logger.debug(f"   -> [{device_name}] Fingerspot API Status {attendance.punch} ignored.")
+                ok = True
                 
         except Exception as e:
             logger.error(f"   -> [{device_name}] Failed to process Fingerspot API attendance record: {e}")
@@ -555,9 +801,13 @@ class StreamingService:
                 message=f"Failed to process Fingerspot API attendance record: {e}",
                 timestamp=attendance.timestamp if hasattr(attendance, 'timestamp') else datetime.now()
             )
+        
+        return ok, deferred
     
-    def _process_online_attendance_record(self, device_name, attendance):
+    def _process_online_attendance_record(self, device_name, attendance, run_attrecord=True):
         """Process attendance record from Online Attendance API device - Execute attrecord procedure only"""
+        ok = False
+        deferred = None
         try:
             # Extract data from online attendance record
             pin = str(attendance.get('pin', ''))
@@ -567,15 +817,15 @@ class StreamingService:
             # Validate required fields
             if not pin:
                 logger.error(f"   -> [{device_name}] Online Attendance: Missing PIN in record")
-                return
+                return True, None
             
             if not status_raw:
                 logger.error(f"   -> [{device_name}] Online Attendance: Missing status in record")
-                return
+                return True, None
             
             if not created_at:
                 logger.error(f"   -> [{device_name}] Online Attendance: Missing created_at in record")
-                return
+                return True, None
             
             # Parse timestamp from ISO 8601 format
             try:
@@ -586,7 +836,8 @@ class StreamingService:
                     timestamp = datetime.strptime(created_at, '%Y-%m-%dT%H:%M:%S')
             except ValueError as e:
                 logger.error(f"   -> [{device_name}] Online Attendance: Invalid timestamp format '{created_at}': {e}")
-                return
+                return True, None
+            self.tracer.start(device_name, pin, timestamp)
             
             # Determine machine using device rules (for logging purposes)
             device_rules = DEVICE_STATUS_RULES.get('Absensi Online', {})
@@ -605,16 +856,19 @@ class StreamingService:
             # This is the main integration point - same as ZK and Fingerspot devices
             try:
                 today_str = timestamp.strftime('%Y-%m-%d')
-                attrecord_success, attrecord_message = self.attendance_model.execute_attrecord_procedure_with_pins(
-                    start_date=today_str,
-                    end_date=today_str,
-                    pins=[pin]
-                )
-                
-                if attrecord_success:
-                    logger.info(f"   -> [{device_name}] Online Attendance Attrecord procedure executed: {attrecord_message}")
+                if run_attrecord:
+                    attrecord_success, attrecord_message = self.attendance_model.execute_attrecord_procedure_with_pins(
+                        start_date=today_str,
+                        end_date=today_str,
+                        pins=[pin]
+                    )
+                    
+                    if attrecord_success:
+                        logger.info(f"   -> [{device_name}] Online Attendance Attrecord procedure executed: {attrecord_message}")
+                    else:
+                        logger.warning(f"   -> [{device_name}] Online Attendance Attrecord procedure failed: {attrecord_message}")
                 else:
-                    logger.warning(f"   -> [{device_name}] Online Attendance Attrecord procedure failed: {attrecord_message}")
+                    deferred = (pin, today_str)
                     
             except Exception as attrecord_error:
                 logger.error(f"   -> [{device_name}] Online Attendance Error executing attrecord procedure: {attrecord_error}")
@@ -632,6 +886,7 @@ class StreamingService:
             )
             
             logger.info(f"   -> [{device_name}] Online Attendance record processed for attrecord procedure: PIN={pin}")
+            ok = True
             
         except Exception as e:
             logger.error(f"   -> [{device_name}] Failed to process Online Attendance record: {e}")
@@ -642,6 +897,43 @@ class StreamingService:
                 message=f"Failed to process Online Attendance record: {e}",
                 timestamp=datetime.now()
             )
+        
+        return ok, deferred
+    
+    def _notify_online_record(self, device_name, attendance):
+        """Notify an Online Attendance record (attrecord is batched by the sync itself)"""
+        PUNCHES_CAPTURED.inc(device=device_name, kind='online')
+        self._process_online_attendance_record(device_name, attendance, run_attrecord=False)
+    
+    def _notify_online_sync_result(self, device_name, success, message, current_time):
+        """Log and notify the result of a scheduled Online Attendance sync"""
+        if success:
+            logger.info(f"[{device_name}] Scheduled sync completed: {message}")
+            # Extract number of records from message if possible
+            import re
+            # Updated regex to match hybrid message formats
+            match = (re.search(r'Attrecord processed: (\d+)', message) or 
+                    re.search(r'Processed: (\d+)', message) or 
+                    re.search(r'Saved: (\d+)', message))
+            records_synced = int(match.group(1)) if match else 0
+            
+            # Add success notification
+            self._add_notification(
+                notification_type='sync_completed',
+                device_name=device_name,
+                message=f"Scheduled sync completed. {message}",
+                timestamp=current_time,
+                records_count=records_synced
+            )
+        else:
+            logger.error(f"[{device_name}] Scheduled sync failed: {message}")
+            # Add error notification
+            self._add_notification(
+                notification_type='sync_error',
+                device_name=device_name,
+                message=f"Scheduled sync failed: {message}",
+                timestamp=current_time
+            )
     
     def _handle_online_attendance_device(self, device_info):
         """Handle streaming from Online Attendance API device with 3-hour schedule"""
@@ -665,38 +957,13 @@ class StreamingService:
                 if time_since_last_sync >= sync_interval:
                     logger.info(f"[{device_name}] Starting scheduled sync (3-hour interval)...")
                     
-                    # Perform sync with modern processor callback for FPLog integration
+                    # attrecord runs once per date inside the sync; the callback only notifies
                     success, message = self.online_attendance_service.sync_attendance_data(
-                        processor_callback=self._process_online_attendance_record
+                        processor_callback=self._notify_online_record,
+                        run_attrecord=True
                     )
                     
-                    if success:
-                        logger.info(f"[{device_name}] Scheduled sync completed: {message}")
-                        # Extract number of records from message if possible
-                        import re
-                        # Updated regex to match hybrid message formats
-                        match = (re.search(r'Attrecord processed: (\d+)', message) or 
-                                re.search(r'Processed: (\d+)', message) or 
-                                re.search(r'Saved: (\d+)', message))
-                        records_synced = int(match.group(1)) if match else 0
-                        
-                        # Add success notification
-                        self._add_notification(
-                            notification_type='sync_completed',
-                            device_name=device_name,
-                            message=f"Scheduled sync completed. {message}",
-                            timestamp=current_time,
-                            records_count=records_synced
-                        )
-                    else:
-                        logger.error(f"[{device_name}] Scheduled sync failed: {message}")
-                        # Add error notification
-                        self._add_notification(
-                            notification_type='sync_error',
-                            device_name=device_name,
-                            message=f"Scheduled sync failed: {message}",
-                            timestamp=current_time
-                        )
+                    self._notify_online_sync_result(device_name, success, message, current_time)
                     
                     # Update last sync time
                     last_sync_time = current_time
@@ -717,3 +984,17 @@ class StreamingService:
                 time.sleep(60)  # 1 minute before retry
         
         logger.info(f"[{device_name}] Online Attendance streaming stopped")
+
+
+# Singleton instance getter
+_streaming_instance = None
+_streaming_lock = threading.Lock()
+
+def get_streaming_service():
+    """Get singleton instance of StreamingService (one per process, shared by controllers)"""
+    global _streaming_instance
+    if _streaming_instance is None:
+        with _streaming_lock:
+            if _streaming_instance is None:
+                _streaming_instance = StreamingService()
+    return _streaming_instance
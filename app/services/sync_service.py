@@ -11,7 +11,7 @@ from config.config import Config
 from config.devices import (
     FINGERPRINT_DEVICES,
     determine_status,
-    get_status_display,
+    resolve_status_batch,
     get_device_display_name,
     get_zk_devices,
     get_fingerspot_api_devices,
@@ -19,6 +19,10 @@ from config.devices import (
 )
 from app.services.online_attendance_service import OnlineAttendanceService
 
+# ZK sync writes FPLog in chunks of this size; bulk_check_fplog_duplicates binds
+# 4 parameters per record and SQL Server allows at most 2100 per statement
+ZK_SYNC_CHUNK_SIZE = 500
+
 class SyncService:
     """Service for synchronizing FPLog data from multiple fingerprint devices"""
     
@@ -49,19 +53,7 @@ class SyncService:
             self.fingerspot_service = None
             print(f"Warning: Fingerspot service not available - Initialization error: {e}")
         
-        # Initialize attendance_queues table
-        self._initialize_attendance_queue_table()
-        
-    def _initialize_attendance_queue_table(self):
-        """Initialize attendance_queues table if it doesn't exist"""
-        try:
-            success, message = self.attendance_model.create_attendance_queues_table()
-            if success:
-                print("Attendance queue table initialized successfully")
-            else:
-                print(f"Warning: Could not initialize attendance queue table: {message}")
-        except Exception as e:
-            print(f"Error initializing attendance queue table: {e}")
+        # attendance_queues is created once by `flask init-db`
         
     def _check_pyzk_availability(self):
         """Check if pyzk module is available"""
@@ -161,80 +153,26 @@ class SyncService:
             self.sync_status[device_name]['status'] = 'reading'
             self.sync_status[device_name]['message'] = 'Reading attendance data...'
             
-            # Get attendance data
+            # Get attendance data (pyzk returns the whole dump as one list)
             attendances = conn.get_attendance()
+            conn.disconnect()
             
             if not attendances:
                 self.sync_status[device_name]['status'] = 'completed'
                 self.sync_status[device_name]['message'] = 'No new data found'
-                conn.disconnect()
                 return True, 'No new data found'
             
-            # Filter by date range if provided
-            filtered_data = []
-            for att in attendances:
-                if start_date and end_date:
-                    if start_date <= att.timestamp.date() <= end_date:
-                        filtered_data.append(att)
-                else:
-                    filtered_data.append(att)
-            
-            # Convert to FPLog format
-            fplog_data = []
-            
             # Get employee ATTID mapping
             print("Fetching employee ATTID mapping...")
             attid_mapping = self._get_employee_attid_mapping()
-            fpid_mapped_count = 0
             
-            for i, att in enumerate(filtered_data):
-                print(f"Processing attendance record {i+1}: {att}")
-                
-                # Get PIN from attendance record
-                pin = str(att.user_id).strip()
-                
-                # Get FPID from employee mapping (attid) based on PIN
-                fpid_value = attid_mapping.get(pin)
-                if fpid_value is not None:
-                    fpid_mapped_count += 1
-                    print(f"PIN {pin} mapped to ATTID {fpid_value}")
-                else:
-                    print(f"PIN {pin} not found in employees or attid is NULL")
-                
-                # Determine status using device-specific rules
-                device_status = determine_status(device_name, att.punch)
-                status_display = get_status_display(device_name, att.punch)
-                
-                print(f"Record {i+1}: PIN {pin}, Punch {att.punch} -> Status: {device_status} ({status_display})")
-                
-                # For device 201 (Fingerspot API), we need to preserve the original punch code
-                # Store original punch code in fpid for device 201, ATTID mapping in different way
-                if device_name == '201':
-                    print(f"   -> Device 201: Storing original punch code {att.punch} in fpid field")
-                    fplog_record = {
-                        'PIN': pin,
-                        'Date': att.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                        'Machine': device_name,
-                        'Status': device_status,
-                        'fpid': att.punch,  # Store original punch code for device 201
-                        'attid': fpid_value  # Store ATTID separately (could be used in comments or other field)
-                    }
-                else:
-                    fplog_record = {
-                        'PIN': pin,
-                        'Date': att.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                        'Machine': device_name,
-                        'Status': device_status,
-                        'fpid': fpid_value  # For other devices, use ATTID mapping
-                    }
-                
-                fplog_data.append(fplog_record)
-            
-            print(f"FPID mapped for {fpid_mapped_count} out of {len(fplog_data)} records")
+            # filter by date -> status/ATTID mapping -> chunks for the bulk writer
+            counts = {'records': 0, 'fpid_mapped': 0}
+            records = self._iter_zk_in_date_range(attendances, start_date, end_date)
+            chunks = (self._zk_fplog_chunk(device_name, chunk, attid_mapping, counts)
+                      for chunk in self._chunked(records, ZK_SYNC_CHUNK_SIZE))
             
-            conn.disconnect()
-            
-            return self._process_zk_fplog_data(device_name, fplog_data, fpid_mapped_count, start_date, end_date)
+            return self._process_zk_fplog_data(device_name, chunks, counts, start_date, end_date)
                 
         except Exception as e:
             error_msg = f"Error syncing ZK device {device_name}: {str(e)}"
@@ -261,7 +199,7 @@ class SyncService:
             self.sync_status[device_name]['status'] = 'connecting'
             self.sync_status[device_name]['message'] = 'Testing Fingerspot API connection...'
             
-            conn_success, conn_message = self.fingerspot_service.test_connection(device_config)
+            conn_success, conn_message = self.fingerspot_service.test_connection(device_config, use_cache=True)
             if not conn_success:
                 self.sync_status[device_name]['status'] = 'error'
                 self.sync_status[device_name]['message'] = conn_message
@@ -407,63 +345,97 @@ class SyncService:
                 self.sync_status[device_name]['end_time'] = datetime.now()
             print(f"DEBUG: Finally block executed for {device_name}. Final status: {self.sync_status[device_name]['status']}")
     
-    def _process_zk_fplog_data(self, device_name, fplog_data, fpid_mapped_count, start_date=None, end_date=None):
-        """Process fplog data for ZK devices with specific handling"""
-        if not fplog_data:
-            self.sync_status[device_name]['status'] = 'completed'
-            self.sync_status[device_name]['message'] = 'No data in date range'
-            return True, 'No data in specified date range'
-        
+    @staticmethod
+    def _iter_zk_in_date_range(attendances, start_date=None, end_date=None):
+        """Yield ZK attendance records inside the date range (all records without a range)"""
+        if not (start_date and end_date):
+            yield from attendances
+            return
+        for att in attendances:
+            if start_date <= att.timestamp.date() <= end_date:
+                yield att
+    
+    @staticmethod
+    def _zk_fplog_chunk(device_name, attendances, attid_mapping, counts):
+        """Convert a chunk of ZK attendance records to FPLog records (status and ATTID lookups), counting as it goes"""
+        # Determine status using device-specific rules, one batch lookup per chunk
+        statuses, _ = resolve_status_batch(device_name, [att.punch for att in attendances])
+        
+        fplog_records = []
+        for att, device_status in zip(attendances, statuses):
+            # Get PIN from attendance record
+            pin = str(att.user_id).strip()
+            
+            # Get FPID from employee mapping (attid) based on PIN
+            fpid_value = attid_mapping.get(pin)
+            counts['records'] += 1
+            if fpid_value is not None:
+                counts['fpid_mapped'] += 1
+            
+            fplog_record = {
+                'PIN': pin,
+                'Date': att.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                'Machine': device_name,
+                'Status': device_status,
+                'fpid': fpid_value  # For other devices, use ATTID mapping
+            }
+            
+            # For device 201 (Fingerspot API), we need to preserve the original punch code
+            # Store original punch code in fpid for device 201, ATTID mapping in different way
+            if device_name == '201':
+                fplog_record['fpid'] = att.punch
+                fplog_record['attid'] = fpid_value
+            
+            fplog_records.append(fplog_record)
+        return fplog_records
+    
+    @staticmethod
+    def _chunked(records, size):
+        """Group an iterable into lists of at most size items"""
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    
+    def _process_zk_fplog_data(self, device_name, chunks, counts, start_date=None, end_date=None):
+        """Process fplog data for ZK devices chunk by chunk (memory bounded by ZK_SYNC_CHUNK_SIZE)"""
         # === ZK Device Processing ===
-        self.sync_status[device_name]['status'] = 'processing'
-        self.sync_status[device_name]['message'] = f'Processing {len(fplog_data)} ZK device records...'
-        
-        # Add to Attendance Queue with ZK-specific processing
-        # self.sync_status[device_name]['status'] = 'queuing'
-        # self.sync_status[device_name]['message'] = f'Adding {len(fplog_data)} ZK records to attendance queue with duplicate check...'
-        
-        # Prepare queue records for ZK devices
-        # queue_records = []
-        # for fplog_record in fplog_data:
-        #     queue_record = {
-        #         'pin': fplog_record['PIN'],
-        #         'date': fplog_record['Date'],
-        #         'status': 'baru',  # Default status for ZK devices
-        #         'machine': fplog_record['Machine'],
-        #         'punch_code': fplog_record.get('Status', None),
-        #         'source_type': 'zk'  # Mark as ZK source
-        #     }
-        #     queue_records.append(queue_record)
-        
-        # # Add to attendance queue with enhanced duplicate check
-        # queue_success, queue_message = self.attendance_model.bulk_add_to_attendance_queue_if_not_duplicate(queue_records)
-        # if not queue_success:
-        #     print(f"Warning: Failed to add ZK records to attendance queue: {queue_message}")
-        # else:
-        #     print(f"Successfully added ZK records to attendance queue with duplicate check: {queue_message}")
-        
-        # Sync to SQL Server FPLog with ZK-specific processing and duplicate check
         self.sync_status[device_name]['status'] = 'syncing'
-        self.sync_status[device_name]['message'] = f'Syncing {len(fplog_data)} ZK records to FPLog table with duplicate check...'
+        self.sync_status[device_name]['message'] = 'Syncing ZK records to FPLog table with duplicate check...'
         
-        # Pass date range and device type to sync method with duplicate check
-        success, message = self.attendance_model.sync_fplog_to_sqlserver_with_duplicate_check(
-            fplog_data, 
-            start_date.strftime('%Y-%m-%d') if start_date else None,
-            end_date.strftime('%Y-%m-%d') if end_date else None
-        )
-        
-        if success:
+        total_inserted = 0
+        total_duplicates = 0
+        for chunk_number, chunk in enumerate(chunks, 1):
+            # Sync to SQL Server FPLog with ZK-specific processing and duplicate check
+            success, message, inserted, duplicates = self.attendance_model.sync_fplog_batch_with_duplicate_check(chunk)
+            if not success:
+                self.sync_status[device_name]['status'] = 'error'
+                error_message = f"ZK Device sync failed: {message} (after {total_inserted} records inserted)"
+                self.sync_status[device_name]['message'] = error_message
+                return False, error_message
+            
+            total_inserted += inserted
+            total_duplicates += duplicates
+            self.sync_status[device_name]['records_synced'] = counts['records']
+            self.sync_status[device_name]['message'] = f'Syncing ZK records to FPLog table: {counts["records"]} processed...'
+            print(f"[{device_name}] Chunk {chunk_number}: {len(chunk)} records, {inserted} inserted, "
+                  f"{duplicates} duplicates, FPID mapped so far {counts['fpid_mapped']}/{counts['records']}")
+        
+        if not counts['records']:
             self.sync_status[device_name]['status'] = 'completed'
-            enhanced_message = f"{message} - ZK Device - FPID mapped for {fpid_mapped_count} records"
-            self.sync_status[device_name]['message'] = enhanced_message
-            self.sync_status[device_name]['records_synced'] = len(fplog_data)
-            return True, enhanced_message
-        else:
-            self.sync_status[device_name]['status'] = 'error'
-            error_message = f"ZK Device sync failed: {message}"
-            self.sync_status[device_name]['message'] = error_message
-            return False, error_message
+            self.sync_status[device_name]['message'] = 'No data in date range'
+            return True, 'No data in specified date range'
+        
+        self.sync_status[device_name]['status'] = 'completed'
+        enhanced_message = (f"Successfully synced {total_inserted} new records (skipped {total_duplicates} duplicates)"
+                            f" - ZK Device - FPID mapped for {counts['fpid_mapped']} records")
+        self.sync_status[device_name]['message'] = enhanced_message
+        self.sync_status[device_name]['records_synced'] = counts['records']
+        return True, enhanced_message
     
     def _process_fingerspot_fplog_data(self, device_name, fplog_data, fpid_mapped_count, start_date=None, end_date=None):
         """Process fplog data for Fingerspot API devices with specific handling"""
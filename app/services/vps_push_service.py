@@ -11,10 +11,18 @@ from typing import Dict, List, Any, Optional, Tuple
 from config.database import db_manager
 from config.config import Config
 from config.logging_config import get_background_logger
+from app.services.punch_tracing import get_punch_tracer
+from app.utils import metrics
+from app.utils.lazy import LazyInstance
 
 # Setup logging
 logger = get_background_logger('VPSPushService', 'logs/vps_push_service.log')
 
+VPS_PUSH_SECONDS = metrics.histogram('attendance_vps_push_seconds', 'VPS push request latency', ['kind', 'outcome'])
+VPS_PUSH_RECORDS = metrics.counter('attendance_vps_push_records_total', 'Records accepted by the VPS', ['kind'])
+VPS_PUSH_BYTES = metrics.counter('attendance_vps_push_bytes_total', 'Request body bytes sent to the VPS', ['kind'])
+VPS_PUSH_RETRIES = metrics.counter('attendance_vps_push_retries_total', 'VPS push attempts after the first', ['kind'])
+
 class VPSPushService:
     """Service untuk mengirim data AttRecord ke VPS"""
     
@@ -32,6 +40,35 @@ class VPSPushService:
         # Validate configuration
         self._validate_config()
     
+    def _post(self, kind, url, payload, headers, attempt, record_count, **kwargs):
+        """POST a JSON payload to the VPS and record push metrics"""
+        body = json.dumps(payload, allow_nan=False).encode('utf-8')
+        VPS_PUSH_BYTES.inc(len(body), kind=kind)
+        if attempt > 1:
+            VPS_PUSH_RETRIES.inc(kind=kind)
+        
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            response = requests.post(url, data=body, headers=headers, timeout=self.timeout, **kwargs)
+            outcome = str(response.status_code)
+            if response.status_code in (200, 201):
+                VPS_PUSH_RECORDS.inc(record_count, kind=kind)
+            return response
+        finally:
+            VPS_PUSH_SECONDS.observe(time.perf_counter() - started, kind=kind, outcome=outcome)
+    
+    @staticmethod
+    def _trace_attrecord_ack(data):
+        """Mark traced punches whose attrecord rows the VPS accepted"""
+        pins_by_date = {}
+        for record in data:
+            if record.get('pin') and record.get('tgl'):
+                pins_by_date.setdefault(record['tgl'][:10], set()).add(record['pin'])
+        tracer = get_punch_tracer()
+        for date_str, pins in pins_by_date.items():
+            tracer.mark_date(pins, date_str, 'vps_ack')
+    
     def _validate_config(self):
         """Validate VPS configuration"""
         if not self.push_enabled:
@@ -223,11 +260,8 @@ class VPSPushService:
                 print(f"📤 Attempt {attempt}/{self.retry_count}: Pushing {len(data)} records to VPS...")
                 logger.info(f"Pushing {len(data)} records to VPS (attempt {attempt}/{self.retry_count})")
                 
-                response = requests.post(
-                    endpoint,
-                    json=payload,
-                    headers=headers,
-                    timeout=self.timeout,
+                response = self._post(
+                    'attrecord', endpoint, payload, headers, attempt, len(data),
                     verify=True  # Verify SSL certificates
                 )
                 
@@ -238,6 +272,7 @@ class VPSPushService:
                 
                 # Check response
                 if response.status_code == 200:
+                    self._trace_attrecord_ack(data)
                     print("✅ SUCCESS: Data pushed successfully!")
                     logger.info(f"Successfully pushed {len(data)} records to VPS")
                     logger.info(f"VPS Response: {response.text}")
@@ -655,11 +690,8 @@ class VPSPushService:
                     print(f"📤 Attempt {attempt}/{self.retry_count}: Pushing {len(data)} WorkingHours records to VPS...")
                     logger.info(f"Pushing {len(data)} WorkingHours records to VPS (attempt {attempt}/{self.retry_count})")
                     
-                    response = requests.post(
-                        endpoint,
-                        json=payload,
-                        headers=headers,
-                        timeout=self.timeout,
+                    response = self._post(
+                        'workinghours', endpoint, payload, headers, attempt, len(data),
                         verify=True
                     )
                     
@@ -1006,14 +1038,12 @@ class VPSPushService:
             # Try to push with retry logic
             for attempt in range(self.retry_count):
                 try:
-                    response = requests.post(
-                        url,
-                        json=payload,
-                        headers=headers,
-                        timeout=self.timeout
-                    )
+                    response = self._post('fplog', url, payload, headers, attempt + 1, len(data))
                     
                     if response.status_code == 200 or response.status_code == 201:
+                        get_punch_tracer().mark_many(
+                            [(record.get('PIN', ''), record.get('Date', '')) for record in data], 'vps_ack'
+                        )
                         logger.info(f"Successfully pushed {len(data)} FPLog records to VPS")
                         return True, f"Successfully pushed {len(data)} FPLog records to VPS"
                     else:
@@ -1094,4 +1124,4 @@ class VPSPushService:
             }
 
 # Global VPS push service instance
-vps_push_service = VPSPushService()
\ No newline at end of file
+vps_push_service = LazyInstance(VPSPushService)
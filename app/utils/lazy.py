@@ -0,0 +1,58 @@
+"""
+Lazy per-process instances for controllers and services.
+
+LazyInstance stands in for a module-level instance: the target module is
+imported and the object constructed on first attribute access, so importing
+app.routes (and therefore create_app) does not pull in pandas, pyzk or the
+device services, and does not touch the database.
+"""
+
+import importlib
+import threading
+
+
+class LazyInstance:
+    """Proxy that builds 'package.module:Factory' (or a callable) on first use;
+    'package.module:name' may also name another LazyInstance"""
+
+    def __init__(self, target):
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, '_instance', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def _build(self):
+        """Import and construct the instance (once per process)"""
+        target = self._target
+        if isinstance(target, str):
+            module_name, _, attr = target.partition(':')
+            target = getattr(importlib.import_module(module_name), attr)
+            if isinstance(target, LazyInstance):
+                # Module-level lazy instance: share it instead of building a second one
+                return target.get()
+        return target()
+
+    def get(self):
+        """Get the real instance, constructing it if needed"""
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                instance = self._instance
+                if instance is None:
+                    instance = self._build()
+                    object.__setattr__(self, '_instance', instance)
+        return instance
+
+    @property
+    def is_loaded(self):
+        """Whether the instance has been constructed"""
+        return self._instance is not None
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.get(), name, value)
+
+    def __repr__(self):
+        state = 'loaded' if self.is_loaded else 'not loaded'
+        return f"<LazyInstance {self._target!r} ({state})>"
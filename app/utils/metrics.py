@@ -0,0 +1,240 @@
+"""
+In-process metrics
+Counters, gauges and histograms rendered in the Prometheus text exposition
+format by the /metrics endpoint.
+
+Metrics are module-level objects created once (get-or-create by name) and
+updated from any thread; each metric keeps its series in a dict keyed by
+label values behind its own lock, so an update is a dict lookup and an add.
+Values are per process: with several workers, scrape each one or read the
+process that holds the relevant leader role.
+"""
+
+import bisect
+import threading
+import time
+from functools import wraps
+
+# Seconds; covers sub-millisecond inserts up to multi-minute stored procedures
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _escape(value):
+    """Escape a label value"""
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=None):
+    """{a="1",b="2"} (empty string when there are no labels)"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    """Number in exposition format"""
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base class: name, help text and label handling"""
+
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def _key(self, labels):
+        """Label values in labelnames order"""
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        """Exposition lines for this metric"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self):
+        with self.lock:
+            items = list(self.series.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        """Add amount to the series for labels"""
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def get(self, **labels):
+        """Current value of one series"""
+        with self.lock:
+            return self.series.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, or is read from a callback at scrape time"""
+
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        # callback() -> {label values tuple: value}, evaluated on render
+        self.callback = callback
+
+    def set(self, value, **labels):
+        """Set the series for labels"""
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = value
+
+    def inc(self, amount=1, **labels):
+        """Add amount to the series for labels"""
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        """Subtract amount from the series for labels"""
+        self.inc(-amount, **labels)
+
+    def _samples(self):
+        if self.callback:
+            values = self.callback() or {}
+            with self.lock:
+                self.series = {tuple(str(v) for v in key): value for key, value in values.items()}
+        return super()._samples()
+
+
+class Histogram(_Metric):
+    """Distribution of observations in cumulative buckets"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        """Record one observation"""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.series.get(key)
+            if state is None:
+                # [per-bucket counts (+Inf last), sum, count]
+                state = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        """Context manager that observes the elapsed seconds"""
+        return _Timer(self, labels)
+
+    def timed(self, **labels):
+        """Decorator that observes the function's duration"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with _Timer(self, labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _samples(self):
+        with self.lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self.series.items()]
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(float(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class _Timer:
+    """Measures a block with perf_counter and observes it on exit"""
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self.started
+        self.histogram.observe(self.elapsed, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """Named metrics of this process"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as {metric.type_name}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        """Get or create a counter"""
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        """Get or create a gauge"""
+        return self._get_or_create(Gauge, name, documentation, labelnames, callback=callback)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """Get or create a histogram"""
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        """All metrics in text exposition format"""
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # One failing callback (e.g. database down) must not break the scrape
+                lines.append(f"# {metric.name} unavailable: {_escape(e)}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+counter = registry.counter
+gauge = registry.gauge
+histogram = registry.histogram
@@ -9,11 +9,16 @@ import threading
 from datetime import datetime, timedelta
 from collections import defaultdict
 from app.models.attendance import AttendanceModel
+from app.utils import metrics
 from config.logging_config import get_worker_logger
 
 # Setup logging with Unicode support
 logger = get_worker_logger()
 
+WORKER_BATCH_SECONDS = metrics.histogram(
+    'attendance_worker_batch_seconds', 'Duration of one attendance queue processing run', ['mode']
+)
+
 class AttendanceWorker:
     """Worker untuk memproses antrian absensi dan menjalankan prosedur SQL"""
     
@@ -35,6 +40,7 @@ class AttendanceWorker:
             except Exception as e:
                 logger.error(f"Error in activity callback: {str(e)}")
         
+    @WORKER_BATCH_SECONDS.timed(mode='scheduled')
     def process_attendance_queue(self):
         """Memproses antrian absensi dengan status 'baru'"""
         try:
@@ -176,6 +182,7 @@ class AttendanceWorker:
         
         logger.info("[STOP] Attendance Worker dihentikan")
     
+    @WORKER_BATCH_SECONDS.timed(mode='filtered')
     def process_attendance_queue_with_filters(self, start_date=None, end_date=None, pins_filter=None):
         """Memproses antrian absensi dengan filter tanggal dan PINs"""
         result = {
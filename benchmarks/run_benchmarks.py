@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark suite
+Runs the ingest, sync, worker, attrecord and reporting paths against a
+SQLite stand-in for SQL Server (benchmarks/standin_db.py) with a seeded
+synthetic workload (benchmarks/workload.py), and stores the results so
+commits can be compared.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--employees N] [--devices M] [--days D]
+        [--gagal-rate R] [--scenarios a,b] [--repeat N] [--rtt-ms MS]
+        [--no-memory] [--compare FILE|latest] [--threshold PCT]
+
+Scenarios:
+    streaming_ingest   StreamingService.process_attendance_batch, batches of 50 ZK punches
+    bulk_sync          AttendanceModel.sync_fplog_batch_with_duplicate_check in ZK sync chunks
+    queue_worker       AttendanceWorker.process_attendance_queue_with_filters over a full queue
+    attrecord_engine   AttendanceRecordProcessor.process (Python attrecord engine)
+    report_pagination  AttendanceReportModel pages, filtered pages, summary and filter options
+    report_export      AttendanceReportModel.export_to_excel
+    legacy_export      LegacyAttendanceService.export_legacy_attendance_to_csv
+
+Each scenario reports wall time (median of --repeat runs), throughput,
+database round trips, connections and rows fetched, the top statements and,
+in a separate traced run, peak Python memory (tracemalloc). Round trips do
+not depend on the machine, so they are the most reliable regression signal;
+--rtt-ms adds a per-round-trip delay to approximate a remote SQL Server.
+
+Results are written to benchmarks/results/<timestamp>-<commit>.json. With
+--compare the run is compared to a previous result file (or the latest one)
+and the exit code is non-zero when a scenario regressed by more than
+--threshold percent. Scenarios whose optional dependency (pandas, openpyxl,
+schedule) is missing are skipped.
+"""
+
+import argparse
+import contextlib
+import gc
+import glob
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import datetime
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(PROJECT_DIR, 'benchmarks', 'results')
+
+STREAMING_BATCH_SIZE = 50
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _check(ok, message):
+    if not ok:
+        raise RuntimeError(message)
+
+
+# === Scenarios ===
+# Each scenario is (requires, setup(ctx) -> state, run(ctx, state) -> items processed).
+# setup restores the tables the scenario reads or writes, so every run starts equal.
+
+def setup_streaming_ingest(ctx):
+    from app.services.streaming_service import StreamingService
+    ctx.db.truncate('FPLog', 'attendance_queues')
+    return StreamingService(), ctx.workload.zk_items()
+
+
+def run_streaming_ingest(ctx, state):
+    service, items = state
+    for batch in _chunks(items, STREAMING_BATCH_SIZE):
+        service.process_attendance_batch(batch)
+    _check(ctx.db.count('FPLog') > 0, "No FPLog rows written")
+    return len(items)
+
+
+def setup_bulk_sync(ctx):
+    from app.models.attendance import AttendanceModel
+    ctx.db.truncate('FPLog')
+    return AttendanceModel()
+
+
+def run_bulk_sync(ctx, model):
+    from app.services.sync_service import ZK_SYNC_CHUNK_SIZE
+    for chunk in _chunks(ctx.fplog_rows, ZK_SYNC_CHUNK_SIZE):
+        success, message, _, _ = model.sync_fplog_batch_with_duplicate_check(chunk)
+        _check(success, message)
+    return len(ctx.fplog_rows)
+
+
+def setup_queue_worker(ctx):
+    from app.workers.attendance_worker import AttendanceWorker
+    ctx.db.load_queue(ctx.fplog_rows)
+    return AttendanceWorker()
+
+
+def run_queue_worker(ctx, worker):
+    result = worker.process_attendance_queue_with_filters()
+    _check(result['success'], result['summary'])
+    return result['total_processed']
+
+
+def setup_attrecord_engine(ctx):
+    from app.services.attrecord_service import AttendanceRecordProcessor
+    ctx.db.load_fplog(ctx.fplog_rows)
+    ctx.db.truncate('attrecords')
+    return AttendanceRecordProcessor('DRIVER=stand-in')
+
+
+def run_attrecord_engine(ctx, processor):
+    result = processor.process(ctx.workload.start_date, ctx.workload.end_date)
+    _check(result['status'] == 'success', result['message'])
+    return result['records_inserted']
+
+
+def setup_report_pagination(ctx):
+    from app.models.attendance_report import AttendanceReportModel
+    ctx.db.load_attrecords(ctx.attrecord_rows)
+    return AttendanceReportModel()
+
+
+def run_report_pagination(ctx, model):
+    date_range = {'start_date': str(ctx.workload.start_date), 'end_date': str(ctx.workload.end_date)}
+    rows = 0
+    for filters in (date_range, dict(date_range, lokasi='P1'), dict(date_range, keterangan='Terlambat')):
+        for page in range(1, 11):
+            data, total, pages = model.get_attendance_data(filters, page=page, per_page=50)
+            rows += len(data)
+            if page >= pages:
+                break
+    _check(rows > 0, "No report rows returned")
+    _check(model.get_summary_stats(date_range), "Summary failed")
+    model.get_filter_options()
+    return rows
+
+
+def setup_report_export(ctx):
+    from app.models.attendance_report import AttendanceReportModel
+    ctx.db.load_attrecords(ctx.attrecord_rows)
+    return AttendanceReportModel()
+
+
+def run_report_export(ctx, model):
+    output = model.export_to_excel({})
+    _check(output is not None, "Excel export failed")
+    return len(ctx.attrecord_rows)
+
+
+def setup_legacy_export(ctx):
+    from app.services.legacy_attendance_service import LegacyAttendanceService
+    ctx.db.load_fplog(ctx.fplog_rows)
+    return LegacyAttendanceService()
+
+
+def run_legacy_export(ctx, service):
+    success, csv_data, _, message = service.export_legacy_attendance_to_csv(
+        str(ctx.workload.start_date), str(ctx.workload.end_date)
+    )
+    _check(success, message)
+    # The CSV is streamed in chunks; drain them so the whole export is measured
+    return sum(chunk.count(b'\n') for chunk in csv_data) - 1
+
+
+SCENARIOS = {
+    'streaming_ingest': ((), setup_streaming_ingest, run_streaming_ingest),
+    'bulk_sync': ((), setup_bulk_sync, run_bulk_sync),
+    'queue_worker': (('schedule',), setup_queue_worker, run_queue_worker),
+    'attrecord_engine': (('pandas',), setup_attrecord_engine, run_attrecord_engine),
+    'report_pagination': ((), setup_report_pagination, run_report_pagination),
+    'report_export': (('pandas', 'openpyxl'), setup_report_export, run_report_export),
+    'legacy_export': ((), setup_legacy_export, run_legacy_export),
+}
+
+
+class BenchmarkContext:
+    """Workload, stand-in database and the derived row sets shared by the scenarios"""
+
+    def __init__(self, workload, db):
+        from config.devices import resolve_status
+        self.workload = workload
+        self.db = db
+        self.fplog_rows = workload.fplog_rows(resolve_status)
+        self.attrecord_rows = workload.attrecord_rows()
+
+
+# === Measurement ===
+
+def _missing_modules(modules):
+    import importlib.util
+    return [name for name in modules if importlib.util.find_spec(name) is None]
+
+
+@contextlib.contextmanager
+def _quiet(verbose):
+    """Silence the services' logging (errors excepted) and print() output during a run"""
+    if verbose:
+        yield
+        return
+    logging.disable(logging.WARNING)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+            # pandas warns that the stand-in is not an SQLAlchemy connection
+            warnings.simplefilter('ignore')
+            yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def run_scenario(ctx, name, repeat, memory, verbose):
+    """Timed runs plus an optional traced run; returns the result dict"""
+    from config.database import statement_stats
+    requires, setup, run = SCENARIOS[name]
+    missing = _missing_modules(requires)
+    if missing:
+        return {'skipped': f"missing {', '.join(missing)}"}
+
+    timings = []
+    items = 0
+    try:
+        with _quiet(verbose):
+            for _ in range(repeat):
+                state = setup(ctx)
+                ctx.db.reset_counters()
+                statement_stats.reset()
+                gc.collect()
+                started = time.perf_counter()
+                items = run(ctx, state)
+                timings.append(time.perf_counter() - started)
+            counters = ctx.db.snapshot()
+            statements = statement_stats.top(5)
+
+            peak = None
+            if memory:
+                state = setup(ctx)
+                gc.collect()
+                tracemalloc.start()
+                try:
+                    run(ctx, state)
+                    peak = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+    except Exception as e:
+        return {'error': f"{type(e).__name__}: {e}"}
+
+    wall = statistics.median(timings)
+    return {
+        'items': items,
+        'wall_seconds': round(wall, 4),
+        'wall_seconds_runs': [round(t, 4) for t in timings],
+        'items_per_second': round(items / wall, 1) if wall else None,
+        'round_trips': counters['round_trips'],
+        'round_trips_per_item': round(counters['round_trips'] / items, 3) if items else None,
+        'connections': counters['connections'],
+        'rows_fetched': counters['rows_fetched'],
+        'procedure_calls': counters['procedure_calls'],
+        'peak_memory_bytes': peak,
+        'top_statements': [
+            {'statement': s['statement'][:300], 'calls': s['calls'], 'total_seconds': round(s['total_seconds'], 4),
+             'rows': s['rows']}
+            for s in statements
+        ],
+    }
+
+
+# === Results ===
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], cwd=PROJECT_DIR, capture_output=True, text=True,
+                              timeout=30).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_metadata(args, workload):
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': _git('rev-parse', 'HEAD'),
+        'git_branch': _git('rev-parse', '--abbrev-ref', 'HEAD'),
+        'git_dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'workload': workload.describe(),
+        'options': {'repeat': args.repeat, 'rtt_ms': args.rtt_ms, 'procedure_ms': args.procedure_ms},
+    }
+
+
+def save_results(results, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    commit = (results['meta']['git_commit'] or 'nogit')[:10]
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(output_dir, f"{stamp}-{commit}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, default=str)
+    return path
+
+
+def latest_result(output_dir, exclude=None):
+    paths = sorted(p for p in glob.glob(os.path.join(output_dir, '*.json')) if p != exclude)
+    return paths[-1] if paths else None
+
+
+def _change(new, old):
+    if new is None or not old:
+        return None
+    return (new - old) * 100.0 / old
+
+
+def compare_results(current, baseline, threshold):
+    """Print per-scenario deltas; returns the list of regressions"""
+    meta = baseline['meta']
+    print(f"\nCompared with {(meta.get('git_commit') or '?')[:10]} ({meta.get('timestamp')}), "
+          f"threshold {threshold:.0f}%")
+    if meta.get('workload') != current['meta']['workload']:
+        print("  [WARN] Workloads differ; deltas are not comparable")
+    if meta.get('options') != current['meta']['options']:
+        print("  [WARN] Options differ (repeat/rtt_ms/procedure_ms)")
+
+    regressions = []
+    fields = (('wall_seconds', 'time'), ('round_trips', 'round trips'), ('peak_memory_bytes', 'memory'))
+    for name, result in current['scenarios'].items():
+        old = baseline['scenarios'].get(name)
+        if not old or 'wall_seconds' not in old or 'wall_seconds' not in result:
+            continue
+        parts = []
+        for field, label in fields:
+            delta = _change(result.get(field), old.get(field))
+            if delta is None:
+                continue
+            parts.append(f"{label} {delta:+.1f}%")
+            if delta > threshold:
+                regressions.append(f"{name}: {label} {old[field]} -> {result[field]} ({delta:+.1f}%)")
+        print(f"  {name:<18} {', '.join(parts)}")
+    return regressions
+
+
+def print_results(results):
+    print(f"{'scenario':<18} {'items':>8} {'wall s':>9} {'items/s':>10} {'trips':>8} {'trips/item':>10} {'peak MB':>8}")
+    for name, result in results['scenarios'].items():
+        if 'skipped' in result or 'error' in result:
+            print(f"{name:<18} {'SKIPPED: ' + result['skipped'] if 'skipped' in result else 'ERROR: ' + result['error']}")
+            continue
+        peak = result['peak_memory_bytes']
+        print(f"{name:<18} {result['items']:>8} {result['wall_seconds']:>9.3f} {result['items_per_second'] or 0:>10.1f} "
+              f"{result['round_trips']:>8} {result['round_trips_per_item'] or 0:>10.2f} "
+              f"{(peak / 1048576 if peak is not None else 0):>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--employees', type=int, default=500)
+    parser.add_argument('--devices', type=int, default=4)
+    parser.add_argument('--days', type=int, default=3)
+    parser.add_argument('--gagal-rate', type=float, default=0.01, help='Share of scans that end up in gagalabsens')
+    parser.add_argument('--duplicate-rate', type=float, default=0.02, help='Share of scans that are double taps')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma-separated scenario names')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per scenario (median is reported)')
+    parser.add_argument('--rtt-ms', type=float, default=0.0, help='Delay per database round trip')
+    parser.add_argument('--procedure-ms', type=float, default=0.0, help='Extra delay per stored procedure call')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc run')
+    parser.add_argument('--output-dir', default=RESULTS_DIR)
+    parser.add_argument('--no-save', action='store_true')
+    parser.add_argument('--compare', help="Result file to compare with, or 'latest'")
+    parser.add_argument('--threshold', type=float, default=15.0, help='Regression threshold in percent')
+    parser.add_argument('--verbose', action='store_true', help='Keep service logging and print output')
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+    baseline_path = latest_result(args.output_dir) if args.compare == 'latest' else args.compare
+    baseline_path = os.path.abspath(baseline_path) if baseline_path else None
+    if args.compare and not baseline_path:
+        parser.error("No previous result to compare with")
+    output_dir = os.path.abspath(args.output_dir)
+
+    # Logs, the punch spool and the database stay out of the working tree
+    workdir = tempfile.mkdtemp(prefix='attendance-bench-')
+    os.chdir(workdir)
+    sys.path.insert(0, PROJECT_DIR)
+    os.environ.setdefault('FLASK_ENV', 'testing')
+    os.environ.setdefault('LEADER_ELECTION', 'off')
+
+    from benchmarks.standin_db import StandInDatabase
+    from benchmarks.workload import SyntheticWorkload
+
+    workload = SyntheticWorkload(employees=args.employees, devices=args.devices, days=args.days,
+                                 gagal_rate=args.gagal_rate, duplicate_rate=args.duplicate_rate, seed=args.seed)
+    db = StandInDatabase(workdir, rtt_ms=args.rtt_ms, procedure_ms=args.procedure_ms)
+    db.load_master_data(workload)
+    ctx = BenchmarkContext(workload, db)
+    described = workload.describe()
+    print(f"Workload: {described['employees']} employees, {len(described['devices'])} devices, "
+          f"{described['days']} days, {described['punches']} punches, {described['gagalabsens']} gagalabsens "
+          f"(work dir {workdir})")
+
+    results = {'meta': run_metadata(args, workload), 'scenarios': {}}
+    with db.installed():
+        for name in names:
+            print(f"  running {name}...", flush=True)
+            results['scenarios'][name] = run_scenario(ctx, name, args.repeat, not args.no_memory, args.verbose)
+
+    print()
+    print_results(results)
+    if not args.no_save:
+        path = save_results(results, output_dir)
+        print(f"\nResults saved to {path}")
+
+    failed = any('error' in result for result in results['scenarios'].values())
+    if baseline_path:
+        with open(baseline_path, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"[REGRESSION] {regression}")
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
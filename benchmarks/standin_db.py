@@ -0,0 +1,311 @@
+"""
+SQL Server stand-in
+A SQLite database behind a pyodbc-shaped connect(), so the real models and
+services run unchanged in the benchmarks.
+
+Statements are translated from the T-SQL the application uses (CONVERT,
+ISNULL, GETDATE, @@IDENTITY, OFFSET/FETCH) to SQLite, stored procedures
+(attrecord, spJamkerja) are no-ops, and result values that look like dates
+come back as date/datetime like pyodbc returns them. Every execute counts
+as one round trip; rtt_ms/procedure_ms add a fixed delay per round trip and
+per procedure call to model a remote server.
+
+It is a stand-in for throughput and round-trip comparisons between commits,
+not a SQL Server emulator: absolute timings differ from production.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from functools import lru_cache
+
+from benchmarks.workload import DEPARTMENTS
+
+sqlite3.register_adapter(datetime, lambda value: value.strftime('%Y-%m-%d %H:%M:%S'))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+
+SCHEMA = """
+CREATE TABLE departments (id INTEGER PRIMARY KEY, deptname TEXT);
+CREATE TABLE employees (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, pin TEXT, attid INTEGER, eid TEXT, name TEXT,
+    jabatan TEXT, lokasi TEXT, shift TEXT, department INTEGER, status TEXT
+);
+CREATE INDEX idx_employees_pin ON employees (pin);
+CREATE TABLE FPLog (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, PIN TEXT, Date TEXT, Machine TEXT, Status TEXT, fpid INTEGER
+);
+CREATE INDEX idx_fplog_pin_date ON FPLog (PIN, Date);
+CREATE INDEX idx_fplog_date ON FPLog (Date);
+CREATE TABLE gagalabsens (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, pin TEXT, tgl TEXT, machine TEXT, status TEXT,
+    created_at TEXT, updated_at TEXT
+);
+CREATE INDEX idx_gagalabsens_tgl ON gagalabsens (tgl);
+CREATE TABLE attendance_queues (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, pin TEXT NOT NULL, date TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'baru', machine TEXT, punch_code INTEGER,
+    created_at TEXT DEFAULT (datetime('now', 'localtime')),
+    updated_at TEXT DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX idx_pin_attendance_queues ON attendance_queues (pin);
+CREATE INDEX idx_status_attendance_queues ON attendance_queues (status);
+CREATE TABLE attrecords (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, tgl TEXT, fpid INTEGER, pin TEXT, name TEXT,
+    jabatan TEXT, lokasi TEXT, deptname TEXT, masuk TEXT, keluar TEXT, shift TEXT,
+    created_at TEXT DEFAULT (datetime('now', 'localtime')),
+    updated_at TEXT DEFAULT (datetime('now', 'localtime')),
+    keterangan TEXT, masuk_produksi TEXT, keluar_produksi TEXT
+);
+CREATE INDEX idx_attrecords_tgl ON attrecords (tgl);
+CREATE INDEX idx_attrecords_pin ON attrecords (pin);
+"""
+
+TABLES = ('departments', 'employees', 'FPLog', 'gagalabsens', 'attendance_queues', 'attrecords')
+
+_PROCEDURE = re.compile(r"^\s*EXEC\s+(?:\[?dbo\]?\.)?\[?(\w+)\]?", re.IGNORECASE)
+
+# (pattern, replacement) applied in order
+_TRANSLATIONS = [
+    (re.compile(r"CONVERT\(\s*varchar\(16\)\s*,\s*([^,()]+|\?)\s*,\s*120\s*\)", re.IGNORECASE), r"SUBSTR(\1, 1, 16)"),
+    (re.compile(r"CONVERT\(\s*VARCHAR\s*,\s*((?:MIN|MAX)\([^()]*\))\s*,\s*8\s*\)", re.IGNORECASE), r"TIME(\1)"),
+    (re.compile(r"CONVERT\(\s*DATE\s*,\s*([^()]+?)\s*\)", re.IGNORECASE), r"DATE(\1)"),
+    (re.compile(r"\bISNULL\(", re.IGNORECASE), "IFNULL("),
+    (re.compile(r"\bGETDATE\(\)", re.IGNORECASE), "datetime('now', 'localtime')"),
+    (re.compile(r"@@IDENTITY", re.IGNORECASE), "last_insert_rowid()"),
+    # OFFSET ? ROWS FETCH NEXT ? ROWS ONLY binds (offset, count), like SQLite's LIMIT offset, count
+    (re.compile(r"OFFSET\s+(\?|\d+)\s+ROWS\s+FETCH\s+NEXT\s+(\?|\d+)\s+ROWS\s+ONLY", re.IGNORECASE), r"LIMIT \1, \2"),
+    (re.compile(r"\[dbo\]\.", re.IGNORECASE), ""),
+]
+
+_DATETIME_VALUE = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$")
+_DATE_VALUE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_COMPACT_DATE = re.compile(r"^(19|20)\d{2}(0[1-9]|1[0-2])(0[1-9]|[12]\d|3[01])$")
+
+
+@lru_cache(maxsize=1024)
+def translate(sql):
+    """T-SQL statement -> SQLite statement"""
+    for pattern, replacement in _TRANSLATIONS:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+def _param(value):
+    """pyodbc-style parameter -> SQLite (YYYYMMDD date strings become YYYY-MM-DD)"""
+    if isinstance(value, str) and len(value) == 8 and _COMPACT_DATE.match(value):
+        return f"{value[:4]}-{value[4:6]}-{value[6:]}"
+    return value
+
+
+def _value(value):
+    """Result value -> the type pyodbc returns for DATE/DATETIME columns"""
+    if isinstance(value, str):
+        if len(value) == 19 and _DATETIME_VALUE.match(value):
+            return datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+        if len(value) == 10 and _DATE_VALUE.match(value):
+            return date.fromisoformat(value)
+    return value
+
+
+class StandInCursor:
+    """pyodbc-like cursor over a SQLite cursor"""
+
+    def __init__(self, database, cursor):
+        self._database = database
+        self._cursor = cursor
+        self.rowcount = -1
+        self.description = None
+
+    def execute(self, sql, *params):
+        if len(params) == 1 and isinstance(params[0], (list, tuple)):
+            params = params[0]
+        procedure = _PROCEDURE.match(sql)
+        if procedure:
+            self._database.round_trip(procedure=procedure.group(1))
+            self.rowcount = -1
+            self.description = None
+            return self
+        self._database.round_trip()
+        self._cursor.execute(translate(sql), [_param(p) for p in params])
+        self.rowcount = self._cursor.rowcount
+        self.description = self._cursor.description
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._database.round_trip()
+        self._cursor.executemany(translate(sql), [[_param(p) for p in params] for params in seq_of_params])
+        self.rowcount = self._cursor.rowcount
+        self.description = None
+        return self
+
+    def _convert(self, row):
+        return tuple(_value(v) for v in row)
+
+    def fetchone(self):
+        if self.description is None:
+            return None
+        row = self._cursor.fetchone()
+        if row is None:
+            return None
+        self._database.add_rows(1)
+        return self._convert(row)
+
+    def fetchall(self):
+        if self.description is None:
+            return []
+        rows = [self._convert(row) for row in self._cursor.fetchall()]
+        self._database.add_rows(len(rows))
+        return rows
+
+    def fetchmany(self, size=None):
+        if self.description is None:
+            return []
+        rows = [self._convert(row) for row in self._cursor.fetchmany(size or self._cursor.arraysize)]
+        self._database.add_rows(len(rows))
+        return rows
+
+    def fetchval(self):
+        row = self.fetchone()
+        return row[0] if row else None
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self._cursor.close()
+
+
+class StandInConnection:
+    """pyodbc-like connection; each connect() opens its own SQLite connection"""
+
+    def __init__(self, database):
+        self._database = database
+        self._connection = sqlite3.connect(database.path, timeout=30, check_same_thread=False)
+        self._connection.execute("PRAGMA synchronous=OFF")
+        self.autocommit = False
+
+    def cursor(self):
+        return StandInCursor(self._database, self._connection.cursor())
+
+    def execute(self, sql, *params):
+        return self.cursor().execute(sql, *params)
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        self._connection.close()
+
+
+class StandInDatabase:
+    """SQLite file with the application tables, connection counters and seed helpers"""
+
+    def __init__(self, directory, rtt_ms=0.0, procedure_ms=0.0):
+        self.path = os.path.join(directory, 'standin.db')
+        self.rtt = rtt_ms / 1000.0
+        self.procedure_seconds = procedure_ms / 1000.0
+        self.lock = threading.Lock()
+        self.reset_counters()
+        with self._admin() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    # === Counters ===
+
+    def reset_counters(self):
+        with self.lock:
+            self.counters = {'connections': 0, 'round_trips': 0, 'rows_fetched': 0, 'procedure_calls': {}}
+
+    def snapshot(self):
+        with self.lock:
+            return {**self.counters, 'procedure_calls': dict(self.counters['procedure_calls'])}
+
+    def round_trip(self, procedure=None):
+        with self.lock:
+            self.counters['round_trips'] += 1
+            if procedure:
+                calls = self.counters['procedure_calls']
+                calls[procedure] = calls.get(procedure, 0) + 1
+        delay = self.rtt + (self.procedure_seconds if procedure else 0.0)
+        if delay:
+            time.sleep(delay)
+
+    def add_rows(self, count):
+        with self.lock:
+            self.counters['rows_fetched'] += count
+
+    # === pyodbc entry point ===
+
+    def connect(self, *args, **kwargs):
+        with self.lock:
+            self.counters['connections'] += 1
+        return StandInConnection(self)
+
+    @contextmanager
+    def installed(self):
+        """Route pyodbc.connect (used by db_manager and the attrecord engine) to this database"""
+        import pyodbc
+        original = pyodbc.connect
+        pyodbc.connect = self.connect
+        try:
+            yield self
+        finally:
+            pyodbc.connect = original
+
+    # === Seeding ===
+
+    @contextmanager
+    def _admin(self):
+        """Direct SQLite connection for setup (not counted)"""
+        conn = sqlite3.connect(self.path)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def truncate(self, *tables):
+        with self._admin() as conn:
+            for table in tables or TABLES:
+                conn.execute(f"DELETE FROM {table}")
+                conn.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table,))
+
+    def _insert(self, table, columns, rows):
+        placeholders = ', '.join('?' * len(columns))
+        with self._admin() as conn:
+            conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+
+    def load_master_data(self, workload):
+        """departments, employees and gagalabsens"""
+        self.truncate('departments', 'employees', 'gagalabsens')
+        self._insert('departments', ('id', 'deptname'), DEPARTMENTS)
+        columns = ('pin', 'attid', 'eid', 'name', 'jabatan', 'lokasi', 'shift', 'department', 'status')
+        self._insert('employees', columns, [tuple(e[c] for c in columns) for e in workload.employees])
+        self._insert('gagalabsens', ('pin', 'tgl', 'machine', 'status', 'created_at', 'updated_at'),
+                     [(g['pin'], g['tgl'], g['machine'], g['status'], g['tgl'], g['tgl']) for g in workload.gagalabsens])
+
+    def load_fplog(self, rows):
+        self.truncate('FPLog')
+        self._insert('FPLog', ('PIN', 'Date', 'Machine', 'Status', 'fpid'),
+                     [(r['PIN'], r['Date'], r['Machine'], r['Status'], r['fpid']) for r in rows])
+
+    def load_queue(self, rows, status='baru'):
+        self.truncate('attendance_queues')
+        self._insert('attendance_queues', ('pin', 'date', 'status', 'machine', 'punch_code'),
+                     [(r['PIN'], r['Date'], status, r['Machine'], None) for r in rows])
+
+    def load_attrecords(self, rows):
+        self.truncate('attrecords')
+        columns = ('tgl', 'fpid', 'pin', 'name', 'jabatan', 'lokasi', 'deptname', 'masuk', 'keluar', 'shift', 'keterangan')
+        self._insert('attrecords', columns, [tuple(r[c] for c in columns) for r in rows])
+
+    def count(self, table):
+        with self._admin() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark
+Measures cold start (import app + create_app) in a fresh interpreter and
+checks it against an import-time budget.
+
+Usage:
+    python benchmarks/startup_benchmark.py [--budget SECONDS] [--runs N] [--top N]
+
+The budget defaults to STARTUP_BUDGET_SECONDS (1.5 s). The run also fails if
+a module that should only load on first use (pandas, openpyxl, pyzk) is
+imported during startup. Exit code is non-zero when the budget is exceeded.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_BUDGET_SECONDS = float(os.environ.get('STARTUP_BUDGET_SECONDS', '1.5'))
+
+# Only needed by export/upload/device paths, never at startup
+DEFERRED_MODULES = ['pandas', 'openpyxl', 'numpy', 'zk']
+
+# Runs in the child interpreter
+CHILD_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app('testing')
+finished = time.perf_counter()
+print(json.dumps({
+    'import_seconds': imported - started,
+    'create_app_seconds': finished - imported,
+    'total_seconds': finished - started,
+    'loaded': sorted(m for m in %r if m in sys.modules),
+}))
+"""
+
+
+def run_once():
+    """One cold start; returns (result dict, importtime lines)"""
+    env = dict(os.environ, FLASK_ENV='testing', LEADER_ELECTION='off')
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD_SCRIPT % (DEFERRED_MODULES,)],
+        cwd=PROJECT_DIR, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Startup failed:\n{proc.stderr[-4000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return result, [line for line in proc.stderr.splitlines() if line.startswith('import time:')]
+
+
+def slowest_imports(importtime_lines, top):
+    """Top-level imports by cumulative time (microseconds)"""
+    rows = []
+    for line in importtime_lines:
+        parts = line.split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2]
+        # -X importtime indents nested imports by two spaces per level
+        if name.startswith('   '):
+            continue
+        rows.append((int(parts[1]), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_SECONDS,
+                        help='Cold start budget in seconds (median of runs)')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='Slowest imports to show')
+    args = parser.parse_args()
+
+    results = []
+    importtime_lines = []
+    for _ in range(args.runs):
+        result, importtime_lines = run_once()
+        results.append(result)
+
+    totals = sorted(r['total_seconds'] for r in results)
+    median = totals[len(totals) // 2]
+    loaded = sorted({m for r in results for m in r['loaded']})
+
+    print(f"Cold start over {args.runs} runs: median {median:.3f}s, "
+          f"min {totals[0]:.3f}s, max {totals[-1]:.3f}s (budget {args.budget:.3f}s)")
+    print(f"  import app: {results[-1]['import_seconds']:.3f}s, "
+          f"create_app: {results[-1]['create_app_seconds']:.3f}s")
+    print("Slowest top-level imports (last run):")
+    for micros, name in slowest_imports(importtime_lines, args.top):
+        print(f"  {micros / 1000:8.1f} ms  {name}")
+
+    failed = False
+    if median > args.budget:
+        print(f"[FAIL] Median cold start {median:.3f}s exceeds budget {args.budget:.3f}s")
+        failed = True
+    if loaded:
+        print(f"[FAIL] Loaded at startup but should be deferred: {', '.join(loaded)}")
+        failed = True
+    if not failed:
+        print("[OK] Startup within budget")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""
+Synthetic workload
+Seeded generator of employees, device punches and gagalabsens rows for the
+benchmark suite.
+
+Punches cluster around shift boundaries the way they do on the floor: most
+employees arrive a few minutes before the shift starts (some late), leave a
+few minutes after it ends, production staff also scan the production
+machine, and a small share is absent, forgets to scan out or double-taps the
+reader. A share of employee-days (gagal_rate) has a failed scan that ends up
+in gagalabsens instead of FPLog.
+
+The same seed always produces the same workload, so results of different
+commits are comparable.
+"""
+
+import random
+from datetime import datetime, time, timedelta
+
+from app.services.punch_spool import SpooledPunch
+
+# name -> (start, end); the end is on the next day when it is before the start
+SHIFTS = {
+    'Non shift 1': (time(8, 0), time(16, 0)),
+    'Shift 1': (time(7, 0), time(15, 0)),
+    'Shift 2': (time(15, 0), time(23, 0)),
+    'Shift 3': (time(23, 0), time(7, 0)),
+}
+SHIFT_WEIGHTS = [0.3, 0.3, 0.25, 0.15]
+
+# (lokasi, jabatan, weight); production locations scan a production machine too
+POSITIONS = [
+    ('P1', 'OPERATOR', 20), ('P1', 'HELPER', 8), ('P1', 'STAFF', 5), ('P1', 'SUPERVISOR', 2),
+    ('P2', 'OPERATOR', 20), ('P2', 'HELPER', 8), ('P2', 'STAFF', 5), ('P2', 'MANAGER', 1),
+    ('PELET', 'OPERATOR', 10), ('BLOWING', 'OPERATOR', 10), ('KARUNG', 'OPERATOR', 11),
+]
+PRODUCTION_DEVICES = {'PELET': '111', 'BLOWING': '110', 'KARUNG': '108'}
+
+DEPARTMENTS = [(1, 'Produksi'), (2, 'Gudang'), (3, 'HRD'), (4, 'Maintenance'), (5, 'QC')]
+
+# (device name, role, punch code); names follow DEVICE_STATUS_RULES
+DEVICE_POOL = [
+    ('104', 'in', 0),
+    ('102', 'out', 2),
+    ('108', 'production', None),
+    ('110', 'production', None),
+    ('111', 'production', None),
+    ('103', 'canteen', 0),
+]
+
+# gagalabsens machine and status for a failed scan per role
+GAGAL_MACHINES = {'in': ('104', 'I'), 'out': ('102', 'O'), 'production_in': ('204', 'I'), 'production_out': ('202', 'O')}
+
+
+class Punch:
+    """One scan on a device"""
+
+    __slots__ = ('device', 'pin', 'timestamp', 'punch')
+
+    def __init__(self, device, pin, timestamp, punch):
+        self.device = device
+        self.pin = pin
+        self.timestamp = timestamp
+        self.punch = punch
+
+
+class SyntheticWorkload:
+    """Employees, punches and failed scans for a number of days"""
+
+    def __init__(self, employees=500, devices=4, days=3, start_date=None, gagal_rate=0.01,
+                 absent_rate=0.03, missing_out_rate=0.02, duplicate_rate=0.02, seed=42):
+        if devices < 2:
+            raise ValueError("At least 2 devices (in and out) are required")
+        self.employee_count = employees
+        self.device_count = devices
+        self.days = days
+        # Stable default: a fixed past week, so results do not depend on the run date
+        self.start_date = start_date or datetime(2025, 1, 6).date()
+        self.gagal_rate = gagal_rate
+        self.absent_rate = absent_rate
+        self.missing_out_rate = missing_out_rate
+        self.duplicate_rate = duplicate_rate
+        self.seed = seed
+
+        rng = random.Random(seed)
+        self.devices = self._build_devices()
+        self.employees = self._build_employees(rng)
+        self.punches, self.gagalabsens = self._build_punches(rng)
+
+    def describe(self):
+        """Workload parameters and sizes (stored with the results)"""
+        return {
+            'employees': self.employee_count,
+            'devices': [name for name, _, _ in self.devices],
+            'days': self.days,
+            'start_date': str(self.start_date),
+            'gagal_rate': self.gagal_rate,
+            'absent_rate': self.absent_rate,
+            'missing_out_rate': self.missing_out_rate,
+            'duplicate_rate': self.duplicate_rate,
+            'seed': self.seed,
+            'punches': len(self.punches),
+            'gagalabsens': len(self.gagalabsens),
+        }
+
+    @property
+    def end_date(self):
+        return self.start_date + timedelta(days=self.days - 1)
+
+    # === Generation ===
+
+    def _build_devices(self):
+        """First M devices of the pool; more than the pool adds generic in/out readers"""
+        devices = list(DEVICE_POOL[:self.device_count])
+        for i in range(len(devices), self.device_count):
+            role = 'in' if i % 2 == 0 else 'out'
+            # Unknown device names use the 'default' status rules (punch 0 = I, 1 = O)
+            devices.append((f'GATE-{role.upper()}-{i}', role, 0 if role == 'in' else 1))
+        return devices
+
+    def _build_employees(self, rng):
+        positions = [(lokasi, jabatan) for lokasi, jabatan, _ in POSITIONS]
+        weights = [weight for _, _, weight in POSITIONS]
+        employees = []
+        for i in range(self.employee_count):
+            lokasi, jabatan = rng.choices(positions, weights)[0]
+            shift = 'Non shift 1' if jabatan in ('STAFF', 'MANAGER') else rng.choices(list(SHIFTS), SHIFT_WEIGHTS)[0]
+            employees.append({
+                'pin': str(10001 + i),
+                'attid': 5001 + i,
+                'eid': f'EMP{i + 1:05d}',
+                'name': f'Karyawan {i + 1:05d}',
+                'jabatan': jabatan,
+                'lokasi': lokasi,
+                'shift': shift,
+                'department': DEPARTMENTS[i % len(DEPARTMENTS)][0],
+                'status': 'Active',
+            })
+        return employees
+
+    def _devices_for(self, role):
+        return [device for device in self.devices if device[1] == role]
+
+    def _build_punches(self, rng):
+        in_devices = self._devices_for('in')
+        out_devices = self._devices_for('out')
+        production_devices = {name for name, role, _ in self.devices if role == 'production'}
+        canteen_devices = self._devices_for('canteen')
+
+        punches = []
+        gagalabsens = []
+
+        def scan(device, pin, at, punch_code, role):
+            name, _, _ = device
+            if role in GAGAL_MACHINES and rng.random() < self.gagal_rate:
+                machine, status = GAGAL_MACHINES[role]
+                gagalabsens.append({'pin': pin, 'tgl': at, 'machine': machine, 'status': status})
+                return
+            punches.append(Punch(name, pin, at, punch_code))
+            if rng.random() < self.duplicate_rate:
+                # Double tap: same reader a few seconds later (same minute most of the time)
+                punches.append(Punch(name, pin, at + timedelta(seconds=rng.randint(1, 20)), punch_code))
+
+        for day in range(self.days):
+            day_date = self.start_date + timedelta(days=day)
+            for employee in self.employees:
+                if rng.random() < self.absent_rate:
+                    continue
+                pin = employee['pin']
+                start, end = SHIFTS[employee['shift']]
+                shift_start = datetime.combine(day_date, start)
+                shift_end = datetime.combine(day_date, end)
+                if shift_end <= shift_start:
+                    shift_end += timedelta(days=1)
+
+                # Arrive ~10 minutes early with a tail of late arrivals
+                arrive = shift_start - timedelta(minutes=rng.gauss(10, 7))
+                leave = shift_end + timedelta(minutes=abs(rng.gauss(6, 8)))
+                arrive = arrive.replace(microsecond=0) + timedelta(seconds=rng.randint(0, 59))
+                leave = leave.replace(microsecond=0) + timedelta(seconds=rng.randint(0, 59))
+
+                in_device = rng.choice(in_devices)
+                scan(in_device, pin, arrive, in_device[2], 'in')
+
+                production = PRODUCTION_DEVICES.get(employee['lokasi'])
+                if production in production_devices:
+                    device = (production, 'production', 0)
+                    scan(device, pin, arrive + timedelta(minutes=rng.uniform(5, 20)), 0, 'production_in')
+                    scan(device, pin, leave - timedelta(minutes=rng.uniform(5, 20)), 1, 'production_out')
+
+                if canteen_devices and rng.random() < 0.5:
+                    middle = shift_start + (shift_end - shift_start) / 2
+                    scan(canteen_devices[0], pin, middle + timedelta(minutes=rng.gauss(0, 20)), 0, 'canteen')
+
+                if rng.random() >= self.missing_out_rate:
+                    out_device = rng.choice(out_devices)
+                    scan(out_device, pin, leave, out_device[2], 'out')
+
+        for punch in punches:
+            punch.timestamp = punch.timestamp.replace(microsecond=0)
+        for row in gagalabsens:
+            row['tgl'] = row['tgl'].replace(microsecond=0)
+        punches.sort(key=lambda p: p.timestamp)
+        return punches, gagalabsens
+
+    # === Views used by the scenarios ===
+
+    def zk_items(self, punches=None):
+        """(kind, device_name, record) items for StreamingService.process_attendance_batch"""
+        return [
+            ('zk', punch.device, SpooledPunch(punch.pin, punch.timestamp, punch.punch, uid=int(punch.pin)))
+            for punch in (self.punches if punches is None else punches)
+        ]
+
+    def fplog_rows(self, resolve_status):
+        """FPLog dicts as produced by the device sync (resolve_status(device, punch) -> (status, display))"""
+        attids = {employee['pin']: employee['attid'] for employee in self.employees}
+        rows = []
+        for punch in self.punches:
+            status, _ = resolve_status(punch.device, punch.punch)
+            if status is None:
+                continue
+            rows.append({
+                'PIN': punch.pin,
+                'Date': punch.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                'Machine': punch.device,
+                'Status': status,
+                'fpid': attids.get(punch.pin),
+            })
+        return rows
+
+    def attrecord_rows(self):
+        """attrecords rows (first scan in, last scan out per employee-day) for the report scenarios"""
+        employees = {employee['pin']: employee for employee in self.employees}
+        days = {}
+        for punch in self.punches:
+            key = (punch.pin, punch.timestamp.date())
+            first, last = days.get(key, (punch.timestamp, punch.timestamp))
+            days[key] = (min(first, punch.timestamp), max(last, punch.timestamp))
+        rows = []
+        for (pin, tgl), (first, last) in sorted(days.items()):
+            employee = employees[pin]
+            rows.append({
+                'tgl': tgl,
+                'fpid': employee['attid'],
+                'pin': pin,
+                'name': employee['name'],
+                'jabatan': employee['jabatan'],
+                'lokasi': employee['lokasi'],
+                'deptname': DEPARTMENTS[(employee['department'] - 1) % len(DEPARTMENTS)][1],
+                'masuk': first.strftime('%H:%M:%S'),
+                'keluar': last.strftime('%H:%M:%S') if last != first else None,
+                'shift': employee['shift'],
+                'keterangan': 'Terlambat' if first.time() > SHIFTS[employee['shift']][0] else None,
+            })
+        return rows
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+ZK load test
+Drives the real sync and streaming code against simulated ZK terminals
+(benchmarks/zk_simulator.py) and the SQLite stand-in for SQL Server
+(benchmarks/standin_db.py), so reconnect storms, live capture throughput and
+full-dump sync times can be measured on one machine without devices.
+
+Usage:
+    python benchmarks/zk_load_test.py sync  [--devices N] [--log-size N] [--concurrency N]
+    python benchmarks/zk_load_test.py live  [--devices N] [--punch-rate R] [--duration S] [--mode gateway|threads]
+    python benchmarks/zk_load_test.py storm [--devices N] [--storms N] [--storm-interval S] [--backoff-base S]
+
+Modes:
+    sync    SyncService.sync_single_device for every device (full attendance
+            dump, date filter, bulk FPLog write); reports dump and sync time
+            per device and records per second
+    live    StreamingService (gateway or thread-per-device mode) for --duration
+            seconds; reports punches pushed by the devices, FPLog rows written,
+            throughput, and connection failures/restarts from the supervisor
+    storm   like live, but every --storm-interval seconds all connections are
+            dropped at once; reports how long it takes until every device is
+            connected again
+
+Common fault options (--response-ms, --slow-rate, --slow-ms, --dump-kbps,
+--disconnect-interval, --refuse-rate) are passed to the simulated devices.
+Requires pyzk; the simulator itself does not. pyzk pings a device before
+connecting, so ping must work for 127.0.0.1.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+# === Modes ===
+
+def run_sync(args, simulator, db):
+    """Full dump + FPLog sync of every device, --concurrency at a time"""
+    from app.services.sync_service import SyncService
+    service = SyncService()
+    end_date = datetime.now().date()
+    start_date = end_date - timedelta(days=simulator.profile.log_days)
+
+    def sync(device):
+        started = time.perf_counter()
+        success, message = service.sync_single_device(device, start_date, end_date)
+        return device['name'], success, message, time.perf_counter() - started
+
+    db.truncate('FPLog')
+    db.reset_counters()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(sync, simulator.device_configs()))
+    elapsed = time.perf_counter() - started
+
+    durations = [duration for _, success, _, duration in results if success]
+    failures = [(name, message) for name, success, message, _ in results if not success]
+    totals = simulator.stats()['totals']
+    return {
+        'devices': len(results),
+        'failed': len(failures),
+        'failures': failures[:10],
+        'elapsed_seconds': round(elapsed, 3),
+        'dump_records': totals['dump_records'],
+        'fplog_rows': db.count('FPLog'),
+        'records_per_second': round(totals['dump_records'] / elapsed, 1) if elapsed else None,
+        'device_seconds_median': round(statistics.median(durations), 3) if durations else None,
+        'device_seconds_p95': round(_percentile(durations, 95), 3) if durations else None,
+        'database': db.snapshot(),
+    }
+
+
+def _start_streaming(args, simulator):
+    from app.services.device_supervisor import BackoffPolicy, DeviceSupervisor
+    from app.services.streaming_service import StreamingService
+    service = StreamingService()
+    service.devices = simulator.device_configs()
+    service.supervisor = DeviceSupervisor(backoff=BackoffPolicy(base=args.backoff_base, cap=args.backoff_cap))
+    success, message = service.start_streaming()
+    if not success:
+        raise RuntimeError(message)
+    return service
+
+
+def _connected(service):
+    return sum(1 for health in service.supervisor.health.values() if health.state == 'connected')
+
+
+def _wait_connected(service, count, timeout):
+    """Seconds until count devices are connected (None on timeout)"""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if _connected(service) >= count:
+            return time.perf_counter() - started
+        time.sleep(0.05)
+    return None
+
+
+def _streaming_summary(service, gateway, simulator, db, elapsed):
+    from app.services.streaming_service import STREAMING_MODE
+    totals = simulator.stats()['totals']
+    health = service.supervisor.snapshot().values()
+    fplog_rows = db.count('FPLog')
+    return {
+        'mode': STREAMING_MODE,
+        'elapsed_seconds': round(elapsed, 1),
+        'events_generated': totals['events_generated'],
+        'events_sent': totals['events_sent'],
+        'events_acked': totals['events_acked'],
+        'events_dropped': totals['events_dropped'],
+        # Punches still queued on the devices (generated faster than captured)
+        'device_backlog': totals['events_generated'] - totals['events_acked'],
+        # The same PIN, minute and status is stored once, so with few --users
+        # and a high --punch-rate fewer rows than events are expected
+        'fplog_rows': fplog_rows,
+        'fplog_rows_per_second': round(fplog_rows / elapsed, 1) if elapsed else None,
+        'connections': totals['connections'],
+        'forced_disconnects': totals['forced_disconnects'],
+        'connection_failures': sum(h['total_failures'] for h in health),
+        'restarts': sum(h['restarts'] for h in health),
+        'gateway': gateway.get_status()['stats'] if gateway else None,
+        'database': db.snapshot(),
+    }
+
+
+def run_live(args, simulator, db):
+    """Stream from every device for --duration seconds"""
+    db.truncate('FPLog', 'attendance_queues')
+    db.reset_counters()
+    started = time.perf_counter()
+    service = _start_streaming(args, simulator)
+    gateway = service.gateway
+    try:
+        connect_seconds = _wait_connected(service, len(simulator.devices), args.duration)
+        time.sleep(max(0.0, args.duration - (time.perf_counter() - started)))
+    finally:
+        service.stop_streaming()
+    result = _streaming_summary(service, gateway, simulator, db, time.perf_counter() - started)
+    result['initial_connect_seconds'] = round(connect_seconds, 2) if connect_seconds is not None else None
+    return result
+
+
+def run_storm(args, simulator, db):
+    """Drop all connections every --storm-interval seconds and time the recovery"""
+    db.truncate('FPLog', 'attendance_queues')
+    db.reset_counters()
+    devices = len(simulator.devices)
+    started = time.perf_counter()
+    service = _start_streaming(args, simulator)
+    gateway = service.gateway
+    recoveries = []
+    try:
+        if _wait_connected(service, devices, args.storm_interval) is None:
+            raise RuntimeError(f"Only {_connected(service)}/{devices} devices connected before the first storm")
+        for storm in range(args.storms):
+            simulator.disconnect_all()
+            # Let the app notice the drop before counting connected devices again
+            deadline = time.perf_counter() + 5
+            while _connected(service) == devices and time.perf_counter() < deadline:
+                time.sleep(0.01)
+            recovery = _wait_connected(service, devices, args.storm_interval)
+            recoveries.append(recovery)
+            print(f"  storm {storm + 1}: "
+                  f"{'%.2fs to reconnect all devices' % recovery if recovery is not None else 'not recovered'}",
+                  file=sys.stderr, flush=True)
+            if recovery is not None:
+                time.sleep(max(0.0, args.storm_interval - recovery))
+    finally:
+        service.stop_streaming()
+    result = _streaming_summary(service, gateway, simulator, db, time.perf_counter() - started)
+    recovered = [value for value in recoveries if value is not None]
+    result.update({
+        'storms': len(recoveries),
+        'not_recovered': len(recoveries) - len(recovered),
+        'recovery_seconds_median': round(statistics.median(recovered), 2) if recovered else None,
+        'recovery_seconds_max': round(max(recovered), 2) if recovered else None,
+    })
+    return result
+
+
+MODES = {'sync': run_sync, 'live': run_live, 'storm': run_storm}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('test', choices=sorted(MODES))
+    parser.add_argument('--devices', type=int, default=20)
+    parser.add_argument('--base-port', type=int, default=14370)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--log-size', type=int, default=20000, help='Attendance records per device')
+    parser.add_argument('--log-days', type=int, default=30)
+    parser.add_argument('--punch-rate', type=float, default=1.0, help='Live punches per second per device')
+    parser.add_argument('--response-ms', type=float, default=0.0)
+    parser.add_argument('--slow-rate', type=float, default=0.0)
+    parser.add_argument('--slow-ms', type=float, default=2000.0)
+    parser.add_argument('--dump-kbps', type=float, default=0.0)
+    parser.add_argument('--disconnect-interval', type=float, default=0.0)
+    parser.add_argument('--refuse-rate', type=float, default=0.0)
+    parser.add_argument('--concurrency', type=int, default=4, help='sync: devices synced in parallel')
+    parser.add_argument('--duration', type=float, default=60.0, help='live: seconds to stream')
+    parser.add_argument('--mode', choices=['gateway', 'threads'], default='gateway', help='live/storm: STREAMING_MODE')
+    parser.add_argument('--storms', type=int, default=3)
+    parser.add_argument('--storm-interval', type=float, default=60.0)
+    parser.add_argument('--backoff-base', type=float, default=5.0, help='Supervisor reconnect backoff base (seconds)')
+    parser.add_argument('--backoff-cap', type=float, default=600.0)
+    parser.add_argument('--rtt-ms', type=float, default=0.0, help='Delay per database round trip')
+    parser.add_argument('--verbose', action='store_true', help='Keep service logging and print output')
+    args = parser.parse_args()
+
+    # Logs, the punch spool and the database stay out of the working tree
+    workdir = tempfile.mkdtemp(prefix='attendance-zkload-')
+    os.chdir(workdir)
+    sys.path.insert(0, PROJECT_DIR)
+    os.environ.setdefault('FLASK_ENV', 'testing')
+    os.environ.setdefault('LEADER_ELECTION', 'off')
+    os.environ['STREAMING_MODE'] = args.mode
+
+    try:
+        import zk  # noqa: F401
+    except ImportError:
+        print("pyzk is required for the load test: pip install pyzk", file=sys.stderr)
+        return 2
+
+    from benchmarks.run_benchmarks import _quiet
+    from benchmarks.standin_db import StandInDatabase
+    from benchmarks.workload import SyntheticWorkload
+    from benchmarks.zk_simulator import DeviceProfile, ZKSimulator
+
+    # Master data only: PINs 10001.. match the simulated devices' users
+    db = StandInDatabase(workdir, rtt_ms=args.rtt_ms)
+    db.load_master_data(SyntheticWorkload(employees=args.users, days=1))
+    profile = DeviceProfile(
+        users=args.users, log_size=args.log_size, log_days=args.log_days,
+        punch_rate=args.punch_rate if args.test != 'sync' else 0.0, response_ms=args.response_ms,
+        slow_rate=args.slow_rate, slow_ms=args.slow_ms, dump_kbps=args.dump_kbps,
+        disconnect_interval=args.disconnect_interval, refuse_rate=args.refuse_rate
+    )
+    print(f"{args.test}: {args.devices} simulated devices on ports {args.base_port}-"
+          f"{args.base_port + args.devices - 1} (work dir {workdir})", flush=True)
+
+    with ZKSimulator(args.devices, args.base_port, profile=profile) as simulator, db.installed(), _quiet(args.verbose):
+        result = MODES[args.test](args, simulator, db)
+    result = {'test': args.test, 'profile': profile.to_dict(), 'devices': args.devices, **result}
+
+    print(json.dumps(result, indent=2, default=str))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+"""
+ZK terminal simulator
+Speaks enough of the ZK TCP protocol, as used by pyzk 0.9, to stand in for
+many fingerprint terminals on localhost ports:
+
+    connect / auth / exit        CMD_CONNECT, CMD_AUTH (comm key), CMD_EXIT
+    get_users / get_attendance   CMD_GET_FREE_SIZES and buffered reads
+                                 (1503 prepare buffer, 1504 read chunk, CMD_FREE_DATA)
+    live_capture                 CMD_REG_EVENT, then one pushed event per client ACK
+
+Each device keeps an attendance log of log_size records, which is returned
+by full dumps, and pushes live punches at punch_rate per second (Poisson)
+while a client is registered for events. Live punches are appended to the
+log too. Faults are configurable per profile: a fixed delay on every
+response, a share of slow responses, limited dump bandwidth, connections
+dropped after a random interval, refused connections, and
+ZKSimulator.disconnect_all() for a reconnect storm.
+
+Usage (standalone, for pointing a running app at it):
+    python benchmarks/zk_simulator.py [--devices N] [--base-port PORT] [--users N]
+        [--log-size N] [--punch-rate R] [--response-ms MS] [--slow-rate R --slow-ms MS]
+        [--disconnect-interval S] [--password N]
+
+Only TCP is implemented (pyzk's default; force_udp=True clients are not
+supported). pyzk pings the device before connecting unless ommit_ping=True,
+so the host needs a working ping for 127.0.0.1.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+MACHINE_PREPARE_DATA_1 = 0x5050
+MACHINE_PREPARE_DATA_2 = 0x7D82
+USHRT_MAX = 65535
+
+CMD_USERTEMP_RRQ = 9
+CMD_OPTIONS_RRQ = 11
+CMD_ATTLOG_RRQ = 13
+CMD_GET_FREE_SIZES = 50
+CMD_REG_EVENT = 500
+CMD_CONNECT = 1000
+CMD_EXIT = 1001
+CMD_ENABLEDEVICE = 1002
+CMD_DISABLEDEVICE = 1003
+CMD_GET_VERSION = 1100
+CMD_AUTH = 1102
+CMD_PREPARE_DATA = 1500
+CMD_DATA = 1501
+CMD_FREE_DATA = 1502
+CMD_PREPARE_BUFFER = 1503
+CMD_READ_BUFFER = 1504
+CMD_ACK_OK = 2000
+CMD_ACK_UNAUTH = 2005
+CMD_ACK_UNKNOWN = 0xFFFF
+EF_ATTLOG = 1
+
+# Commands answered with a plain ACK_OK
+SIMPLE_COMMANDS = {
+    CMD_ENABLEDEVICE, CMD_DISABLEDEVICE, 60, 61, 62, 57, 1013, 1014, 1017, 1008, 202, 31, 15, 14,
+}
+
+USER_RECORD = struct.Struct('<HB8s24sIx7sx24s')        # 72 bytes (ZK8 firmware)
+ATTENDANCE_RECORD = struct.Struct('<H24sB4sB8s')       # 40 bytes
+EVENT_RECORD = struct.Struct('<24sBB6s')               # 32 bytes
+
+
+def checksum(buf):
+    """ZK packet checksum (zkemsdk.c)"""
+    total = 0
+    for i in range(0, len(buf) - 1, 2):
+        total += buf[i] | (buf[i + 1] << 8)
+        if total > USHRT_MAX:
+            total -= USHRT_MAX
+    if len(buf) % 2:
+        total += buf[-1]
+    while total > USHRT_MAX:
+        total -= USHRT_MAX
+    total = ~total
+    while total < 0:
+        total += USHRT_MAX
+    return total
+
+
+def make_commkey(key, session_id, ticks=50):
+    """Scrambled password the client sends with CMD_AUTH (commpro.c MakeKey)"""
+    key = int(key)
+    k = 0
+    for i in range(32):
+        k = (k << 1 | 1) if key & (1 << i) else k << 1
+    k += int(session_id)
+    b = struct.unpack('BBBB', struct.pack('I', k & 0xFFFFFFFF))
+    b = struct.pack('BBBB', b[0] ^ ord('Z'), b[1] ^ ord('K'), b[2] ^ ord('S'), b[3] ^ ord('O'))
+    h = struct.unpack('HH', b)
+    b = struct.unpack('BBBB', struct.pack('HH', h[1], h[0]))
+    t = 0xFF & ticks
+    return struct.pack('BBBB', b[0] ^ t, b[1] ^ t, t, b[3] ^ t)
+
+
+def encode_time(t):
+    """datetime -> 4-byte device time (zkemsdk.c EncodeTime)"""
+    value = (((t.year % 100) * 12 * 31 + (t.month - 1) * 31 + t.day - 1) * 86400
+             + (t.hour * 60 + t.minute) * 60 + t.second)
+    return struct.pack('<I', value)
+
+
+def encode_timehex(t):
+    """datetime -> 6-byte event time"""
+    return struct.pack('6B', t.year - 2000, t.month, t.day, t.hour, t.minute, t.second)
+
+
+class DeviceProfile:
+    """Size, traffic and fault settings of a simulated device"""
+
+    def __init__(self, users=500, log_size=5000, log_days=30, punch_rate=0.5, punch_codes=(0,),
+                 response_ms=0.0, slow_rate=0.0, slow_ms=2000.0, dump_kbps=0.0,
+                 disconnect_interval=0.0, refuse_rate=0.0, password=0, event_gap_ms=10.0,
+                 max_pending_events=10000, seed=1):
+        self.users = users
+        self.log_size = log_size
+        self.log_days = log_days
+        self.punch_rate = punch_rate
+        self.punch_codes = tuple(punch_codes)
+        self.response_ms = response_ms
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        # 0 = unlimited; otherwise dump chunks are paced to this bandwidth
+        self.dump_kbps = dump_kbps
+        # Mean seconds until a connected client is dropped (0 = never)
+        self.disconnect_interval = disconnect_interval
+        self.refuse_rate = refuse_rate
+        self.password = password
+        # Pause between an event ACK and the next queued event (a terminal
+        # needs a moment per scan); caps one device at 1000/event_gap_ms events/s
+        self.event_gap_ms = event_gap_ms
+        self.max_pending_events = max_pending_events
+        self.seed = seed
+
+    def to_dict(self):
+        return dict(vars(self), punch_codes=list(self.punch_codes))
+
+
+class DeviceStats:
+    """Counters of one simulated device"""
+
+    FIELDS = ('connections', 'refused', 'auth_failures', 'commands', 'dumps', 'dump_records', 'bytes_sent',
+              'events_generated', 'events_sent', 'events_acked', 'events_dropped', 'forced_disconnects',
+              'slow_responses')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+
+    def add(self, field, amount=1):
+        with self.lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def to_dict(self):
+        with self.lock:
+            return {field: getattr(self, field) for field in self.FIELDS}
+
+
+class SimulatedDevice:
+    """One terminal: users, attendance log and the connection handler"""
+
+    def __init__(self, name, port, profile):
+        self.name = name
+        self.port = port
+        self.profile = profile
+        self.stats = DeviceStats()
+        self.rng = random.Random(f"{profile.seed}-{name}")
+        self.pins = [str(10001 + i) for i in range(profile.users)]
+        self.log = self._build_log()
+        self.connections = set()
+        self.server = None
+
+    def _build_log(self):
+        """log_size records spread over the last log_days days, oldest first"""
+        now = datetime.now().replace(microsecond=0)
+        span = self.profile.log_days * 86400
+        offsets = sorted(self.rng.randrange(span) for _ in range(self.profile.log_size))
+        start = now - timedelta(seconds=span)
+        return [
+            (self.rng.choice(self.pins), start + timedelta(seconds=offset), self.rng.choice(self.profile.punch_codes))
+            for offset in offsets
+        ]
+
+    # === Buffers served by 1503/1504 ===
+
+    def user_buffer(self):
+        records = b''.join(
+            USER_RECORD.pack(uid, 0, b'', f'Karyawan {pin}'.encode(), 0, b'1', pin.encode())
+            for uid, pin in enumerate(self.pins, 1)
+        )
+        return struct.pack('<I', len(records)) + records
+
+    def attendance_buffer(self):
+        uids = {pin: uid for uid, pin in enumerate(self.pins, 1)}
+        log = list(self.log)
+        records = b''.join(
+            ATTENDANCE_RECORD.pack(uids.get(pin, 0), pin.encode(), 1, encode_time(ts), punch, b'')
+            for pin, ts, punch in log
+        )
+        self.stats.add('dumps')
+        self.stats.add('dump_records', len(log))
+        return struct.pack('<I', len(records)) + records
+
+    def free_sizes(self):
+        fields = [0] * 20
+        fields[4] = len(self.pins)
+        fields[8] = len(self.log)
+        fields[14], fields[15], fields[16] = 3000, 10000, 100000
+        fields[17] = fields[14]
+        fields[18] = fields[15] - len(self.pins)
+        fields[19] = fields[16] - len(self.log)
+        return struct.pack('20i', *fields) + struct.pack('3i', 0, 0, 0)
+
+    # === Connection handling ===
+
+    async def handle(self, reader, writer):
+        if self.rng.random() < self.profile.refuse_rate:
+            self.stats.add('refused')
+            writer.transport.abort()
+            return
+        connection = _Connection(self, reader, writer)
+        self.connections.add(connection)
+        self.stats.add('connections')
+        try:
+            await connection.run()
+        finally:
+            self.connections.discard(connection)
+
+    def drop_connections(self):
+        """Abort every open connection (reconnect storm)"""
+        for connection in list(self.connections):
+            connection.abort()
+            self.stats.add('forced_disconnects')
+
+
+class _Connection:
+    """One client session"""
+
+    def __init__(self, device, reader, writer):
+        self.device = device
+        self.profile = device.profile
+        self.reader = reader
+        self.writer = writer
+        self.session_id = device.rng.randint(1, USHRT_MAX - 2)
+        self.authenticated = not self.profile.password
+        self.buffer = b''
+        self.live = False
+        self.awaiting_ack = False
+        self.pending = deque()
+        self.tasks = set()
+        self.closed = False
+
+    async def run(self):
+        if self.profile.disconnect_interval:
+            self._spawn(self._drop_later())
+        try:
+            while not self.closed:
+                top = await self.reader.readexactly(8)
+                prefix1, prefix2, length = struct.unpack('<HHI', top)
+                if (prefix1, prefix2) != (MACHINE_PREPARE_DATA_1, MACHINE_PREPARE_DATA_2) or length < 8:
+                    break
+                packet = await self.reader.readexactly(length)
+                command, _, _, reply_id = struct.unpack('<4H', packet[:8])
+                await self._dispatch(command, reply_id, packet[8:])
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            pass
+        finally:
+            self.abort()
+
+    def _spawn(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def abort(self):
+        if self.closed:
+            return
+        self.closed = True
+        for task in list(self.tasks):
+            task.cancel()
+        self.writer.transport.abort()
+
+    async def _drop_later(self):
+        await asyncio.sleep(self.device.rng.expovariate(1.0 / self.profile.disconnect_interval))
+        self.device.stats.add('forced_disconnects')
+        self.abort()
+
+    # === Framing ===
+
+    def _packet(self, command, reply_id, data=b''):
+        header = struct.pack('<4H', command, 0, self.session_id, reply_id) + data
+        header = struct.pack('<4H', command, checksum(header), self.session_id, reply_id) + data
+        return struct.pack('<HHI', MACHINE_PREPARE_DATA_1, MACHINE_PREPARE_DATA_2, len(header)) + header
+
+    async def _send(self, *packets):
+        payload = b''.join(packets)
+        self.writer.write(payload)
+        self.device.stats.add('bytes_sent', len(payload))
+        await self.writer.drain()
+
+    async def _respond_delay(self):
+        delay = self.profile.response_ms / 1000.0
+        if self.profile.slow_rate and self.device.rng.random() < self.profile.slow_rate:
+            delay += self.profile.slow_ms / 1000.0
+            self.device.stats.add('slow_responses')
+        if delay:
+            await asyncio.sleep(delay)
+
+    # === Commands ===
+
+    async def _dispatch(self, command, reply_id, data):
+        if command == CMD_ACK_OK:
+            # Client acknowledging a pushed event
+            if self.awaiting_ack:
+                self.device.stats.add('events_acked')
+                self._spawn(self._release_after_gap())
+            return
+
+        self.device.stats.add('commands')
+        await self._respond_delay()
+
+        if command == CMD_CONNECT:
+            code = CMD_ACK_OK if self.authenticated else CMD_ACK_UNAUTH
+            await self._send(self._packet(code, reply_id))
+        elif command == CMD_AUTH:
+            self.authenticated = data[:4] == make_commkey(self.profile.password, self.session_id)
+            if not self.authenticated:
+                self.device.stats.add('auth_failures')
+            await self._send(self._packet(CMD_ACK_OK if self.authenticated else CMD_ACK_UNAUTH, reply_id))
+        elif not self.authenticated:
+            await self._send(self._packet(CMD_ACK_UNAUTH, reply_id))
+        elif command == CMD_EXIT:
+            await self._send(self._packet(CMD_ACK_OK, reply_id))
+            self.abort()
+        elif command == CMD_GET_FREE_SIZES:
+            await self._send(self._packet(CMD_ACK_OK, reply_id, self.device.free_sizes()))
+        elif command == CMD_PREPARE_BUFFER:
+            _, table, _, _ = struct.unpack('<bhii', data[:11])
+            if table == CMD_ATTLOG_RRQ:
+                self.buffer = self.device.attendance_buffer()
+            elif table == CMD_USERTEMP_RRQ:
+                self.buffer = self.device.user_buffer()
+            else:
+                self.buffer = struct.pack('<I', 0)
+            await self._send(self._packet(CMD_ACK_OK, reply_id, b'\x00' + struct.pack('<I', len(self.buffer)) + b'\x00' * 4))
+        elif command == CMD_READ_BUFFER:
+            start, size = struct.unpack('<ii', data[:8])
+            chunk = self.buffer[start:start + size]
+            if self.profile.dump_kbps:
+                await asyncio.sleep(len(chunk) / (self.profile.dump_kbps * 128.0))
+            await self._send(
+                self._packet(CMD_PREPARE_DATA, reply_id, struct.pack('<II', len(chunk), 0)),
+                self._packet(CMD_DATA, reply_id, chunk),
+                self._packet(CMD_ACK_OK, reply_id)
+            )
+        elif command == CMD_FREE_DATA:
+            self.buffer = b''
+            await self._send(self._packet(CMD_ACK_OK, reply_id))
+        elif command == CMD_REG_EVENT:
+            flags = struct.unpack('<I', data[:4])[0] if len(data) >= 4 else 0
+            await self._send(self._packet(CMD_ACK_OK, reply_id))
+            self._set_live(bool(flags & EF_ATTLOG))
+        elif command == CMD_GET_VERSION:
+            await self._send(self._packet(CMD_ACK_OK, reply_id, b'Ver 6.60 Sim\x00'))
+        elif command == CMD_OPTIONS_RRQ:
+            key = data.split(b'\x00')[0]
+            await self._send(self._packet(CMD_ACK_OK, reply_id, key + b'=SIM-' + self.device.name.encode() + b'\x00'))
+        elif command in SIMPLE_COMMANDS:
+            await self._send(self._packet(CMD_ACK_OK, reply_id))
+        else:
+            await self._send(self._packet(CMD_ACK_UNKNOWN, reply_id))
+
+    # === Live capture ===
+
+    def _set_live(self, live):
+        if live and not self.live and self.profile.punch_rate > 0:
+            self._spawn(self._generate_punches())
+        self.live = live
+        if not live:
+            self.pending.clear()
+
+    async def _generate_punches(self):
+        rng = self.device.rng
+        while self.live and not self.closed:
+            await asyncio.sleep(rng.expovariate(self.profile.punch_rate))
+            if not self.live:
+                break
+            punch = (rng.choice(self.device.pins), datetime.now().replace(microsecond=0), rng.choice(self.profile.punch_codes))
+            self.device.log.append(punch)
+            self.device.stats.add('events_generated')
+            if len(self.pending) >= self.profile.max_pending_events:
+                self.device.stats.add('events_dropped')
+                continue
+            self.pending.append(punch)
+            await self._push_pending()
+
+    async def _release_after_gap(self):
+        await asyncio.sleep(self.profile.event_gap_ms / 1000.0)
+        self.awaiting_ack = False
+        await self._push_pending()
+
+    async def _push_pending(self):
+        """Send the next event once the previous one was acknowledged"""
+        if self.awaiting_ack or not self.pending or not self.live or self.closed:
+            return
+        pin, timestamp, punch = self.pending.popleft()
+        self.awaiting_ack = True
+        self.device.stats.add('events_sent')
+        await self._send(self._packet(CMD_REG_EVENT, 0, EVENT_RECORD.pack(pin.encode(), 1, punch, encode_timehex(timestamp))))
+
+
+class ZKSimulator:
+    """Simulated devices on consecutive localhost ports, served from a background event loop"""
+
+    def __init__(self, devices=10, base_port=14370, host='127.0.0.1', profile=None, names=None):
+        self.host = host
+        self.profile = profile or DeviceProfile()
+        names = list(names or [])
+        self.devices = [
+            SimulatedDevice(names[i] if i < len(names) else f'SIM{i + 1:03d}', base_port + i, self.profile)
+            for i in range(devices)
+        ]
+        self.loop = None
+        self.thread = None
+
+    def start(self):
+        """Start listening on all ports; returns once every device accepts connections"""
+        ready = threading.Event()
+        errors = []
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            try:
+                self.loop.run_until_complete(self._start_servers())
+            except Exception as e:
+                errors.append(e)
+                ready.set()
+                return
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, name='ZKSimulator', daemon=True)
+        self.thread.start()
+        ready.wait()
+        if errors:
+            raise errors[0]
+        return self
+
+    async def _start_servers(self):
+        for device in self.devices:
+            device.server = await asyncio.start_server(device.handle, self.host, device.port, backlog=512)
+
+    def stop(self):
+        if not self.loop:
+            return
+        asyncio.run_coroutine_threadsafe(self._stop_servers(), self.loop).result(timeout=10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=10)
+        self.loop = None
+
+    async def _stop_servers(self):
+        for device in self.devices:
+            device.drop_connections()
+            if device.server:
+                device.server.close()
+                await device.server.wait_closed()
+
+    def disconnect_all(self):
+        """Drop every open connection at once (reconnect storm)"""
+        self.loop.call_soon_threadsafe(lambda: [device.drop_connections() for device in self.devices])
+
+    def device_configs(self, password=None):
+        """FINGERPRINT_DEVICES entries pointing at the simulated devices"""
+        return [
+            {'name': device.name, 'ip': self.host, 'port': device.port,
+             'password': self.profile.password if password is None else password, 'connection_type': 'zk'}
+            for device in self.devices
+        ]
+
+    def stats(self):
+        """Per-device counters and their totals"""
+        per_device = {device.name: device.stats.to_dict() for device in self.devices}
+        totals = {field: sum(stats[field] for stats in per_device.values()) for field in DeviceStats.FIELDS}
+        return {'totals': totals, 'devices': per_device}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--devices', type=int, default=10)
+    parser.add_argument('--base-port', type=int, default=14370)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--log-size', type=int, default=5000, help='Attendance records per device')
+    parser.add_argument('--punch-rate', type=float, default=0.5, help='Live punches per second per device')
+    parser.add_argument('--punch-codes', default='0', help='Comma-separated punch codes to draw from')
+    parser.add_argument('--response-ms', type=float, default=0.0, help='Delay on every response')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='Share of responses delayed by --slow-ms')
+    parser.add_argument('--slow-ms', type=float, default=2000.0)
+    parser.add_argument('--dump-kbps', type=float, default=0.0, help='Dump bandwidth limit (0 = unlimited)')
+    parser.add_argument('--disconnect-interval', type=float, default=0.0,
+                        help='Mean seconds until a client is dropped (0 = never)')
+    parser.add_argument('--refuse-rate', type=float, default=0.0, help='Share of connections refused')
+    parser.add_argument('--password', type=int, default=0, help='Comm key (0 = none)')
+    parser.add_argument('--stats-interval', type=float, default=10.0)
+    args = parser.parse_args()
+
+    profile = DeviceProfile(
+        users=args.users, log_size=args.log_size, punch_rate=args.punch_rate,
+        punch_codes=[int(code) for code in args.punch_codes.split(',')], response_ms=args.response_ms,
+        slow_rate=args.slow_rate, slow_ms=args.slow_ms, dump_kbps=args.dump_kbps,
+        disconnect_interval=args.disconnect_interval, refuse_rate=args.refuse_rate, password=args.password
+    )
+    simulator = ZKSimulator(args.devices, args.base_port, args.host, profile).start()
+    print("Simulated devices (FINGERPRINT_DEVICES entries):")
+    print(json.dumps(simulator.device_configs(), indent=2), flush=True)
+    try:
+        while True:
+            time.sleep(args.stats_interval)
+            print(json.dumps({'at': datetime.now().isoformat(timespec='seconds'), **simulator.stats()['totals']}), flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
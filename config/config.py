@@ -30,6 +30,9 @@ class Config:
     VPS_API_RETRY_COUNT = int(os.environ.get('VPS_API_RETRY_COUNT', 3))
     VPS_PUSH_ENABLED = os.environ.get('VPS_PUSH_ENABLED', 'False').lower() == 'true'
     
+    # /metrics requires "Authorization: Bearer <token>" when set
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+    
     def get_available_odbc_drivers(self):
         """Get list of available SQL Server ODBC drivers"""
         drivers = pyodbc.drivers()
@@ -1,7 +1,246 @@
 import pyodbc
 from config.config import config
+from config.logging_config import get_background_logger
 import os
+import re
+import time
 import logging
+import threading
+from functools import lru_cache
+from app.utils import metrics
+
+DB_CONNECT_SECONDS = metrics.histogram(
+    'attendance_db_connect_seconds', 'Time to obtain a SQL Server connection (ODBC pool wait + login)', ['outcome']
+)
+DB_STATEMENT_SECONDS = metrics.histogram(
+    'attendance_db_statement_seconds', 'Statement execute + fetch time by statement kind', ['kind']
+)
+
+slow_query_logger = get_background_logger('SlowQuery', 'logs/slow_query.log')
+
+# Literals and parameter lists that vary between calls of the same statement
+_STRING_LITERAL = re.compile(r"N?'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w@#])-?\d+(?:\.\d+)?\b")
+_PARAM_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def statement_fingerprint(sql):
+    """Normalized statement text: literals -> ?, IN (?, ?, ...) -> (?+), single-spaced"""
+    text = _STRING_LITERAL.sub('?', sql)
+    text = _NUMBER_LITERAL.sub('?', text)
+    text = _PARAM_LIST.sub('(?+)', text)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def _statement_kind(fingerprint):
+    """select/insert/update/delete/merge/exec/other from the first keyword"""
+    first = fingerprint.split(' ', 1)[0].lower() if fingerprint else ''
+    if first in ('select', 'insert', 'update', 'delete', 'merge'):
+        return first
+    if first in ('exec', 'execute'):
+        return 'exec'
+    return 'other'
+
+
+class StatementStats:
+    """Per-fingerprint totals of every statement run through InstrumentedCursor"""
+
+    def __init__(self, slow_ms=500, max_statements=500):
+        self.slow_ms = slow_ms
+        self.max_statements = max_statements
+        self.statements = {}
+        self.lock = threading.Lock()
+
+    def record(self, fingerprint, execute_seconds, fetch_seconds, rows):
+        """Add one completed statement and log it when it was slow"""
+        total = execute_seconds + fetch_seconds
+        kind = _statement_kind(fingerprint)
+        DB_STATEMENT_SECONDS.observe(total, kind=kind)
+        with self.lock:
+            entry = self.statements.get(fingerprint)
+            if entry is None:
+                if len(self.statements) >= self.max_statements:
+                    # Forget the cheapest statement to bound memory
+                    cheapest = min(self.statements, key=lambda k: self.statements[k]['total_seconds'])
+                    del self.statements[cheapest]
+                entry = self.statements[fingerprint] = {
+                    'kind': kind, 'calls': 0, 'total_seconds': 0.0, 'execute_seconds': 0.0,
+                    'fetch_seconds': 0.0, 'max_seconds': 0.0, 'rows': 0, 'slow_calls': 0
+                }
+            entry['calls'] += 1
+            entry['total_seconds'] += total
+            entry['execute_seconds'] += execute_seconds
+            entry['fetch_seconds'] += fetch_seconds
+            entry['max_seconds'] = max(entry['max_seconds'], total)
+            entry['rows'] += max(rows, 0)
+            slow = total * 1000 >= self.slow_ms
+            if slow:
+                entry['slow_calls'] += 1
+        if slow:
+            slow_query_logger.warning(
+                f"{total * 1000:.0f} ms (execute {execute_seconds * 1000:.0f} ms, fetch {fetch_seconds * 1000:.0f} ms, "
+                f"rows {rows}): {fingerprint[:2000]}"
+            )
+
+    def top(self, limit=20, order_by='total_seconds'):
+        """Top statements by a numeric field"""
+        with self.lock:
+            items = [dict(entry, statement=fingerprint) for fingerprint, entry in self.statements.items()]
+        items.sort(key=lambda item: item.get(order_by, 0), reverse=True)
+        for item in items[:limit]:
+            item['avg_ms'] = round(item['total_seconds'] * 1000 / item['calls'], 1) if item['calls'] else None
+        return items[:limit]
+
+    def reset(self):
+        """Clear all totals"""
+        with self.lock:
+            self.statements.clear()
+
+
+statement_stats = StatementStats(
+    slow_ms=int(os.environ.get('SLOW_QUERY_MS', 500)),
+    max_statements=int(os.environ.get('DB_STATEMENT_STATS_MAX', 500))
+)
+
+
+class InstrumentedCursor:
+    """pyodbc cursor proxy that times execute and fetch per statement"""
+
+    def __init__(self, cursor, stats=statement_stats, owner=None):
+        self._cursor = cursor
+        self._stats = stats
+        self._owner = owner
+        self._fingerprint = None
+
+    def _begin(self, sql):
+        self._finish()
+        self._fingerprint = statement_fingerprint(sql)
+        self._execute_seconds = 0.0
+        self._fetch_seconds = 0.0
+        self._rows = 0
+
+    def _finish(self):
+        """Record the current statement (on the next execute or close)"""
+        if self._fingerprint is None:
+            return
+        fingerprint, self._fingerprint = self._fingerprint, None
+        try:
+            self._stats.record(fingerprint, self._execute_seconds, self._fetch_seconds, self._rows)
+        except Exception:
+            pass
+
+    def _run(self, method, sql, *args, **kwargs):
+        self._begin(sql)
+        started = time.perf_counter()
+        try:
+            method(sql, *args, **kwargs)
+        finally:
+            self._execute_seconds = time.perf_counter() - started
+            try:
+                self._rows = max(self._cursor.rowcount, 0)
+            except Exception:
+                pass
+        return self
+
+    def execute(self, sql, *params):
+        return self._run(self._cursor.execute, sql, *params)
+
+    def executemany(self, sql, params):
+        return self._run(self._cursor.executemany, sql, params)
+
+    def _fetch(self, method, *args):
+        started = time.perf_counter()
+        result = method(*args)
+        self._fetch_seconds += time.perf_counter() - started
+        if isinstance(result, list):
+            self._rows += len(result)
+        elif result is not None:
+            self._rows += 1
+        return result
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone)
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            return self._fetch(self._cursor.fetchmany)
+        return self._fetch(self._cursor.fetchmany, size)
+
+    def fetchval(self):
+        return self._fetch(self._cursor.fetchval)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def close(self):
+        self._finish()
+        if self._owner is not None and self in self._owner:
+            self._owner.remove(self)
+        self._cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._cursor, name, value)
+
+
+class InstrumentedConnection:
+    """pyodbc connection proxy whose cursors are InstrumentedCursor"""
+
+    def __init__(self, connection, stats=statement_stats):
+        object.__setattr__(self, '_connection', connection)
+        object.__setattr__(self, '_stats', stats)
+        object.__setattr__(self, '_cursors', [])
+
+    def cursor(self):
+        cursor = InstrumentedCursor(self._connection.cursor(), self._stats, owner=self._cursors)
+        self._cursors.append(cursor)
+        return cursor
+
+    def execute(self, sql, *params):
+        return self.cursor().execute(sql, *params)
+
+    def close(self):
+        # Callers often close the connection without closing the cursor
+        for cursor in self._cursors:
+            cursor._finish()
+        self._cursors.clear()
+        self._connection.close()
+
+    def __enter__(self):
+        self._connection.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._connection.__exit__(exc_type, exc, tb)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._connection, name, value)
 
 class DatabaseManager:
     """Database connection manager for SQL Server"""
@@ -31,8 +270,15 @@ class DatabaseManager:
                 f"Timeout=30;"
             )
             
-            connection = pyodbc.connect(connection_string)
+            started = time.perf_counter()
+            try:
+                connection = pyodbc.connect(connection_string)
+            except Exception:
+                DB_CONNECT_SECONDS.observe(time.perf_counter() - started, outcome='error')
+                raise
+            DB_CONNECT_SECONDS.observe(time.perf_counter() - started, outcome='ok')
             connection.autocommit = False
+            connection = InstrumentedConnection(connection)
             
             if self.config_name == 'production':
                 self.logger.info("SQL Server connection established (production)")
@@ -1,4 +1,4 @@
-m-"""
+"""
 Device Configuration for Fingerprint Attendance System
 Centralized configuration for all fingerprint devices
 """
@@ -25,7 +25,16 @@ FINGERSPOT_API_CONFIG = {
     },
     'timeout': 30,
     'retry_count': 3,
-    'retry_delay': 5
+    'retry_delay': 5,
+    # Streaming poller (seconds); can be overridden per device in api_config
+    'poll_interval': 120,
+    'min_poll_interval': 60,
+    'max_poll_interval': 900,
+    'poll_backoff_factor': 1.5,
+    'lookback_days': 1,
+    'max_concurrent_windows': 4,
+    # Successful connection tests are reused for this long (seconds)
+    'connection_check_ttl': 60
 }
 
 # === Online Attendance API Configuration ===
@@ -41,7 +50,85 @@ ONLINE_ATTENDANCE_API_CONFIG = {
     },
     'timeout': 30,
     'retry_count': 3,
-    'retry_delay': 5
+    'retry_delay': 5,
+    # Paginated fetch: ranges are requested one window of window_days at a time,
+    # following page/per_page when the API returns pagination metadata
+    'window_days': 1,
+    'page_size': 500,
+    'max_pages': 1000,
+    # Records processed and saved per batch during sync
+    'sync_batch_size': 500
+}
+
+# === HTTP Client Pool ===
+# Keep-alive sessions shared by the API clients (one pool per host)
+HTTP_CLIENT_CONFIG = {
+    'pool_connections': 4,
+    # >= concurrent requests per host (Fingerspot max_concurrent_windows x API devices)
+    'pool_maxsize': 10,
+    # Requests kept per host for latency percentiles
+    'latency_window': 200
+}
+
+# Punch latency tracing (device -> FPLog -> queue -> attrecord -> VPS)
+PUNCH_TRACE_CONFIG = {
+    'enabled': True,
+    # Latencies kept per stage for percentiles
+    'window': 2000,
+    # Open traces kept in memory; the oldest are dropped beyond this
+    'max_open_traces': 20000,
+    # Traces that never reach the VPS are dropped after this many seconds
+    'trace_ttl': 2 * 24 * 3600,
+    # Seconds since capture after which a stage counts as a slow outlier
+    'slow_seconds': {
+        'fplog_commit': 5,
+        'queue_insert': 10,
+        'recompute': 120,
+        'vps_ack': 6 * 3600
+    },
+    # Fraction of slow outliers written to the trace log (0 disables it)
+    'slow_sample_rate': 1.0,
+    'log_file': 'logs/punch_trace.log',
+    # Stages stamped in processes without open traces (e.g. a VPS push from a web
+    # worker) are handed to the streaming leader through this file
+    'shared_file': 'shared/punch_trace_stamps.db',
+    # How often the leader joins shared stamps into its traces (seconds)
+    'shared_poll_interval': 5
+}
+
+# === Data Retention ===
+# Rows older than the retention window are moved (not copied) to <table>_archive,
+# so the hot tables only hold recent data. FPLog and gagalabsens are archived by
+# whole months: everything before the month that contains (today - days).
+# days = 0 keeps the table as is. Stored procedures (attrecord, spJamkerja) read
+# FPLog/gagalabsens directly, so keep those windows longer than any recompute range.
+DATA_RETENTION_CONFIG = {
+    'enabled': True,
+    # Daily run time (HH:MM, server time)
+    'run_at': '02:30',
+    # Rows moved per transaction; below SQL Server's 5000-lock escalation threshold
+    'batch_size': 4000,
+    # Upper bound per table and run; the rest is moved on the next run
+    'max_batches_per_run': 250,
+    'tables': {
+        # Worker queue: only processed rows ('selesai'), by punch date
+        'attendance_queues': {'days': 30, 'date_column': 'date', 'status': 'selesai', 'monthly': False},
+        'FPLog': {'days': 0, 'date_column': 'Date', 'monthly': True},
+        'gagalabsens': {'days': 0, 'date_column': 'tgl', 'monthly': True},
+    }
+}
+
+# Columnar archive: closed months exported to compressed NumPy files for audits
+# (flask export-archive / flask query-archive); rows are read from the hot table
+# and its _archive table
+COLUMNAR_ARCHIVE_CONFIG = {
+    'directory': 'archive/columnar',
+    'fetch_size': 20000,
+    'tables': {
+        'FPLog': {'date_column': 'Date', 'pin_column': 'PIN'},
+        'gagalabsens': {'date_column': 'tgl', 'pin_column': 'pin'},
+        'attrecords': {'date_column': 'tgl', 'pin_column': 'pin'},
+    }
 }
 
 
@@ -153,11 +240,11 @@ DEVICE_DISPLAY_NAMES = {
 # === Helper Functions ===
 
 def get_device_by_name(device_name):
-    """Get device configuration by name"""
-    for device in FINGERPRINT_DEVICES:
-        if device['name'] == device_name:
-            return device
-    return None
+    """Get device configuration by name (O(1) via the name index)"""
+    if len(_DEVICE_INDEX) != len(FINGERPRINT_DEVICES):
+        # FINGERPRINT_DEVICES was modified at runtime
+        reload_device_tables()
+    return _DEVICE_INDEX.get(device_name)
 
 def get_device_ip(device_name):
     """Get device IP address by name"""
@@ -200,6 +287,120 @@ def get_fingerspot_config(device_name):
         return device.get('api_config', {})
     return None
 
+def _status_to_display(device_name, status):
+    """Convert a resolved status value to human-readable display text"""
+    # Handle binary status devices (like 102)
+    if isinstance(status, int):
+        if status == 0:
+            return 'Masuk'
+        elif status == 1:
+            return 'Keluar'
+        return 'Unknown'
+    
+    # Handle string status devices
+    if isinstance(status, str):
+        # Handle special case for device 201 (P1 MASUK-X format)
+        if device_name == '201' and status.startswith('P1 MASUK-'):
+            try:
+                return f'P1 Masuk Ke-{status.split("-")[1]}'
+            except IndexError:
+                return 'P1 Masuk'
+        upper = status.upper()
+        if upper == 'I':
+            return 'Masuk'
+        elif upper == 'O':
+            return 'Keluar'
+        elif upper == 'B':
+            return 'Istirahat'
+        return status  # Return the status as-is for custom formats
+    
+    return 'Unknown'
+
+
+def _normalize_punch(punch_code):
+    """Normalize a punch code to the lookup key (digit strings become ints)"""
+    if isinstance(punch_code, str) and punch_code.isdigit():
+        return int(punch_code)
+    return punch_code
+
+
+# Punch codes precomputed for devices whose status is derived from the code (201)
+_PRECOMPUTED_PUNCH_RANGE = range(256)
+
+
+def _compile_device_rules(device_name, rules):
+    """
+    Compile one device's rules into (lookup, default) where lookup maps a
+    normalized punch code to (status, display) and default is used on a miss
+    """
+    def entry(status):
+        return (status, _status_to_display(device_name, status))
+    
+    lookup = {}
+    for key, status in rules.items():
+        if not key.startswith('punch_') or key == 'punch_other':
+            continue
+        lookup[_normalize_punch(key[len('punch_'):])] = entry(status)
+    
+    if device_name == '102':
+        # Binary device: only 2 and 3 are mapped, everything else is In
+        lookup = {code: value for code, value in lookup.items() if code in (2, 3)}
+        default = entry(rules['punch_other'])
+    elif device_name == '201':
+        # P1 MASUK-X where X = status_scan + 1
+        for code in _PRECOMPUTED_PUNCH_RANGE:
+            lookup[code] = entry(f'P1 MASUK-{code + 1}')
+        default = entry(rules.get('punch_other', 'P1 MASUK-1'))
+    elif device_name == 'default':
+        default = entry('I')
+    else:
+        default = entry(rules.get('punch_other', 'I'))
+    
+    return lookup, default
+
+
+def reload_device_tables():
+    """
+    (Re)build the precompiled status lookup tables and the device name index.
+    Call after changing DEVICE_STATUS_RULES or FINGERPRINT_DEVICES at runtime.
+    """
+    global _STATUS_TABLES, _DEVICE_INDEX
+    _STATUS_TABLES = {
+        device_name: _compile_device_rules(device_name, rules)
+        for device_name, rules in DEVICE_STATUS_RULES.items()
+    }
+    _DEVICE_INDEX = {device['name']: device for device in FINGERPRINT_DEVICES}
+
+
+def resolve_status(device_name, punch_code):
+    """
+    Resolve status value and display text in a single O(1) lookup
+    
+    Args:
+        device_name (str): Name of the device (e.g., '104', '108', etc.)
+        punch_code (int/str): Punch code from the device
+    
+    Returns:
+        tuple: (status, status_display)
+    """
+    lookup, default = _STATUS_TABLES.get(device_name) or _STATUS_TABLES['default']
+    key = _normalize_punch(punch_code)
+    try:
+        hit = lookup.get(key)
+    except TypeError:
+        # Unhashable punch code
+        return default
+    if hit is not None:
+        return hit
+    
+    # Device 201 derives the status from any non-negative numeric code
+    if device_name == '201' and isinstance(key, int) and key >= 0:
+        status = f'P1 MASUK-{key + 1}'
+        return status, _status_to_display(device_name, status)
+    
+    return default
+
+
 def determine_status(device_name, punch_code):
     """
     Determine attendance status based on device name and punch code
@@ -212,69 +413,7 @@ def determine_status(device_name, punch_code):
     Returns:
         str/int: Status value based on device rules
     """
-    try:
-        # Convert punch_code to proper type if needed
-        if isinstance(punch_code, str) and punch_code.isdigit():
-            punch_code = int(punch_code)
-        
-        # Check if device has specific rules
-        if device_name in DEVICE_STATUS_RULES:
-            rules = DEVICE_STATUS_RULES[device_name]
-            
-            # Handle special case for device 102 (binary status)
-            if device_name == '102':
-                if punch_code == 2:
-                    return rules['punch_2']
-                elif punch_code == 3:
-                    return rules['punch_3']
-                else:
-                    return rules['punch_other']
-            
-            # Handle special case for device 201 (Fingerspot API with P1 MASUK-X format)
-            elif device_name == '201':
-                # Device 201 menggunakan format P1 MASUK-X dimana X = status_scan + 1
-                if isinstance(punch_code, (int, str)) and str(punch_code).isdigit():
-                    status_scan = int(punch_code)
-                    increment = status_scan + 1
-                    return f'P1 MASUK-{increment}'
-                else:
-                    # Fallback ke punch key lookup jika tidak numerik
-                    punch_key = f'punch_{punch_code}'
-                    return rules.get(punch_key, rules.get('punch_other', 'P1 MASUK-1'))
-            
-            # Handle other devices with string status
-            else:
-                # Create punch key for lookup
-                punch_key = f'punch_{punch_code}'
-                
-                # Direct lookup for numeric punch codes
-                if punch_key in rules:
-                    return rules[punch_key]
-                
-                # Handle special string punch codes
-                elif punch_code == 'i' and 'punch_i' in rules:
-                    return rules['punch_i']
-                elif punch_code == 'o' and 'punch_o' in rules:
-                    return rules['punch_o']
-                
-                # Use default for device
-                else:
-                    return rules.get('punch_other', 'I')
-        
-        # Use default rules for devices without specific configuration
-        default_rules = DEVICE_STATUS_RULES['default']
-        if punch_code == 0:
-            return default_rules['punch_0']
-        elif punch_code == 1:
-            return default_rules['punch_1']
-        else:
-            # Return the punch code itself if no mapping found
-            return 'I'  # Default to 'I' (In) for unknown punch codes
-            
-    except Exception as e:
-        # Log error and return safe default
-        print(f"Error determining status for device {device_name}, punch {punch_code}: {e}")
-        return 'I'  # Safe default
+    return resolve_status(device_name, punch_code)[0]
 
 def get_status_display(device_name, punch_code):
     """
@@ -287,46 +426,33 @@ def get_status_display(device_name, punch_code):
     Returns:
         str: Human-readable status ('Masuk', 'Keluar', 'Istirahat', 'Unknown')
     """
-    try:
-        # Get the status value using determine_status
-        status = determine_status(device_name, punch_code)
-        
-        # Handle binary status devices (like 102)
-        if isinstance(status, int):
-            if status == 0:
-                return 'Masuk'
-            elif status == 1:
-                return 'Keluar'
-            else:
-                return 'Unknown'
-        
-        # Handle string status devices
-        elif isinstance(status, str):
-            # Handle special case for device 201 (P1 MASUK-X format)
-            if device_name == '201' and status.startswith('P1 MASUK-'):
-                # Extract increment number for display
-                try:
-                    increment = status.split('-')[1]
-                    return f'P1 Masuk Ke-{increment}'
-                except (IndexError, ValueError):
-                    return 'P1 Masuk'
-            # Handle standard status codes
-            elif status.upper() == 'I':
-                return 'Masuk'
-            elif status.upper() == 'O':
-                return 'Keluar'
-            elif status.upper() == 'B':
-                return 'Istirahat'
-            else:
-                return status  # Return the status as-is for custom formats
-        
-        # Fallback for unknown status types
-        else:
-            return 'Unknown'
-            
-    except Exception as e:
-        print(f"Error getting status display for device {device_name}, punch {punch_code}: {e}")
-        return 'Unknown'
+    return resolve_status(device_name, punch_code)[1]
+
+def resolve_status_batch(device_name, punch_codes):
+    """
+    Map a whole batch of punch codes for one device
+    
+    Each distinct code is resolved once against the precompiled table, then the
+    batch is mapped through the result with Series.map.
+    
+    Args:
+        device_name (str): Name of the device
+        punch_codes: pandas Series or iterable of punch codes
+    
+    Returns:
+        tuple: (statuses, displays) - object Series aligned to the input index
+        for a Series, lists otherwise
+    """
+    import pandas as pd
+    
+    is_series = isinstance(punch_codes, pd.Series)
+    codes = punch_codes if is_series else pd.Series(list(punch_codes), dtype=object)
+    resolved = {code: resolve_status(device_name, code) for code in codes.unique()}
+    statuses = codes.map({code: hit[0] for code, hit in resolved.items()}).astype(object)
+    displays = codes.map({code: hit[1] for code, hit in resolved.items()}).astype(object)
+    if is_series:
+        return statuses, displays
+    return statuses.tolist(), displays.tolist()
 
 def validate_device_config():
     """
@@ -385,12 +511,12 @@ def validate_device_config():
     
     return errors
 
-# Run validation on import
-_validation_errors = validate_device_config()
-if _validation_errors:
-    print("Device configuration validation errors:")
-    for error in _validation_errors:
-        print(f"  - {error}")
+# Build lookup tables on import
+_STATUS_TABLES = {}
+_DEVICE_INDEX = {}
+reload_device_tables()
+
+# Validation runs from create_app (logged) and `flask check-devices`, not on import
 
 # === Compatibility Mapping ===
 # For backward compatibility with existing code that uses DEVICE_CONFIG
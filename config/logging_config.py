@@ -1,12 +1,46 @@
 """
 Logging configuration for the attendance system
 Handles Unicode characters properly on Windows
+
+Records are formatted and written by one QueueListener thread per process:
+loggers only put the record on a bounded queue, so console and file I/O stay off the
+streaming and worker threads. When the queue is full the record is dropped
+and counted (attendance_log_records_dropped_total). INFO/DEBUG records of
+the loggers in LOG_THROTTLE are rate limited per call site, so per-punch
+messages cannot flood the log during a burst.
+
+Environment:
+    LOG_ASYNC=false       write from the calling thread (previous behaviour)
+    LOG_FORMAT=json       one JSON object per line instead of plain text
+    LOG_QUEUE_SIZE=10000  records buffered before new ones are dropped
 """
 
+import atexit
+import json
 import logging
 import os
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+import threading
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_ASYNC = os.environ.get('LOG_ASYNC', 'true').lower() != 'false'
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+
+# Per-logger limits for INFO/DEBUG records, per call site (file and line):
+# `rate` records per second with bursts up to `burst`; past the limit only
+# one in `sample` records is kept (0 = none)
+LOG_THROTTLE = {
+    'StreamingService': {'rate': 20, 'burst': 200, 'sample': 50},
+}
+
+# Created by _register_metrics() on the first setup_logging() call: app/__init__
+# imports this module, so app.utils.metrics cannot be imported at module level
+LOG_RECORDS_DROPPED = None
+LOG_RECORDS_THROTTLED = None
 
 
 class SafeStreamHandler(logging.StreamHandler):
@@ -36,6 +70,212 @@ class SafeStreamHandler(logging.StreamHandler):
             self.handleError(record)
 
 
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; extra={...} fields are included"""
+
+    # Attributes every LogRecord has; anything else came from extra=
+    STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in self.STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class LogThrottle(logging.Filter):
+    """Token bucket per call site for records at or below max_level"""
+
+    def __init__(self, rate, burst, sample=0, max_level=logging.INFO):
+        super().__init__()
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.sample = int(sample)
+        self.max_level = max_level
+        self.sites = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > self.max_level:
+            return True
+        now = time.monotonic()
+        key = (record.pathname, record.lineno)
+        with self.lock:
+            site = self.sites.get(key)
+            if site is None:
+                site = self.sites[key] = [self.burst, now, 0]
+            site[0] = min(self.burst, site[0] + (now - site[1]) * self.rate)
+            site[1] = now
+            if site[0] >= 1:
+                site[0] -= 1
+                suppressed, site[2] = site[2], 0
+            else:
+                site[2] += 1
+                if not self.sample or site[2] < self.sample:
+                    LOG_RECORDS_THROTTLED.inc(logger=record.name)
+                    return False
+                # Sampled: keep this one, report the ones skipped before it
+                suppressed, site[2] = site[2] - 1, 0
+        if suppressed:
+            # Shown by JsonFormatter: records skipped at this call site before this one
+            record.suppressed = suppressed
+        return True
+
+
+class _RoutingHandler(logging.Handler):
+    """Runs on the listener thread: hands each record to the handlers of its logger"""
+
+    def __init__(self):
+        super().__init__()
+        self.routes = {}
+        self.routes_lock = threading.Lock()
+
+    def route(self, name, handlers):
+        """Set the handlers of a logger; returns the previous ones"""
+        with self.routes_lock:
+            previous = self.routes.get(name, [])
+            self.routes[name] = handlers
+            return previous
+
+    def emit(self, record):
+        retired = getattr(record, 'retired_handlers', None)
+        if retired is not None:
+            for handler in retired:
+                handler.close()
+            return
+        with self.routes_lock:
+            handlers = self.routes.get(record.name, ())
+        for handler in handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+class _LogListener:
+    """One QueueListener per process, started lazily so a forked worker gets its own thread and queue"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.router = _RoutingHandler()
+        self.lock = threading.Lock()
+        self.queue = None
+        self.listener = None
+        self.pid = None
+        self.stopped = False
+
+    def get_queue(self):
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.queue = queue.Queue(self.maxsize)
+                    self.listener = QueueListener(self.queue, self.router, respect_handler_level=True)
+                    self.listener.start()
+                    self.pid = os.getpid()
+                    self.stopped = False
+        return self.queue
+
+    def running(self):
+        return self.pid == os.getpid() and not self.stopped
+
+    def retire(self, handlers):
+        """
+        Close replaced handlers on the listener thread, after the records queued
+        ahead of them, so a handler is never closed while it is being written to
+        """
+        if not handlers:
+            return
+        if not self.running():
+            for handler in handlers:
+                handler.close()
+            return
+        try:
+            self.queue.put(logging.makeLogRecord({'levelno': logging.CRITICAL, 'retired_handlers': handlers}), timeout=5)
+        except queue.Full:
+            # Left to the garbage collector rather than closed under the listener
+            pass
+
+    def stop(self):
+        """Write what is queued and stop the thread (registered with atexit)"""
+        if not self.running():
+            return
+        self.stopped = True
+        try:
+            self.listener.stop()
+        except queue.Full:
+            pass
+
+    def get_stats(self):
+        return {
+            'running': self.running(),
+            'queued': self.queue.qsize() if self.queue else 0,
+            'queue_size': self.maxsize,
+        }
+
+
+_listener = _LogListener(LOG_QUEUE_SIZE)
+atexit.register(_listener.stop)
+
+
+def _register_metrics():
+    global LOG_RECORDS_DROPPED, LOG_RECORDS_THROTTLED
+    if LOG_RECORDS_DROPPED is not None:
+        return
+    from app.utils import metrics
+    LOG_RECORDS_DROPPED = metrics.counter(
+        'attendance_log_records_dropped_total', 'Log records dropped because the log queue was full', ['logger']
+    )
+    LOG_RECORDS_THROTTLED = metrics.counter(
+        'attendance_log_records_throttled_total', 'INFO/DEBUG log records suppressed by the per-call-site rate limit',
+        ['logger']
+    )
+    metrics.gauge('attendance_log_queue_depth', 'Log records waiting for the listener thread',
+                  callback=lambda: {(): _listener.get_stats()['queued']})
+
+
+class AsyncLogHandler(QueueHandler):
+    """Hands records to the listener thread; drops (and counts) them when the queue is full"""
+
+    def __init__(self, level=logging.NOTSET):
+        super().__init__(None)
+        self.setLevel(level)
+
+    def prepare(self, record):
+        """Resolve message and exception text now; args may change before the listener gets to them"""
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            _listener.get_queue().put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc(logger=record.name)
+
+
+def get_logging_stats():
+    """Writer thread and queue state plus dropped/throttled record counts"""
+    _register_metrics()
+    stats = _listener.get_stats()
+    with LOG_RECORDS_DROPPED.lock:
+        stats['dropped'] = {key[0]: value for key, value in LOG_RECORDS_DROPPED.series.items()}
+    with LOG_RECORDS_THROTTLED.lock:
+        stats['throttled'] = {key[0]: value for key, value in LOG_RECORDS_THROTTLED.series.items()}
+    return stats
+
+
 def setup_logging(name, log_level=logging.INFO, log_file=None):
     """
     Setup logging with Unicode support and conflict prevention
@@ -48,12 +288,16 @@ def setup_logging(name, log_level=logging.INFO, log_file=None):
     Returns:
         logger: Configured logger instance
     """
+    _register_metrics()
     logger = logging.getLogger(name)
     
     # Always clear existing handlers to prevent conflicts
     for handler in logger.handlers[:]:
         logger.removeHandler(handler)
         handler.close()
+    for log_filter in logger.filters[:]:
+        if isinstance(log_filter, LogThrottle):
+            logger.removeFilter(log_filter)
     
     logger.setLevel(log_level)
     
@@ -61,16 +305,21 @@ def setup_logging(name, log_level=logging.INFO, log_file=None):
     logger.propagate = False
     
     # Create formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
+    if LOG_FORMAT == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+    
+    handlers = []
     
     # Console handler with safe Unicode support
     console_handler = SafeStreamHandler(sys.stdout)
     console_handler.setLevel(log_level)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    handlers.append(console_handler)
     
     # File handler (if specified)
     if log_file:
@@ -89,7 +338,19 @@ def setup_logging(name, log_level=logging.INFO, log_file=None):
         )
         file_handler.setLevel(log_level)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
+    
+    throttle = LOG_THROTTLE.get(name)
+    if throttle:
+        logger.addFilter(LogThrottle(**throttle))
+    
+    if LOG_ASYNC:
+        # The listener thread owns the console/file handlers; the logger only enqueues
+        _listener.retire(_listener.router.route(name, handlers))
+        logger.addHandler(AsyncLogHandler(log_level))
+    else:
+        for handler in handlers:
+            logger.addHandler(handler)
     
     return logger
 
@@ -1,137 +1,251 @@
 """
 Notification Queue System for Inter-Process Communication
 Handles notifications between streaming_data.py and Flask app
+
+Notifications are stored in an append-only SQLite log (WAL mode) so the
+streaming process and every gunicorn worker can write and read it safely.
+Each notification gets a monotonically increasing sequence number; readers
+can ask for everything after a known sequence, and old entries are trimmed
+by a background compaction thread instead of rewriting the whole store.
 """
 
 import json
 import os
+import sqlite3
 import threading
 import time
+import uuid
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
 class NotificationQueue:
-    def __init__(self, file_path: str = "shared/notifications.json", max_notifications: int = 100):
+    def __init__(self, file_path: str = "shared/notifications.db", max_notifications: int = 100,
+                 compact_interval: int = 60):
         self.file_path = file_path
         self.max_notifications = max_notifications
-        self.lock = threading.Lock()
+        self.compact_interval = compact_interval
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._compactor_thread = None
         self._ensure_directory()
-        
+
     def _ensure_directory(self):
         """Ensure the directory exists for the notification file"""
         directory = os.path.dirname(self.file_path)
         if directory and not os.path.exists(directory):
             os.makedirs(directory)
-            
-    def _read_notifications(self) -> List[Dict[str, Any]]:
-        """Read notifications from file"""
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get the calling thread's connection, creating it (and the schema) on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.file_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+            self._ensure_schema(conn)
+        return conn
+
+    def _ensure_schema(self, conn: sqlite3.Connection):
+        """Create the notification log table if it does not exist"""
+        if self._schema_ready:
+            return
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS notifications (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id TEXT NOT NULL UNIQUE,
+                    type TEXT,
+                    device_name TEXT,
+                    created_at TEXT NOT NULL,
+                    read INTEGER NOT NULL DEFAULT 0,
+                    payload TEXT NOT NULL
+                )
+            """)
+            self._schema_ready = True
+
+    def _start_compactor(self):
+        """Start the background compaction thread once per process"""
+        if self._compactor_thread and self._compactor_thread.is_alive():
+            return
+        self._compactor_thread = threading.Thread(
+            target=self._compaction_loop,
+            daemon=True,
+            name="NotificationCompactor"
+        )
+        self._compactor_thread.start()
+
+    def _compaction_loop(self):
+        """Periodically trim the log to the newest max_notifications entries"""
+        while True:
+            time.sleep(self.compact_interval)
+            try:
+                self.compact()
+            except sqlite3.Error as e:
+                print(f"Error compacting notifications: {e}")
+
+    def compact(self):
+        """Delete entries older than the newest max_notifications and checkpoint the WAL"""
+        conn = self._connect()
+        conn.execute(
+            "DELETE FROM notifications WHERE seq <= (SELECT MAX(seq) FROM notifications) - ?",
+            (self.max_notifications,)
+        )
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def _row_to_notification(self, row) -> Dict[str, Any]:
+        """Convert a (seq, read, payload) row to a notification dict"""
+        seq, read, payload = row
+        notification = json.loads(payload)
+        notification['seq'] = seq
+        notification['read'] = bool(read)
+        return notification
+
+    def add_notification(self, notification_type: str, message: str, device_name: str,
+                        user_id: str = None, status: str = None, **kwargs):
+        """Append a new notification to the log (single INSERT, O(1))"""
+        new_notification = {
+            'id': f"{int(time.time()*1000)}_{uuid.uuid4().hex[:8]}",  # Unique ID
+            'type': notification_type,
+            'message': message,
+            'device_name': device_name,
+            'user_id': user_id,
+            'status': status,
+            'timestamp': datetime.now().isoformat(),
+            'read': False,
+            **kwargs  # Additional data
+        }
+
         try:
-            if os.path.exists(self.file_path):
-                with open(self.file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    return data.get('notifications', [])
+            conn = self._connect()
+            conn.execute(
+                "INSERT INTO notifications (id, type, device_name, created_at, payload) VALUES (?, ?, ?, ?, ?)",
+                (
+                    new_notification['id'],
+                    notification_type,
+                    device_name,
+                    new_notification['timestamp'],
+                    json.dumps(new_notification, ensure_ascii=False, default=str)
+                )
+            )
+            self._start_compactor()
+        except sqlite3.Error as e:
+            print(f"Error writing notifications: {e}")
+
+        return new_notification['id']
+
+    def get_notifications(self, limit: int = None, unread_only: bool = False) -> List[Dict[str, Any]]:
+        """Get notifications from the queue (newest first)"""
+        query = "SELECT seq, read, payload FROM notifications"
+        if unread_only:
+            query += " WHERE read = 0"
+        query += " ORDER BY seq DESC"
+        params = ()
+        if limit:
+            query += " LIMIT ?"
+            params = (limit,)
+
+        try:
+            rows = self._connect().execute(query, params).fetchall()
+        except sqlite3.Error:
             return []
-        except (json.JSONDecodeError, FileNotFoundError, PermissionError):
+        return [self._row_to_notification(row) for row in rows]
+
+    def get_notifications_since(self, seq: int, limit: int = None, newest: bool = False) -> List[Dict[str, Any]]:
+        """
+        Get notifications appended after sequence number seq (oldest first).
+        With newest=True the limit keeps the most recent entries instead of the oldest.
+        """
+        query = "SELECT seq, read, payload FROM notifications WHERE seq > ?"
+        query += " ORDER BY seq DESC" if newest else " ORDER BY seq ASC"
+        params = (seq,)
+        if limit:
+            query += " LIMIT ?"
+            params = (seq, limit)
+
+        try:
+            rows = self._connect().execute(query, params).fetchall()
+        except sqlite3.Error:
             return []
-    
-    def _write_notifications(self, notifications: List[Dict[str, Any]]):
-        """Write notifications to file"""
+        if newest:
+            rows.reverse()
+        return [self._row_to_notification(row) for row in rows]
+
+    def count_notifications_since(self, seq: int) -> int:
+        """Count notifications appended after sequence number seq"""
         try:
-            data = {
-                'notifications': notifications,
-                'last_updated': datetime.now().isoformat()
-            }
-            with open(self.file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-        except (PermissionError, OSError) as e:
-            print(f"Error writing notifications: {e}")
-    
-    def add_notification(self, notification_type: str, message: str, device_name: str, 
-                        user_id: str = None, status: str = None, **kwargs):
-        """Add a new notification to the queue"""
-        with self.lock:
-            notifications = self._read_notifications()
-            
-            new_notification = {
-                'id': f"{int(time.time()*1000)}_{len(notifications)}",  # Unique ID
-                'type': notification_type,
-                'message': message,
-                'device_name': device_name,
-                'user_id': user_id,
-                'status': status,
-                'timestamp': datetime.now().isoformat(),
-                'read': False,
-                **kwargs  # Additional data
-            }
-            
-            notifications.append(new_notification)
-            
-            # Keep only the latest notifications (FIFO)
-            if len(notifications) > self.max_notifications:
-                notifications = notifications[-self.max_notifications:]
-            
-            self._write_notifications(notifications)
-            return new_notification['id']
-    
-    def get_notifications(self, limit: int = None, unread_only: bool = False) -> List[Dict[str, Any]]:
-        """Get notifications from the queue"""
-        with self.lock:
-            notifications = self._read_notifications()
-            
-            if unread_only:
-                notifications = [n for n in notifications if not n.get('read', False)]
-            
-            # Sort by timestamp (newest first)
-            notifications.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
-            
-            if limit:
-                notifications = notifications[:limit]
-                
-            return notifications
-    
+            row = self._connect().execute("SELECT COUNT(*) FROM notifications WHERE seq > ?", (seq,)).fetchone()
+        except sqlite3.Error:
+            return 0
+        return row[0]
+
+    def get_last_sequence(self) -> int:
+        """Get the sequence number of the newest notification (0 if empty)"""
+        try:
+            row = self._connect().execute("SELECT MAX(seq) FROM notifications").fetchone()
+        except sqlite3.Error:
+            return 0
+        return row[0] or 0
+
     def mark_as_read(self, notification_ids: List[str] = None):
         """Mark notifications as read"""
-        with self.lock:
-            notifications = self._read_notifications()
-            
-            for notification in notifications:
-                if notification_ids is None or notification['id'] in notification_ids:
-                    notification['read'] = True
-            
-            self._write_notifications(notifications)
-    
+        try:
+            conn = self._connect()
+            if notification_ids is None:
+                conn.execute("UPDATE notifications SET read = 1 WHERE read = 0")
+            elif notification_ids:
+                placeholders = ', '.join('?' * len(notification_ids))
+                conn.execute(
+                    f"UPDATE notifications SET read = 1 WHERE id IN ({placeholders})",
+                    tuple(notification_ids)
+                )
+        except sqlite3.Error as e:
+            print(f"Error writing notifications: {e}")
+
     def clear_notifications(self):
         """Clear all notifications"""
-        with self.lock:
-            self._write_notifications([])
-    
+        try:
+            self._connect().execute("DELETE FROM notifications")
+        except sqlite3.Error as e:
+            print(f"Error writing notifications: {e}")
+
     def get_stats(self) -> Dict[str, Any]:
         """Get notification statistics"""
-        with self.lock:
-            notifications = self._read_notifications()
-            
-            total = len(notifications)
-            unread = len([n for n in notifications if not n.get('read', False)])
-            
+        try:
+            conn = self._connect()
+            total, unread = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(CASE WHEN read = 0 THEN 1 ELSE 0 END), 0) FROM notifications"
+            ).fetchone()
+
             # Count by type
-            type_counts = {}
-            for notification in notifications:
-                type_name = notification.get('type', 'unknown')
-                type_counts[type_name] = type_counts.get(type_name, 0) + 1
-            
+            type_counts = {
+                row[0] or 'unknown': row[1]
+                for row in conn.execute("SELECT type, COUNT(*) FROM notifications GROUP BY type")
+            }
+
             # Count by device
-            device_counts = {}
-            for notification in notifications:
-                device_name = notification.get('device_name', 'unknown')
-                device_counts[device_name] = device_counts.get(device_name, 0) + 1
-            
-            return {
-                'total': total,
-                'unread': unread,
-                'by_type': type_counts,
-                'by_device': device_counts,
-                'last_notification': notifications[-1] if notifications else None
+            device_counts = {
+                row[0] or 'unknown': row[1]
+                for row in conn.execute("SELECT device_name, COUNT(*) FROM notifications GROUP BY device_name")
             }
 
+            last_row = conn.execute(
+                "SELECT seq, read, payload FROM notifications ORDER BY seq DESC LIMIT 1"
+            ).fetchone()
+        except sqlite3.Error:
+            return {'total': 0, 'unread': 0, 'by_type': {}, 'by_device': {}, 'last_notification': None}
+
+        return {
+            'total': total,
+            'unread': unread,
+            'by_type': type_counts,
+            'by_device': device_counts,
+            'last_notification': self._row_to_notification(last_row) if last_row else None
+        }
+
 # Global instance for easy import
 notification_queue = NotificationQueue()
@@ -0,0 +1,148 @@
+"""
+Tests for parsing and saving the failed attendance (gagal absensi) Excel upload
+"""
+
+from datetime import datetime, time
+
+import pandas as pd
+import pytest
+
+from app.services.failed_attendance_upload_service import FailedAttendanceUploadService, REQUIRED_COLUMNS
+
+
+def _sheet(rows):
+    """DataFrame as returned by _read_excel_file; missing columns are blank"""
+    return pd.DataFrame([{column: row.get(column) for column in REQUIRED_COLUMNS} for row in rows])
+
+
+class FakeCursor:
+    """Stages rows and answers the INSERT ... SELECT with the rows the anti-join would keep"""
+
+    def __init__(self, table):
+        self.table = table
+        self.staged = []
+        self.rowcount = -1
+
+    def execute(self, sql, *params):
+        if 'INSERT INTO gagalabsens' in sql:
+            inserted = 0
+            for _, pin, tgl, machine, status in sorted(self.staged, key=lambda row: (row[2], row[0])):
+                key = (pin, machine, tgl[:16])
+                if key not in self.table:
+                    self.table[key] = status
+                    inserted += 1
+            self.rowcount = inserted
+
+    def executemany(self, sql, rows):
+        self.staged.extend(rows)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, table):
+        self.table = table
+
+    def cursor(self):
+        return FakeCursor(self.table)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeDatabaseManager:
+    def __init__(self):
+        self.table = {}
+
+    def get_connection(self):
+        return FakeConnection(self.table)
+
+
+@pytest.fixture
+def service():
+    service = FailedAttendanceUploadService()
+    service.db_manager = FakeDatabaseManager()
+    return service
+
+
+def _upload(service, monkeypatch, df):
+    monkeypatch.setattr(service, '_read_excel_file', lambda file_path: df)
+    return service.process_excel_upload('missing-upload.xlsx')
+
+
+def test_hmm_numbers_and_excel_time_cells(service):
+    df = _sheet([
+        {'TANGGAL': '2024-03-01', 'ID': 1001, 'MASUK': 800, 'PULANG': 1730.0},
+        {'TANGGAL': datetime(2024, 3, 2), 'ID': 1002.0, 'MASUK': time(7, 45), 'PULANG': datetime(1900, 1, 1, 16, 5)},
+        {'TANGGAL': '02/03/2024', 'ID': '1003', 'MASUK PRODUKSI': '8:15', 'PULANG PRODUKSI': '17:00'},
+    ])
+
+    punches, errors, stats = service._build_punches(df)
+
+    assert punches == [
+        ('1001', '2024-03-01 08:00:00', '104', 'I'),
+        ('1001', '2024-03-01 17:30:00', '102', 'O'),
+        ('1002', '2024-03-02 07:45:00', '104', 'I'),
+        ('1002', '2024-03-02 16:05:00', '102', 'O'),
+        ('1003', '2024-03-02 08:15:00', '204', 'I'),
+        ('1003', '2024-03-02 17:00:00', '202', 'O'),
+    ]
+    assert errors == []
+    assert stats['processed_masuk'] == 2
+    assert stats['processed_produksi'] == 2
+    assert stats['processed_pulang'] == 2
+
+
+def test_out_of_range_times_are_rejected(service):
+    df = _sheet([{'TANGGAL': '2024-03-01', 'ID': 1001, 'MASUK': '25:00', 'PULANG': '17:60', 'MASUK PRODUKSI': 2400}])
+
+    punches, errors, stats = service._build_punches(df)
+
+    assert punches == []
+    assert [(error['column'], error['value']) for error in errors] == [
+        ('MASUK', '25:00'), ('MASUK PRODUKSI', '2400'), ('PULANG', '17:60')
+    ]
+    assert stats['skipped_rows'] == 1
+
+
+def test_invalid_ids_are_reported_without_aborting_the_upload(service):
+    df = _sheet([
+        {'TANGGAL': '2024-03-01', 'ID': float('inf'), 'MASUK': '08:00'},
+        {'TANGGAL': '2024-03-01', 'ID': '-inf', 'MASUK': '08:00'},
+        {'TANGGAL': '2024-03-01', 'ID': 12.5, 'MASUK': '08:00'},
+        {'TANGGAL': '2024-03-01', 'ID': None, 'MASUK': '08:00'},
+        {'TANGGAL': '2024-03-01', 'ID': 1e30, 'MASUK': '08:00'},
+        {'TANGGAL': '2024-03-01', 'ID': 1004, 'MASUK': '08:00'},
+    ])
+
+    punches, errors, stats = service._build_punches(df)
+
+    assert punches == [('1004', '2024-03-01 08:00:00', '104', 'I')]
+    assert [error['row'] for error in errors if error['column'] == 'ID'] == [2, 3, 4, 5, 6]
+    assert stats['error_rows'] == 5
+
+
+def test_reupload_counts_duplicates(service, monkeypatch):
+    rows = [
+        {'TANGGAL': '2024-03-01', 'ID': 1001, 'MASUK': '08:00', 'PULANG': '17:00'},
+        {'TANGGAL': '2024-03-01', 'ID': 1002, 'MASUK': '08:05'},
+        # Same PIN, machine and minute as the first row
+        {'TANGGAL': '2024-03-01', 'ID': 1001, 'MASUK': '08:00:30'},
+    ]
+
+    success, message, stats = _upload(service, monkeypatch, _sheet(rows))
+    assert success, message
+    assert (stats['inserted_records'], stats['duplicate_records']) == (3, 1)
+
+    rows.append({'TANGGAL': '2024-03-02', 'ID': 1001, 'MASUK': '08:00'})
+    success, message, stats = _upload(service, monkeypatch, _sheet(rows))
+    assert success, message
+    assert (stats['inserted_records'], stats['duplicate_records']) == (1, 4)
+    assert len(service.db_manager.table) == 4
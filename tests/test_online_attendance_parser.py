@@ -0,0 +1,49 @@
+"""
+Tests for the incremental Online Attendance response parser
+"""
+
+import json
+
+import pytest
+
+from app.services.online_attendance_service import _iter_json_records
+
+
+def _chunked(body, size):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+def test_multibyte_character_split_across_chunks():
+    body = json.dumps({'data': [{'pin': '1', 'name': 'Siti Nur’aini É'}]}, ensure_ascii=False).encode('utf-8')
+    split = body.index('’'.encode('utf-8')) + 1  # inside the 3-byte sequence
+    meta = {}
+
+    records = list(_iter_json_records([body[:split], body[split:]], meta))
+
+    assert records == [{'pin': '1', 'name': 'Siti Nur’aini É'}]
+
+
+def test_every_chunk_size_yields_the_same_records():
+    payload = {
+        'current_page': 1,
+        'data': [{'pin': str(i), 'name': 'Ñame 中', 'status': 'I'} for i in range(20)],
+        'last_page': 2,
+    }
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+    for size in (1, 2, 3, 7, 64):
+        meta = {}
+        assert list(_iter_json_records(_chunked(body, size), meta)) == payload['data']
+        assert meta == {'current_page': 1, 'last_page': 2}
+
+
+def test_top_level_list():
+    assert list(_iter_json_records([b'[{"pin": "1"},', b' {"pin": "2"}]'], {})) == [{'pin': '1'}, {'pin': '2'}]
+
+
+def test_truncated_multibyte_sequence_raises():
+    body = '[{"name": "é"}]'.encode('utf-8')
+    truncated = body[:body.index('é'.encode('utf-8')) + 1]
+
+    with pytest.raises(ValueError):
+        list(_iter_json_records([truncated], {}))
@@ -11,10 +11,11 @@ import sys
 project_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, project_dir)
 
-from app import create_app
+from app import create_app, start_leader_elector
 
 # Create application instance for production
 application = create_app('production')
+start_leader_elector(application, 'production')
 
 if __name__ == "__main__":
     application.run()